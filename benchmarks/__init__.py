@@ -0,0 +1,13 @@
+"""
+This directory contains the performance benchmarks of FB-PIC.
+
+The benchmarks follow the conventions of airspeed velocity (asv): each
+benchmark is a class with the attributes `params` and `param_names`, a
+method `setup` and one or several methods `time_*`. They can thus be run
+either with `asv run` (see `asv.conf.json`), or with the standalone
+script `benchmarks/run_benchmarks.py`, which does not require asv.
+
+The script `benchmarks/scaling.py` measures the strong and weak scaling
+of the domain decomposition with MPI (it launches the simulations itself,
+and is thus not part of the asv benchmarks).
+"""
@@ -0,0 +1,102 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the performance benchmarks of FB-PIC.
+It benchmarks the field kernels on CPU: the Hankel and Fourier transforms
+(for one azimuthal mode), the complete transformation of the fields
+between the interpolation and spectral grids, and the field push in
+spectral space (standard, Galilean and comoving PSATD), with the
+azimuthal modes handled serially or concurrently.
+"""
+import numpy as np
+from scipy.constants import c
+from fbpic.fields.spectral_transform.hankel import DHT
+from fbpic.fields.spectral_transform.fourier import FFT
+from .common import get_simulation, set_num_threads, count_cells, \
+    reference_configs, config_names, thread_counts, rmax
+
+class Transforms(object):
+    """
+    Forward and backward discrete Hankel transform (DHT) and
+    Fourier transform (FFT) of one complex array of shape (Nz, Nr)
+    """
+    params = [ config_names, thread_counts ]
+    param_names = [ 'config', 'nthreads' ]
+    timeout = 600
+
+    def setup( self, config, nthreads ):
+        set_num_threads( nthreads )
+        Nz = reference_configs[config]['Nz']
+        Nr = reference_configs[config]['Nr']
+        self.dht = DHT( 1, 0, Nr, Nz, rmax )
+        self.fft = FFT( Nr, Nz )
+        np.random.seed(0)
+        self.array_in = np.random.random( (Nz, Nr) ) \
+            + 1.j*np.random.random( (Nz, Nr) )
+        self.array_out = np.empty( (Nz, Nr), dtype=np.complex128 )
+        self.n_cells = Nz*Nr
+
+    def time_dht_transform( self, config, nthreads ):
+        self.dht.transform( self.array_in, self.array_out )
+
+    def time_dht_inverse_transform( self, config, nthreads ):
+        self.dht.inverse_transform( self.array_in, self.array_out )
+
+    def time_fft_transform( self, config, nthreads ):
+        self.fft.transform( self.array_in, self.array_out )
+
+    def time_fft_inverse_transform( self, config, nthreads ):
+        self.fft.inverse_transform( self.array_in, self.array_out )
+
+
+class FieldKernels(object):
+    """
+    Transformation of the fields and currents between the interpolation
+    and spectral grids (all azimuthal modes), and field push
+    """
+    params = [ config_names, [ 'standard', 'galilean', 'comoving' ],
+               thread_counts ]
+    param_names = [ 'config', 'solver', 'nthreads' ]
+    timeout = 600
+
+    def setup( self, config, solver, nthreads ):
+        set_num_threads( nthreads )
+        if solver == 'standard':
+            kw = {}
+        else:
+            kw = dict( v_comoving=-0.999*c,
+                       use_galilean=(solver == 'galilean') )
+        self.fld = get_simulation( config, **kw ).fld
+        self.n_cells = count_cells( get_simulation( config, **kw ) )
+
+    def time_interp2spect_J( self, config, solver, nthreads ):
+        self.fld.interp2spect( 'J' )
+
+    def time_spect2interp_E( self, config, solver, nthreads ):
+        self.fld.spect2interp( 'E' )
+
+    def time_push( self, config, solver, nthreads ):
+        self.fld.push( use_true_rho=True )
+
+
+class ModeThreads(object):
+    """
+    Transformation of the fields and field push, with the azimuthal
+    modes handled serially or concurrently (`use_mode_threads`)
+    """
+    params = [ config_names, [ False, True ] ]
+    param_names = [ 'config', 'use_mode_threads' ]
+    timeout = 600
+
+    def setup( self, config, use_mode_threads ):
+        set_num_threads( thread_counts[-1] )
+        sim = get_simulation( config, use_mode_threads=use_mode_threads )
+        self.fld = sim.fld
+        self.n_cells = count_cells( sim )
+
+    def time_transforms_and_push( self, config, use_mode_threads ):
+        self.fld.interp2spect( 'J' )
+        self.fld.push( use_true_rho=True )
+        self.fld.spect2interp( 'E' )
+        self.fld.spect2interp( 'B' )
@@ -0,0 +1,116 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the performance benchmarks of FB-PIC.
+It benchmarks the particle kernels on CPU: deposition of rho and J,
+field gathering, momentum and position push, and removal of the
+particles that leave the local domain.
+
+The kernels are called through the methods of the `Particles` object
+(e.g. `deposit` calls `deposit_J_numba_linear` or `deposit_J_numba_cubic`,
+depending on the particle shape), so that the benchmarks remain valid
+when the signature of the kernels changes.
+"""
+from fbpic.boundaries.particle_buffer_handling import remove_particles_cpu
+from .common import get_simulation, set_num_threads, count_particles, \
+    config_names, particle_shapes, thread_counts
+
+class ParticleKernels(object):
+    """
+    Deposition, gathering and push of the macroparticles of a uniform
+    plasma, for the reference configurations
+    """
+    params = [ config_names, particle_shapes, thread_counts ]
+    param_names = [ 'config', 'shape', 'nthreads' ]
+    timeout = 600
+
+    def setup( self, config, shape, nthreads ):
+        set_num_threads( nthreads )
+        self.sim = get_simulation( config, shape )
+        self.species = self.sim.ptcl[0]
+        self.n_particles = count_particles( self.sim )
+
+    def time_deposit_rho( self, config, shape, nthreads ):
+        self.species.deposit( self.sim.fld, 'rho' )
+
+    def time_deposit_J( self, config, shape, nthreads ):
+        self.species.deposit( self.sim.fld, 'J' )
+
+    def time_gather( self, config, shape, nthreads ):
+        self.species.gather( self.sim.fld.interp )
+
+    def time_push_p( self, config, shape, nthreads ):
+        self.species.push_p( self.sim.time )
+
+    def time_push_x( self, config, shape, nthreads ):
+        # Push forward and backward, so that the particles stay in the box
+        self.species.push_x( 0.5*self.sim.dt )
+        self.species.push_x( -0.5*self.sim.dt )
+
+
+class ParticleRemoval(object):
+    """
+    Removal of the particles that are in the guard cells (and copy into
+    the MPI sending buffers), with 10% of the particles to be removed
+
+    (The simulation has open boundaries, so that it has guard cells.
+    Since the particles are removed in place, each timed call needs fresh
+    copies of the particle arrays: these are restored by `setup`, which
+    is called before each call, since `number` is 1.)
+    """
+    params = [ config_names ]
+    param_names = [ 'config' ]
+    timeout = 600
+    number = 1
+    warmup_time = 0
+    attributes = [ 'x', 'y', 'z', 'ux', 'uy', 'uz', 'inv_gamma', 'w' ]
+
+    def setup( self, config ):
+        self.sim = get_simulation( config, boundaries='open' )
+        self.species = self.sim.ptcl[0]
+        self.n_particles = count_particles( self.sim )
+        # Store the arrays of the cached simulation (restored in
+        # `teardown`), and prepare modified copies
+        self.cached = [ getattr( self.species, attr )
+                        for attr in self.attributes ]
+        self.original = [ array.copy() for array in self.cached ]
+        # Place 90% of the particles in the physical domain,
+        # and 10% in the guard cells
+        interp = self.sim.fld.interp[0]
+        n_guard = self.sim.comm.n_guard
+        assert n_guard > 0
+        zbox_min = interp.zmin + n_guard*interp.dz
+        zbox_max = interp.zmax - n_guard*interp.dz
+        z = self.original[2]
+        z[:] = zbox_min + (zbox_max - zbox_min) * \
+            (z - interp.zmin)/(interp.zmax - interp.zmin)
+        z[::10] = interp.zmin + 0.25*interp.dz
+        # Check that the particles in the guard cells are removed
+        self.restore( self.original )
+        self.remove_particles()
+        assert self.species.Ntot == len( z ) - len( z[::10] )
+        # Use fresh copies for the timed call
+        self.restore( self.original )
+
+    def teardown( self, config ):
+        self.restore( self.cached, copy=False )
+
+    def restore( self, arrays, copy=True ):
+        """
+        Replace the particle arrays of the species by `arrays`
+        (or by copies of `arrays`, if `copy` is True)
+        """
+        for attr, array in zip( self.attributes, arrays ):
+            if copy:
+                array = array.copy()
+            setattr( self.species, attr, array )
+        self.species.Ntot = len( arrays[0] )
+
+    def remove_particles( self ):
+        """Remove the particles that are in the guard cells"""
+        remove_particles_cpu( self.species, self.sim.fld,
+                              self.sim.comm.n_guard, 0, 0 )
+
+    def time_remove_particles( self, config ):
+        self.remove_particles()
@@ -0,0 +1,34 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the performance benchmarks of FB-PIC.
+It benchmarks the complete PIC cycle (`Simulation.step`), with a uniform
+plasma, for the reference configurations.
+"""
+from .common import create_simulation, set_num_threads, count_cells, \
+    count_particles, config_names, particle_shapes, thread_counts
+
+# Simulations of this benchmark (they are advanced by the benchmark,
+# and are thus not shared with the other benchmarks ; see `get_simulation`)
+_step_simulations = {}
+
+class SimulationStep(object):
+    """
+    One PIC iteration (deposition, field solve, gathering and push)
+    """
+    params = [ config_names, particle_shapes, thread_counts ]
+    param_names = [ 'config', 'shape', 'nthreads' ]
+    timeout = 1200
+
+    def setup( self, config, shape, nthreads ):
+        set_num_threads( nthreads )
+        if (config, shape) not in _step_simulations:
+            _step_simulations[ (config, shape) ] = \
+                create_simulation( config, shape )
+        self.sim = _step_simulations[ (config, shape) ]
+        self.n_particles = count_particles( self.sim )
+        self.n_cells = count_cells( self.sim )
+
+    def time_step( self, config, shape, nthreads ):
+        self.sim.step( 1, show_progress=False )
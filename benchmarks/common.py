@@ -0,0 +1,115 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the performance benchmarks of FB-PIC.
+It defines the reference configurations of the benchmarks, and the
+functions that set up the corresponding simulations.
+"""
+import numpy as np
+import numba
+from scipy.constants import c
+from fbpic.main import Simulation
+from fbpic.utils.threading import threading_enabled
+
+# Reference configurations (grid size Nz x Nr x Nm,
+# and number of macroparticles per cell along z, r and theta)
+# - 'small': quick check, which runs in a few seconds
+# - 'lwfa': typical laser-wakefield simulation, on one node
+# - 'multimode': same grid, with 4 azimuthal modes (e.g. for asymmetric
+#   lasers), and thus twice more macroparticles along theta
+reference_configs = {
+    'small': dict( Nz=256, Nr=64, Nm=2, p_nz=2, p_nr=2, p_nt=4 ),
+    'lwfa': dict( Nz=1024, Nr=128, Nm=2, p_nz=2, p_nr=2, p_nt=4 ),
+    'multimode': dict( Nz=1024, Nr=128, Nm=4, p_nz=2, p_nr=2, p_nt=8 ),
+}
+config_names = [ 'small', 'lwfa', 'multimode' ]
+particle_shapes = [ 'linear', 'cubic' ]
+
+# Box size (the physical size does not affect the performance)
+zmin = -20.e-6
+zmax = 20.e-6
+rmax = 20.e-6
+n_e = 4.e24
+
+def get_thread_counts():
+    """
+    Return the numbers of threads for which the benchmarks are run:
+    1 and all the threads available to numba (and the powers of 2 between)
+    """
+    if not threading_enabled:
+        return( [1] )
+    max_threads = numba.config.NUMBA_NUM_THREADS
+    counts = [ 2**i for i in range(int(np.log2(max_threads))+1) ]
+    if counts[-1] != max_threads:
+        counts.append( max_threads )
+    return( counts )
+
+thread_counts = get_thread_counts()
+
+def set_num_threads( n ):
+    """Use `n` threads in the numba parallel kernels"""
+    if threading_enabled:
+        numba.set_num_threads( n )
+
+_simulation_cache = {}
+
+def get_simulation( config_name, particle_shape='linear', **kw ):
+    """
+    Return a simulation with a uniform plasma (electrons only),
+    for the reference configuration `config_name`.
+
+    The simulations are cached, so that benchmarks with the same
+    configuration do not need to reinitialize them. (The benchmarks
+    should thus not modify the simulation, or restore it afterwards.)
+
+    Parameters
+    ----------
+    config_name: str
+        One of the keys of `reference_configs`
+
+    particle_shape: str
+        Either 'linear' or 'cubic'
+
+    **kw: keyword arguments passed to `Simulation`
+        (e.g. `v_comoving`, `use_galilean`, `boundaries`)
+    """
+    key = ( config_name, particle_shape, tuple(sorted(kw.items())) )
+    if key not in _simulation_cache:
+        _simulation_cache[key] = create_simulation( config_name,
+                                                    particle_shape, **kw )
+    return( _simulation_cache[key] )
+
+def create_simulation( config_name, particle_shape='linear', **kw ):
+    """
+    Return a new simulation with a uniform plasma (electrons only), for
+    the reference configuration `config_name`, without caching it.
+    (For the benchmarks that modify the simulation ; see `get_simulation`
+    for the parameters.)
+    """
+    config = reference_configs[ config_name ]
+    Nz = config['Nz']
+    dt = (zmax-zmin)/Nz/c
+    sim = Simulation( Nz, zmax, config['Nr'], rmax, config['Nm'], dt,
+                zmin=zmin, n_e=n_e, p_nz=config['p_nz'],
+                p_nr=config['p_nr'], p_nt=config['p_nt'],
+                particle_shape=particle_shape, use_cuda=False,
+                verbose_level=0, **kw )
+    # Give the particles a small random momentum, so that the
+    # deposition and push kernels do not operate on trivial data
+    np.random.seed(0)
+    elec = sim.ptcl[0]
+    for u in [ elec.ux, elec.uy, elec.uz ]:
+        u[:] = 1.e-2*np.random.normal( size=elec.Ntot )
+    elec.inv_gamma[:] = 1./np.sqrt( 1 + elec.ux**2 + elec.uy**2
+                                      + elec.uz**2 )
+    return( sim )
+
+def count_cells( sim ):
+    """Return the number of cells of the grid, summed over the modes"""
+    interp = sim.fld.interp[0]
+    return( interp.Nz * interp.Nr * sim.fld.Nm )
+
+def count_particles( sim ):
+    """Return the total number of macroparticles of the simulation"""
+    return( sum( species.Ntot for species in sim.ptcl ) )
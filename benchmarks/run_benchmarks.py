@@ -0,0 +1,200 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the performance benchmarks of FB-PIC.
+It runs the benchmarks without asv, reports the measured throughput
+(macroparticles per second and cells per second), stores the results in
+a json file, and compares them with the results of another run (e.g.
+obtained with a previous commit, or with other versions of the
+dependencies).
+
+Usage :
+-------
+Run all the benchmarks for the 'small' configuration and store the results:
+$ python benchmarks/run_benchmarks.py --config small --save before.json
+Then, e.g. after upgrading numba, compare with the previous results:
+$ python benchmarks/run_benchmarks.py --config small --save after.json \
+      --compare before.json
+(The script exits with a non-zero status if one of the benchmarks is
+slower than in the reference file, by more than `--threshold`.)
+"""
+import os
+import sys
+import re
+import json
+import time
+import argparse
+import itertools
+import importlib
+import platform
+import subprocess
+import numpy as np
+
+benchmark_modules = [ 'bench_particles', 'bench_fields', 'bench_simulation' ]
+
+def get_environment():
+    """Return a dictionary that describes the code and its dependencies"""
+    import numba
+    import scipy
+    import fbpic
+    repo_dir = os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) )
+    try:
+        commit = subprocess.check_output( ['git', 'rev-parse', 'HEAD'],
+            cwd=repo_dir, stderr=subprocess.STDOUT ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = 'unknown'
+    return( dict( commit=commit, fbpic=fbpic.__version__,
+        numba=numba.__version__, numpy=np.__version__,
+        scipy=scipy.__version__, python=platform.python_version(),
+        machine=platform.node(), processor=platform.processor(),
+        date=time.strftime('%Y-%m-%d %H:%M:%S') ) )
+
+def iter_benchmarks( pattern, configs, threads ):
+    """
+    Yield the name, the benchmark class, the name of the timed method and
+    the parameters, for all the benchmarks whose name matches `pattern`
+    (and whose parameters are in `configs` and `threads`, if not None)
+    """
+    for module_name in benchmark_modules:
+        module = importlib.import_module( 'benchmarks.' + module_name )
+        for class_name in sorted( dir(module) ):
+            cls = getattr( module, class_name )
+            if not (isinstance( cls, type ) and hasattr( cls, 'params' )):
+                continue
+            methods = [ m for m in sorted(dir(cls)) if m.startswith('time_') ]
+            for params in itertools.product( *cls.params ):
+                named = dict( zip( cls.param_names, params ) )
+                if configs and named.get('config') not in configs:
+                    continue
+                if threads and named.get('nthreads', 1) not in threads:
+                    continue
+                for method in methods:
+                    name = '%s.%s(%s)' %( class_name, method,
+                                ', '.join( str(p) for p in params ) )
+                    if re.search( pattern, name ):
+                        yield( name, cls, method, params )
+
+def run_benchmark( cls, method, params, repeat, number ):
+    """
+    Run one benchmark: call the timed method once (to trigger the
+    compilation of the kernels), and then time `repeat` series of
+    `number` calls. As in asv, `setup` and `teardown` are called before
+    and after each series, and the benchmark class can impose `number`
+    (e.g. `number = 1` for the benchmarks that modify their data).
+    Return a dictionary with the median and minimal time per call,
+    and the corresponding throughput.
+    """
+    bench = cls()
+    number = getattr( cls, 'number', number )
+    func = getattr( bench, method )
+    timings = []
+    for i_series in range( repeat + 1 ):
+        bench.setup( *params )
+        t0 = time.perf_counter()
+        # (The first series only calls the method once, for compilation)
+        n_calls = number if i_series > 0 else 1
+        for _ in range( n_calls ):
+            func( *params )
+        if i_series > 0:
+            timings.append( (time.perf_counter() - t0)/number )
+        if hasattr( bench, 'teardown' ):
+            bench.teardown( *params )
+
+    result = dict( time=float(np.median(timings)),
+                   min_time=float(np.min(timings)) )
+    for quantity in [ 'particles', 'cells' ]:
+        n = getattr( bench, 'n_' + quantity, None )
+        if n is not None:
+            result[ quantity + '_per_s' ] = n/result['time']
+    return( result )
+
+def format_result( result ):
+    """Return a short string that describes `result`"""
+    line = '%10.3e s' %result['time']
+    for quantity in [ 'particles', 'cells' ]:
+        key = quantity + '_per_s'
+        if key in result:
+            line += '  %10.3e %s/s' %( result[key], quantity )
+    return( line )
+
+def compare( results, reference, threshold ):
+    """
+    Print the ratio of the times in `results` and `reference`
+    (dictionaries of results), and return the names of the
+    benchmarks that are slower by more than `threshold` (relative)
+
+    (The minimal times are compared, since they are less sensitive
+    to the noise of the machine than the median times.)
+    """
+    regressions = []
+    print( '\nComparison with the reference (time / reference time):' )
+    for name in sorted( results ):
+        if name not in reference:
+            continue
+        ratio = results[name]['min_time']/reference[name]['min_time']
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  <-- slower'
+            regressions.append( name )
+        elif ratio < 1 - threshold:
+            flag = '  <-- faster'
+        print( '%-70s %6.3f%s' %(name, ratio, flag) )
+    return( regressions )
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( description=
+        'Run the performance benchmarks of FB-PIC' )
+    parser.add_argument( '--bench', default='.',
+        help='Regular expression; only the matching benchmarks are run' )
+    parser.add_argument( '--config', nargs='*', default=None,
+        help='Reference configurations to be run (default: all)' )
+    parser.add_argument( '--threads', nargs='*', type=int, default=None,
+        help='Numbers of threads to be run (default: all)' )
+    parser.add_argument( '--repeat', type=int, default=5,
+        help='Number of timed series for each benchmark' )
+    parser.add_argument( '--number', type=int, default=1,
+        help='Number of calls in each timed series' )
+    parser.add_argument( '--save', default=None,
+        help='json file in which the results are stored' )
+    parser.add_argument( '--compare', default=None,
+        help='json file with the reference results (from --save)' )
+    parser.add_argument( '--threshold', type=float, default=0.1,
+        help='Relative slowdown above which a benchmark is flagged' )
+    args = parser.parse_args( argv )
+
+    # Make the package `benchmarks` importable
+    sys.path.insert( 0,
+        os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ) )
+
+    environment = get_environment()
+    print( 'fbpic %(fbpic)s (commit %(commit)s), numba %(numba)s, '
+           'numpy %(numpy)s' %environment )
+    results = {}
+    for name, cls, method, params in iter_benchmarks(
+                                args.bench, args.config, args.threads ):
+        results[name] = run_benchmark( cls, method, params,
+                                       args.repeat, args.number )
+        print( '%-70s %s' %(name, format_result(results[name])) )
+        sys.stdout.flush()
+
+    if args.save is not None:
+        with open( args.save, 'w' ) as f:
+            json.dump( dict( environment=environment, results=results ),
+                       f, indent=2, sort_keys=True )
+
+    if args.compare is not None:
+        with open( args.compare ) as f:
+            reference = json.load( f )
+        print( 'Reference: commit %(commit)s, numba %(numba)s, '
+               'numpy %(numpy)s' %reference['environment'] )
+        regressions = compare( results, reference['results'],
+                               args.threshold )
+        if regressions:
+            print( '\n%d benchmark(s) slower than the reference.'
+                   %len(regressions) )
+            return( 1 )
+    return( 0 )
+
+if __name__ == '__main__':
+    sys.exit( main() )
@@ -0,0 +1,321 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the performance benchmarks of FB-PIC.
+It measures the strong and weak scaling of an LWFA simulation (same setup
+as `docs/source/example_input/lwfa_script.py`), with domain decomposition
+on one machine, for different values of `n_order`, `n_guard` and
+`exchange_period`.
+
+For each number of MPI ranks and each set of parameters, the script
+launches the simulation with `mpirun` (in a separate process), and
+collects the time spent in each stage of the PIC loop, the time spent in
+the MPI exchanges (`exchange_domains`, in which the ranks wait for their
+neighbors) and in the gathering of the diagnostics (`Gatherv`), as well
+as the size of the exchanged messages. The results are printed as strong
+and weak scaling tables, and can be stored in a json file.
+
+Usage :
+-------
+Strong and weak scaling on 1, 2 and 4 ranks, for two stencil orders:
+$ python benchmarks/scaling.py --np 1 2 4 --n_order 16 32
+With another MPI launcher (`{np}` is replaced by the number of ranks):
+$ python benchmarks/scaling.py --np 1 2 4 --launcher "srun -n {np}"
+"""
+import os
+import sys
+import json
+import time
+import shlex
+import shutil
+import argparse
+import tempfile
+import itertools
+import subprocess
+import numpy as np
+
+# Stages of the PIC loop, given as (object, method), where the object is
+# 'comm', 'fld' or 'species' (i.e. each species of the simulation)
+timed_stages = [
+    ('species', 'deposit'), ('species', 'gather'),
+    ('species', 'push_p'), ('species', 'push_x'),
+    ('fld', 'interp2spect'), ('fld', 'spect2interp'),
+    ('fld', 'filter_spect'), ('fld', 'correct_currents'), ('fld', 'push'),
+    ('comm', 'exchange_fields'), ('comm', 'exchange_particles'),
+    ('comm', 'move_grids'), ('comm', 'damp_EB_open_boundary') ]
+# MPI communications (called by the above stages or by the diagnostics),
+# for which the size of the sent messages is also recorded, with the number
+# of leading arguments of each method that are sent buffers
+timed_communications = [ ('exchange_domains', 2), ('gather_grid_array', 1),
+                         ('gather_ptcl_array', 1) ]
+
+class StageTimer(object):
+    """
+    Measures the time spent in methods of the simulation objects, by
+    replacing them with timed wrappers (on the instances only).
+    """
+
+    def __init__( self ):
+        self.time = {}
+        self.calls = {}
+        self.nbytes = {}
+
+    def wrap( self, obj, method, label, n_sent_args=0 ):
+        """
+        Replace `obj.method` by a wrapper which records the time spent
+        in the method (and the size of its first `n_sent_args` positional
+        arguments, i.e. of the sent buffers) under the name `label`
+        """
+        func = getattr( obj, method )
+        for d in [ self.time, self.calls, self.nbytes ]:
+            d.setdefault( label, 0 )
+
+        def timed_func( *args, **kwargs ):
+            t0 = time.perf_counter()
+            result = func( *args, **kwargs )
+            self.time[label] += time.perf_counter() - t0
+            self.calls[label] += 1
+            self.nbytes[label] += int( sum( a.nbytes
+                for a in args[:n_sent_args] if isinstance(a, np.ndarray) ) )
+            return( result )
+
+        setattr( obj, method, timed_func )
+
+    def reset( self ):
+        """Reset the recorded quantities (e.g. after the warm-up steps)"""
+        for d in [ self.time, self.calls, self.nbytes ]:
+            for label in d:
+                d[label] = 0
+
+    def instrument( self, sim ):
+        """Wrap the stages of the PIC loop and the MPI communications"""
+        for obj_name, method in timed_stages:
+            if obj_name == 'species':
+                for species in sim.ptcl:
+                    self.wrap( species, method, 'species.' + method )
+            else:
+                self.wrap( getattr( sim, obj_name ), method,
+                           obj_name + '.' + method )
+        for method, n_sent_args in timed_communications:
+            # Only the sent buffers are counted (e.g. in `exchange_domains`,
+            # the received buffers have the same size on the neighbors)
+            self.wrap( sim.comm, method, 'comm.' + method, n_sent_args )
+
+def run_worker( args ):
+    """
+    Run the LWFA simulation on the current MPI ranks, and write the
+    timings of all ranks in the json file `args.output` (on rank 0)
+    """
+    from scipy.constants import c
+    from fbpic.main import Simulation
+    from fbpic.lpa_utils.laser import add_laser
+    from fbpic.openpmd_diag import FieldDiagnostic
+
+    # LWFA setup (as in docs/source/example_input/lwfa_script.py),
+    # where the box is extended along z for weak scaling
+    Nz = args.Nz
+    zmin = -10.e-6
+    zmax = 30.e-6
+    if args.mode == 'weak':
+        Nz = args.Nz*args.size
+        zmin = zmax - (zmax - zmin)*args.size
+    dt = (zmax-zmin)/Nz/c
+    n_guard = None if args.n_guard < 0 else args.n_guard
+    exchange_period = None if args.exchange_period < 0 \
+        else args.exchange_period
+    sim = Simulation( Nz, zmax, args.Nr, 20.e-6, args.Nm, dt,
+        p_zmin=zmin, p_zmax=500.e-6, p_rmax=18.e-6, p_nz=2, p_nr=2, p_nt=4,
+        n_e=4.e24, zmin=zmin, boundaries='open', n_order=args.n_order,
+        n_guard=n_guard, exchange_period=exchange_period,
+        use_cuda=args.use_cuda, verbose_level=0 )
+    add_laser( sim, 4., 5.e-6, 5.e-6, zmax - 15.e-6 )
+    sim.set_moving_window( v=c )
+    write_dir = tempfile.mkdtemp()
+    if args.diag_period > 0:
+        sim.diags = [ FieldDiagnostic( args.diag_period, sim.fld,
+                        comm=sim.comm, write_dir=write_dir ) ]
+
+    # Instrument the simulation, run the warm-up steps (compilation)
+    # and then the timed steps
+    timer = StageTimer()
+    timer.instrument( sim )
+    sim.step( args.warmup_steps, show_progress=False )
+    timer.reset()
+    if sim.comm.size > 1:
+        sim.comm.mpi_comm.Barrier()
+    t0 = time.perf_counter()
+    sim.step( args.steps, show_progress=False )
+    total = time.perf_counter() - t0
+    shutil.rmtree( write_dir, ignore_errors=True )
+
+    local = dict( total=total, time=timer.time, calls=timer.calls,
+        nbytes=timer.nbytes, Nz_local=int(sim.fld.interp[0].Nz),
+        n_guard=int(sim.comm.n_guard),
+        exchange_period=int(sim.comm.exchange_period),
+        Nptcl=int(sum( species.Ntot for species in sim.ptcl )) )
+    if sim.comm.size > 1:
+        ranks = sim.comm.mpi_comm.gather( local, root=0 )
+    else:
+        ranks = [ local ]
+    if sim.comm.rank == 0:
+        with open( args.output, 'w' ) as f:
+            json.dump( dict( size=sim.comm.size, Nz=Nz, steps=args.steps,
+                             ranks=ranks ), f )
+
+def launch( args, size, mode, n_order, n_guard, exchange_period ):
+    """
+    Launch one run of the worker on `size` MPI ranks, and return its
+    results (or None if the run failed)
+    """
+    fd, output = tempfile.mkstemp( suffix='.json' )
+    os.close( fd )
+    command = []
+    if size > 1 or args.launch_serial:
+        command += shlex.split( args.launcher.format( np=size ) )
+    command += [ sys.executable, os.path.abspath(__file__), '--worker',
+        '--output', output, '--size', str(size), '--mode', mode,
+        '--n_order', str(n_order), '--n_guard', str(n_guard),
+        '--exchange_period', str(exchange_period) ]
+    for option in [ 'Nz', 'Nr', 'Nm', 'steps', 'warmup_steps',
+                    'diag_period' ]:
+        command += [ '--' + option, str(getattr( args, option )) ]
+    if args.use_cuda:
+        command += [ '--use_cuda' ]
+    # (The output file is created empty, and written by the worker)
+    if subprocess.call( command ) != 0 or os.path.getsize( output ) == 0:
+        print( 'Run failed: %s' %' '.join(command) )
+        os.remove( output )
+        return( None )
+    with open( output ) as f:
+        result = json.load( f )
+    os.remove( output )
+    return( result )
+
+def summarize( result ):
+    """
+    Return a dictionary with the time per step, the time per step spent
+    in the communications (maximum over the ranks) and the size of the
+    sent messages per step (summed over the ranks)
+    """
+    ranks = result['ranks']
+    steps = result['steps']
+    summary = dict( time_per_step=max( r['total'] for r in ranks )/steps )
+    for label in [ 'comm.exchange_domains', 'comm.gather_grid_array' ]:
+        summary[label] = max( r['time'][label] for r in ranks )/steps
+        summary[label + ' MB'] = sum( r['nbytes'][label]
+                                      for r in ranks )/steps/1.e6
+    # Load imbalance: ratio of the maximal and average time in the
+    # particle stages (which depend on the number of particles per rank)
+    ptcl_times = [ sum( t for label, t in r['time'].items()
+                        if label.startswith('species.') ) for r in ranks ]
+    summary['imbalance'] = max( ptcl_times )/max( np.mean(ptcl_times), 1e-30 )
+    return( summary )
+
+def print_table( title, mode, results ):
+    """Print the scaling table for the list of (size, result)"""
+    print( '\n' + title )
+    print( '%5s %10s %10s %8s %8s %12s %10s %10s %9s' %( 'np',
+        'Nz', 's/step', 'speedup' if mode == 'strong' else '',
+        'effic.', 'exch. s/step', 'exch. MB', 'gath. s', 'imbal.' ) )
+    reference = None
+    for size, result in results:
+        summary = summarize( result )
+        if reference is None:
+            reference = ( size, summary['time_per_step'] )
+        if mode == 'strong':
+            speedup = reference[1]/summary['time_per_step']
+            efficiency = speedup*reference[0]/size
+            speedup = '%8.2f' %speedup
+        else:
+            speedup = ''
+            efficiency = reference[1]/summary['time_per_step']
+        print( '%5d %10d %10.3e %8s %8.2f %12.3e %10.3f %10.3e %9.2f' %(
+            size, result['Nz'], summary['time_per_step'], speedup,
+            efficiency, summary['comm.exchange_domains'],
+            summary['comm.exchange_domains MB'],
+            summary['comm.gather_grid_array'], summary['imbalance'] ) )
+
+def print_stages( result ):
+    """Print the time per step in each stage (maximum over the ranks)"""
+    ranks = result['ranks']
+    labels = sorted( ranks[0]['time'] )
+    print( '    Stages (s/step, max over ranks):' )
+    for label in labels:
+        t = max( r['time'][label] for r in ranks )/result['steps']
+        print( '      %-28s %10.3e' %(label, t) )
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( description=
+        'Strong and weak scaling of an LWFA simulation with FB-PIC' )
+    parser.add_argument( '--np', nargs='*', type=int, default=[1, 2, 4],
+        help='Numbers of MPI ranks' )
+    parser.add_argument( '--mode', nargs='*', default=['strong', 'weak'],
+        choices=['strong', 'weak'] )
+    parser.add_argument( '--n_order', nargs='*', type=int, default=[32],
+        help='Stencil orders (should be finite for domain decomposition)' )
+    parser.add_argument( '--n_guard', nargs='*', type=int, default=[-1],
+        help='Numbers of guard cells (-1: automatic)' )
+    parser.add_argument( '--exchange_period', nargs='*', type=int,
+        default=[-1], help='Periods of the particle exchanges '
+        '(-1: automatic)' )
+    parser.add_argument( '--Nz', type=int, default=800,
+        help='Nz (for strong scaling), or Nz per rank (for weak scaling)' )
+    parser.add_argument( '--Nr', type=int, default=50 )
+    parser.add_argument( '--Nm', type=int, default=2 )
+    parser.add_argument( '--steps', type=int, default=50,
+        help='Number of timed steps' )
+    parser.add_argument( '--warmup_steps', type=int, default=5,
+        help='Number of steps before the timing (compilation)' )
+    parser.add_argument( '--diag_period', type=int, default=10,
+        help='Period of the field diagnostics (0: no diagnostics)' )
+    parser.add_argument( '--use_cuda', action='store_true' )
+    parser.add_argument( '--launcher', default='mpirun -np {np}',
+        help='Command that launches the MPI ranks' )
+    parser.add_argument( '--launch_serial', action='store_true',
+        help='Use the launcher also for 1 rank' )
+    parser.add_argument( '--save', default=None,
+        help='json file in which all the results are stored' )
+    # Options of the worker processes (internal)
+    parser.add_argument( '--worker', action='store_true',
+                         help=argparse.SUPPRESS )
+    parser.add_argument( '--output', help=argparse.SUPPRESS )
+    parser.add_argument( '--size', type=int, help=argparse.SUPPRESS )
+    args = parser.parse_args( argv )
+
+    if args.worker:
+        args.mode = args.mode[0]
+        args.n_order = args.n_order[0]
+        args.n_guard = args.n_guard[0]
+        args.exchange_period = args.exchange_period[0]
+        run_worker( args )
+        return
+
+    all_results = []
+    for mode, n_order, n_guard, exchange_period in itertools.product(
+            args.mode, args.n_order, args.n_guard, args.exchange_period ):
+        results = []
+        for size in sorted( args.np ):
+            result = launch( args, size, mode, n_order, n_guard,
+                             exchange_period )
+            if result is not None:
+                results.append( (size, result) )
+                all_results.append( dict( mode=mode, n_order=n_order,
+                    n_guard=n_guard, exchange_period=exchange_period,
+                    result=result ) )
+        if not results:
+            continue
+        first = results[0][1]['ranks'][0]
+        print_table( '%s scaling: n_order=%d, n_guard=%d, '
+            'exchange_period=%d' %( mode.capitalize(), n_order,
+            first['n_guard'], first['exchange_period'] ), mode, results )
+        for size, result in results:
+            print( '  np=%d' %size )
+            print_stages( result )
+
+    if args.save is not None:
+        with open( args.save, 'w' ) as f:
+            json.dump( all_results, f, indent=2 )
+
+if __name__ == '__main__':
+    main()
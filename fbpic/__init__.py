@@ -4,7 +4,8 @@ Fourier-Bessel Particle-In-Cell code (FBPIC)
 
 Usage
 -----
-See the fbpic.main.Simulation class to set up a simulation.
+See the fbpic.main.Simulation class to set up a simulation, and
+fbpic.plan to predict its memory footprint before running it.
 """
 
 # Change the default formatting for warnings within fbpic
@@ -13,3 +14,9 @@ def modified_formatting(message, category, filename, lineno, line=None):
     """Format a warning so that the code line `line` is not shown`."""
     return('\n%s: %s:%s:\n%s\n'%(category.__name__, filename, lineno, message))
 warnings.formatwarning = modified_formatting
+
+# Resource planner and auto-tuner (these do not import the numba kernels
+# of fbpic, until they are called)
+from .planning import plan
+from .tuning import autotune
+__all__ = ['plan', 'autotune']
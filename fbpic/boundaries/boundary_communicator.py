@@ -7,6 +7,7 @@ It defines the structure necessary to implement the boundary exchanges.
 """
 import numpy as np
 from scipy.constants import c
+from fbpic.utils.timing import perf_counter
 from fbpic.utils.mpi import MPI, comm, mpi_type_dict, \
     mpi_installed, gpudirect_enabled
 from fbpic.fields.fields import FieldInterpolationGrid
@@ -14,12 +15,16 @@ from fbpic.fields.utility_methods import get_stencil_reach
 from fbpic.particles.particles import Particles
 from .field_buffer_handling import BufferHandler
 from .particle_buffer_handling import remove_outside_particles, \
-     add_buffers_to_particles, shift_particles_periodic_subdomain
+     add_buffers_to_particles, shift_particles_periodic_subdomain, \
+     ParticleExchangeBuffers
+from .comm_profiler import CommProfiler, profile_comm_enabled
+from .shared_memory import SharedMemoryExchanger, shared_memory_enabled
 # Check if CUDA is available, then import CUDA functions
 from fbpic.utils.cuda import cuda_installed
 if cuda_installed:
     from fbpic.utils.cuda import cuda, cuda_tpb_bpg_2d
-    from .cuda_methods import cuda_damp_EB_left, cuda_damp_EB_right
+    from .cuda_methods import cuda_damp_EB_left, cuda_damp_EB_right, \
+        cuda_damp_scal_left, cuda_damp_scal_right
 
 class BoundaryCommunicator(object):
     """
@@ -46,7 +51,7 @@ class BoundaryCommunicator(object):
 
     def __init__( self, Nz, zmin, zmax, Nr, rmax, Nm, dt, v_comoving,
             use_galilean, boundaries, n_order, n_guard=None, n_damp=30,
-            exchange_period=None, use_all_mpi_ranks=True):
+            exchange_period=None, use_all_mpi_ranks=True, n_mode_ranks=1):
         """
         Initializes a communicator object.
 
@@ -118,6 +123,16 @@ class BoundaryCommunicator(object):
             - if `use_all_mpi_ranks` is False:
               Each MPI rank will run an independent simulation.
               This can be useful when running parameter scans.
+
+        n_mode_ranks: int, optional
+            Number of MPI ranks among which the azimuthal modes of each
+            subdomain are distributed. The domain is then decomposed in z
+            into (number of MPI ranks)/n_mode_ranks subdomains, and the
+            consecutive ranks `n_mode_ranks*i` to `n_mode_ranks*(i+1)-1`
+            handle the subdomain i (see `Fields` for the distribution
+            of the modes). In this case, `mpi_comm` connects the ranks that
+            have the same index `mode_rank` within their subdomain, and
+            `mode_comm` connects the ranks of the same subdomain.
         """
         # Initialize global number of cells and modes
         self.Nr = Nr
@@ -130,11 +145,29 @@ class BoundaryCommunicator(object):
 
         # MPI Setup
         self.use_all_mpi_ranks = use_all_mpi_ranks
+        self.n_mode_ranks = n_mode_ranks
+        self.mode_comm = None
+        self.mode_rank = 0
         if self.use_all_mpi_ranks and mpi_installed:
-            self.mpi_comm = comm
+            if n_mode_ranks > 1:
+                # Split the ranks into subdomains (in z) and mode groups
+                if (comm.size % n_mode_ranks != 0) or (n_mode_ranks > Nm):
+                    raise ValueError('The number of MPI ranks (%d) should be '
+                        'a multiple of `n_mode_ranks` (%d), which should not '
+                        'exceed the number of modes (%d).'
+                        %(comm.size, n_mode_ranks, Nm) )
+                self.mode_rank = comm.rank % n_mode_ranks
+                z_rank = comm.rank // n_mode_ranks
+                self.mpi_comm = comm.Split( self.mode_rank, z_rank )
+                self.mode_comm = comm.Split( z_rank, self.mode_rank )
+            else:
+                self.mpi_comm = comm
             self.rank = self.mpi_comm.rank
             self.size = self.mpi_comm.size
         else:
+            if n_mode_ranks > 1:
+                raise ValueError('The decomposition of the azimuthal modes '
+                    '(`n_mode_ranks` > 1) requires MPI, with all the ranks.')
             self.mpi_comm = None
             self.rank = 0
             self.size = 1
@@ -225,10 +258,31 @@ class BoundaryCommunicator(object):
         # set_moving_window in main.py to initialize a proper moving window)
         self.moving_win = None
 
+        # Initialize the profiler of the MPI communications to None,
+        # unless requested by the environment variable FBPIC_PROFILE_COMM
+        # (See the method enable_profiler)
+        self.profiler = None
+        if profile_comm_enabled:
+            self.enable_profiler()
+
         # Initialize a buffer handler object, for MPI communications
         if self.size > 1:
             self.mpi_buffers = BufferHandler( self.n_guard, Nr, Nm,
                                       self.left_proc, self.right_proc )
+        # When neighbouring procs are on the same node, exchange the fields
+        # through a shared-memory window (CPU only ; this can be disabled
+        # by setting the environment variable FBPIC_DISABLE_SHARED_MEMORY)
+        self.shared_memory = None
+        if self.size > 1 and shared_memory_enabled and not cuda_installed:
+            self.shared_memory = SharedMemoryExchanger( self.mpi_comm,
+                self.left_proc, self.right_proc, self.mpi_buffers.buffer_shapes )
+            if self.shared_memory.left_shared or \
+                    self.shared_memory.right_shared:
+                self.mpi_buffers.use_shared_memory( self.shared_memory )
+            else:
+                self.shared_memory = None
+        # Initialize persistent buffers for the exchange of particles
+        self.ptcl_buffers = ParticleExchangeBuffers()
 
         # Create damping arrays for the damping cells at the left
         # and right of the box in the case of "open" boundaries.
@@ -246,6 +300,31 @@ class BoundaryCommunicator(object):
                 if cuda_installed:
                     self.d_right_damp = cuda.to_device( self.right_damp )
 
+    def enable_profiler( self ):
+        """
+        Start recording the MPI communications (number of messages and bytes,
+        time spent packing/unpacking the buffers and waiting for the
+        messages, for each operation and neighbour).
+
+        The results can be printed with `self.profiler.print_report()`,
+        which has to be called by all procs.
+
+        Returns
+        -------
+        profiler: a CommProfiler object
+        """
+        if self.profiler is None:
+            self.profiler = CommProfiler( self.mpi_comm, self.rank, self.size )
+        return( self.profiler )
+
+    def activate_envelope( self ):
+        """
+        Allocate the MPI buffers for the exchange of the laser envelope
+        (called when the envelope model is activated)
+        """
+        if self.size > 1:
+            self.mpi_buffers.activate_envelope()
+
     def divide_into_domain( self ):
         """
         Divide the global simulation into domain and add local guard cells.
@@ -472,11 +551,13 @@ class BoundaryCommunicator(object):
         ------------
         interp: list
             A list of FieldInterpolationGrid objects
-            (one element per azimuthal mode)
+            (one element per azimuthal mode), or of EnvelopeInterpolationGrid
+            objects (one element per envelope mode) for fieldtype 'a'
 
         fieldtype: str
             An identifier for the field to send
-            (Either 'E', 'B', 'J' or 'rho')
+            (Either 'E', 'B', 'J', 'rho' or 'a')
+            (For 'a', both the envelope a and a_old are exchanged)
 
         method: str
             Can either be 'replace' or 'add' depending on the type
@@ -487,12 +568,31 @@ class BoundaryCommunicator(object):
             return
 
         # Build the string `exchange_type`:
-        # This is either 'E:replace', 'B:replace', 'J:add', or 'rho:add'
+        # This is either 'E:replace', 'B:replace', 'J:add', 'rho:add'
+        # or 'a:replace'
         exchange_type = ':'.join([ fieldtype, method ])
 
         # Shortcut
         Nm = self.Nm
         use_cuda = interp[0].use_cuda
+        profiler = self.profiler
+        shared_memory = self.shared_memory
+        if (shared_memory is not None) and \
+                (exchange_type not in shared_memory.buffer_shapes):
+            # The buffers of the envelope are not in the shared-memory
+            # window: exchange them through MPI messages
+            shared_memory = None
+        if shared_memory is not None:
+            # Wait until the neighbours of the same node have read the
+            # previous content of the sending buffers
+            if profiler is not None:
+                t_start = perf_counter()
+            shared_memory.wait_until_read()
+            if profiler is not None:
+                profiler.record( 'fields ' + exchange_type, 'shared memory',
+                                 wait=perf_counter()-t_start )
+        if profiler is not None:
+            t_start = perf_counter()
 
         # Fill the sending buffers with data from the interpolation grid
         if fieldtype in ('E', 'B', 'J'):
@@ -505,7 +605,12 @@ class BoundaryCommunicator(object):
                     before_sending=True, gpudirect=gpudirect_enabled )
         else:
             # Scalar field
-            grid = [ getattr(interp[m], fieldtype) for m in range(Nm) ]
+            if fieldtype == 'a':
+                # Envelope: a and a_old, for all the envelope modes
+                grid = [ env_grid.a for env_grid in interp ] + \
+                        [ env_grid.a_old for env_grid in interp ]
+            else:
+                grid = [ getattr(interp[m], fieldtype) for m in range(Nm) ]
             self.mpi_buffers.handle_scal_buffer(
                     grid, method, exchange_type, use_cuda,
                     before_sending=True, gpudirect=gpudirect_enabled )
@@ -514,6 +619,9 @@ class BoundaryCommunicator(object):
             # execution to make sure that writing the buffer arrays
             # completed before sendind via MPI directly)
             cuda.synchronize()
+        if profiler is not None:
+            profiler.record( 'fields ' + exchange_type, 'local',
+                             pack=perf_counter()-t_start )
 
         # Prepare MPI call by pointing to the correct sending/receiving buffers
         if gpudirect_enabled:
@@ -534,9 +642,14 @@ class BoundaryCommunicator(object):
             recv_r = self.mpi_buffers.recv_r[ exchange_type ]
 
         # Send and receive the buffers via MPI
-        self.exchange_domains( send_l, send_r, recv_l, recv_r )
+        # (or via the shared memory, for the neighbours of the same node)
+        self.exchange_domains( send_l, send_r, recv_l, recv_r,
+                                operation='fields ' + exchange_type,
+                                shared_memory=shared_memory )
 
         # Copy/Add the received buffers to the interpolation grid
+        if profiler is not None:
+            t_start = perf_counter()
         if fieldtype in ('E', 'B', 'J'):
             # Vector field
             self.mpi_buffers.handle_vec_buffer(
@@ -547,9 +660,16 @@ class BoundaryCommunicator(object):
             self.mpi_buffers.handle_scal_buffer(
                     grid, method, exchange_type, use_cuda,
                     after_receiving=True, gpudirect=gpudirect_enabled )
+        if profiler is not None:
+            profiler.record( 'fields ' + exchange_type, 'local',
+                             unpack=perf_counter()-t_start )
+        if shared_memory is not None:
+            # Notify the neighbours that their buffers were read
+            shared_memory.finish_exchange()
 
 
-    def exchange_domains( self, send_left, send_right, recv_left, recv_right ):
+    def exchange_domains( self, send_left, send_right, recv_left, recv_right,
+                            operation='domains', shared_memory=None ):
         """
         Send the arrays send_left and send_right to the left and right
         processes respectively.
@@ -560,29 +680,69 @@ class BoundaryCommunicator(object):
         ------------
         - send_left, send_right, recv_left, recv_right : arrays
              Sending and receiving buffers
+        - operation: str, optional
+             The name under which this exchange is recorded
+             (only used if the communications are profiled)
+        - shared_memory: a SharedMemoryExchanger object, optional
+             If not None, the sending buffers are in the shared-memory
+             window of this object, and the receiving buffers of the
+             neighbours of the same node point to their sending buffers:
+             only a notification is then exchanged with these neighbours
         """
+        # Find the neighbours for which the data is exchanged in messages
+        left_messages = (self.left_proc is not None)
+        right_messages = (self.right_proc is not None)
+        if shared_memory is not None:
+            shared_memory.start_exchange()
+            left_messages = left_messages and not shared_memory.left_shared
+            right_messages = right_messages and not shared_memory.right_shared
+
         # MPI-Exchange: Uses non-blocking send and receive,
         # which return directly and need to be synchronized later.
         # Send to left domain and receive from left domain
-        if self.left_proc is not None :
+        if left_messages:
             req_sl = self.mpi_comm.Isend(
                 send_left, dest=self.left_proc, tag=1 )
             req_rl = self.mpi_comm.Irecv(
                 recv_left, source=self.left_proc, tag=2 )
         # Send to right domain and receive from right domain
-        if self.right_proc is not None :
+        if right_messages:
             req_sr = self.mpi_comm.Isend(
                 send_right, dest=self.right_proc, tag=2 )
             req_rr = self.mpi_comm.Irecv(
                 recv_right, source=self.right_proc, tag=1 )
 
         # Wait for the non-blocking sends to be received (synchronization)
-        if self.left_proc is not None :
+        # (When profiling, the time blocked waiting for each neighbour is
+        # recorded; the messages of the right neighbour may thus arrive
+        # while waiting for the left neighbour.)
+        profiler = self.profiler
+        if left_messages:
+            if profiler is not None:
+                t_start = perf_counter()
             req_rl.Wait()
             req_sl.Wait()
-        if self.right_proc is not None :
+            if profiler is not None:
+                profiler.record_exchange( operation, 'left', send_left,
+                    recv_left, perf_counter()-t_start )
+        elif self.left_proc is not None:
+            wait = shared_memory.wait_for_neighbour( 'left' )
+            if profiler is not None:
+                profiler.record( operation, 'left (shared)', messages=2,
+                                 wait=wait )
+        if right_messages:
+            if profiler is not None:
+                t_start = perf_counter()
             req_rr.Wait()
             req_sr.Wait()
+            if profiler is not None:
+                profiler.record_exchange( operation, 'right', send_right,
+                    recv_right, perf_counter()-t_start )
+        elif self.right_proc is not None:
+            wait = shared_memory.wait_for_neighbour( 'right' )
+            if profiler is not None:
+                profiler.record( operation, 'right (shared)', messages=2,
+                                 wait=wait )
 
 
     def exchange_particles(self, species, fld, time ):
@@ -650,11 +810,17 @@ class BoundaryCommunicator(object):
             from a density profile: in the case the time is used in
             order to infer how much the plasma has moved)
         """
+        profiler = self.profiler
+        if profiler is not None:
+            t_start = perf_counter()
         # Remove out-of-domain particles from particle arrays (either on
         # CPU or GPU) and store them in sending buffers on the CPU
         float_send_left, float_send_right, uint_send_left, uint_send_right = \
             remove_outside_particles( species, fld, self.n_guard,
-                                    self.left_proc, self.right_proc )
+                    self.left_proc, self.right_proc, self.ptcl_buffers )
+        if profiler is not None:
+            profiler.record( 'particles', 'local',
+                             pack=perf_counter()-t_start )
 
         # Send/receive the number of particles (need to be stored in arrays)
         N_send_l = np.array( float_send_left.shape[1], dtype=np.uint32 )
@@ -663,20 +829,32 @@ class BoundaryCommunicator(object):
         N_recv_r = np.array( 0, dtype=np.uint32 )
         # Note: if left_proc or right_proc is None, the
         # corresponding N_recv remains 0 (no exchange)
-        self.exchange_domains(N_send_l, N_send_r, N_recv_l, N_recv_r)
-        # Allocate the receiving buffers and exchange particles
+        self.exchange_domains(N_send_l, N_send_r, N_recv_l, N_recv_r,
+                                operation='particles')
+        # Get the (persistent) receiving buffers and exchange particles
+        # (The received particles are copied to the particle arrays
+        # by `add_buffers_to_particles`, so that the buffers can be reused)
+        buffers = self.ptcl_buffers
+        N_recv_l = int( N_recv_l )
+        N_recv_r = int( N_recv_r )
         n_float = float_send_left.shape[0]
-        float_recv_left = np.zeros((n_float, N_recv_l), dtype=np.float64)
-        float_recv_right = np.zeros((n_float, N_recv_r), dtype=np.float64)
+        float_recv_left = buffers.get( 'float_recv_left',
+                                       (n_float, N_recv_l), np.float64 )
+        float_recv_right = buffers.get( 'float_recv_right',
+                                        (n_float, N_recv_r), np.float64 )
         self.exchange_domains( float_send_left, float_send_right,
-                                float_recv_left, float_recv_right )
+                                float_recv_left, float_recv_right,
+                                operation='particles' )
         # Integers (e.g. particle id), if any
         n_int = uint_send_left.shape[0]
-        uint_recv_left = np.zeros((n_int, N_recv_l), dtype=np.uint64 )
-        uint_recv_right = np.zeros((n_int, N_recv_r), dtype=np.uint64 )
+        uint_recv_left = buffers.get( 'uint_recv_left',
+                                      (n_int, N_recv_l), np.uint64 )
+        uint_recv_right = buffers.get( 'uint_recv_right',
+                                       (n_int, N_recv_r), np.uint64 )
         if n_int > 0:
             self.exchange_domains( uint_send_left, uint_send_right,
-                                    uint_recv_left, uint_recv_right )
+                                    uint_recv_left, uint_recv_right,
+                                    operation='particles' )
 
         # When using a moving window, create new particles in recv_right
         # (Overlap this with the exchange of domains, since recv_right
@@ -700,8 +878,13 @@ class BoundaryCommunicator(object):
 
         # Add the exchanged buffers to the particles on the CPU or GPU
         # and resize the auxiliary field-on-particle and sorting arrays
+        if profiler is not None:
+            t_start = perf_counter()
         add_buffers_to_particles( species, float_recv_left, float_recv_right,
                                     uint_recv_left, uint_recv_right )
+        if profiler is not None:
+            profiler.record( 'particles', 'local',
+                             unpack=perf_counter()-t_start )
 
     def damp_EB_open_boundary( self, interp ):
         """
@@ -761,6 +944,41 @@ class BoundaryCommunicator(object):
                         interp[m].Bt[-nd:,:]*=self.right_damp[::-1,np.newaxis]
                         interp[m].Bz[-nd:,:]*=self.right_damp[::-1,np.newaxis]
 
+    def damp_envelope_open_boundary( self, envelope_interp ):
+        """
+        Damp the laser envelope (a and a_old) in the damp cells,
+        at the right and left of the *global* simulation box.
+
+        Parameter:
+        -----------
+        envelope_interp: list of EnvelopeInterpolationGrid objects
+            (one per envelope mode) Objects that contain the envelope.
+        """
+        # Do not damp the fields for 0 n_damp cells (periodic)
+        if self.n_damp == 0:
+            return
+        grid = [ env_grid.a for env_grid in envelope_interp ] + \
+                [ env_grid.a_old for env_grid in envelope_interp ]
+        nd = self.n_guard + self.n_damp
+        if envelope_interp[0].use_cuda:
+            dim_grid, dim_block = cuda_tpb_bpg_2d( nd, envelope_interp[0].Nr )
+        if self.left_proc is None:
+            # Damp the envelope on the CPU or the GPU
+            for F in grid:
+                if envelope_interp[0].use_cuda:
+                    cuda_damp_scal_left[dim_grid, dim_block](
+                        F, self.d_left_damp, self.n_guard, self.n_damp )
+                else:
+                    F[:nd,:] *= self.left_damp[:,np.newaxis]
+        if self.right_proc is None:
+            # Damp the envelope on the CPU or the GPU
+            for F in grid:
+                if envelope_interp[0].use_cuda:
+                    cuda_damp_scal_right[dim_grid, dim_block](
+                        F, self.d_right_damp, self.n_guard, self.n_damp )
+                else:
+                    F[-nd:,:] *= self.right_damp[::-1,np.newaxis]
+
     def generate_damp_array( self, n_guard, n_damp ):
         """
         Create a 1d damping array of length n_guard.
@@ -892,7 +1110,13 @@ class BoundaryCommunicator(object):
             mpi_type = mpi_type_dict[ str(array.dtype) ]
             sendbuf = [ local_array, N_procs[self.rank] ]
             recvbuf = [ gathered_array, N_procs, istart_procs, mpi_type ]
+            if self.profiler is not None:
+                t_start = perf_counter()
             self.mpi_comm.Gatherv( sendbuf, recvbuf, root=root )
+            if self.profiler is not None:
+                self.profiler.record( 'gather grid', 'collective', messages=1,
+                    n_bytes=local_array.nbytes,
+                    wait=perf_counter()-t_start )
         else:
             gathered_array[:,:] = local_array
 
@@ -1040,7 +1264,13 @@ class BoundaryCommunicator(object):
             sendbuf = [ array, n_rank_procs[self.rank] ]
             recvbuf = [ gathered_array, n_rank_procs, i_start_procs, mpi_type ]
             # Send/receive the arrays
+            if self.profiler is not None:
+                t_start = perf_counter()
             self.mpi_comm.Gatherv( sendbuf, recvbuf, root=root )
+            if self.profiler is not None:
+                self.profiler.record( 'gather particles', 'collective',
+                    messages=1, n_bytes=n_rank_procs[self.rank]*array.itemsize,
+                    wait=perf_counter()-t_start )
         else:
             gathered_array[:] = array[:]
 
@@ -1048,6 +1278,35 @@ class BoundaryCommunicator(object):
         if self.rank == root:
             return(gathered_array)
 
+    def start_allgather_counts( self, local_counts ):
+        """
+        Start gathering, on all procs, a list of non-negative integers from
+        each proc (e.g. the numbers of particles of several species), in a
+        single non-blocking MPI call.
+
+        Parameter:
+        -----------
+        local_counts: list of ints
+            The integers of the local proc
+
+        Returns:
+        ---------
+        A tuple with:
+        request: an MPI request (or None for a single proc)
+            `request.Wait()` should be called before using `counts`
+        counts: 2darray of uint64, of shape (size, len(local_counts))
+            The integers of all the procs (one row per proc)
+        """
+        send_counts = np.array( local_counts, dtype=np.uint64 )
+        counts = np.empty( (self.size, len(send_counts)), dtype=np.uint64 )
+        if self.size == 1:
+            counts[0] = send_counts
+            return( None, counts )
+        mpi_type = mpi_type_dict['uint64']
+        request = self.mpi_comm.Iallgather(
+            [ send_counts, mpi_type ], [ counts, mpi_type ] )
+        return( request, counts )
+
 
 def get_gpu_mpi_buffer(gpu_array):
     """
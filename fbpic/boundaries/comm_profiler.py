@@ -0,0 +1,276 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines the CommProfiler object, which records the MPI communications
+of the BoundaryCommunicator, and aggregates them across ranks.
+"""
+import os
+import numpy as np
+from fbpic.utils.timing import perf_counter
+
+# Check if the environment variable FBPIC_PROFILE_COMM is set to 1
+# and in that case, profile the MPI communications of all simulations
+profile_comm_enabled = False
+if 'FBPIC_PROFILE_COMM' in os.environ:
+    if int(os.environ['FBPIC_PROFILE_COMM']) == 1:
+        profile_comm_enabled = True
+
+# Quantities that are recorded, for each operation and neighbour
+recorded_quantities = [ 'messages', 'bytes', 'pack', 'unpack', 'wait' ]
+
+# Thresholds used to interpret the aggregated results:
+# - Relative spread of the waiting time between ranks, above which
+#   the communications are dominated by waiting on the slowest ranks
+straggler_threshold = 0.5
+# - Average message size (in bytes) below which the communications
+#   are dominated by the latency of the network
+latency_threshold = 65536
+
+class CommProfiler(object):
+    """
+    Class that records the number of messages, the number of bytes, the
+    time spent packing/unpacking the MPI buffers and the time spent
+    blocked in MPI calls, for each communication operation (e.g. the
+    exchange of a given field type) and each neighbour of the local rank.
+
+    Usage (from the user script):
+
+    - either set the environment variable FBPIC_PROFILE_COMM to 1, or call
+      `sim.comm.enable_profiler()` before `sim.step`
+
+    - call `sim.comm.profiler.print_report()` after `sim.step` (on all ranks)
+    """
+
+    def __init__( self, mpi_comm, rank, size ):
+        """
+        Initialize an empty profiler
+
+        Parameters
+        ----------
+        mpi_comm: an mpi4py communicator, or None
+            The communicator of the simulation (used to aggregate the results)
+
+        rank, size: ints
+            The rank of the local proc, and the total number of procs
+        """
+        self.mpi_comm = mpi_comm
+        self.rank = rank
+        self.size = size
+        self.reset()
+
+    def reset( self ):
+        """
+        Erase the recorded data (e.g. in order to exclude the first
+        iterations, which include the just-in-time compilation)
+        """
+        # Dictionary of arrays (one element per quantity of
+        # `recorded_quantities`), with keys (operation, neighbour)
+        self.records = {}
+        self.start_time = perf_counter()
+
+    def record( self, operation, neighbour, messages=0, n_bytes=0,
+                pack=0., unpack=0., wait=0. ):
+        """
+        Add the given counts and times to the record of `operation`
+
+        Parameters
+        ----------
+        operation: str
+            The communication operation (e.g. 'fields E:replace')
+
+        neighbour: str
+            Either 'left' or 'right' (point-to-point exchanges),
+            'collective' (e.g. gathering of the diagnostics), or
+            'local' (for the packing/unpacking of the buffers)
+
+        messages, n_bytes: ints
+            The number of messages and bytes sent and received
+
+        pack, unpack, wait: floats (in seconds)
+            The time spent filling the sending buffers, emptying the
+            receiving buffers, and blocked in the MPI calls
+        """
+        key = (operation, neighbour)
+        if key not in self.records:
+            self.records[key] = np.zeros( len(recorded_quantities) )
+        self.records[key] += [ messages, n_bytes, pack, unpack, wait ]
+
+    def record_exchange( self, operation, neighbour, send_buffer,
+                         recv_buffer, wait ):
+        """
+        Record a point-to-point exchange with the neighbour `neighbour`
+        (one message sent and one message received)
+
+        Parameters
+        ----------
+        send_buffer, recv_buffer: arrays or MPI buffer objects (GPUDirect)
+            The buffers of the exchange
+
+        wait: float (in seconds)
+            The time spent in `Wait` for these messages
+        """
+        n_bytes = get_nbytes( send_buffer ) + get_nbytes( recv_buffer )
+        self.record( operation, neighbour, messages=2,
+                     n_bytes=n_bytes, wait=wait )
+
+    def gather_records( self, root=0 ):
+        """
+        Gather the records of all procs on the proc `root`
+
+        Returns
+        -------
+        A list of dictionaries (one per proc) on the proc `root`,
+        None on the other procs
+        """
+        elapsed = perf_counter() - self.start_time
+        local_records = { 'elapsed': elapsed, 'records': self.records }
+        if self.size > 1:
+            return( self.mpi_comm.gather( local_records, root=root ) )
+        else:
+            return( [ local_records ] )
+
+    def get_report( self, root=0 ):
+        """
+        Aggregate the records of all procs into an imbalance report.
+        (This has to be called by all procs.)
+
+        Returns
+        -------
+        A string on the proc `root`, None on the other procs
+        """
+        records_per_rank = self.gather_records( root=root )
+        if self.rank == root:
+            return( format_report( records_per_rank ) )
+
+    def print_report( self, root=0 ):
+        """
+        Print the imbalance report on the proc `root`.
+        (This has to be called by all procs.)
+        """
+        report = self.get_report( root=root )
+        if self.rank == root:
+            print( report )
+
+def get_nbytes( buffer ):
+    """
+    Return the number of bytes of a numpy array or of an MPI buffer object
+    """
+    if hasattr( buffer, 'nbytes' ):
+        return( buffer.nbytes )
+    else:
+        return( len(buffer) )
+
+def aggregate_records( records_per_rank ):
+    """
+    Combine the records of all procs
+
+    Parameters
+    ----------
+    records_per_rank: list of dictionaries
+        The dictionaries returned by `CommProfiler.gather_records`
+
+    Returns
+    -------
+    A tuple with:
+    - a dictionary with keys (operation, neighbour) and values
+      2darrays of shape (N_ranks, len(recorded_quantities))
+    - a 2darray of shape (N_ranks, len(recorded_quantities))
+      (the total over all operations, for each rank)
+    """
+    N_ranks = len( records_per_rank )
+    keys = sorted( set( key for rank_records in records_per_rank
+                        for key in rank_records['records'] ) )
+    combined = {}
+    for key in keys:
+        combined[key] = np.zeros( (N_ranks, len(recorded_quantities)) )
+        for rank, rank_records in enumerate( records_per_rank ):
+            if key in rank_records['records']:
+                combined[key][rank] = rank_records['records'][key]
+    totals = np.zeros( (N_ranks, len(recorded_quantities)) )
+    for key in keys:
+        totals += combined[key]
+    return( combined, totals )
+
+def diagnose( totals ):
+    """
+    Interpret the total communication times of each rank
+
+    Parameters
+    ----------
+    totals: 2darray of shape (N_ranks, len(recorded_quantities))
+        The total over all operations, for each rank
+
+    Returns
+    -------
+    A string, which states whether the communications are dominated by
+    waiting on the slowest ranks ('stragglers'), by the latency of the
+    network ('latency-bound'), or by the bandwidth ('bandwidth-bound')
+    """
+    messages = totals[:, recorded_quantities.index('messages')]
+    n_bytes = totals[:, recorded_quantities.index('bytes')]
+    wait = totals[:, recorded_quantities.index('wait')]
+    if messages.sum() == 0 or wait.sum() == 0:
+        return( 'no MPI communication was recorded' )
+    # When some ranks wait much longer than others, the ranks that wait
+    # the least are the ones that the others are waiting for.
+    spread = (wait.max() - wait.min()) / wait.mean()
+    if len(wait) > 1 and spread > straggler_threshold:
+        return( 'waiting on stragglers (the wait time varies by %d%% '
+            'between ranks; rank %d waits the least and is the slowest)'
+            %( 100*spread, np.argmin(wait) ) )
+    bytes_per_message = n_bytes.sum() / messages.sum()
+    if bytes_per_message < latency_threshold:
+        return( 'latency-bound (%d bytes per message on average, '
+            '%.1f us per message)'
+            %( bytes_per_message, 1.e6*wait.sum()/messages.sum() ) )
+    return( 'bandwidth-bound (%d bytes per message on average, '
+        'effective bandwidth of %.3g GB/s)'
+        %( bytes_per_message, 1.e-9*n_bytes.sum()/wait.sum() ) )
+
+def format_report( records_per_rank ):
+    """
+    Format the imbalance report
+
+    Parameters
+    ----------
+    records_per_rank: list of dictionaries
+        The dictionaries returned by `CommProfiler.gather_records`
+
+    Returns
+    -------
+    A string containing the table of the operations (with the
+    minimum/mean/maximum waiting time across ranks), a summary per rank,
+    and the interpretation of the results
+    """
+    combined, totals = aggregate_records( records_per_rank )
+    i_msg, i_bytes, i_pack, i_unpack, i_wait = \
+        [ recorded_quantities.index(q) for q in recorded_quantities ]
+    elapsed = np.array([ r['elapsed'] for r in records_per_rank ])
+
+    lines = [ 'MPI communications (%d ranks, %.3f s profiled)'
+                %( len(records_per_rank), elapsed.max() ), '' ]
+    # Table of the operations (summed over ranks, except the wait time)
+    lines.append( '%-22s %-10s %10s %11s %9s %9s %29s' %( 'Operation',
+        'Neighbour', 'Messages', 'MBytes', 'Pack (s)', 'Unpack(s)',
+        'Wait (s) min / mean / max' ) )
+    for (operation, neighbour), values in combined.items():
+        wait = values[:, i_wait]
+        lines.append( '%-22s %-10s %10d %11.3f %9.3f %9.3f %9.3f %9.3f %9.3f'
+            %( operation, neighbour, values[:, i_msg].sum(),
+               1.e-6*values[:, i_bytes].sum(), values[:, i_pack].sum(),
+               values[:, i_unpack].sum(), wait.min(), wait.mean(), wait.max()))
+    lines.append( '' )
+    # Summary per rank
+    lines.append( '%-6s %10s %11s %16s %9s %12s' %( 'Rank', 'Messages',
+        'MBytes', 'Pack+unpack (s)', 'Wait (s)', 'Wait/elapsed' ) )
+    for rank in range( len(records_per_rank) ):
+        lines.append( '%-6d %10d %11.3f %16.3f %9.3f %11.1f%%'
+            %( rank, totals[rank, i_msg], 1.e-6*totals[rank, i_bytes],
+               totals[rank, i_pack] + totals[rank, i_unpack],
+               totals[rank, i_wait],
+               100*totals[rank, i_wait]/max(elapsed[rank], 1.e-12) ) )
+    lines.append( '' )
+    lines.append( 'Diagnosis: ' + diagnose( totals ) )
+    return( '\n'.join( lines ) )
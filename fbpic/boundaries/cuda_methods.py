@@ -430,3 +430,43 @@ def cuda_damp_EB_right( Er, Et, Ez, Br, Bt, Bz, damp_array, n_guard, n_damp ):
             Br[iz_right, ir] *= damp_factor_right
             Bt[iz_right, ir] *= damp_factor_right
             Bz[iz_right, ir] *= damp_factor_right
+
+@cuda.jit
+def cuda_damp_scal_left( F, damp_array, n_guard, n_damp ):
+    """
+    Multiply the scalar field F (e.g. the laser envelope)
+    in the left guard cells by damp_array.
+
+    See the docstring of cuda_damp_EB_left for the parameters.
+    """
+    # Obtain Cuda grid
+    iz, ir = cuda.grid(2)
+
+    # Obtain the size of the array along z and r
+    Nz, Nr = F.shape
+
+    # Modify the field
+    if ir < Nr :
+        # Apply the damping arrays
+        if iz < n_guard+n_damp:
+            F[iz, ir] *= damp_array[iz]
+
+@cuda.jit
+def cuda_damp_scal_right( F, damp_array, n_guard, n_damp ):
+    """
+    Multiply the scalar field F (e.g. the laser envelope)
+    in the right guard cells by damp_array.
+
+    See the docstring of cuda_damp_EB_right for the parameters.
+    """
+    # Obtain Cuda grid
+    iz, ir = cuda.grid(2)
+
+    # Obtain the size of the array along z and r
+    Nz, Nr = F.shape
+
+    # Modify the field
+    if ir < Nr :
+        # Apply the damping arrays
+        if iz < n_guard+n_damp:
+            F[Nz - iz - 1, ir] *= damp_array[iz]
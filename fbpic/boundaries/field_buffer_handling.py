@@ -57,6 +57,39 @@ class BufferHandler(object):
         # the fields between domains (either replacing or adding fields)
         # Buffers are allocated for the left and right side of the domain
 
+        # Allocate buffers of different size, for the different exchange types
+        # (The buffers of the laser envelope are only allocated when the
+        # envelope model is used ; see `activate_envelope`)
+        self.buffer_shapes = {
+            'E:replace': (3*Nm,   ng, Nr),
+            'B:replace': (3*Nm,   ng, Nr),
+            'J:add'    : (3*Nm, 2*ng, Nr),
+            'rho:add'  : (  Nm, 2*ng, Nr) }
+        self.send_l = {}
+        self.send_r = {}
+        self.recv_l = {}
+        self.recv_r = {}
+        if cuda_installed:
+            self.d_send_l = {}
+            self.d_send_r = {}
+            self.d_recv_l = {}
+            self.d_recv_r = {}
+        for key, shape in self.buffer_shapes.items():
+            self.allocate_buffers( key, shape )
+
+    def allocate_buffers( self, exchange_type, shape ):
+        """
+        Allocate the sending and receiving buffers of `exchange_type`,
+        on the CPU and (if CUDA is available) on the GPU
+
+        Parameters
+        ----------
+        exchange_type: str
+            e.g. 'E:replace' or 'rho:add'
+
+        shape: tuple of ints
+            The shape of each buffer
+        """
         # Allocate buffers on the CPU
         if cuda_installed:
             # Use cuda.pinned_array so that CPU array is pagelocked.
@@ -65,39 +98,60 @@ class BufferHandler(object):
         else:
             # Use regular numpy arrays
             alloc_cpu = np.empty
-        # Allocate buffers of different size, for the different exchange types
-        self.send_l = {
-            'E:replace': alloc_cpu( (3*Nm,   ng, Nr), dtype=np.complex128),
-            'B:replace': alloc_cpu( (3*Nm,   ng, Nr), dtype=np.complex128),
-            'J:add'    : alloc_cpu( (3*Nm, 2*ng, Nr), dtype=np.complex128),
-            'rho:add'  : alloc_cpu( (  Nm, 2*ng, Nr), dtype=np.complex128) }
-        self.send_r = {
-            'E:replace': alloc_cpu( (3*Nm,   ng, Nr), dtype=np.complex128),
-            'B:replace': alloc_cpu( (3*Nm,   ng, Nr), dtype=np.complex128),
-            'J:add'    : alloc_cpu( (3*Nm, 2*ng, Nr), dtype=np.complex128),
-            'rho:add'  : alloc_cpu( (  Nm, 2*ng, Nr), dtype=np.complex128) }
-        self.recv_l = {
-            'E:replace': alloc_cpu( (3*Nm,   ng, Nr), dtype=np.complex128),
-            'B:replace': alloc_cpu( (3*Nm,   ng, Nr), dtype=np.complex128),
-            'J:add'    : alloc_cpu( (3*Nm, 2*ng, Nr), dtype=np.complex128),
-            'rho:add'  : alloc_cpu( (  Nm, 2*ng, Nr), dtype=np.complex128) }
-        self.recv_r = {
-            'E:replace': alloc_cpu( (3*Nm,   ng, Nr), dtype=np.complex128),
-            'B:replace': alloc_cpu( (3*Nm,   ng, Nr), dtype=np.complex128),
-            'J:add'    : alloc_cpu( (3*Nm, 2*ng, Nr), dtype=np.complex128),
-            'rho:add'  : alloc_cpu( (  Nm, 2*ng, Nr), dtype=np.complex128) }
-
-        # Allocate buffers on the GPU, for the different exchange types
+        for buffers in [ self.send_l, self.send_r, self.recv_l, self.recv_r ]:
+            buffers[exchange_type] = alloc_cpu( shape, dtype=np.complex128 )
+
+        # Allocate buffers on the GPU
         if cuda_installed:
-            self.d_send_l = { key: cuda.to_device(value) for key, value in \
-                                self.send_l.items() }
-            self.d_send_r = { key: cuda.to_device(value) for key, value in \
-                                self.send_r.items() }
-            self.d_recv_l = { key: cuda.to_device(value) for key, value in \
-                                self.recv_l.items() }
-            self.d_recv_r = { key: cuda.to_device(value) for key, value in \
-                                self.recv_r.items() }
+            self.d_send_l[exchange_type] = cuda.to_device(
+                                        self.send_l[exchange_type] )
+            self.d_send_r[exchange_type] = cuda.to_device(
+                                        self.send_r[exchange_type] )
+            self.d_recv_l[exchange_type] = cuda.to_device(
+                                        self.recv_l[exchange_type] )
+            self.d_recv_r[exchange_type] = cuda.to_device(
+                                        self.recv_r[exchange_type] )
+
+    def activate_envelope( self ):
+        """
+        Allocate the buffers of the laser envelope, when the envelope model
+        is activated (these buffers contain both a and a_old, for the
+        envelope modes -Nm+1 to Nm-1)
+
+        These buffers are not placed in the shared-memory window
+        (see `use_shared_memory`): the envelope is always exchanged
+        through MPI messages.
+        """
+        if 'a:replace' in self.buffer_shapes:
+            return
+        Na = 2*self.Nm - 1
+        shape = (2*Na, self.n_guard, self.Nr)
+        # (A new dictionary is created, since the shared-memory window
+        # refers to the initial one)
+        self.buffer_shapes = dict( self.buffer_shapes )
+        self.buffer_shapes['a:replace'] = shape
+        self.allocate_buffers( 'a:replace', shape )
+
+
+    def use_shared_memory( self, shared_memory ):
+        """
+        Place the sending buffers in the shared-memory window of
+        `shared_memory`, and use the sending buffers of the neighbours
+        of the same node as receiving buffers (CPU only)
 
+        Parameters
+        ----------
+        shared_memory: a SharedMemoryExchanger object
+        """
+        self.send_l, self.send_r = shared_memory.get_buffers(
+                                        shared_memory.node_comm.rank )
+        # The left neighbour sends its right buffers, and vice-versa
+        if shared_memory.left_shared:
+            _, self.recv_l = shared_memory.get_buffers(
+                                        shared_memory.left_node_rank )
+        if shared_memory.right_shared:
+            self.recv_r, _ = shared_memory.get_buffers(
+                                        shared_memory.right_node_rank )
 
     def handle_vec_buffer(self, grid_r, grid_t, grid_z, method, exchange_type,
                             use_cuda, before_sending=False,
@@ -301,7 +355,8 @@ class BufferHandler(object):
         Parameters
         ----------
         grid: list of 2darrays
-            (One element per azimuthal mode)
+            (One element per azimuthal mode; for the envelope 'a',
+            one element per envelope mode, for both a and a_old)
             The 2d arrays represent the fields on the interpolation grid
 
         method: str
@@ -348,7 +403,7 @@ class BufferHandler(object):
 
             if before_sending:
                 # Copy the inner regions of the domain to the buffers
-                for m in range(self.Nm):
+                for m in range(len(grid)):
                     copy_scal_to_gpu_buffer[ dim_grid_2d, dim_block_2d ](
                         self.d_send_l[exchange_type],
                         self.d_send_r[exchange_type],
@@ -375,14 +430,14 @@ class BufferHandler(object):
                             self.recv_r[exchange_type] )
                 if method == 'replace':
                     # Replace the guard cells of the domain with the buffers
-                    for m in range(self.Nm):
+                    for m in range(len(grid)):
                         replace_scal_from_gpu_buffer[dim_grid_2d, dim_block_2d](
                             self.d_recv_l[exchange_type],
                             self.d_recv_r[exchange_type],
                             grid[m], m, copy_left, copy_right, nz_start, nz_end)
                 elif method == 'add':
                     # Add the buffers to the domain
-                    for m in range(self.Nm):
+                    for m in range(len(grid)):
                         add_scal_from_gpu_buffer[ dim_grid_2d, dim_block_2d ](
                             self.d_recv_l[exchange_type],
                             self.d_recv_r[exchange_type],
@@ -397,10 +452,10 @@ class BufferHandler(object):
                 send_r = self.send_r[exchange_type]
                 # Copy the inner regions of the domain to the buffer
                 if copy_left:
-                    for m in range(self.Nm):
+                    for m in range(len(grid)):
                         send_l[m,:,:]=grid[m][nz_start:nz_end,:]
                 if copy_right:
-                    for m in range(self.Nm):
+                    for m in range(len(grid)):
                         send_r[m,:,:]=grid[m][Nz-nz_end:Nz-nz_start,:]
 
             elif after_receiving:
@@ -410,17 +465,17 @@ class BufferHandler(object):
                 if method == 'replace':
                     # Replace the guard cells of the domain with the buffers
                     if copy_left:
-                        for m in range(self.Nm):
+                        for m in range(len(grid)):
                             grid[m][:nz_end-nz_start,:]=recv_l[m,:,:]
                     if copy_right:
-                        for m in range(self.Nm):
+                        for m in range(len(grid)):
                             grid[m][-(nz_end-nz_start):,:]=recv_r[m,:,:]
 
                 if method == 'add':
                     # Add buffers to the domain
                     if copy_left:
-                        for m in range(self.Nm):
+                        for m in range(len(grid)):
                             grid[m][:nz_end-nz_start,:]+=recv_l[m,:,:]
                     if copy_right:
-                        for m in range(self.Nm):
+                        for m in range(len(grid)):
                             grid[m][-(nz_end-nz_start):,:]+=recv_r[m,:,:]
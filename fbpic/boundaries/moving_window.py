@@ -51,10 +51,12 @@ class MovingWindow(object):
         zmin_global_domain, zmax_global_domain = comm.get_zmin_zmax(
                             local=False, with_damp=False, with_guard=False )
 
-        # Attach reference position of moving window (only for the first proc)
-        # (Determines by how many cells the window should be moved)
-        if comm.rank == 0:
-            self.zmin = zmin_global_domain
+        # Attach reference position and time of the moving window
+        # (The position of the window at a given time is calculated from
+        # these quantities, and thus identically by all procs)
+        self.zmin_start = zmin_global_domain
+        self.t_start = time - dt
+        self.zmin = zmin_global_domain
 
 
     def move_grids(self, fld, ptcl, comm, time):
@@ -80,21 +82,16 @@ class MovingWindow(object):
             The global time in the simulation
             This is used in order to determine how much the window should move
         """
-        # To avoid discrepancies between processors, only the first proc
-        # decides whether to send the data, and broadcasts the information.
+        # The continuous position of the moving window is a function of
+        # the time only (not accumulated from step to step), and the
+        # position of the global domain is shifted identically on all procs:
+        # all procs thus find the same number of cells, without communication
         dz = comm.dz
-        if comm.rank==0:
-            # Move the continuous position of the moving window object
-            self.zmin += self.v * (time - self.t_last_move)
-            # Find the number of cells by which the window should move
-            zmin_global_domain, zmax_global_domain = comm.get_zmin_zmax(
-                            local=False, with_damp=False, with_guard=False )
-            n_move = int( (self.zmin - zmin_global_domain)/dz )
-        else:
-            n_move = None
-        # Broadcast the information to all proc
-        if comm.size > 1:
-            n_move = comm.mpi_comm.bcast( n_move )
+        self.zmin = self.zmin_start + self.v * (time - self.t_start)
+        # Find the number of cells by which the window should move
+        zmin_global_domain, zmax_global_domain = comm.get_zmin_zmax(
+                        local=False, with_damp=False, with_guard=False )
+        n_move = int( (self.zmin - zmin_global_domain)/dz )
 
         # Move the grids
         if n_move != 0:
@@ -106,6 +103,7 @@ class MovingWindow(object):
                 # Modify the values of the corresponding z's
                 fld.interp[m].zmin += n_move*fld.interp[m].dz
                 fld.interp[m].zmax += n_move*fld.interp[m].dz
+            for m in fld.local_modes:
                 # Shift/move fields by n_move cells in spectral space
                 self.shift_spect_grid( fld.spect[m], n_move )
             if fld.use_envelope:
@@ -7,13 +7,65 @@ It defines the structure necessary to handle mpi buffers for the particles
 """
 import numpy as np
 import numba
+from fbpic.utils.threading import njit_parallel, prange, nthreads, \
+    get_chunk_indices
+from fbpic.utils.placement import first_touch_concatenate
 # Check if CUDA is available, then import CUDA functions
 from fbpic.utils.cuda import cuda_installed
 from fbpic.utils.printing import catch_gpu_memory_error
 if cuda_installed:
     from fbpic.utils.cuda import cuda, cuda_tpb_bpg_1d
 
-def remove_outside_particles(species, fld, n_guard, left_proc, right_proc):
+class ParticleExchangeBuffers(object):
+    """
+    Class that holds persistent CPU buffers for the exchange of particles
+    (sending/receiving buffers and index arrays), so that they are
+    reused from one exchange to the next instead of being reallocated.
+
+    The buffers only grow: when a larger buffer is needed, it is
+    reallocated with some margin.
+    """
+
+    def __init__( self, growth_factor=1.5 ):
+        """
+        Initialize an empty set of buffers
+
+        Parameters
+        ----------
+        growth_factor: float, optional
+            Factor by which a buffer is enlarged beyond the requested
+            size, when it needs to be reallocated
+        """
+        self.growth_factor = growth_factor
+        self.buffers = {}
+
+    def get( self, name, shape, dtype ):
+        """
+        Return a C-contiguous array of shape `shape`, which is a view of
+        the persistent buffer `name`. (The content of the array is
+        undefined; it is overwritten the next time `name` is requested.)
+
+        Parameters
+        ----------
+        name: str
+            Identifier of the buffer (e.g. 'float_send_left')
+
+        shape: tuple of ints
+            The shape of the requested array
+
+        dtype: numpy dtype
+            The type of the requested array
+        """
+        size = int( np.prod( shape ) )
+        buffer = self.buffers.get( name )
+        if (buffer is None) or (buffer.size < size) or \
+                (buffer.dtype != dtype):
+            buffer = np.empty( int(self.growth_factor*size), dtype=dtype )
+            self.buffers[ name ] = buffer
+        return( buffer[:size].reshape( shape ) )
+
+def remove_outside_particles(species, fld, n_guard, left_proc, right_proc,
+                                buffers=None):
     """
     Remove the particles that are outside of the physical domain (i.e.
     in the guard cells). Store them in sending buffers, which are returned.
@@ -38,6 +90,10 @@ def remove_outside_particles(species, fld, n_guard, left_proc, right_proc):
         Indicate whether there is a left or right processor or if the
         boundary is open (None).
 
+    buffers: a ParticleExchangeBuffers object, optional
+        Persistent buffers in which the sending buffers are stored
+        (on CPU). If None, new arrays are allocated.
+
     Returns
     -------
     float_send_left, float_send_right, uint_send_left, uint_send_right:
@@ -54,11 +110,13 @@ def remove_outside_particles(species, fld, n_guard, left_proc, right_proc):
     else:
         # Remove outside particles on the CPU
         float_send_left, float_send_right, uint_send_left, uint_send_right = \
-            remove_particles_cpu( species, fld, n_guard, left_proc, right_proc )
+            remove_particles_cpu( species, fld, n_guard, left_proc, right_proc,
+                                    buffers )
 
     return(float_send_left, float_send_right, uint_send_left, uint_send_right)
 
-def remove_particles_cpu(species, fld, n_guard, left_proc, right_proc):
+def remove_particles_cpu(species, fld, n_guard, left_proc, right_proc,
+                            buffers=None):
     """
     Remove the particles that are outside of the physical domain (i.e.
     in the guard cells). Store them in sending buffers, which are returned.
@@ -67,6 +125,13 @@ def remove_particles_cpu(species, fld, n_guard, left_proc, right_proc):
     outermost half of the guard cells are removed. The particles that
     are in the innermost half are kept.
 
+    The particle arrays are modified in place: the leaving particles are
+    packed into the sending buffers, the staying particles that are
+    beyond the new number of particles are moved into the slots that
+    were left empty, and the arrays are truncated. Apart from finding
+    the leaving particles, the cost is thus proportional to the number
+    of leaving particles. (The order of the staying particles changes.)
+
     Parameters
     ----------
     species: a Particles object
@@ -83,6 +148,10 @@ def remove_particles_cpu(species, fld, n_guard, left_proc, right_proc):
         Indicate whether there is a left or right processor or if the
         boundary is open (None).
 
+    buffers: a ParticleExchangeBuffers object, optional
+        Persistent buffers in which the sending buffers are stored.
+        If None, new arrays are allocated.
+
     Returns
     -------
     float_send_left, float_send_right, uint_send_left, uint_send_right:
@@ -91,92 +160,82 @@ def remove_particles_cpu(species, fld, n_guard, left_proc, right_proc):
         proc and right proc respectively, and where n_float and n_int
         are the number of float and integer quantities respectively
     """
+    if buffers is None:
+        buffers = ParticleExchangeBuffers()
+
     # Calculate the positions between which to remove particles
     # For the open boundaries, only the particles in the outermost
     # half of the guard cells are removed
     zbox_min = fld.interp[0].zmin + n_guard*fld.interp[0].dz
     zbox_max = fld.interp[0].zmax - n_guard*fld.interp[0].dz
 
-    # Select the particles that are in the left or right guard cells,
-    # and those that stay on the local process
-    selec_left = ( species.z < zbox_min )
-    selec_right = ( species.z > zbox_max )
-    selec_stay = (np.logical_not(selec_left) & np.logical_not(selec_right))
-
-    # Shortcuts
+    # Find the indices of the particles that are in the left or right
+    # guard cells (in increasing order), with one chunk per thread
+    Ntot = species.Ntot
+    chunk_indices = get_chunk_indices( Ntot, nthreads )
+    n_left_chunk = np.empty( nthreads, dtype=np.int64 )
+    n_right_chunk = np.empty( nthreads, dtype=np.int64 )
+    count_leaving_particles_numba( species.z, zbox_min, zbox_max,
+        chunk_indices, n_left_chunk, n_right_chunk )
+    N_left = int( n_left_chunk.sum() )
+    N_right = int( n_right_chunk.sum() )
+    left_idx = buffers.get( 'left_idx', (N_left,), np.int64 )
+    right_idx = buffers.get( 'right_idx', (N_right,), np.int64 )
+    find_leaving_particles_numba( species.z, zbox_min, zbox_max,
+        chunk_indices, np.cumsum( n_left_chunk ) - n_left_chunk,
+        np.cumsum( n_right_chunk ) - n_right_chunk, left_idx, right_idx )
+
+    # Pair the empty slots below the new number of particles with
+    # the staying particles above it
+    N_stay = Ntot - N_left - N_right
+    hole_idx = buffers.get( 'hole_idx', (N_left+N_right,), np.int64 )
+    tail_idx = buffers.get( 'tail_idx', (N_left+N_right,), np.int64 )
+    n_holes = pair_empty_slots_numba( species.z, zbox_min, zbox_max,
+                        N_stay, left_idx, right_idx, hole_idx, tail_idx )
+    hole_idx = hole_idx[:n_holes]
+    tail_idx = tail_idx[:n_holes]
+
+    # Get the sending buffers
+    # (If left_proc or right_proc is None, the particles are simply lost,
+    # and an empty buffer is returned)
     n_float = species.n_float_quantities
     n_int = species.n_integer_quantities
-
-    # Allocate and fill left sending buffer
-    if left_proc is not None:
-        N_send_l = selec_left.sum()
-        float_send_left = np.empty((n_float, N_send_l), dtype=np.float64)
-        uint_send_left = np.empty((n_int, N_send_l), dtype=np.uint64)
-        float_send_left[0,:] = species.x[selec_left]
-        float_send_left[1,:] = species.y[selec_left]
-        float_send_left[2,:] = species.z[selec_left]
-        float_send_left[3,:] = species.ux[selec_left]
-        float_send_left[4,:] = species.uy[selec_left]
-        float_send_left[5,:] = species.uz[selec_left]
-        float_send_left[6,:] = species.inv_gamma[selec_left]
-        float_send_left[7,:] = species.w[selec_left]
-        i_attr = 0
-        if species.tracker is not None:
-            uint_send_left[i_attr,:] = species.tracker.id[selec_left]
-            i_attr += 1
-        if species.ionizer is not None:
-            uint_send_left[i_attr,:] = \
-                species.ionizer.ionization_level[selec_left]
-            float_send_left[8,:] = species.ionizer.w_times_level[selec_left]
-    else:
-        # No need to allocate and copy data ; return an empty array
-        float_send_left = np.empty((n_float, 0), dtype=np.float64)
-        uint_send_left = np.empty((n_int, 0), dtype=np.uint64)
-
-    # Allocate and fill right sending buffer
-    if right_proc is not None:
-        N_send_r = selec_right.sum()
-        float_send_right = np.empty((n_float, N_send_r), dtype=np.float64)
-        uint_send_right = np.empty((n_int, N_send_r), dtype=np.float64)
-        float_send_right[0,:] = species.x[selec_right]
-        float_send_right[1,:] = species.y[selec_right]
-        float_send_right[2,:] = species.z[selec_right]
-        float_send_right[3,:] = species.ux[selec_right]
-        float_send_right[4,:] = species.uy[selec_right]
-        float_send_right[5,:] = species.uz[selec_right]
-        float_send_right[6,:] = species.inv_gamma[selec_right]
-        float_send_right[7,:] = species.w[selec_right]
-        i_attr = 0
-        if species.tracker is not None:
-            uint_send_right[i_attr,:] = species.tracker.id[selec_right]
-            i_attr += 1
-        if species.ionizer is not None:
-            uint_send_right[i_attr,:] = \
-                species.ionizer.ionization_level[selec_right]
-            float_send_right[8,:] = species.ionizer.w_times_level[selec_right]
-    else:
-        # No need to allocate and copy data ; return an empty array
-        float_send_right = np.empty((n_float, 0), dtype = np.float64)
-        uint_send_right = np.empty((n_int, 0), dtype=np.float64)
-
-    # Resize the particle arrays
-    N_stay = selec_stay.sum()
-    species.Ntot = N_stay
-    species.x = species.x[selec_stay]
-    species.y = species.y[selec_stay]
-    species.z = species.z[selec_stay]
-    species.ux = species.ux[selec_stay]
-    species.uy = species.uy[selec_stay]
-    species.uz = species.uz[selec_stay]
-    species.inv_gamma = species.inv_gamma[selec_stay]
-    species.w = species.w[selec_stay]
+    N_send_l = N_left if left_proc is not None else 0
+    N_send_r = N_right if right_proc is not None else 0
+    float_send_left = buffers.get( 'float_send_left',
+                                   (n_float, N_send_l), np.float64 )
+    float_send_right = buffers.get( 'float_send_right',
+                                    (n_float, N_send_r), np.float64 )
+    uint_send_left = buffers.get( 'uint_send_left',
+                                  (n_int, N_send_l), np.uint64 )
+    uint_send_right = buffers.get( 'uint_send_right',
+                                   (n_int, N_send_r), np.uint64 )
+
+    # Build the list of float and integer quantities
+    float_attrs = [ (species,'x'), (species,'y'), (species,'z'),
+                    (species,'ux'), (species,'uy'), (species,'uz'),
+                    (species,'inv_gamma'), (species,'w') ]
+    if species.ionizer is not None:
+        float_attrs.append( (species.ionizer,'w_times_level') )
+    uint_attrs = []
     if species.tracker is not None:
-        species.tracker.id = species.tracker.id[selec_stay]
+        uint_attrs.append( (species.tracker,'id') )
     if species.ionizer is not None:
-        species.ionizer.w_times_level = \
-            species.ionizer.w_times_level[selec_stay]
-        species.ionizer.ionization_level = \
-            species.ionizer.ionization_level[selec_stay]
+        uint_attrs.append( (species.ionizer,'ionization_level') )
+
+    # For each quantity: fill the sending buffers, then fill the empty
+    # slots and truncate the particle array
+    for attrs, send_left, send_right in [
+            (float_attrs, float_send_left, float_send_right),
+            (uint_attrs, uint_send_left, uint_send_right) ]:
+        for i_attr, (obj, name) in enumerate( attrs ):
+            array = getattr( obj, name )
+            pack_particles_numba( array, left_idx[:N_send_l],
+                    right_idx[:N_send_r], send_left[i_attr],
+                    send_right[i_attr] )
+            fill_empty_slots_numba( array, hole_idx, tail_idx )
+            setattr( obj, name, array[:N_stay] )
+    species.Ntot = N_stay
 
     # Return the sending buffers
     return(float_send_left, float_send_right, uint_send_left, uint_send_right)
@@ -410,27 +469,42 @@ def add_buffers_cpu( species, float_recv_left, float_recv_right,
         are the number of float and integer quantities respectively
         These arrays are always on the CPU (since they were used for MPI)
     """
+    # Nothing to do if no particle was received
+    if float_recv_left.shape[1] + float_recv_right.shape[1] == 0:
+        return
+
     # Form the new particle arrays by adding the received particles
     # from the left and the right to the particles that stay in the domain
-    species.x = np.hstack((float_recv_left[0], species.x, float_recv_right[0]))
-    species.y = np.hstack((float_recv_left[1], species.y, float_recv_right[1]))
-    species.z = np.hstack((float_recv_left[2], species.z, float_recv_right[2]))
-    species.ux = np.hstack((float_recv_left[3],species.ux,float_recv_right[3]))
-    species.uy = np.hstack((float_recv_left[4],species.uy,float_recv_right[4]))
-    species.uz = np.hstack((float_recv_left[5],species.uz,float_recv_right[5]))
-    species.inv_gamma = \
-        np.hstack((float_recv_left[6], species.inv_gamma, float_recv_right[6]))
-    species.w = np.hstack((float_recv_left[7], species.w, float_recv_right[7]))
+    # (The new arrays are filled in parallel, so that each chunk of
+    # particles is allocated on the NUMA node of the thread that uses it)
+    species.x = first_touch_concatenate(
+        float_recv_left[0], species.x, float_recv_right[0] )
+    species.y = first_touch_concatenate(
+        float_recv_left[1], species.y, float_recv_right[1] )
+    species.z = first_touch_concatenate(
+        float_recv_left[2], species.z, float_recv_right[2] )
+    species.ux = first_touch_concatenate(
+        float_recv_left[3], species.ux, float_recv_right[3] )
+    species.uy = first_touch_concatenate(
+        float_recv_left[4], species.uy, float_recv_right[4] )
+    species.uz = first_touch_concatenate(
+        float_recv_left[5], species.uz, float_recv_right[5] )
+    species.inv_gamma = first_touch_concatenate(
+        float_recv_left[6], species.inv_gamma, float_recv_right[6] )
+    species.w = first_touch_concatenate(
+        float_recv_left[7], species.w, float_recv_right[7] )
     i_attr = 0
     if species.tracker is not None:
-        species.tracker.id = np.hstack( (uint_recv_left[i_attr],
-            species.tracker.id, uint_recv_right[i_attr]))
+        species.tracker.id = first_touch_concatenate(
+            uint_recv_left[i_attr], species.tracker.id, uint_recv_right[i_attr])
         i_attr += 1
     if species.ionizer is not None:
-        species.ionizer.ionization_level = np.hstack( (uint_recv_left[i_attr],
-            species.ionizer.ionization_level, uint_recv_right[i_attr]))
-        species.ionizer.w_times_level = np.hstack( (float_recv_left[8],
-            species.ionizer.w_times_level, float_recv_right[8]))
+        species.ionizer.ionization_level = first_touch_concatenate(
+            uint_recv_left[i_attr], species.ionizer.ionization_level,
+            uint_recv_right[i_attr] )
+        species.ionizer.w_times_level = first_touch_concatenate(
+            float_recv_left[8], species.ionizer.w_times_level,
+            float_recv_right[8] )
 
     # Adapt the total number of particles
     species.Ntot = species.Ntot + float_recv_left.shape[1] \
@@ -571,6 +645,122 @@ def shift_particles_periodic_numba( z, zmin, zmax ):
         while z[i] < zmin:
             z[i] += l_box
 
+# Numba routines
+# --------------
+
+@njit_parallel
+def count_leaving_particles_numba( z, zbox_min, zbox_max, chunk_indices,
+                                    n_left_chunk, n_right_chunk ):
+    """
+    Count the particles that are below `zbox_min` and above `zbox_max`,
+    in each chunk of particles (one chunk per thread)
+
+    Parameters:
+    -----------
+    z: 1darray of floats
+        The z position of the particles (one element per particle)
+    zbox_min, zbox_max: floats
+        The positions beyond which the particles leave the local domain
+    chunk_indices: 1darray of uint64
+        The indices that bound the chunks (see `get_chunk_indices`)
+    n_left_chunk, n_right_chunk: 1darrays of ints
+        Arrays of size nthreads, which are filled by this function
+    """
+    for i_chk in prange( len(chunk_indices)-1 ):
+        n_left = 0
+        n_right = 0
+        for i in range( chunk_indices[i_chk], chunk_indices[i_chk+1] ):
+            if z[i] < zbox_min:
+                n_left += 1
+            elif z[i] > zbox_max:
+                n_right += 1
+        n_left_chunk[i_chk] = n_left
+        n_right_chunk[i_chk] = n_right
+
+@njit_parallel
+def find_leaving_particles_numba( z, zbox_min, zbox_max, chunk_indices,
+                        left_offset, right_offset, left_idx, right_idx ):
+    """
+    Write the indices of the particles that are below `zbox_min` (resp.
+    above `zbox_max`) into `left_idx` (resp. `right_idx`), in increasing
+    order. Each chunk of particles starts writing at the corresponding
+    offset (obtained from `count_leaving_particles_numba`).
+    """
+    for i_chk in prange( len(chunk_indices)-1 ):
+        i_left = left_offset[i_chk]
+        i_right = right_offset[i_chk]
+        for i in range( chunk_indices[i_chk], chunk_indices[i_chk+1] ):
+            if z[i] < zbox_min:
+                left_idx[i_left] = i
+                i_left += 1
+            elif z[i] > zbox_max:
+                right_idx[i_right] = i
+                i_right += 1
+
+@numba.njit
+def pair_empty_slots_numba( z, zbox_min, zbox_max, N_stay,
+                            left_idx, right_idx, hole_idx, tail_idx ):
+    """
+    Find the leaving particles whose index is below `N_stay` (i.e. the
+    slots that become empty), and the staying particles whose index is
+    above `N_stay` (i.e. the particles that should fill these slots).
+    The number of operations is proportional to the number of leaving
+    particles.
+
+    Parameters:
+    -----------
+    N_stay: int
+        The number of particles that stay in the local domain
+    left_idx, right_idx: 1darrays of ints
+        The indices of the leaving particles, in increasing order
+    hole_idx, tail_idx: 1darrays of ints
+        Arrays that are filled by this function (their size is at least
+        the number of leaving particles)
+
+    Returns:
+    --------
+    n_holes: int
+        The number of empty slots (i.e. of elements of hole_idx and
+        tail_idx that were filled)
+    """
+    n_holes = 0
+    for i in left_idx:
+        if i >= N_stay:
+            break
+        hole_idx[n_holes] = i
+        n_holes += 1
+    for i in right_idx:
+        if i >= N_stay:
+            break
+        hole_idx[n_holes] = i
+        n_holes += 1
+    n_tail = 0
+    for i in range( N_stay, len(z) ):
+        if not ( (z[i] < zbox_min) or (z[i] > zbox_max) ):
+            tail_idx[n_tail] = i
+            n_tail += 1
+    return( n_holes )
+
+@njit_parallel
+def pack_particles_numba( array, left_idx, right_idx, send_left, send_right ):
+    """
+    Copy the elements of `array` at the indices `left_idx` (resp.
+    `right_idx`) into `send_left` (resp. `send_right`)
+    """
+    for k in prange( len(left_idx) ):
+        send_left[k] = array[ left_idx[k] ]
+    for k in prange( len(right_idx) ):
+        send_right[k] = array[ right_idx[k] ]
+
+@njit_parallel
+def fill_empty_slots_numba( array, hole_idx, tail_idx ):
+    """
+    Copy the elements of `array` at the indices `tail_idx`
+    to the indices `hole_idx`
+    """
+    for k in prange( len(hole_idx) ):
+        array[ hole_idx[k] ] = array[ tail_idx[k] ]
+
 # Cuda routines
 # -------------
 if cuda_installed:
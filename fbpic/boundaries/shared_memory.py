@@ -0,0 +1,202 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines the SharedMemoryExchanger object, which exchanges the guard
+cells of the fields between neighbouring MPI ranks of the same node
+through an MPI-3 shared-memory window, instead of MPI messages.
+"""
+import os
+import numpy as np
+from fbpic.utils.mpi import MPI, mpi_installed
+from fbpic.utils.timing import perf_counter
+
+# Check if the environment variable FBPIC_DISABLE_SHARED_MEMORY is set to 1
+# and in that case, always exchange the fields through MPI messages
+shared_memory_enabled = mpi_installed and hasattr( MPI, 'Win' ) \
+                        and hasattr( MPI.Win, 'Allocate_shared' )
+if 'FBPIC_DISABLE_SHARED_MEMORY' in os.environ:
+    if int(os.environ['FBPIC_DISABLE_SHARED_MEMORY']) == 1:
+        shared_memory_enabled = False
+
+# Tags of the (empty) synchronization messages
+# (distinct from the tags 1 and 2, used by `exchange_domains`)
+tag_ready_left = 3
+tag_ready_right = 4
+tag_done_left = 5
+tag_done_right = 6
+
+class SharedMemoryExchanger(object):
+    """
+    Class that places the sending buffers of the fields (see
+    `BufferHandler`) in an MPI-3 shared-memory window, so that the
+    neighbouring ranks of the same node can read them directly (instead
+    of receiving a copy of them through MPI messages).
+
+    The exchange of a given buffer proceeds as follows:
+
+    - `wait_until_read`: wait until the neighbours have finished reading
+      the previous content of the sending buffers
+    - the sending buffers are filled (by `BufferHandler`)
+    - `start_exchange` and `wait_left`/`wait_right`: notify the neighbours
+      that the buffers are ready, and wait for their notifications
+    - the buffers of the neighbours are copied/added to the local grid
+      (by `BufferHandler`)
+    - `finish_exchange`: notify the neighbours that their buffers were read
+
+    The notifications are empty point-to-point messages, so that only the
+    neighbouring ranks are synchronized. The neighbours that are on other
+    nodes keep exchanging MPI messages (see `exchange_domains`).
+    """
+
+    def __init__( self, mpi_comm, left_proc, right_proc, buffer_shapes ):
+        """
+        Allocate the shared-memory window of the node, and find
+        which neighbours are on the same node
+
+        This has to be called by all procs of `mpi_comm`.
+
+        Parameters
+        ----------
+        mpi_comm: an mpi4py communicator
+            The communicator of the simulation
+
+        left_proc, right_proc: int or None
+            Rank of the proc to the left and to the right
+            (None for open boundary)
+
+        buffer_shapes: dictionary
+            The shape of the sending buffers (complex128) for each exchange
+            type (the same on all procs ; see `BufferHandler`)
+        """
+        self.mpi_comm = mpi_comm
+        self.left_proc = left_proc
+        self.right_proc = right_proc
+
+        # Find the procs of the same node, and translate
+        # the ranks of the neighbours within the node
+        self.node_comm = mpi_comm.Split_type( MPI.COMM_TYPE_SHARED,
+                                              key=mpi_comm.rank )
+        world_group = mpi_comm.Get_group()
+        node_group = self.node_comm.Get_group()
+        def get_node_rank( proc ):
+            if proc is None:
+                return( None )
+            node_rank = world_group.Translate_ranks( [proc], node_group )[0]
+            if node_rank == MPI.UNDEFINED:
+                return( None )
+            return( node_rank )
+        self.left_node_rank = get_node_rank( left_proc )
+        self.right_node_rank = get_node_rank( right_proc )
+        world_group.Free()
+        node_group.Free()
+        self.left_shared = (self.left_node_rank is not None)
+        self.right_shared = (self.right_node_rank is not None)
+
+        # Layout of the window (identical on all procs):
+        # the left and right sending buffers of each exchange type
+        self.buffer_shapes = buffer_shapes
+        self.offsets = {}
+        n_bytes = 0
+        for exchange_type in sorted( buffer_shapes.keys() ):
+            size = 16 * int( np.prod( buffer_shapes[exchange_type] ) )
+            self.offsets[exchange_type] = ( n_bytes, n_bytes + size )
+            n_bytes += 2*size
+        self.n_bytes = n_bytes
+
+        # Allocate the window (collective operation on the node), and open
+        # a passive-target epoch, so that `Sync` can be used as a memory
+        # barrier for the direct loads/stores in the window
+        self.win = MPI.Win.Allocate_shared( n_bytes, 1, comm=self.node_comm )
+        self.win.Lock_all( MPI.MODE_NOCHECK )
+
+        # Empty message, used for the notifications
+        self.flag = np.zeros( 0, dtype=np.uint8 )
+        # Requests for the notifications that the neighbours
+        # have read the local sending buffers
+        self.done_requests = []
+
+    def get_buffers( self, node_rank ):
+        """
+        Return the sending buffers of the proc `node_rank` (rank within
+        the node), as numpy arrays that point to the shared window
+
+        Returns
+        -------
+        send_l, send_r: dictionaries of 3darrays of complex128
+            The left and right sending buffers, for each exchange type
+        """
+        buf, _ = self.win.Shared_query( node_rank )
+        window = np.frombuffer( buf, dtype=np.uint8, count=self.n_bytes )
+        send_l = {}
+        send_r = {}
+        for exchange_type, shape in self.buffer_shapes.items():
+            start_l, start_r = self.offsets[exchange_type]
+            size = start_r - start_l
+            send_l[exchange_type] = window[start_l:start_l+size].view(
+                np.complex128 ).reshape( shape )
+            send_r[exchange_type] = window[start_r:start_r+size].view(
+                np.complex128 ).reshape( shape )
+        return( send_l, send_r )
+
+    def wait_until_read( self ):
+        """
+        Wait until the neighbours have read the sending buffers of the
+        previous exchange (before these buffers are overwritten)
+        """
+        if len( self.done_requests ) > 0:
+            MPI.Request.Waitall( self.done_requests )
+            self.done_requests = []
+
+    def start_exchange( self ):
+        """
+        Notify the neighbours of the same node that the local sending
+        buffers are ready to be read, and post the reception
+        of their notifications
+        """
+        # Make the stores to the window visible to the other procs
+        self.win.Sync()
+        self.ready_requests = {}
+        if self.left_shared:
+            self.mpi_comm.Isend( self.flag, dest=self.left_proc,
+                                 tag=tag_ready_left ).Free()
+            self.ready_requests['left'] = self.mpi_comm.Irecv(
+                self.flag, source=self.left_proc, tag=tag_ready_right )
+        if self.right_shared:
+            self.mpi_comm.Isend( self.flag, dest=self.right_proc,
+                                 tag=tag_ready_right ).Free()
+            self.ready_requests['right'] = self.mpi_comm.Irecv(
+                self.flag, source=self.right_proc, tag=tag_ready_left )
+
+    def wait_for_neighbour( self, side ):
+        """
+        Wait until the neighbour on the side `side` ('left' or 'right')
+        has filled its sending buffers
+
+        Returns
+        -------
+        The time spent waiting (in seconds)
+        """
+        t_start = perf_counter()
+        self.ready_requests.pop( side ).Wait()
+        # Make the stores of the neighbour visible to the local proc
+        self.win.Sync()
+        return( perf_counter() - t_start )
+
+    def finish_exchange( self ):
+        """
+        Notify the neighbours of the same node that their sending buffers
+        were read, and post the reception of their notifications
+        (see `wait_until_read`)
+        """
+        if self.left_shared:
+            self.mpi_comm.Isend( self.flag, dest=self.left_proc,
+                                 tag=tag_done_left ).Free()
+            self.done_requests.append( self.mpi_comm.Irecv(
+                self.flag, source=self.left_proc, tag=tag_done_right ) )
+        if self.right_shared:
+            self.mpi_comm.Isend( self.flag, dest=self.right_proc,
+                                 tag=tag_done_right ).Free()
+            self.done_requests.append( self.mpi_comm.Irecv(
+                self.flag, source=self.right_proc, tag=tag_done_left ) )
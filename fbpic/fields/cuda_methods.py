@@ -300,8 +300,8 @@ def cuda_push_eb_standard( Ep, Em, Ez, Bp, Bm, Bz, Jp, Jm, Jz,
                         + 1.j*kr[iz, ir]*Jm[iz, ir] )
 
 @cuda.jit
-def cuda_push_envelope_standard(a, a_old, C_w_laser_env, C_w_tot_env,
-                            A_coef, Nz, Nr) :
+def cuda_push_envelope_standard(a, a_old, chi_a, C_w_laser_env, C_w_tot_env,
+                            A_coef, chi_coef_env, Nz, Nr) :
     """
     Push the envelope over one timestep, using the envelope model equations
 
@@ -315,10 +315,40 @@ def cuda_push_envelope_standard(a, a_old, C_w_laser_env, C_w_tot_env,
         a_temp = a[iz, ir]
         # Push the envelope
         a[iz, ir] = A_coef * ( - A_coef * a_old[iz,ir] \
-                + 2 * C_w_tot_env[iz, ir] * a[iz, ir] )
+                + 2 * C_w_tot_env[iz, ir] * a[iz, ir] ) \
+                - chi_coef_env[iz, ir] * chi_a[iz, ir]
         a_old[iz, ir] = a_temp
 
 
+@cuda.jit
+def cuda_max_real_along_r( array, max_array ):
+    """
+    Store the maximum of the real part of `array` along r,
+    for each iz, in the 1d array `max_array`
+    """
+    # Cuda 1D grid
+    iz = cuda.grid(1)
+
+    if iz < array.shape[0]:
+        max_value = array[iz, 0].real
+        for ir in range( 1, array.shape[1] ):
+            max_value = max( max_value, array[iz, ir].real )
+        max_array[iz] = max_value
+
+@cuda.jit
+def cuda_multiply_chi_a( chi, a, chi_a, Nz, Nr ):
+    """
+    Multiply the envelope `a` (of a given azimuthal mode) by the plasma
+    susceptibility `chi` (the real part of the mode 0 of the deposited
+    array), and store the result in `chi_a`
+    """
+    # Cuda 2D grid
+    iz, ir = cuda.grid(2)
+
+    if (iz < Nz) and (ir < Nr) :
+        chi_a[iz, ir] = chi[iz, ir].real * a[iz, ir]
+
+
 @cuda.jit
 def cuda_push_eb_comoving( Ep, Em, Ez, Bp, Bm, Bz, Jp, Jm, Jz,
                        rho_prev, rho_next,
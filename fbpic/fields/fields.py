@@ -6,8 +6,12 @@ This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
 It defines the high-level Fields class.
 """
 import warnings
+import numba
 import numpy as np
-from fbpic.utils.threading import nthreads
+from fbpic.utils.threading import nthreads, threading_enabled, \
+    num_threads_settable, limit_blas_threads
+from fbpic.utils.placement import first_touch_zeros, first_touch_copy
+from fbpic.utils.mpi import MPI
 from .numba_methods import sum_reduce_2d_array
 from .utility_methods import get_modified_k
 from .spectral_transform import SpectralTransformer
@@ -51,7 +55,8 @@ class Fields(object) :
     def __init__( self, Nz, zmax, Nr, rmax, Nm, dt, zmin=0.,
                   n_order=-1, v_comoving=None, use_galilean=True,
                   current_correction='cross-deposition', use_cuda=False,
-                  create_threading_buffers=False ):
+                  create_threading_buffers=False, use_mode_threads=False,
+                  mode_comm=None ):
         """
         Initialize the components of the Fields object
 
@@ -107,6 +112,27 @@ class Fields(object) :
             Whether to create the buffers used in order to perform
             charge/current deposition with threading on CPU
             (buffers are duplicated with the number of threads)
+
+        use_mode_threads: bool, optional
+            Whether to transform and push the different azimuthal modes
+            concurrently, in a pool of threads (one per mode), on CPU.
+            The threads of numba, FFTW and BLAS are then divided between
+            the modes. This is useful for moderate grid sizes, for which
+            the transforms of a single mode do not use all the cores.
+
+        mode_comm: an mpi4py communicator, optional
+            If not None, the azimuthal modes are distributed among the procs
+            of this communicator (the mode m is handled by the proc of rank
+            m % mode_comm.size), on CPU. The spectral transformers, the
+            spectral grids and the PSATD coefficients (whose memory
+            scales as Nr*Nr and Nz*Nr per mode) are only created for the
+            modes of the local proc (`local_modes` ; the other elements of
+            the lists `trans`, `spect` and `psatd` are None). The
+            interpolation grids of all the modes are kept on all the procs:
+            the sources are deposited from the same particles on all the
+            procs, and the fields are broadcast from the proc that
+            handles each mode, whenever they are transformed back to the
+            interpolation grid (see `broadcast_modes`).
         """
         # Register the arguments inside the object
         self.Nz = Nz
@@ -134,13 +160,52 @@ class Fields(object) :
         else:
             raise ValueError('Unkown current correction:%s'%current_correction)
 
+        # Find the azimuthal modes that are handled by the local proc
+        self.mode_comm = mode_comm
+        if mode_comm is None:
+            self.mode_owner = [ 0 for m in range(Nm) ]
+            self.local_modes = list( range(Nm) )
+        else:
+            if self.use_cuda:
+                raise ValueError('The decomposition of the azimuthal modes '
+                                 'is only implemented on CPU.')
+            self.mode_owner = [ m % mode_comm.size for m in range(Nm) ]
+            self.local_modes = [ m for m in range(Nm) \
+                                 if self.mode_owner[m] == mode_comm.rank ]
+
+        # Optionally, prepare a pool of threads for the azimuthal modes
+        # (the threads are divided between the modes, see `for_each_mode`)
+        N_local_modes = len( self.local_modes )
+        self.use_mode_threads = use_mode_threads and (not self.use_cuda) \
+                                    and (N_local_modes > 1)
+        if self.use_mode_threads and threading_enabled \
+                and not num_threads_settable:
+            # The numba threads cannot be divided between the modes
+            warnings.warn(
+                'The azimuthal modes cannot be handled concurrently with '
+                'this version of numba (0.49 or higher is needed).\n'
+                'Handling the modes serially.' )
+            self.use_mode_threads = False
+        self.mode_pool_checked = False
+        self.mode_pool = None
+        if self.use_mode_threads:
+            # (Imported here, since `concurrent.futures` is not available
+            # on Python 2 without the `futures` backport)
+            from concurrent.futures import ThreadPoolExecutor
+            self.threads_per_mode = max( 1, nthreads//N_local_modes )
+            self.mode_pool = ThreadPoolExecutor( max_workers=N_local_modes )
+        else:
+            self.threads_per_mode = None
+
         # Create the list of the transformers, which convert the fields
         # back and forth between the spatial and spectral grid
-        # (one object per azimuthal mode)
-        self.trans = []
-        for m in range(Nm) :
-            self.trans.append( SpectralTransformer(
-                Nz, Nr, m, rmax, use_cuda=self.use_cuda ) )
+        # (one object per azimuthal mode ; None for the modes
+        # that are handled by other procs)
+        self.trans = [ None for m in range(Nm) ]
+        for m in self.local_modes :
+            self.trans[m] = SpectralTransformer(
+                Nz, Nr, m, rmax, use_cuda=self.use_cuda,
+                fft_nthreads=self.threads_per_mode )
 
         # Create the interpolation grid for each modes
         # (one grid per azimuthal mode)
@@ -159,21 +224,22 @@ class Fields(object) :
 
         # Create the spectral grid for each mode, as well as
         # the psatd coefficients
-        # (one grid per azimuthal mode)
-        self.spect = [ ]
-        self.psatd = [ ]
-        for m in range(Nm) :
+        # (one grid per azimuthal mode ; None for the modes
+        # that are handled by other procs)
+        self.spect = [ None for m in range(Nm) ]
+        self.psatd = [ None for m in range(Nm) ]
+        for m in self.local_modes :
             # Extract the inhomogeneous spectral grid for mode m
             kr = 2*np.pi * self.trans[m].dht0.get_nu()
             # Create the object
-            self.spect.append( FieldSpectralGrid( kz_modified, kr, m,
+            self.spect[m] = FieldSpectralGrid( kz_modified, kr, m,
                 kz_true, self.interp[m].dz, self.interp[m].dr,
-                current_correction, use_cuda=self.use_cuda ) )
-            self.psatd.append( PsatdCoeffs( self.spect[m].kz,
+                current_correction, use_cuda=self.use_cuda )
+            self.psatd[m] = PsatdCoeffs( self.spect[m].kz,
                                 self.spect[m].kr, m, dt, Nz, Nr,
                                 V=self.v_comoving,
                                 use_galilean=self.use_galilean,
-                                use_cuda=self.use_cuda ) )
+                                use_cuda=self.use_cuda )
 
         # Record flags that indicates whether, for the sources *in
         # spectral space*, the guard cells have been exchanged via MPI
@@ -185,22 +251,27 @@ class Fields(object) :
         # (One copy per thread ; 2 guard cells on each side in z and r,
         # in order to store contributions from, at most, cubic shape factors ;
         # these deposition guard cells are folded into the regular box
-        # inside `sum_reduce_2d_array`)
+        # inside `sum_reduce_2d_array` ; each copy is first touched by
+        # its own thread, so as to be allocated on its NUMA node)
         if create_threading_buffers:
-            self.rho_global = np.zeros( dtype=np.complex128,
-                shape=(nthreads, self.Nm, self.Nz+4, self.Nr+4) )
-            self.Jr_global = np.zeros( dtype=np.complex128,
-                    shape=(nthreads, self.Nm, self.Nz+4, self.Nr+4) )
-            self.Jt_global = np.zeros( dtype=np.complex128,
-                    shape=(nthreads, self.Nm, self.Nz+4, self.Nr+4) )
-            self.Jz_global = np.zeros( dtype=np.complex128,
-                    shape=(nthreads, self.Nm, self.Nz+4, self.Nr+4) )
+            self.rho_global = first_touch_zeros(
+                (nthreads, self.Nm, self.Nz+4, self.Nr+4), np.complex128 )
+            self.Jr_global = first_touch_zeros(
+                    (nthreads, self.Nm, self.Nz+4, self.Nr+4), np.complex128 )
+            self.Jt_global = first_touch_zeros(
+                    (nthreads, self.Nm, self.Nz+4, self.Nr+4), np.complex128 )
+            self.Jz_global = first_touch_zeros(
+                    (nthreads, self.Nm, self.Nz+4, self.Nr+4), np.complex128 )
+
+        # Cached charge density of the immobile species, on the
+        # interpolation grid (see `store_immobile_rho`)
+        self.immobile_rho = None
 
         # By default will not use the envelope model
         self.use_envelope = False
 
 
-    def activate_envelope_model(self, k0):
+    def activate_envelope_model(self, k0, mpi_comm=None):
         """
         Initializes anything needed for the envelope model
 
@@ -214,9 +285,21 @@ class Fields(object) :
             Wavenumber of the beam represented by the envelope model
             It is important to have only one well-defined wavelength
             in this model
+
+        mpi_comm: an mpi4py communicator, optional
+            The communicator of the domain decomposition, if any (the
+            maximal plasma susceptibility is reduced over this communicator,
+            so that all procs use the same coefficients for the envelope push)
         """
 
+        if self.mode_comm is not None:
+            raise ValueError('The envelope model cannot be used with a '
+                             'decomposition of the azimuthal modes.')
         self.use_envelope = True
+        self.envelope_mpi_comm = mpi_comm
+        # Upper bound of the plasma susceptibility, for which the
+        # coefficients of the envelope push are computed
+        self.envelope_chi_ref = 0.
 
         #Create the envelope interpolation grids for each modes
         #The envelope modes range from -Nm + 1 to Nm - 1
@@ -248,6 +331,26 @@ class Fields(object) :
              self.spect[m].kr, m, self.dt, self.Nz, self.Nr, k0)
 
 
+    def update_envelope_chi_coefs( self, chi_max ):
+        """
+        Recompute the coefficients of the plasma response in the envelope
+        push, if the plasma susceptibility `chi_max` exceeds the value for
+        which they were computed (in order to keep the push stable).
+        A margin is used so that the coefficients are rarely recomputed.
+
+        Parameters
+        ----------
+        chi_max: float (in rad^2.s^-2)
+            The maximal plasma susceptibility on the local grid
+            (reduced over all the procs, if there is a domain decomposition)
+        """
+        if self.envelope_mpi_comm is not None:
+            chi_max = self.envelope_mpi_comm.allreduce( chi_max, op=MPI.MAX )
+        if chi_max > self.envelope_chi_ref:
+            self.envelope_chi_ref = 1.5*chi_max
+            for m in range(self.Nm):
+                self.psatd[m].compute_envelope_chi_coef( self.envelope_chi_ref )
+
     def send_fields_to_gpu( self ):
         """
         Copy the fields to the GPU.
@@ -280,6 +383,81 @@ class Fields(object) :
                     self.envelope_interp[m].receive_fields_from_gpu()
                     self.envelope_spect[m].receive_fields_from_gpu()
 
+    def for_each_mode( self, func ):
+        """
+        Call `func(m)` for each azimuthal mode `m` of the local proc
+        (see `local_modes`).
+
+        If `use_mode_threads` is True, the calls are performed concurrently
+        in the pool of threads (one thread per mode). In this case, each
+        call uses `threads_per_mode` threads for the numba kernels, FFTW
+        and BLAS (instead of all the threads), in order to avoid
+        oversubscription. This relies on the fact that FFTW, BLAS and
+        the numba kernels do not need the GIL; `func` should thus only
+        modify the data of the mode `m`.
+        """
+        if not self.mode_threads_available():
+            for m in self.local_modes:
+                func( m )
+            return
+        with limit_blas_threads( self.threads_per_mode ):
+            futures = [ self.mode_pool.submit( self._call_in_mode_thread,
+                        func, m ) for m in self.local_modes ]
+            for future in futures:
+                # Wait for completion (and raise the errors, if any)
+                future.result()
+
+    def _call_in_mode_thread( self, func, m ):
+        """Call `func(m)`, with the number of numba threads of one mode"""
+        if num_threads_settable:
+            numba.set_num_threads( self.threads_per_mode )
+        func( m )
+
+    def close( self ):
+        """
+        Shut down the pool of threads of the azimuthal modes (if any).
+        The modes are then handled serially.
+        """
+        if self.mode_pool is not None:
+            self.mode_pool.shutdown( wait=True )
+            self.mode_pool = None
+        self.use_mode_threads = False
+
+    def __del__( self ):
+        """Shut down the pool of threads when the fields are deleted"""
+        # (`mode_pool` may not exist if the initialization failed)
+        if getattr( self, 'mode_pool', None ) is not None:
+            self.mode_pool.shutdown( wait=False )
+
+    def mode_threads_available( self ):
+        """
+        Return whether the azimuthal modes can be handled concurrently.
+
+        The numba kernels can be called from several threads only with a
+        threadsafe threading layer (tbb or omp, but not workqueue). Since
+        numba selects the threading layer when the first parallel kernel
+        is launched, the modes are handled serially until then.
+        """
+        if not self.use_mode_threads:
+            return( False )
+        if not self.mode_pool_checked:
+            if threading_enabled:
+                try:
+                    layer = numba.threading_layer()
+                except ValueError:
+                    # No parallel kernel was launched yet
+                    return( False )
+                if layer == 'workqueue':
+                    warnings.warn(
+                        'The azimuthal modes cannot be handled concurrently '
+                        'with the workqueue threading layer of numba.\n'
+                        'Please install tbb or use OpenMP (see the numba '
+                        'documentation). Handling the modes serially.' )
+                    self.use_mode_threads = False
+                    return( False )
+            self.mode_pool_checked = True
+        return( True )
+
     def push(self, use_true_rho=False, check_exchanges=False):
         """
         Push the different azimuthal modes over one timestep,
@@ -307,8 +485,10 @@ class Fields(object) :
 
         # Push each azimuthal grid individually, by passing the
         # corresponding psatd coefficients
-        for m in range(self.Nm) :
+        def push_mode( m ):
             self.spect[m].push_eb_with( self.psatd[m], use_true_rho )
+            self.spect[m].push_rho()
+        self.for_each_mode( push_mode )
 
         # Check if the envelope model is used then
         # push each azimuthal mode individually
@@ -316,9 +496,6 @@ class Fields(object) :
             for m in self.envelope_mode_numbers :
                 self.envelope_spect[m].push_envelope_with(self.psatd[abs(m)])
 
-        for m in range(self.Nm) :
-            self.spect[m].push_rho()
-
     def correct_currents(self, check_exchanges=False) :
         """
         Correct the currents so that they satisfy the
@@ -341,9 +518,8 @@ class Fields(object) :
                 assert self.exchanged_source['rho_next_z'] == False
 
         # Correct each azimuthal grid individually
-        for m in range(self.Nm) :
-            self.spect[m].correct_currents(
-                self.dt, self.psatd[m], self.current_correction )
+        self.for_each_mode( lambda m: self.spect[m].correct_currents(
+                self.dt, self.psatd[m], self.current_correction ) )
 
     def correct_divE(self) :
         """
@@ -351,7 +527,7 @@ class Fields(object) :
         charge conservation equation
         """
         # Correct each azimuthal grid individually
-        for m in range(self.Nm) :
+        for m in self.local_modes :
             self.spect[m].correct_divE()
 
     def interp2spect(self, fieldtype) :
@@ -363,39 +539,14 @@ class Fields(object) :
         ---------
         fieldtype :
             A string which represents the kind of field to transform
-            (either 'E', 'B', 'J', 'rho_next', 'rho_prev', 'a')
+            (either 'E', 'B', 'J', 'rho_next', 'rho_prev', 'a', 'chi')
         """
         # Use the appropriate transformation depending on the fieldtype.
-        if fieldtype == 'E' :
-            for m in range(self.Nm) :
-            # Transform each azimuthal grid individually
-                self.trans[m].interp2spect_scal(
-                    self.interp[m].Ez, self.spect[m].Ez )
-                self.trans[m].interp2spect_vect(
-                    self.interp[m].Er, self.interp[m].Et,
-                    self.spect[m].Ep, self.spect[m].Em )
-        elif fieldtype == 'B' :
+        if fieldtype in ['E', 'B', 'J',
+                         'rho_prev', 'rho_next', 'rho_next_z', 'rho_next_xy']:
             # Transform each azimuthal grid individually
-            for m in range(self.Nm) :
-                self.trans[m].interp2spect_scal(
-                    self.interp[m].Bz, self.spect[m].Bz )
-                self.trans[m].interp2spect_vect(
-                    self.interp[m].Br, self.interp[m].Bt,
-                    self.spect[m].Bp, self.spect[m].Bm )
-        elif fieldtype == 'J' :
-            # Transform each azimuthal grid individually
-            for m in range(self.Nm) :
-                self.trans[m].interp2spect_scal(
-                    self.interp[m].Jz, self.spect[m].Jz )
-                self.trans[m].interp2spect_vect(
-                    self.interp[m].Jr, self.interp[m].Jt,
-                    self.spect[m].Jp, self.spect[m].Jm )
-        elif fieldtype in ['rho_prev', 'rho_next', 'rho_next_z', 'rho_next_xy']:
-            # Transform each azimuthal grid individually
-            for m in range(self.Nm) :
-                spectral_rho = getattr( self.spect[m], fieldtype )
-                self.trans[m].interp2spect_scal(
-                    self.interp[m].rho, spectral_rho )
+            self.for_each_mode(
+                lambda m: self.interp2spect_mode( fieldtype, m ) )
         elif fieldtype == 'a' and self.use_envelope:
             # Transform each azimuthal grid individually
             for m in self.envelope_mode_numbers:
@@ -403,9 +554,48 @@ class Fields(object) :
                     self.envelope_interp[m].a, self.envelope_spect[m].a )
                 self.trans[abs(m)].interp2spect_scal(
                     self.envelope_interp[m].a_old, self.envelope_spect[m].a_old)
+        elif fieldtype == 'chi' and self.use_envelope:
+            # The plasma susceptibility was deposited in the mode 0 of rho
+            # (see `Simulation.deposit`): multiply it by each envelope mode
+            # and transform the corresponding plasma response chi*a
+            self.update_envelope_chi_coefs( self.interp[0].get_max_real_rho() )
+            for m in self.envelope_mode_numbers:
+                self.envelope_interp[m].compute_chi_a( self.interp[0].rho )
+                self.trans[abs(m)].interp2spect_scal(
+                    self.envelope_interp[m].chi_a, self.envelope_spect[m].chi_a )
         else:
             raise ValueError( 'Invalid string for fieldtype: %s' %fieldtype )
 
+    def interp2spect_mode(self, fieldtype, m) :
+        """
+        Transform the fields `fieldtype` of the azimuthal mode `m` from the
+        interpolation grid to the spectral grid
+        (either 'E', 'B', 'J', 'rho_next', 'rho_prev', 'rho_next_z'
+        or 'rho_next_xy' ; see `interp2spect`)
+        """
+        if fieldtype == 'E' :
+            self.trans[m].interp2spect_scal(
+                self.interp[m].Ez, self.spect[m].Ez )
+            self.trans[m].interp2spect_vect(
+                self.interp[m].Er, self.interp[m].Et,
+                self.spect[m].Ep, self.spect[m].Em )
+        elif fieldtype == 'B' :
+            self.trans[m].interp2spect_scal(
+                self.interp[m].Bz, self.spect[m].Bz )
+            self.trans[m].interp2spect_vect(
+                self.interp[m].Br, self.interp[m].Bt,
+                self.spect[m].Bp, self.spect[m].Bm )
+        elif fieldtype == 'J' :
+            self.trans[m].interp2spect_scal(
+                self.interp[m].Jz, self.spect[m].Jz )
+            self.trans[m].interp2spect_vect(
+                self.interp[m].Jr, self.interp[m].Jt,
+                self.spect[m].Jp, self.spect[m].Jm )
+        else:
+            spectral_rho = getattr( self.spect[m], fieldtype )
+            self.trans[m].interp2spect_scal(
+                self.interp[m].rho, spectral_rho )
+
     def spect2interp(self, fieldtype) :
         """
         Transform the fields `fieldtype` from the spectral grid
@@ -418,40 +608,12 @@ class Fields(object) :
             (either 'E', 'B', 'J', 'rho_next', 'rho_prev', 'a')
         """
         # Use the appropriate transformation depending on the fieldtype.
-        if fieldtype == 'E' :
-            # Transform each azimuthal grid individually
-            for m in range(self.Nm) :
-                self.trans[m].spect2interp_scal(
-                    self.spect[m].Ez, self.interp[m].Ez )
-                self.trans[m].spect2interp_vect(
-                    self.spect[m].Ep,  self.spect[m].Em,
-                    self.interp[m].Er, self.interp[m].Et )
-        elif fieldtype == 'B' :
-            # Transform each azimuthal grid individually
-            for m in range(self.Nm) :
-                self.trans[m].spect2interp_scal(
-                    self.spect[m].Bz, self.interp[m].Bz )
-                self.trans[m].spect2interp_vect(
-                    self.spect[m].Bp, self.spect[m].Bm,
-                    self.interp[m].Br, self.interp[m].Bt )
-        elif fieldtype == 'J' :
-            # Transform each azimuthal grid individually
-            for m in range(self.Nm) :
-                self.trans[m].spect2interp_scal(
-                    self.spect[m].Jz, self.interp[m].Jz )
-                self.trans[m].spect2interp_vect(
-                    self.spect[m].Jp,  self.spect[m].Jm,
-                    self.interp[m].Jr, self.interp[m].Jt )
-        elif fieldtype == 'rho_next' :
+        if fieldtype in ['E', 'B', 'J', 'rho_next', 'rho_prev']:
             # Transform each azimuthal grid individually
-            for m in range(self.Nm) :
-                self.trans[m].spect2interp_scal(
-                    self.spect[m].rho_next, self.interp[m].rho )
-        elif fieldtype == 'rho_prev' :
-            # Transform each azimuthal grid individually
-            for m in range(self.Nm) :
-                self.trans[m].spect2interp_scal(
-                    self.spect[m].rho_prev, self.interp[m].rho )
+            self.for_each_mode(
+                lambda m: self.spect2interp_mode( fieldtype, m ) )
+            # Get the modes of the other procs (mode decomposition)
+            self.broadcast_modes( fieldtype )
         elif fieldtype == 'a' and self.use_envelope:
             # Transform each azimuthal grid individually
             for m in self.envelope_mode_numbers :
@@ -463,6 +625,61 @@ class Fields(object) :
         else :
             raise ValueError( 'Invalid string for fieldtype: %s' %fieldtype )
 
+    def spect2interp_mode(self, fieldtype, m) :
+        """
+        Transform the fields `fieldtype` of the azimuthal mode `m` from the
+        spectral grid to the interpolation grid
+        (either 'E', 'B', 'J', 'rho_next' or 'rho_prev' ; see `spect2interp`)
+        """
+        if fieldtype == 'E' :
+            self.trans[m].spect2interp_scal(
+                self.spect[m].Ez, self.interp[m].Ez )
+            self.trans[m].spect2interp_vect(
+                self.spect[m].Ep,  self.spect[m].Em,
+                self.interp[m].Er, self.interp[m].Et )
+        elif fieldtype == 'B' :
+            self.trans[m].spect2interp_scal(
+                self.spect[m].Bz, self.interp[m].Bz )
+            self.trans[m].spect2interp_vect(
+                self.spect[m].Bp, self.spect[m].Bm,
+                self.interp[m].Br, self.interp[m].Bt )
+        elif fieldtype == 'J' :
+            self.trans[m].spect2interp_scal(
+                self.spect[m].Jz, self.interp[m].Jz )
+            self.trans[m].spect2interp_vect(
+                self.spect[m].Jp,  self.spect[m].Jm,
+                self.interp[m].Jr, self.interp[m].Jt )
+        else:
+            spectral_rho = getattr( self.spect[m], fieldtype )
+            self.trans[m].spect2interp_scal( spectral_rho, self.interp[m].rho )
+
+    def broadcast_modes(self, fieldtype) :
+        """
+        Copy the fields `fieldtype` of each azimuthal mode on the
+        interpolation grid, from the proc that handles this mode to
+        the other procs of `mode_comm` (mode decomposition only ;
+        see the docstring of `__init__`)
+
+        Parameter
+        ---------
+        fieldtype :
+            A string which represents the kind of field to broadcast
+            (either 'E', 'B', 'J', 'rho_next', 'rho_prev')
+        """
+        if self.mode_comm is None:
+            return
+        if fieldtype in ['E', 'B', 'J']:
+            fields = [ fieldtype+'r', fieldtype+'t', fieldtype+'z' ]
+        else:
+            fields = [ 'rho' ]
+        # Start all the (non-blocking) broadcasts, then wait for them
+        requests = []
+        for m in range(self.Nm):
+            for field in fields:
+                requests.append( self.mode_comm.Ibcast(
+                    getattr( self.interp[m], field ), root=self.mode_owner[m] ))
+        MPI.Request.Waitall( requests )
+
     def spect2partial_interp(self, fieldtype) :
         """
         Transform the fields `fieldtype` from the spectral grid,
@@ -475,6 +692,9 @@ class Fields(object) :
         but one should be aware that these fields are not actually the
         interpolation fields. These "incorrect" fields would however be
         overwritten by subsequent calls to `spect2interp` (see `step` function)
+        (With a decomposition of the azimuthal modes, only the local modes
+        are transformed: the guard cells of the other modes are exchanged
+        by the procs that handle them.)
 
         Parameter
         ---------
@@ -484,7 +704,7 @@ class Fields(object) :
         """
         # Use the appropriate transformation depending on the fieldtype.
         if fieldtype == 'E' :
-            for m in range(self.Nm) :
+            for m in self.local_modes :
                 self.trans[m].fft.inverse_transform(
                     self.spect[m].Ez, self.interp[m].Ez )
                 self.trans[m].fft.inverse_transform(
@@ -492,7 +712,7 @@ class Fields(object) :
                 self.trans[m].fft.inverse_transform(
                     self.spect[m].Em, self.interp[m].Et )
         elif fieldtype == 'B' :
-            for m in range(self.Nm) :
+            for m in self.local_modes :
                 self.trans[m].fft.inverse_transform(
                     self.spect[m].Bz, self.interp[m].Bz )
                 self.trans[m].fft.inverse_transform(
@@ -500,7 +720,7 @@ class Fields(object) :
                 self.trans[m].fft.inverse_transform(
                     self.spect[m].Bm, self.interp[m].Bt )
         elif fieldtype == 'J' :
-            for m in range(self.Nm) :
+            for m in self.local_modes :
                 self.trans[m].fft.inverse_transform(
                     self.spect[m].Jz, self.interp[m].Jz )
                 self.trans[m].fft.inverse_transform(
@@ -508,11 +728,11 @@ class Fields(object) :
                 self.trans[m].fft.inverse_transform(
                     self.spect[m].Jm, self.interp[m].Jt )
         elif fieldtype == 'rho_next' :
-            for m in range(self.Nm) :
+            for m in self.local_modes :
                 self.trans[m].fft.inverse_transform(
                     self.spect[m].rho_next, self.interp[m].rho )
         elif fieldtype == 'rho_prev' :
-            for m in range(self.Nm) :
+            for m in self.local_modes :
                 self.trans[m].fft.inverse_transform(
                     self.spect[m].rho_prev, self.interp[m].rho )
         elif fieldtype == 'a' and self.use_envelope:
@@ -543,7 +763,7 @@ class Fields(object) :
         """
         # Use the appropriate transformation depending on the fieldtype.
         if fieldtype == 'E' :
-            for m in range(self.Nm) :
+            for m in self.local_modes :
                 self.trans[m].fft.transform(
                     self.interp[m].Ez, self.spect[m].Ez )
                 self.trans[m].fft.transform(
@@ -551,7 +771,7 @@ class Fields(object) :
                 self.trans[m].fft.transform(
                     self.interp[m].Et, self.spect[m].Em )
         elif fieldtype == 'B' :
-            for m in range(self.Nm) :
+            for m in self.local_modes :
                 self.trans[m].fft.transform(
                     self.interp[m].Bz, self.spect[m].Bz )
                 self.trans[m].fft.transform(
@@ -559,7 +779,7 @@ class Fields(object) :
                 self.trans[m].fft.transform(
                     self.interp[m].Bt, self.spect[m].Bm )
         elif fieldtype == 'J' :
-            for m in range(self.Nm) :
+            for m in self.local_modes :
                 self.trans[m].fft.transform(
                     self.interp[m].Jz, self.spect[m].Jz )
                 self.trans[m].fft.transform(
@@ -567,11 +787,11 @@ class Fields(object) :
                 self.trans[m].fft.transform(
                     self.interp[m].Jt, self.spect[m].Jm )
         elif fieldtype == 'rho_next' :
-            for m in range(self.Nm) :
+            for m in self.local_modes :
                 self.trans[m].fft.transform(
                     self.interp[m].rho, self.spect[m].rho_next )
         elif fieldtype == 'rho_prev' :
-            for m in range(self.Nm) :
+            for m in self.local_modes :
                 self.trans[m].fft.transform(
                     self.interp[m].rho, self.spect[m].rho_prev )
         elif fieldtype == 'a' and self.use_envelope:
@@ -613,6 +833,36 @@ class Fields(object) :
                 self.Jt_global[:,:,:,:] = 0.
                 self.Jz_global[:,:,:,:] = 0.
 
+    def reset(self):
+        """
+        Set all the fields, currents and charge densities to zero, on the
+        interpolation and spectral grids of all azimuthal modes.
+        This is called by `Simulation.reset`, between two calls to `step`
+        (i.e. when the arrays are on the CPU).
+
+        The spectral transformers and the PSATD coefficients are kept.
+        """
+        for m in range(self.Nm):
+            for field in [ 'Er', 'Et', 'Ez', 'Br', 'Bt', 'Bz',
+                           'Jr', 'Jt', 'Jz', 'rho' ]:
+                getattr( self.interp[m], field )[:,:] = 0.
+        for m in self.local_modes:
+            for field in [ 'Ep', 'Em', 'Ez', 'Bp', 'Bm', 'Bz', 'Jp', 'Jm',
+                   'Jz', 'rho_prev', 'rho_next', 'rho_next_z', 'rho_next_xy' ]:
+                # (`rho_next_z` and `rho_next_xy` only exist
+                # for the cross-deposition current correction)
+                if hasattr( self.spect[m], field ):
+                    getattr( self.spect[m], field )[:,:] = 0.
+        if self.use_envelope:
+            for m in self.envelope_mode_numbers:
+                for grid in [ self.envelope_interp[m], self.envelope_spect[m] ]:
+                    grid.a[:,:] = 0.
+                    grid.a_old[:,:] = 0.
+                    grid.chi_a[:,:] = 0.
+        for key in self.exchanged_source.keys():
+            self.exchanged_source[key] = False
+        self.clear_immobile_rho()
+
     def sum_reduce_deposition_array(self, fieldtype):
         """
         Sum the duplicated array for rho and J deposition on CPU
@@ -654,7 +904,7 @@ class Fields(object) :
             (either 'E', 'B', 'J', 'rho_next' or 'rho_prev')
         """
 
-        for m in range(self.Nm) :
+        for m in self.local_modes :
                 self.spect[m].filter( fieldtype )
 
     def divide_by_volume( self, fieldtype ) :
@@ -673,3 +923,68 @@ class Fields(object) :
         """
         for m in range(self.Nm):
             self.interp[m].divide_by_volume( fieldtype )
+
+    def store_immobile_rho( self ):
+        """
+        Store a copy of rho on the interpolation grid (i.e. the charge
+        density of the immobile species, after their deposition), so that
+        it can be added to the charge density of the other species at the
+        following depositions (see `add_immobile_rho`). CPU only.
+        """
+        self.immobile_rho = [ first_touch_copy( self.interp[m].rho )
+                              for m in range(self.Nm) ]
+        self.immobile_rho_zmin = self.interp[0].zmin
+
+    def clear_immobile_rho( self ):
+        """
+        Discard the cached charge density of the immobile species (e.g.
+        when their macroparticles were removed or injected), so that
+        it is deposited again.
+        """
+        self.immobile_rho = None
+
+    def shift_immobile_rho( self ):
+        """
+        Shift the cached charge density of the immobile species to the
+        current position of the grid, if possible, and return whether
+        the cache can be used.
+
+        When the grid was moved by an integer number of cells since the
+        charge density was stored (moving window), the cached arrays are
+        shifted accordingly (the cells that enter the grid are empty, since
+        the new macroparticles are only injected at the next particle
+        exchange, which clears the cache). Otherwise (e.g. Galilean frame),
+        the cache is cleared.
+
+        Returns
+        -------
+        A boolean: whether the cache can be used by `add_immobile_rho`
+        """
+        if self.immobile_rho is None:
+            return( False )
+        dz = self.interp[0].dz
+        shift = self.interp[0].zmin - self.immobile_rho_zmin
+        n_move = int( round( shift/dz ) )
+        if abs( shift - n_move*dz ) > 1.e-3*dz:
+            self.clear_immobile_rho()
+            return( False )
+        if n_move != 0:
+            for rho in self.immobile_rho:
+                if abs(n_move) >= self.Nz:
+                    rho[:,:] = 0.
+                elif n_move > 0:
+                    rho[:-n_move,:] = rho[n_move:,:]
+                    rho[-n_move:,:] = 0.
+                else:
+                    rho[-n_move:,:] = rho[:n_move,:]
+                    rho[:-n_move,:] = 0.
+            self.immobile_rho_zmin += n_move*dz
+        return( True )
+
+    def add_immobile_rho( self ):
+        """
+        Add the cached charge density of the immobile species to rho,
+        on the interpolation grid (see `shift_immobile_rho`)
+        """
+        for m in range(self.Nm):
+            self.interp[m].rho += self.immobile_rho[m]
@@ -7,13 +7,16 @@ It defines the InterpolationGrid class.
 """
 import numpy as np
 from numba import cuda
+from .numba_methods import numba_multiply_chi_a
+from fbpic.utils.placement import first_touch_zeros
 # Check if CUDA is available, then import CUDA functions
 from fbpic.utils.cuda import cuda_installed
 if cuda_installed:
-    from fbpic.utils.cuda import cuda_tpb_bpg_2d
-    from .cuda_methods import \
+    from fbpic.utils.cuda import cuda_tpb_bpg_1d, cuda_tpb_bpg_2d
+    from .cuda_methods import cuda_max_real_along_r, \
         cuda_erase_scalar, cuda_erase_vector, \
-        cuda_divide_scalar_by_volume, cuda_divide_vector_by_volume
+        cuda_divide_scalar_by_volume, cuda_divide_vector_by_volume, \
+        cuda_multiply_chi_a
 
 class InterpolationGrid(object) :
     """
@@ -112,16 +115,16 @@ class FieldInterpolationGrid(InterpolationGrid):
         InterpolationGrid.__init__(self, Nz, Nr, m, zmin, zmax, rmax, use_cuda=use_cuda)
 
         # Allocate the fields arrays
-        self.Er = np.zeros( (Nz, Nr), dtype='complex' )
-        self.Et = np.zeros( (Nz, Nr), dtype='complex' )
-        self.Ez = np.zeros( (Nz, Nr), dtype='complex' )
-        self.Br = np.zeros( (Nz, Nr), dtype='complex' )
-        self.Bt = np.zeros( (Nz, Nr), dtype='complex' )
-        self.Bz = np.zeros( (Nz, Nr), dtype='complex' )
-        self.Jr = np.zeros( (Nz, Nr), dtype='complex' )
-        self.Jt = np.zeros( (Nz, Nr), dtype='complex' )
-        self.Jz = np.zeros( (Nz, Nr), dtype='complex' )
-        self.rho = np.zeros( (Nz, Nr), dtype='complex' )
+        self.Er = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.Et = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.Ez = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.Br = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.Bt = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.Bz = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.Jr = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.Jt = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.Jz = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.rho = first_touch_zeros( (Nz, Nr), np.complex128 )
 
     def send_fields_to_gpu( self ):
         """
@@ -244,6 +247,21 @@ class FieldInterpolationGrid(InterpolationGrid):
                 raise ValueError('Invalid string for fieldtype: %s'%fieldtype)
 
 
+    def get_max_real_rho( self ):
+        """
+        Return the maximum of the real part of rho on the grid
+        (e.g. the maximal plasma susceptibility, for the envelope model)
+        """
+        if self.use_cuda:
+            # Reduce along r on the GPU, and along z on the CPU
+            max_along_r = cuda.device_array( self.Nz, dtype=np.float64 )
+            dim_grid_1d, dim_block_1d = cuda_tpb_bpg_1d( self.Nz )
+            cuda_max_real_along_r[dim_grid_1d, dim_block_1d](
+                self.rho, max_along_r )
+            return( max_along_r.copy_to_host().max() )
+        else:
+            return( self.rho.real.max() )
+
 
 class EnvelopeInterpolationGrid(InterpolationGrid):
     """
@@ -253,6 +271,8 @@ class EnvelopeInterpolationGrid(InterpolationGrid):
     - z,r : 1darrays containing the positions of the grid
     - a, a_old:
       2darrays containing the envelope amplitude.
+    - chi_a:
+      2darray containing the plasma response (susceptibility times envelope)
     """
 
     def __init__(self, Nz, Nr, m, zmin, zmax, rmax, use_cuda=False ) :
@@ -266,8 +286,9 @@ class EnvelopeInterpolationGrid(InterpolationGrid):
         InterpolationGrid.__init__(self, Nz, Nr, m, zmin, zmax, rmax, use_cuda=use_cuda)
 
         # Allocate the fields arrays
-        self.a = np.zeros( (Nz, Nr), dtype='complex' )
-        self.a_old = np.zeros( (Nz, Nr), dtype='complex' )
+        self.a = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.a_old = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.chi_a = first_touch_zeros( (Nz, Nr), np.complex128 )
 
 
     def send_fields_to_gpu( self ):
@@ -279,6 +300,7 @@ class EnvelopeInterpolationGrid(InterpolationGrid):
         """
         self.a = cuda.to_device( self.a )
         self.a_old = cuda.to_device( self.a_old )
+        self.chi_a = cuda.to_device( self.chi_a )
 
     def receive_fields_from_gpu( self ):
         """
@@ -289,3 +311,22 @@ class EnvelopeInterpolationGrid(InterpolationGrid):
         """
         self.a = self.a.copy_to_host()
         self.a_old = self.a_old.copy_to_host()
+        self.chi_a = self.chi_a.copy_to_host()
+
+    def compute_chi_a( self, chi ):
+        """
+        Compute the plasma response `chi_a` of this envelope mode,
+        from the plasma susceptibility deposited on the grid.
+
+        Parameter
+        ---------
+        chi : 2darray of complexs
+            The mode 0 of the deposited plasma susceptibility
+            (only its real part is used)
+        """
+        if self.use_cuda:
+            dim_grid, dim_block = cuda_tpb_bpg_2d( self.Nz, self.Nr )
+            cuda_multiply_chi_a[dim_grid, dim_block](
+                chi, self.a, self.chi_a, self.Nz, self.Nr )
+        else:
+            numba_multiply_chi_a( chi, self.a, self.chi_a, self.Nz, self.Nr )
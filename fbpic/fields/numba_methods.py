@@ -143,8 +143,8 @@ def numba_push_eb_standard( Ep, Em, Ez, Bp, Bm, Bz, Jp, Jm, Jz,
     return
 
 @njit_parallel
-def numba_push_envelope_standard(a, a_old, C_w_laser_env, C_w_tot_env,
-                            A_coef, Nz, Nr):
+def numba_push_envelope_standard(a, a_old, chi_a, C_w_laser_env, C_w_tot_env,
+                            A_coef, chi_coef_env, Nz, Nr):
     """
     Push the envelope over one timestep, using the envelope model equations
 
@@ -157,11 +157,24 @@ def numba_push_envelope_standard(a, a_old, C_w_laser_env, C_w_tot_env,
             a_temp = a[iz, ir]
             # Push the envelope
             a[iz, ir] = A_coef * ( - A_coef * a_old[iz,ir] \
-                    + 2*C_w_tot_env[iz, ir] * a[iz, ir] )
+                    + 2*C_w_tot_env[iz, ir] * a[iz, ir] ) \
+                    - chi_coef_env[iz, ir] * chi_a[iz, ir]
             a_old[iz, ir] = a_temp
 
     return
 
+@njit_parallel
+def numba_multiply_chi_a( chi, a, chi_a, Nz, Nr ):
+    """
+    Multiply the envelope `a` (of a given azimuthal mode) by the plasma
+    susceptibility `chi` (the real part of the mode 0 of the deposited
+    array), and store the result in `chi_a`
+    """
+    for iz in prange(Nz):
+        for ir in range(Nr):
+            chi_a[iz, ir] = chi[iz, ir].real * a[iz, ir]
+
+    return
 
 
 @njit_parallel
@@ -213,8 +213,42 @@ class PsatdCoeffs(object) :
         #self.S_env_over_w[ w_tot==0 ] = dt
         self.w_laser = w_laser
         self.A_coef = np.exp(1j * w_laser * dt)
+        self.w_tot_env = w_tot
 
         # Replace these array by arrays on the GPU, when using cuda
         if self.use_cuda:
             self.d_C_w_laser_env = cuda.to_device(self.C_w_laser_env)
             self.d_C_w_tot_env = cuda.to_device(self.C_w_tot_env)
+
+        # Coefficient of the plasma response (for a vanishing plasma)
+        self.compute_envelope_chi_coef( 0. )
+
+    def compute_envelope_chi_coef(self, chi_ref):
+        """
+        Compute the coefficient of the plasma response chi*a in the
+        envelope push, for plasma susceptibilities up to `chi_ref`.
+
+        The coefficient is chosen so that, for a uniform susceptibility
+        0 <= chi <= chi_ref, the effective cos(w dt) of the scheme is a
+        linear interpolation between cos(w_tot dt) (chi=0) and the exact
+        cos(sqrt(w_tot**2 + chi_ref) dt) (chi=chi_ref): it thus stays within
+        [-1, 1] (stable push) and it reduces to the first-order expansion
+        in chi of the exact propagator for small chi_ref.
+
+        Parameters
+        ----------
+        chi_ref : float (in rad^2.s^-2)
+            Upper bound of the plasma susceptibility q^2 n/(m epsilon_0 gamma)
+        """
+        w_tot = self.w_tot_env
+        dt = self.dt
+        if chi_ref*dt**2 > 1.e-10:
+            coef = 2 * ( self.C_w_tot_env - \
+                np.cos( np.sqrt(w_tot**2 + chi_ref)*dt ) ) / chi_ref
+        else:
+            # Limit of small chi_ref: dt*sin(w_tot dt)/w_tot (dt**2 at w_tot=0)
+            coef = np.where( w_tot == 0, dt**2,
+                dt * np.sin(w_tot*dt) / np.where( w_tot == 0, 1, w_tot ) )
+        self.chi_coef_env = self.A_coef * coef
+        if self.use_cuda:
+            self.d_chi_coef_env = cuda.to_device(self.chi_coef_env)
@@ -8,6 +8,7 @@ It defines the SpectralGrid class.
 import numpy as np
 from scipy.constants import epsilon_0
 from .utility_methods import get_filter_array
+from fbpic.utils.placement import first_touch_zeros
 from .numba_methods import numba_push_eb_standard, numba_push_eb_comoving, \
     numba_push_envelope_standard, \
     numba_correct_currents_curlfree_standard, \
@@ -130,20 +131,20 @@ class FieldSpectralGrid(SpectralGrid):
         Nr, Nz = self.Nr, self.Nz
 
         # Allocate the fields arrays
-        self.Ep = np.zeros( (Nz, Nr), dtype='complex' )
-        self.Em = np.zeros( (Nz, Nr), dtype='complex' )
-        self.Ez = np.zeros( (Nz, Nr), dtype='complex' )
-        self.Bp = np.zeros( (Nz, Nr), dtype='complex' )
-        self.Bm = np.zeros( (Nz, Nr), dtype='complex' )
-        self.Bz = np.zeros( (Nz, Nr), dtype='complex' )
-        self.Jp = np.zeros( (Nz, Nr), dtype='complex' )
-        self.Jm = np.zeros( (Nz, Nr), dtype='complex' )
-        self.Jz = np.zeros( (Nz, Nr), dtype='complex' )
-        self.rho_prev = np.zeros( (Nz, Nr), dtype='complex' )
-        self.rho_next = np.zeros( (Nz, Nr), dtype='complex' )
+        self.Ep = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.Em = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.Ez = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.Bp = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.Bm = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.Bz = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.Jp = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.Jm = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.Jz = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.rho_prev = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.rho_next = first_touch_zeros( (Nz, Nr), np.complex128 )
         if current_correction == 'cross-deposition':
-            self.rho_next_z = np.zeros( (Nz, Nr), dtype='complex' )
-            self.rho_next_xy = np.zeros( (Nz, Nr), dtype='complex' )
+            self.rho_next_z = first_touch_zeros( (Nz, Nr), np.complex128 )
+            self.rho_next_xy = first_touch_zeros( (Nz, Nr), np.complex128 )
 
         # - for curl-free current correction
         if current_correction == 'curl-free':
@@ -463,6 +464,8 @@ class EnvelopeSpectralGrid(SpectralGrid):
     - kz,kr : 1darrays containing the positions of the grid
     - a, a_old:
       2darrays containing the envelope amplitude.
+    - chi_a:
+      2darray containing the plasma response (susceptibility times envelope)
     """
 
     def __init__(self, kz_modified, kr, m, kz_true, dz, dr,
@@ -477,8 +480,9 @@ class EnvelopeSpectralGrid(SpectralGrid):
         SpectralGrid.__init__(self, kz_modified, kr, m, kz_true, dz, dr,
                         use_cuda= use_cuda )
         Nr, Nz = self.Nr, self.Nz
-        self.a  = np.zeros( (Nz, Nr), dtype='complex' )
-        self.a_old  = np.zeros( (Nz, Nr), dtype='complex' )
+        self.a  = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.a_old  = first_touch_zeros( (Nz, Nr), np.complex128 )
+        self.chi_a  = first_touch_zeros( (Nz, Nr), np.complex128 )
 
 
     def push_envelope_with(self, ps):
@@ -487,8 +491,11 @@ class EnvelopeSpectralGrid(SpectralGrid):
         Push the a and a_old envelope fields over one timestep,
         using the psatd coefficients.
 
-        WARNING: currently only implemented for non-comoving simulations,
-        with only CPU usage
+        The plasma response `chi_a` (obtained from the deposition of the
+        plasma susceptibility, see `Fields.interp2spect('chi')`) is treated
+        as constant over the timestep.
+
+        WARNING: currently only implemented for non-comoving simulations
 
         Parameters
         ----------
@@ -504,14 +511,15 @@ class EnvelopeSpectralGrid(SpectralGrid):
             # Push the fields on the GPU
 
             cuda_push_envelope_standard[dim_grid, dim_block](self.a, self.a_old,
-                                        ps.d_C_w_laser_env,
+                                        self.chi_a, ps.d_C_w_laser_env,
                                         ps.d_C_w_tot_env, ps.A_coef,
-                                        self.Nz, self.Nr )
+                                        ps.d_chi_coef_env, self.Nz, self.Nr )
 
         else:
-            numba_push_envelope_standard(self.a, self.a_old,
+            numba_push_envelope_standard(self.a, self.a_old, self.chi_a,
                                     ps.C_w_laser_env, ps.C_w_tot_env,
-                                    ps.A_coef, self.Nz, self.Nr)
+                                    ps.A_coef, ps.chi_coef_env,
+                                    self.Nz, self.Nr)
 
 
     def send_fields_to_gpu( self ):
@@ -523,6 +531,7 @@ class EnvelopeSpectralGrid(SpectralGrid):
         """
         self.a = cuda.to_device( self.a )
         self.a_old = cuda.to_device( self.a_old)
+        self.chi_a = cuda.to_device( self.chi_a )
 
     def receive_fields_from_gpu( self ):
         """
@@ -533,3 +542,4 @@ class EnvelopeSpectralGrid(SpectralGrid):
         """
         self.a = self.a.copy_to_host()
         self.a_old = self.a_old.copy_to_host()
+        self.chi_a = self.chi_a.copy_to_host()
@@ -6,21 +6,54 @@ This file is part of the Fourier-Bessel Partile-In-Cell code (FB-PIC)
 It defines the FFT object, which performs Fourier transforms along the axis 0,
 and is used in spectral_transformer.py
 """
+import os
 import numpy as np
-import numba
+from fbpic.utils.threading import get_num_threads
 # Check if CUDA is available, then import CUDA functions
 from fbpic.utils.cuda import cuda_installed
 if cuda_installed:
     from pyculib import fft as cufft, blas as cublas
     from fbpic.utils.cuda import cuda, cuda_tpb_bpg_2d
     from .cuda_methods import cuda_copy_2d_to_1d, cuda_copy_1d_to_2d
-# Check if the MKL FFT is available
+# Check if the MKL FFT and FFTW are available (at least one of them is needed)
 try:
     from .mkl_fft import MKLFFT
     mkl_installed = True
 except OSError:
-    import pyfftw
     mkl_installed = False
+try:
+    import pyfftw
+    fftw_installed = True
+except ImportError:
+    fftw_installed = False
+    if not mkl_installed:
+        raise
+available_fft_backends = [ backend for backend, installed in
+            [ ('mkl', mkl_installed), ('fftw', fftw_installed) ] if installed ]
+
+# Library used for the FFTs on the CPU (MKL when available)
+fft_backend = available_fft_backends[0]
+
+def set_fft_backend( backend ):
+    """
+    Select the library that is used for the FFTs on the CPU, in the
+    FFT objects that are created afterwards.
+
+    Parameters
+    ----------
+    backend: string
+        Either 'mkl' or 'fftw'
+    """
+    global fft_backend
+    if backend not in available_fft_backends:
+        raise ValueError( 'FFT backend %s is not available (available: %s)'
+                          %(backend, available_fft_backends) )
+    fft_backend = backend
+
+# The library can also be selected with the environment variable
+# FBPIC_FFT_BACKEND
+if 'FBPIC_FFT_BACKEND' in os.environ:
+    set_fft_backend( os.environ['FBPIC_FFT_BACKEND'] )
 
 class FFT(object):
     """
@@ -47,8 +80,9 @@ class FFT(object):
 
         nthreads : int, optional
             Number of threads for the FFTW transform.
-            If None, the default number of threads of numba is used
-            (environment variable NUMBA_NUM_THREADS)
+            If None, the number of threads currently used by numba is used
+            (environment variable NUMBA_NUM_THREADS, or the value set
+            with `numba.set_num_threads`)
         """
         # Check whether to use cuda
         self.use_cuda = use_cuda
@@ -58,7 +92,7 @@ class FFT(object):
             print('** Performing the Fourier transform on the CPU.')
 
         # Check whether to use MKL
-        self.use_mkl = mkl_installed
+        self.use_mkl = ( fft_backend == 'mkl' )
 
         # Initialize the object for calculation on the GPU
         if self.use_cuda:
@@ -89,8 +123,8 @@ class FFT(object):
             else:
                 # Determine number of threads
                 if nthreads is None:
-                    # Get the default number of threads for numba
-                    nthreads = numba.config.NUMBA_NUM_THREADS
+                    # Get the number of threads currently used by numba
+                    nthreads = get_num_threads()
                 # Initialize the FFT plan with dummy arrays
                 interp_buffer = np.zeros( (Nz, Nr), dtype=np.complex128 )
                 spect_buffer = np.zeros( (Nz, Nr), dtype=np.complex128 )
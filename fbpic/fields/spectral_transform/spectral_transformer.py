@@ -38,7 +38,7 @@ class SpectralTransformer(object) :
         converts a vector field from the interpolation to the spectral grid
     """
 
-    def __init__(self, Nz, Nr, m, rmax, use_cuda=False ) :
+    def __init__(self, Nz, Nr, m, rmax, use_cuda=False, fft_nthreads=None ) :
         """
         Initializes the dht and fft attributes, which contain auxiliary
         matrices allowing to transform the fields quickly
@@ -53,6 +53,13 @@ class SpectralTransformer(object) :
 
         rmax : float
             The size of the simulation box along r.
+
+        use_cuda : bool, optional
+            Whether to perform the transforms on the GPU
+
+        fft_nthreads : int, optional
+            Number of threads for the FFT on CPU
+            (if None, the default number of threads of numba is used)
         """
         # Check whether to use the GPU
         self.use_cuda = use_cuda
@@ -68,7 +75,7 @@ class SpectralTransformer(object) :
         self.dhtm = DHT(m-1, m, Nr, Nz, rmax, use_cuda=self.use_cuda )
 
         # Initialize the FFT
-        self.fft = FFT( Nr, Nz, use_cuda=self.use_cuda )
+        self.fft = FFT( Nr, Nz, use_cuda=self.use_cuda, nthreads=fft_nthreads )
 
         # Initialize the spectral buffers
         if self.use_cuda:
@@ -5,9 +5,12 @@
 This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
 It defines a set of utilities for the initialization of an electron bunch.
 """
+import math
 import numpy as np
 from scipy.constants import m_e, c, e, epsilon_0, mu_0
 from fbpic.fields import Fields
+from fbpic.utils.threading import njit_parallel, prange
+from fbpic.utils.mpi import MPI
 from fbpic.particles.elementary_process.cuda_numba_utils import \
     reallocate_and_copy_old
 from fbpic.particles.injection import BallisticBeforePlane
@@ -376,6 +379,231 @@ def add_elec_bunch_from_arrays( sim, x, y, z, ux, uy, uz, w,
     w = w[selected]
     inv_gamma = inv_gamma[selected]
 
+    # Add the electrons of the local subdomain, and calculate the space charge
+    add_local_elec_bunch( sim, x, y, z, ux, uy, uz, inv_gamma, w,
+                    boost, direction, z_injection_plane )
+
+
+def add_elec_bunch_stream( sim, filename, Q_tot=None, z_off=0., group='/',
+                    chunk_size=1000000, boost=None, direction='forward',
+                    z_injection_plane=None ):
+    """
+    Introduce a relativistic electron bunch in the simulation,
+    along with its space charge field, loading particles from a large
+    binary file (HDF5 or NumPy `.npy`).
+
+    Unlike `add_elec_bunch_file`, the file is read by chunks of
+    `chunk_size` particles, and each MPI rank only keeps the particles
+    that are inside its local subdomain (after the Lorentz boost, which
+    is applied chunk by chunk). Therefore, the memory footprint on each
+    rank is that of one chunk, plus that of its local particles.
+
+    Parameters
+    ----------
+    sim : a Simulation object
+        The structure that contains the simulation.
+
+    filename : string
+        The file containing the particle phase space, either:
+
+        - an HDF5 file, in which the group `group` contains the 1d
+          datasets `x`, `y`, `z` (in meters), `ux`, `uy`, `uz` (unitless)
+          and optionally `w` (number of physical electrons per macroparticle)
+        - a NumPy `.npy` file, containing a 2d array of shape (N, 6)
+          (or (N, 7), with the weights in the last column), with
+          the columns x, y, z, ux, uy, uz (in the same units as above)
+
+    Q_tot : float (in Coulomb), optional
+        Total charge in bunch (should be a positive number).
+        If this is not None, the particles are equally weighted.
+        If this is None, the weights are read from the file.
+
+    z_off: float (in meters)
+        Shift the particle positions in z by z_off
+
+    group: string, optional
+        The path of the group that contains the datasets, in the HDF5 file
+
+    chunk_size: int, optional
+        The number of particles that are read (and boosted) at once
+
+    boost : a BoostConverter object, optional
+        A BoostConverter object defining the Lorentz boost of
+        the simulation.
+
+    direction : string, optional
+        Can be either "forward" or "backward".
+        Propagation direction of the beam.
+
+    z_injection_plane: float (in meters) or None
+        When `z_injection_plane` is not None, then particles have a ballistic
+        motion for z<z_injection_plane. This is sometimes useful in
+        boosted-frame simulations.
+        `z_injection_plane` is always given in the lab frame.
+    """
+    # Open the file, get a function that reads one chunk of particles,
+    # and read the particles of the local subdomain
+    if filename.endswith('.npy'):
+        data = np.load( filename, mmap_mode='r' )
+        if data.ndim != 2 or data.shape[1] not in [6, 7]:
+            raise ValueError('The array in %s should have the shape (N, 6) '
+                             'or (N, 7).' %filename)
+        def read_chunk( quantity, i_start, i_end ):
+            i_col = ['x', 'y', 'z', 'ux', 'uy', 'uz', 'w'].index( quantity )
+            return( np.array( data[i_start:i_end, i_col], dtype=np.float64 ) )
+        x, y, z, ux, uy, uz, inv_gamma, w = read_local_particles( sim,
+            read_chunk, data.shape[0], data.shape[1] == 7, filename, Q_tot,
+            z_off, chunk_size, boost )
+    else:
+        import h5py
+        with h5py.File( filename, 'r' ) as f:
+            data = f[group]
+            def read_chunk( quantity, i_start, i_end ):
+                return( data[quantity][i_start:i_end].astype( np.float64 ) )
+            x, y, z, ux, uy, uz, inv_gamma, w = read_local_particles( sim,
+                read_chunk, data['x'].shape[0], 'w' in data, filename, Q_tot,
+                z_off, chunk_size, boost )
+
+    # Add the electrons of the local subdomain, and calculate the space charge
+    add_local_elec_bunch( sim, x, y, z, ux, uy, uz, inv_gamma, w,
+                    boost, direction, z_injection_plane )
+
+
+def read_local_particles( sim, read_chunk, N_part, has_weights, filename,
+                          Q_tot, z_off, chunk_size, boost ):
+    """
+    Read the particles of a file by chunks (with `read_chunk`), boost them,
+    and return the arrays x, y, z, ux, uy, uz, inv_gamma, w of the particles
+    that are in the local subdomain (see `add_elec_bunch_stream` for the
+    other parameters)
+
+    Parameters
+    ----------
+    read_chunk: callable
+        `read_chunk( quantity, i_start, i_end )` returns the array of
+        `quantity` (e.g. 'x' or 'w') for the particles i_start to i_end
+
+    N_part: int
+        The number of particles in the file
+
+    has_weights: bool
+        Whether the file contains the weights `w`
+    """
+    if (Q_tot is None) and (not has_weights):
+        raise ValueError('The file %s does not contain the weights `w`.\n'
+                'Please pass the total charge `Q_tot`.' %filename )
+
+    # Prepare the Lorentz boost
+    if boost is not None:
+        gamma0 = boost.gamma0
+        beta0 = boost.beta0
+    else:
+        gamma0 = 1.
+        beta0 = 0.
+    # Get the boundaries of the local subdomain
+    zmin, zmax = sim.comm.get_zmin_zmax(
+        local=True, with_damp=False, with_guard=False, rank=sim.comm.rank )
+
+    # Read the file by chunks, and keep the particles of the local subdomain
+    local_chunks = []
+    for i_start in range( 0, N_part, chunk_size ):
+        i_end = min( i_start + chunk_size, N_part )
+        x, y, z, ux, uy, uz = [ read_chunk( quantity, i_start, i_end )
+                    for quantity in ['x', 'y', 'z', 'ux', 'uy', 'uz'] ]
+        # Boost the particles (in place) and select those in the subdomain
+        inv_gamma = np.empty_like( x )
+        selected = np.empty( x.shape, dtype=np.bool_ )
+        boost_and_select_numba( x, y, z, ux, uy, uz, inv_gamma, z_off,
+                        gamma0, beta0, boost is not None, zmin, zmax, selected )
+        if not selected.any():
+            continue
+        if Q_tot is None:
+            w = read_chunk( 'w', i_start, i_end )
+        else:
+            # Equally-weighted particles
+            w = Q_tot/(N_part*e) * np.ones_like( x )
+        local_chunks.append( [ array[selected] for array in
+                               (x, y, z, ux, uy, uz, inv_gamma, w) ] )
+
+    # Concatenate the local particles
+    if len( local_chunks ) > 0:
+        return( [ np.concatenate( arrays ) for arrays in zip( *local_chunks ) ] )
+    else:
+        return( [ np.zeros(0) for i in range(8) ] )
+
+
+@njit_parallel
+def boost_and_select_numba( x, y, z, ux, uy, uz, inv_gamma, z_off,
+                    gamma0, beta0, use_boost, zmin, zmax, selected ):
+    """
+    Shift the particles by `z_off`, calculate their Lorentz factor and
+    (if `use_boost` is True) convert them to the boosted frame, in place
+    (see `BoostConverter.boost_particle_arrays` for the formulas).
+    Then flag the particles whose boosted position is in [zmin, zmax[.
+
+    Parameters
+    ----------
+    x, y, z, ux, uy, uz: 1darrays of floats
+        The positions (in meters) and momenta (unitless) of the particles
+        in the lab frame ; modified in place
+
+    inv_gamma: 1darray of floats
+        Array where the inverse of the Lorentz factor is stored
+
+    z_off: float (in meters)
+        Shift of the particle positions (in the lab frame)
+
+    gamma0, beta0: floats
+        The Lorentz factor and velocity of the boosted frame
+
+    use_boost: bool
+        Whether to convert the particles to the boosted frame
+
+    zmin, zmax: floats (in meters)
+        The boundaries of the local subdomain (in the boosted frame)
+
+    selected: 1darray of booleans
+        Array where the selection flags are stored
+    """
+    for i in prange( x.shape[0] ):
+        z_i = z[i] + z_off
+        inv_gamma_i = 1./math.sqrt( 1. + ux[i]**2 + uy[i]**2 + uz[i]**2 )
+        if use_boost:
+            # Transform the time and position to the boosted frame
+            t_boost = -gamma0*beta0*z_i/c
+            z_boost = gamma0*z_i
+            # Transform the velocities to the boosted frame
+            vx = ux[i]*inv_gamma_i*c
+            vy = uy[i]*inv_gamma_i*c
+            vz = uz[i]*inv_gamma_i*c
+            boost_fact = 1./(1.-beta0*vz/c)
+            vx_boost = vx*boost_fact/gamma0
+            vy_boost = vy*boost_fact/gamma0
+            vz_boost = (vz-beta0*c)*boost_fact
+            # Move the particles to the boosted time t'=0
+            x[i] = x[i] - t_boost * vx_boost
+            y[i] = y[i] - t_boost * vy_boost
+            z_i = z_boost - t_boost * vz_boost
+            inv_gamma_i = math.sqrt(
+                1.-(vx_boost**2 + vy_boost**2 + vz_boost**2)/c**2 )
+            ux[i] = vx_boost / (inv_gamma_i * c)
+            uy[i] = vy_boost / (inv_gamma_i * c)
+            uz[i] = vz_boost / (inv_gamma_i * c)
+        z[i] = z_i
+        inv_gamma[i] = inv_gamma_i
+        selected[i] = (z_i >= zmin) and (z_i < zmax)
+    return
+
+
+def add_local_elec_bunch( sim, x, y, z, ux, uy, uz, inv_gamma, w,
+                          boost, direction, z_injection_plane ):
+    """
+    Create a new electron species from the particles of the local subdomain
+    (already converted to the boosted frame, if needed), and add the
+    corresponding space charge field to the simulation.
+
+    See `add_elec_bunch_from_arrays` for the parameters.
+    """
     # Create electron species with no macroparticles
     relat_elec = sim.add_new_species( q=-e, m=m_e )
 
@@ -402,12 +630,23 @@ def add_elec_bunch_from_arrays( sim, x, y, z, ux, uy, uz, w,
     get_space_charge_fields( sim, relat_elec, direction=direction )
 
 
-def get_space_charge_fields( sim, ptcl, direction='forward') :
+def get_space_charge_fields( sim, ptcl, direction='forward',
+                             distributed=None ) :
     """
     Add the space charge field from `ptcl` the interpolation grid
 
     This assumes that all the particles being passed have the same gamma.
 
+    The space charge field is calculated either on the whole grid by the
+    first MPI rank (the sources are gathered and the fields are scattered),
+    or by each rank on its own subdomain (using the spectral transformers
+    of the simulation, on GPU if enabled). The latter is exact up to the
+    contributions of the sources which are further than the guard cells,
+    since the field of a relativistic bunch decays over a length of the
+    order of `rmax/gamma` in z. (The only exception is the uniform
+    transverse field of the modes m>0, i.e. the kr=0 component, which
+    is not local in z and depends on the length of the periodic grid.)
+
     Parameters
     ----------
     sim : a Simulation object
@@ -421,6 +660,11 @@ def get_space_charge_fields( sim, ptcl, direction='forward') :
     direction : string, optional
         Can be either "forward" or "backward".
         Propagation direction of the beam.
+
+    distributed : bool or None, optional
+        Whether each MPI rank calculates the space charge field on its own
+        subdomain. If None, this is done for multi-proc simulations in which
+        the guard cells are longer than 10 decay lengths of the field.
     """
     print("Calculating initial space charge field...")
 
@@ -438,12 +682,97 @@ def get_space_charge_fields( sim, ptcl, direction='forward') :
     sim.fld.erase('J')
     ptcl.deposit( sim.fld, 'rho' )
     ptcl.deposit( sim.fld, 'J' )
+    # Sum contribution from each CPU threads (skipped on GPU)
+    sim.fld.sum_reduce_deposition_array('rho')
+    sim.fld.sum_reduce_deposition_array('J')
     sim.fld.divide_by_volume('rho')
     sim.fld.divide_by_volume('J')
     # Exchange guard cells
     sim.comm.exchange_fields( sim.fld.interp, 'rho', 'add' )
     sim.comm.exchange_fields( sim.fld.interp, 'J', 'add')
 
+    # Calculate the space charge field
+    if distributed is None:
+        distributed = (sim.comm.size > 1) and \
+            ( sim.comm.n_guard*sim.comm.dz > 10*get_decay_length(sim, gamma) )
+    if distributed:
+        add_local_space_charge_fields( sim, gamma, direction )
+    else:
+        add_global_space_charge_fields( sim, gamma, direction )
+
+    print("Done.\n")
+
+
+def get_decay_length( sim, gamma ):
+    """
+    Return the longitudinal length over which the space charge field
+    of a point charge with Lorentz factor `gamma` decays (in the frame
+    of the simulation), i.e. 1/(gamma*kr) for the smallest non-zero
+    radial wavenumber kr of the spectral grids.
+    """
+    kr_min = min( sim.fld.spect[m].kr[0, sim.fld.spect[m].kr[0,:] > 0].min()
+                  for m in sim.fld.local_modes )
+    # With a decomposition of the modes, take the minimum over all modes
+    if sim.fld.mode_comm is not None:
+        kr_min = sim.fld.mode_comm.allreduce( kr_min, op=MPI.MIN )
+    return( 1./(gamma*kr_min) )
+
+
+def add_local_space_charge_fields( sim, gamma, direction ):
+    """
+    Calculate the space charge field from the sources (rho and J) that are
+    on the local interpolation grid of `sim.fld` (including guard cells),
+    using the spectral grids of `sim.fld`, and add it to the local E and B
+    fields. (No global communication is needed.)
+
+    See `get_space_charge_fields` for the parameters.
+    """
+    fld = sim.fld
+    # Keep a copy of the pre-existing fields (e.g. laser)
+    previous_fields = [ { field: getattr( fld.interp[m], field ).copy()
+            for field in ['Er', 'Et', 'Ez', 'Br', 'Bt', 'Bz'] }
+            for m in range(fld.Nm) ]
+    for m in fld.local_modes:
+        for field in ['Ep', 'Em', 'Ez', 'Bp', 'Bm', 'Bz']:
+            getattr( fld.spect[m], field )[:,:] = 0.
+
+    # Convert the sources to spectral space
+    # (When using the GPU, the transforms are performed on the GPU, while
+    # the space charge fields are calculated on the CPU.)
+    fld.send_fields_to_gpu()
+    fld.interp2spect('rho_prev')
+    fld.interp2spect('J')
+    if sim.filter_currents:
+        fld.filter_spect('rho_prev')
+        fld.filter_spect('J')
+    fld.receive_fields_from_gpu()
+    # Get the space charge fields in spectral space, and in real space
+    for m in fld.local_modes:
+        get_space_charge_spect( fld.spect[m], gamma, direction )
+    fld.send_fields_to_gpu()
+    fld.spect2interp('E')
+    fld.spect2interp('B')
+    fld.receive_fields_from_gpu()
+
+    # Add the pre-existing fields
+    for m in range(fld.Nm):
+        for field in ['Er', 'Et', 'Ez', 'Br', 'Bt', 'Bz']:
+            getattr( fld.interp[m], field )[:,:] += previous_fields[m][field]
+    # The fields in the guard cells are less accurate (due to the
+    # periodicity of the local grid): replace them by those of the
+    # neighboring subdomains
+    sim.comm.exchange_fields( fld.interp, 'E', 'replace' )
+    sim.comm.exchange_fields( fld.interp, 'B', 'replace' )
+
+
+def add_global_space_charge_fields( sim, gamma, direction ):
+    """
+    Gather the sources (rho and J) of the whole grid on the first MPI rank,
+    calculate the space charge field there, and scatter it to the other
+    ranks, where it is added to the E and B fields.
+
+    See `get_space_charge_fields` for the parameters.
+    """
     # Create a global field object across all subdomains, and copy the sources
     # (Space-charge calculation is a global operation)
     # Note: in the single-proc case, this is also useful in order not to
@@ -498,8 +827,6 @@ def get_space_charge_fields( sim, ptcl, direction='forward') :
             local_field = getattr( sim.fld.interp[m], field )
             local_field[ iz_in_array:iz_in_array+Nz_local, : ] += local_array
 
-    print("Done.\n")
-
 
 def get_space_charge_spect( spect, gamma, direction='forward' ) :
     """
@@ -0,0 +1,8 @@
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It imports the objects that allow to apply external fields to the particles
+"""
+from .external_field import ExternalField
+from .tabulated_field import TabulatedExternalField
+
+__all__ = ['ExternalField', 'TabulatedExternalField']
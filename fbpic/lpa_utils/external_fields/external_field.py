@@ -1,6 +1,11 @@
 # Copyright 2016, FBPIC contributors
 # Authors: Remi Lehe, Manuel Kirchen
 # License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines the class ExternalField, which applies an analytical
+field expression to the particles.
+"""
 from numba import vectorize, float64
 import numpy as np
 # Check if CUDA is available, then import CUDA functions
@@ -0,0 +1,141 @@
+# Copyright 2016, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines inline functions that are compiled for both GPU and CPU, and
+used in order to apply tabulated external fields.
+"""
+import math
+from scipy.constants import c
+
+def add_tabulated_field( xj, yj, zj, Ex, Ey, Ez, Bx, By, Bz,
+                table, cylindrical, xmin, xmax, inv_dx, ymin, ymax, inv_dy,
+                zmin, zmax, inv_dz, t, t_start, t_end,
+                gamma_boost, beta_boost ):
+    """
+    Return the fields of one particle at position (xj, yj, zj), with the
+    tabulated fields added (if the particle is inside the bounding
+    box of the table, and inside the time window)
+
+    Parameters
+    ----------
+    xj, yj, zj: floats (in meters)
+        The position of the particle (in the simulation frame)
+
+    Ex, Ey, Ez, Bx, By, Bz: floats
+        The fields of the particle, before adding the tabulated fields
+
+    table: 4darray of floats
+        Array of shape (6, N1, N2, Nz) that contains the tabulated fields
+        (see the docstring of `TabulatedExternalField`)
+
+    cylindrical: bool
+        Whether the axis 1 of `table` corresponds to r (and the components
+        of `table` are the cylindrical components) or to x
+
+    xmin, xmax, inv_dx, ymin, ymax, inv_dy, zmin, zmax, inv_dz: floats
+        The bounds and inverse grid step of the table, along each axis
+
+    t, t_start, t_end: floats (in seconds)
+        The time in the simulation frame, and the time window of the table
+
+    gamma_boost, beta_boost: floats
+        Properties of the Lorentz boost between the frame of the
+        table and the simulation frame.
+    """
+    # Convert the position and time to the frame of the table
+    zlab = gamma_boost * ( zj + beta_boost*c*t )
+    tlab = gamma_boost * ( t + beta_boost*zj/c )
+    # Time and longitudinal gating
+    if tlab < t_start or tlab > t_end or zlab < zmin or zlab > zmax:
+        return( Ex, Ey, Ez, Bx, By, Bz )
+    # Transverse gating
+    if cylindrical:
+        rj = math.sqrt( xj**2 + yj**2 )
+        if rj > xmax:
+            return( Ex, Ey, Ez, Bx, By, Bz )
+        v1 = rj
+        v2 = 0.
+    else:
+        if table.shape[1] > 1 and (xj < xmin or xj > xmax):
+            return( Ex, Ey, Ez, Bx, By, Bz )
+        if table.shape[2] > 1 and (yj < ymin or yj > ymax):
+            return( Ex, Ey, Ez, Bx, By, Bz )
+        v1 = xj
+        v2 = yj
+
+    # Indices of the lower gridpoints, and linear weights of the upper
+    # gridpoints (For degenerate axes, i.e. N=1, the weight is always 0.)
+    N1 = table.shape[1]
+    N2 = table.shape[2]
+    Nz = table.shape[3]
+    i1 = 0
+    S1 = 0.
+    if N1 > 1:
+        v_cell = inv_dx * ( v1 - xmin )
+        i1 = min( int( math.floor( v_cell ) ), N1-2 )
+        S1 = v_cell - i1
+    i2 = 0
+    S2 = 0.
+    if N2 > 1:
+        v_cell = inv_dy * ( v2 - ymin )
+        i2 = min( int( math.floor( v_cell ) ), N2-2 )
+        S2 = v_cell - i2
+    iz = 0
+    Sz = 0.
+    if Nz > 1:
+        v_cell = inv_dz * ( zlab - zmin )
+        iz = min( int( math.floor( v_cell ) ), Nz-2 )
+        Sz = v_cell - iz
+
+    # Interpolate the 6 components (trilinear interpolation)
+    F0 = 0.
+    F1 = 0.
+    Ez_ext = 0.
+    F3 = 0.
+    F4 = 0.
+    Bz_ext = 0.
+    for c1 in range(2):
+        j1 = min( i1+c1, N1-1 )
+        w1 = S1 if c1 == 1 else 1.-S1
+        for c2 in range(2):
+            j2 = min( i2+c2, N2-1 )
+            w2 = S2 if c2 == 1 else 1.-S2
+            for cz in range(2):
+                jz = min( iz+cz, Nz-1 )
+                w = w1 * w2 * ( Sz if cz == 1 else 1.-Sz )
+                F0 += w * table[0, j1, j2, jz]
+                F1 += w * table[1, j1, j2, jz]
+                Ez_ext += w * table[2, j1, j2, jz]
+                F3 += w * table[3, j1, j2, jz]
+                F4 += w * table[4, j1, j2, jz]
+                Bz_ext += w * table[5, j1, j2, jz]
+
+    # Convert cylindrical components to Cartesian components
+    if cylindrical:
+        if rj != 0.:
+            cos = xj / rj
+            sin = yj / rj
+        else:
+            cos = 1.
+            sin = 0.
+        Ex_ext = cos*F0 - sin*F1
+        Ey_ext = sin*F0 + cos*F1
+        Bx_ext = cos*F3 - sin*F4
+        By_ext = sin*F3 + cos*F4
+    else:
+        Ex_ext = F0
+        Ey_ext = F1
+        Bx_ext = F3
+        By_ext = F4
+
+    # Convert the fields from the lab frame to the simulation frame
+    # (Identity when there is no boost)
+    Ex += gamma_boost * ( Ex_ext - beta_boost*c*By_ext )
+    Ey += gamma_boost * ( Ey_ext + beta_boost*c*Bx_ext )
+    Ez += Ez_ext
+    Bx += gamma_boost * ( Bx_ext + beta_boost/c*Ey_ext )
+    By += gamma_boost * ( By_ext - beta_boost/c*Ex_ext )
+    Bz += Bz_ext
+    return( Ex, Ey, Ez, Bx, By, Bz )
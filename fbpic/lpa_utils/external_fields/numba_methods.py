@@ -0,0 +1,32 @@
+# Copyright 2016, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines numba methods that are used to apply tabulated external fields
+(on CPU).
+"""
+import numba
+from fbpic.utils.threading import njit_parallel, prange
+# Import the inline functions
+from .inline_functions import add_tabulated_field
+# Compile the inline functions for CPU
+add_tabulated_field = numba.njit( add_tabulated_field )
+
+@njit_parallel
+def apply_tabulated_field_numba( Ntot, x, y, z, Ex, Ey, Ez, Bx, By, Bz,
+                table, cylindrical, xmin, xmax, inv_dx, ymin, ymax, inv_dy,
+                zmin, zmax, inv_dz, t, t_start, t_end,
+                gamma_boost, beta_boost ):
+    """
+    Add the tabulated fields to the fields gathered on the particles
+    (in parallel if threading is installed)
+
+    See the docstring of `add_tabulated_field` for the arguments.
+    """
+    for ip in prange( Ntot ):
+        Ex[ip], Ey[ip], Ez[ip], Bx[ip], By[ip], Bz[ip] = add_tabulated_field(
+            x[ip], y[ip], z[ip], Ex[ip], Ey[ip], Ez[ip],
+            Bx[ip], By[ip], Bz[ip], table, cylindrical,
+            xmin, xmax, inv_dx, ymin, ymax, inv_dy, zmin, zmax, inv_dz,
+            t, t_start, t_end, gamma_boost, beta_boost )
@@ -0,0 +1,248 @@
+# Copyright 2016, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines the class TabulatedExternalField, which interpolates fields
+that are tabulated on a grid onto the particles.
+"""
+import numpy as np
+from .numba_methods import apply_tabulated_field_numba
+# Check if CUDA is available, then import CUDA functions
+from fbpic.utils.cuda import cuda_installed
+if cuda_installed:
+    from fbpic.utils.cuda import cuda, cuda_tpb_bpg_1d
+    from .cuda_methods import apply_tabulated_field_cuda
+
+class TabulatedExternalField( object ):
+
+    def __init__(self, fields, zmin, zmax, rmax=None, xmin=None, xmax=None,
+                 ymin=None, ymax=None, t_start=-np.inf, t_end=np.inf,
+                 gamma_boost=None, species=None ):
+        """
+        Initialize a TabulatedExternalField object, so that the fields
+        that are tabulated on a regular grid are interpolated onto the
+        particles, and added to the gathered fields at each time step.
+
+        In contrast to `ExternalField`, all the field components are applied
+        in one single pass over the particles, and only the particles that are
+        inside the bounding box of the grid (and inside the time window
+        between `t_start` and `t_end`) are modified. This is typically
+        much faster for fields that cover only a small part of the box
+        (e.g. undulators, plasma lenses).
+
+        This object should be added to the list `external_fields`,
+        which is an attribute of the Simulation object, so that the
+        fields are applied at each timestep. (See the example below)
+
+        The fields are assumed to be static within the time window.
+        Three geometries are supported, depending on the arguments passed:
+
+        - 1D: ``rmax``, ``xmin``, ``xmax``, ``ymin``, ``ymax`` are None.
+          The fields only depend on z, and are given as arrays of
+          shape ``(Nz,)``, for the components 'Ex', 'Ey', 'Ez', 'Bx',
+          'By', 'Bz'. Particles at any transverse position are modified.
+
+        - 2D (cylindrical): ``rmax`` is passed. The fields are axisymmetric
+          and are given as arrays of shape ``(Nz, Nr)``, for the components
+          'Er', 'Et', 'Ez', 'Br', 'Bt', 'Bz'. The radial gridpoints are
+          evenly spaced between 0 and ``rmax``.
+
+        - 3D: ``xmin``, ``xmax``, ``ymin`` and ``ymax`` are passed.
+          The fields are given as arrays of shape ``(Nx, Ny, Nz)``,
+          for the components 'Ex', 'Ey', 'Ez', 'Bx', 'By', 'Bz'.
+
+        In all cases, the gridpoints are evenly spaced and include the
+        boundaries (e.g. the gridpoints in z are ``np.linspace(zmin,zmax,Nz)``)
+        and the fields are linearly interpolated between gridpoints.
+
+        Parameters
+        ----------
+        fields: dict
+            A dictionary whose keys are the names of the field components
+            (see above) and whose values are the corresponding arrays
+            (in V/m for E and in T for B). Components that are not
+            in this dictionary are assumed to be 0.
+
+        zmin, zmax: floats (in meters)
+            Positions of the first and last gridpoints along z
+
+        rmax: float (in meters), optional
+            Position of the last radial gridpoint (2D cylindrical geometry)
+
+        xmin, xmax, ymin, ymax: floats (in meters), optional
+            Positions of the first and last gridpoints along x and y
+            (3D geometry)
+
+        t_start, t_end: floats (in seconds), optional
+            The time window during which the fields are applied.
+
+        gamma_boost: float, optional
+            When running the simulation in a boosted frame, set this to
+            the corresponding Lorentz factor. In this case, all the above
+            quantities (fields, positions and times) are to be given in the
+            lab frame, and are converted to the boosted frame on the
+            particles. Otherwise, they are given in the simulation frame.
+
+        species: a Particles object, optionals
+            The species on which the external field has to be applied.
+            If no species is specified, the external field is applied
+            to all particles.
+
+        Example
+        -------
+        In order to define a 10 cm-long plasma lens, with a focusing gradient
+        of 1000 T/m up to a radius of 1 mm, starting at z=1 cm :
+
+        ::
+
+            r = np.linspace( 0, 1.e-3, 11 )
+            Bt = 1000. * r * np.ones( (2, 11) )
+            sim.external_fields = [ TabulatedExternalField( {'Bt': Bt},
+                                zmin=1.e-2, zmax=11.e-2, rmax=1.e-3 ) ]
+        """
+        # Determine the geometry
+        if rmax is not None:
+            self.geometry = 'rz'
+            components = ['Er', 'Et', 'Ez', 'Br', 'Bt', 'Bz']
+        elif None not in [ xmin, xmax, ymin, ymax ]:
+            self.geometry = 'xyz'
+            components = ['Ex', 'Ey', 'Ez', 'Bx', 'By', 'Bz']
+        elif [ xmin, xmax, ymin, ymax ] == [ None ]*4:
+            self.geometry = 'z'
+            components = ['Ex', 'Ey', 'Ez', 'Bx', 'By', 'Bz']
+        else:
+            raise ValueError('`xmin`, `xmax`, `ymin` and `ymax` should '
+                             'either be all passed, or all be None.')
+        # Check the names of the fields
+        for fieldtype in fields.keys():
+            if fieldtype not in components:
+                raise ValueError('Unknown field component for the `%s` '
+                    'geometry: %s\nThe available field components are: %s'
+                    %(self.geometry, fieldtype, components) )
+        if len(fields) == 0:
+            raise ValueError('`fields` should contain at least one array.')
+        shape = np.shape( list(fields.values())[0] )
+
+        # Store all the fields in a single array of shape (6, N1, N2, Nz),
+        # where the axes 1 and 2 correspond to x and y (for 3D),
+        # r and nothing (for 2D), and are degenerate (for 1D)
+        ndim = { 'z':1, 'rz':2, 'xyz':3 }[ self.geometry ]
+        if len(shape) != ndim:
+            raise ValueError('The arrays in `fields` should have %d '
+                'dimension(s) for the `%s` geometry.' %(ndim, self.geometry))
+        if self.geometry == 'z':
+            table_shape = (1, 1, shape[0])
+        elif self.geometry == 'rz':
+            table_shape = (shape[1], 1, shape[0])
+        else:
+            table_shape = shape
+        self.table = np.zeros( (6,)+table_shape, dtype=np.float64 )
+        for i_comp, fieldtype in enumerate( components ):
+            if fieldtype in fields:
+                F = np.asarray( fields[fieldtype], dtype=np.float64 )
+                if F.shape != shape:
+                    raise ValueError('All the arrays in `fields` should '
+                                     'have the same shape.')
+                if self.geometry == 'z':
+                    self.table[i_comp] = F[np.newaxis, np.newaxis, :]
+                elif self.geometry == 'rz':
+                    self.table[i_comp] = F.T[:, np.newaxis, :]
+                else:
+                    self.table[i_comp] = F
+        N1, N2, Nz = self.table.shape[1:]
+
+        # Register the grid properties along each axis
+        if self.geometry == 'rz':
+            xmin, xmax = 0., rmax
+        elif self.geometry == 'z':
+            xmin = xmax = ymin = ymax = 0.
+        if self.geometry != 'xyz':
+            ymin = ymax = 0.
+        self.axes = []
+        for vmin, vmax, N in [ (xmin, xmax, N1), (ymin, ymax, N2),
+                               (zmin, zmax, Nz) ]:
+            if N > 1:
+                if vmax <= vmin:
+                    raise ValueError('The upper bound of the grid should '
+                                     'be larger than the lower bound.')
+                inv_dv = (N-1)/(vmax - vmin)
+            else:
+                inv_dv = 0.
+            self.axes.append( (vmin, vmax, inv_dv) )
+
+        # Register the other arguments
+        self.t_start = t_start
+        self.t_end = t_end
+        self.species = species
+        if gamma_boost is not None:
+            self.gamma_boost = gamma_boost
+            self.beta_boost = ( 1. - 1./gamma_boost**2 )**0.5
+        else:
+            self.gamma_boost = 1.
+            self.beta_boost = 0.
+
+        # The table is copied to the GPU when first needed
+        # (i.e. only when running on GPU ; see `apply_expression`)
+        self.d_table = None
+
+    def apply_expression( self, ptcl, t ):
+        """
+        Interpolate the tabulated fields and add them to the
+        fields gathered on the particles
+
+        This function is called at each timestep, after field gathering
+        in the step function.
+
+        Parameters
+        ----------
+        ptcl: a list a Particles objects
+            The particles on which the external fields will be applied
+
+        t: float (seconds)
+            The time in the simulation
+        """
+        # Skip the whole function when outside of the time window
+        # (only possible when the time window is in the simulation frame)
+        if self.beta_boost == 0. and not (self.t_start <= t <= self.t_end):
+            return
+
+        (xmin, xmax, inv_dx), (ymin, ymax, inv_dy), (zmin, zmax, inv_dz) = \
+            self.axes
+        cylindrical = ( self.geometry == 'rz' )
+
+        for species in ptcl:
+
+            # If any species was specified at initialization,
+            # apply the field only on this species
+            if (self.species is None) or (species is self.species):
+
+                # Only apply the field if there are macroparticles
+                # in this species
+                if species.Ntot > 0:
+
+                    if type( species.Ex ) is np.ndarray:
+                        # Call the CPU function
+                        apply_tabulated_field_numba( species.Ntot,
+                            species.x, species.y, species.z,
+                            species.Ex, species.Ey, species.Ez,
+                            species.Bx, species.By, species.Bz,
+                            self.table, cylindrical,
+                            xmin, xmax, inv_dx, ymin, ymax, inv_dy,
+                            zmin, zmax, inv_dz, t, self.t_start, self.t_end,
+                            self.gamma_boost, self.beta_boost )
+                    else:
+                        # Copy the table to the GPU, if not done yet
+                        if self.d_table is None:
+                            self.d_table = cuda.to_device( self.table )
+                        # Call the GPU function
+                        dim_grid_1d, dim_block_1d = \
+                            cuda_tpb_bpg_1d( species.Ntot )
+                        apply_tabulated_field_cuda[dim_grid_1d, dim_block_1d](
+                            species.Ntot, species.x, species.y, species.z,
+                            species.Ex, species.Ey, species.Ez,
+                            species.Bx, species.By, species.Bz,
+                            self.d_table, cylindrical,
+                            xmin, xmax, inv_dx, ymin, ymax, inv_dy,
+                            zmin, zmax, inv_dz, t, self.t_start, self.t_end,
+                            self.gamma_boost, self.beta_boost )
@@ -9,8 +9,8 @@ emit a laser during a simulation.
 import numpy as np
 from scipy.constants import e, c, epsilon_0, physical_constants
 r_e = physical_constants['classical electron radius'][0]
-from fbpic.particles.utilities.utility_methods import weights
-from fbpic.particles.deposition.numba_methods import deposit_field_numba
+from .numba_methods import update_v_separable_numba, \
+    deposit_rho_antenna_numba, deposit_J_antenna_numba
 
 # Check if CUDA is available, then import CUDA functions
 from fbpic.utils.cuda import cuda_installed
@@ -42,6 +42,10 @@ class LaserAntenna( object ):
 
     Since the number of macroparticles is small, both updating their motion
     and depositing their charge/current is always done on the CPU.
+    For separable laser profiles (see `LaserProfile.is_separable`), the
+    transverse part of the laser profile is evaluated only once on the
+    virtual particles (which do not move in the lab frame), and only the
+    longitudinal/temporal part is evaluated at each timestep.
     For GPU performance, the charge/current are deposited in a small-size array
     (corresponding to a thin slice in z) which is then transfered to the GPU
     and added into the full-size array of charge/current.
@@ -138,6 +142,14 @@ class LaserAntenna( object ):
             self.baseline_z, = boost.static_length( [ self.baseline_z ] )
             self.vz, = boost.velocity( [ self.vz ] )
 
+        # For separable laser profiles, the transverse factors are cached
+        # (they are calculated at the first call to `update_v`)
+        self.transverse_factors = None
+        self.z_transverse_factors = None
+        # Tolerance on the lab-frame position of the antenna, beyond
+        # which the cached transverse factors are recalculated
+        self.z_tolerance = 1.e-3 * dr_grid
+
         # Initialize small-size buffers where the particles charge and currents
         # will be deposited before being added to the regular, large-size array
         # (esp. useful when running on GPU, for memory transfer)
@@ -201,14 +213,39 @@ class LaserAntenna( object ):
         # Eu is the amplitude along the polarization direction
         # Note that we neglect the (small) excursion of the particles when
         # calculating the electric field on the particles.
-        Ex, Ey = self.laser_profile.E_field(
-            self.baseline_x, self.baseline_y, zlab, tlab )
+        if self.laser_profile.is_separable:
+            # All virtual particles have the same baseline_z, and thus
+            # the same zlab and tlab
+            zlab = zlab[0]
+            if self.boost is not None:
+                tlab = tlab[0]
+            # Calculate the transverse factors only if needed
+            # (The antenna does not move in the lab frame, so that zlab
+            # changes only by roundoff errors from one step to the next.)
+            if (self.transverse_factors is None) or \
+                abs(zlab - self.z_transverse_factors) > self.z_tolerance:
+                self.transverse_factors = np.array(
+                    self.laser_profile.transverse_factors(
+                        self.baseline_x, self.baseline_y, zlab ),
+                    dtype=np.complex128 )
+                self.z_transverse_factors = zlab
+            # Calculate the longitudinal factors, and get the corresponding
+            # velocity. This takes into account lab-frame to boosted-frame
+            # conversion, through a modification of the mobility coefficient
+            Lx, Ly = self.laser_profile.longitudinal_factors( zlab, tlab )
+            update_v_separable_numba( self.transverse_factors,
+                np.asarray( Lx, dtype=np.complex128 ),
+                np.asarray( Ly, dtype=np.complex128 ),
+                self.mobility_coef, self.vx, self.vy )
+        else:
+            Ex, Ey = self.laser_profile.E_field(
+                self.baseline_x, self.baseline_y, zlab, tlab )
 
-        # Calculate the corresponding velocity. This takes into account
-        # lab-frame to boosted-frame conversion, through a modification
-        # of the mobility coefficient: see the __init__ function
-        self.vx = self.mobility_coef * Ex
-        self.vy = self.mobility_coef * Ey
+            # Calculate the corresponding velocity. This takes into account
+            # lab-frame to boosted-frame conversion, through a modification
+            # of the mobility coefficient: see the __init__ function
+            self.vx = self.mobility_coef * Ex
+            self.vy = self.mobility_coef * Ey
 
     def deposit( self, fld, fieldtype, comm ):
         """
@@ -253,26 +290,30 @@ class LaserAntenna( object ):
             self.Jt_buffer[:,:,:] = 0.
             self.Jz_buffer[:,:,:] = 0.
 
-        # Indices and weights in z:
+        # Index and linear shape factors in z:
         # same for both the negative and positive virtual particles
-        iz, Sz = weights(self.baseline_z, grid[0].invdz, grid[0].zmin, grid[0].Nz,
-                         direction='z', shape_order=1)
-        # Find the z index where the small-size buffers should be added
-        # to the large-size arrays rho, Jr, Jt, Jz
-        iz_min = iz.min()
-        iz_max = iz.max()
-        # Since linear shape are used, and since the virtual particles all
-        # have the same z position, iz_max is necessarily equal to iz_min+1
+        # (since all virtual particles have the same z position)
+        z_cell = grid[0].invdz*( z_antenna - grid[0].zmin ) - 0.5
+        iz_min = int( np.floor( z_cell ) )
+        Sz0 = iz_min + 1 - z_cell
+        Sz1 = z_cell - iz_min
         # This is a sanity check, to avoid out-of-bound access later on.
-        assert iz_max == iz_min+1
-        # Substract from the array of indices in order to find the particle
-        # index within the small-size buffers
-        iz = iz - iz_min
+        assert (iz_min >= 0) and (iz_min+1 <= grid[0].Nz-1)
 
         # Deposit the charge/current of positive and negative
-        # virtual particles successively, into the small-size buffers
-        for q in [-1, 1]:
-            self.deposit_virtual_particles( q, fieldtype, grid, iz, Sz )
+        # virtual particles, into the small-size buffers
+        # (The sign -1 with which the guards are added is not
+        # trivial to derive but avoids artifacts on the axis)
+        if fieldtype == 'rho':
+            deposit_rho_antenna_numba( self.baseline_x, self.baseline_y,
+                self.excursion_x, self.excursion_y, self.w, Sz0, Sz1,
+                grid[0].invdr, grid[0].rmin, grid[0].Nr, self.rho_buffer )
+        elif fieldtype == 'J':
+            deposit_J_antenna_numba( self.baseline_x, self.baseline_y,
+                self.excursion_x, self.excursion_y, self.w,
+                self.vx, self.vy, self.vz, Sz0, Sz1,
+                grid[0].invdr, grid[0].rmin, grid[0].Nr,
+                self.Jr_buffer, self.Jt_buffer, self.Jz_buffer )
 
         # Copy the small-size buffers into the large-size arrays
         # (When running on the GPU, this involves copying the
@@ -282,104 +323,6 @@ class LaserAntenna( object ):
         elif fieldtype == 'J':
             self.copy_J_buffer( iz_min, grid )
 
-    def deposit_virtual_particles( self, q, fieldtype, grid, iz, Sz ):
-        """
-        Deposit the charge/current of the positive (q=+1) or negative
-        (q=-1) virtual macroparticles
-
-        Parameters
-        ----------
-        q: float (either +1 or -1)
-            Indicates whether to deposit the charge/current
-            of the positive or negative virtual macroparticles
-
-        fieldtype: string (either 'rho' or 'J')
-            Indicates whether to deposit the charge or current
-
-        grid: a list of InterpolationGrid object
-            The grids on which to the deposit the charge/current
-
-        iz, ir : 2darray of ints
-            Arrays of shape (shape_order+1, Ntot)
-            where Ntot is the number of macroparticles.
-            Contains the index of the cells that each virtual macroparticle
-            will deposit to.
-            (In the case of the laser antenna, these arrays are constant
-            in principle; but they are kept as arrays for compatibility
-            with the deposit_field_numba function.)
-
-        Sz, Sr: 2darray of ints
-            Arrays of shape (shape_order+1, Ntot)
-            where Ntot is the number of macroparticles
-            Contains the weight for respective cells from iz and ir,
-            for each macroparticle.
-        """
-        # Position of the particles
-        x = self.baseline_x + q*self.excursion_x
-        y = self.baseline_y + q*self.excursion_y
-        vx = q*self.vx
-        vy = q*self.vy
-        w = q*self.w
-
-        # Preliminary arrays for the cylindrical conversion
-        r = np.sqrt( x**2 + y**2 )
-        # Avoid division by 0.
-        invr = 1./np.where( r!=0., r, 1. )
-        cos = np.where( r!=0., x*invr, 1. )
-        sin = np.where( r!=0., y*invr, 0. )
-
-        # Indices and weights in r
-        ir, Sr = weights(r, grid[0].invdr, grid[0].rmin, grid[0].Nr,
-                         direction='r', shape_order=1)
-
-        if fieldtype == 'rho' :
-            # ---------------------------------------
-            # Deposit the charge density mode by mode
-            # ---------------------------------------
-            # Prepare auxiliary matrix
-            exptheta = np.ones( self.Ntot, dtype='complex')
-            # exptheta takes the value exp(im theta) throughout the loop
-            for m in range( len(grid) ) :
-                # Increment exptheta (notice the + : forward transform)
-                if m==1 :
-                    exptheta[:].real = cos
-                    exptheta[:].imag = sin
-                elif m>1 :
-                    exptheta[:] = exptheta*( cos + 1.j*sin )
-                # Deposit the fields into small-size buffer arrays
-                # (The sign -1 with which the guards are added is not
-                # trivial to derive but avoids artifacts on the axis)
-                deposit_field_numba( w*exptheta, self.rho_buffer[m,:],
-                    iz, ir, Sz, Sr, -1.)
-
-        elif fieldtype == 'J' :
-            # ----------------------------------------
-            # Deposit the current density mode by mode
-            # ----------------------------------------
-            # Calculate the currents
-            Jr = w * ( cos*vx + sin*vy )
-            Jt = w * ( cos*vy - sin*vx )
-            Jz = w * self.vz
-            # Prepare auxiliary matrix
-            exptheta = np.ones( self.Ntot, dtype='complex')
-            # exptheta takes the value exp(im theta) throughout the loop
-            for m in range( len(grid) ) :
-                # Increment exptheta (notice the + : forward transform)
-                if m==1 :
-                    exptheta[:].real = cos
-                    exptheta[:].imag = sin
-                elif m>1 :
-                    exptheta[:] = exptheta*( cos + 1.j*sin )
-                # Deposit the fields into small-size buffer arrays
-                # (The sign -1 with which the guards are added is not
-                # trivial to derive but avoids artifacts on the axis)
-                deposit_field_numba( Jr*exptheta, self.Jr_buffer[m,:],
-                                     iz, ir, Sz, Sr, -1.)
-                deposit_field_numba( Jt*exptheta, self.Jt_buffer[m,:],
-                                     iz, ir, Sz, Sr, -1.)
-                deposit_field_numba( Jz*exptheta, self.Jz_buffer[m,:],
-                                     iz, ir, Sz, Sr, -1.)
-
     def copy_rho_buffer( self, iz_min, grid ):
         """
         Add the small-size array rho_buffer into the full-size array rho
@@ -27,7 +27,9 @@ def add_laser_direct_envelope( sim, laser_profile, boost ):
     # Check that no other laser simulation has been already added
     if sim.fld.use_envelope:
         raise ValueError("Another laser profile has already been added")
-    sim.fld.activate_envelope_model(laser_profile.k0)
+    sim.fld.activate_envelope_model( laser_profile.k0,
+                                     mpi_comm=sim.comm.mpi_comm )
+    sim.comm.activate_envelope()
 
     # Get the local azimuthally-decomposed laser fields a and a_old on each proc
     laser_a, laser_a_old = get_laser_a( sim, laser_profile, boost )
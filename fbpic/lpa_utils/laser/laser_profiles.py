@@ -21,7 +21,14 @@ class LaserProfile( object ):
 
     Profiles that inherit from this base class can be summed,
     using the overloaded + operator.
+
+    Profiles whose field can be written as a sum of terms of the form
+    Re[ T(x, y, z) * L(z, t) ] can also set `is_separable` to True and
+    define the methods `transverse_factors` and `longitudinal_factors`.
+    This is used e.g. by the laser antenna, which evaluates the
+    transverse factors only once on its (fixed) virtual particles.
     """
+    is_separable = False
 
     def E_field( self, x, y, z, t ):
         """
@@ -43,6 +50,50 @@ class LaserProfile( object ):
         # (This should be replaced by any class that inherits from this one.)
         return( np.zeros_like(x), np.zeros_like(x) )
 
+    def transverse_factors( self, x, y, z ):
+        """
+        Return the time-independent (complex) transverse factors
+        of the laser, for each of the terms that compose the profile
+
+        Parameters
+        -----------
+        x, y: ndarrays (meters)
+            The transverse positions at which to calculate the factors
+            (in the lab frame)
+        z: float (meters)
+            The longitudinal position at which to calculate the factors
+            (in the lab frame)
+
+        Returns:
+        --------
+        A list of complex ndarrays (one per term), of the same shape as x
+        """
+        raise NotImplementedError(
+            'This laser profile is not separable.')
+
+    def longitudinal_factors( self, z, t ):
+        """
+        Return the (complex) longitudinal/temporal factors of the laser,
+        for each of the terms that compose the profile, already
+        multiplied by the amplitude along x and y.
+
+        The field is then given by Ex = sum_k Re[ Lx_k * T_k ]
+        (and similarly for Ey), where T_k are the `transverse_factors`
+
+        Parameters
+        -----------
+        z: float (meters)
+            The position at which to calculate the factors (in the lab frame)
+        t: float (seconds)
+            The time at which to calculate the factors (in the lab frame)
+
+        Returns:
+        --------
+        Lx, Ly: 1darrays of complexs (one element per term)
+        """
+        raise NotImplementedError(
+            'This laser profile is not separable.')
+
     def __add__( self, other ):
         """
         Overload the + operations for laser profiles
@@ -65,6 +116,8 @@ class SummedLaserProfile( LaserProfile ):
         # Register the profiles from which the sum should be calculated
         self.profile1 = profile1
         self.profile2 = profile2
+        # The sum is separable if both profiles are separable
+        self.is_separable = profile1.is_separable and profile2.is_separable
 
     def E_field( self, x, y, z, t ):
         """
@@ -86,12 +139,30 @@ class SummedLaserProfile( LaserProfile ):
         Ex2, Ey2 = self.profile2.E_field( x, y, z, t )
         return( Ex1+Ex2, Ey1+Ey2 )
 
+    def transverse_factors( self, x, y, z ):
+        """
+        Return the list of transverse factors of both profiles
+        (See the docstring of `LaserProfile.transverse_factors`)
+        """
+        return( self.profile1.transverse_factors( x, y, z ) + \
+                self.profile2.transverse_factors( x, y, z ) )
+
+    def longitudinal_factors( self, z, t ):
+        """
+        Return the longitudinal factors of both profiles
+        (See the docstring of `LaserProfile.longitudinal_factors`)
+        """
+        Lx1, Ly1 = self.profile1.longitudinal_factors( z, t )
+        Lx2, Ly2 = self.profile2.longitudinal_factors( z, t )
+        return( np.concatenate(( Lx1, Lx2 )), np.concatenate(( Ly1, Ly2 )) )
+
 
 # Particular classes for each laser profile
 # -----------------------------------------
 
 class GaussianLaser( LaserProfile ):
     """Class that calculates a Gaussian laser pulse."""
+    is_separable = True
 
     def __init__( self, a0, waist, tau, z0, zf=None, theta_pol=0.,
                     lambda0=0.8e-6, cep_phase=0., phi2_chirp=0. ):
@@ -254,9 +325,33 @@ class GaussianLaser( LaserProfile ):
         a = self.a0 * profile
         return a
 
+    def transverse_factors( self, x, y, z ):
+        """
+        Return the transverse factor of the laser
+        (See the docstring of `LaserProfile.transverse_factors`)
+        """
+        diffract_factor = 1. + 1j * ( z - self.zf ) * self.inv_zr
+        stretch_factor = 1 - 2j * self.phi2_chirp * c**2 * self.inv_ctau2
+        transverse = np.exp( - (x**2 + y**2) / (self.w0**2 * diffract_factor) )\
+            / (diffract_factor * stretch_factor**0.5)
+        return( [ transverse ] )
+
+    def longitudinal_factors( self, z, t ):
+        """
+        Return the longitudinal factor of the laser
+        (See the docstring of `LaserProfile.longitudinal_factors`)
+        """
+        stretch_factor = 1 - 2j * self.phi2_chirp * c**2 * self.inv_ctau2
+        exp_argument = 1j*self.k0*( z - self.z0 - c*t ) - 1j*self.cep_phase \
+            - 1./stretch_factor * self.inv_ctau2 * ( z - self.z0 - c*t )**2
+        longitudinal = np.exp( exp_argument )
+        return( np.array([ self.E0x * longitudinal ]),
+                np.array([ self.E0y * longitudinal ]) )
+
 
 class LaguerreGaussLaser( LaserProfile ):
     """Class that calculates a Laguerre-Gauss pulse."""
+    is_separable = True
 
     def __init__( self, p, m, a0, waist, tau, z0, zf=None, theta_pol=0.,
                     lambda0=0.8e-6, cep_phase=0., theta0=0. ):
@@ -462,9 +557,41 @@ class LaguerreGaussLaser( LaserProfile ):
 
         return a
 
+    def transverse_factors( self, x, y, z ):
+        """
+        Return the transverse factor of the laser
+        (See the docstring of `LaserProfile.transverse_factors`)
+        """
+        # Diffraction factor, waist and Gouy phase
+        diffract_factor = 1. + 1j * ( z - self.zf ) * self.inv_zr
+        w = self.w0 * abs( diffract_factor )
+        psi = np.angle( diffract_factor )
+        # Calculate the scaled radius and azimuthal angle
+        scaled_radius_squared = 2*( x**2 + y**2 ) / w**2
+        scaled_radius = np.sqrt( scaled_radius_squared )
+        theta = np.angle( x + 1.j*y )
+        # Get the transverse profile, including the *additional* Gouy phase
+        transverse = np.exp( - (x**2 + y**2) / (self.w0**2 * diffract_factor) \
+                             + 1.j*(2*self.p + self.m)*psi ) / diffract_factor \
+            * scaled_radius**self.m * self.laguerre_pm(scaled_radius_squared) \
+            * np.cos( self.m*(theta-self.theta0) )
+        return( [ transverse ] )
+
+    def longitudinal_factors( self, z, t ):
+        """
+        Return the longitudinal factor of the laser
+        (See the docstring of `LaserProfile.longitudinal_factors`)
+        """
+        exp_argument = 1j*self.k0*( z - self.z0 - c*t ) - 1j*self.cep_phase \
+            - self.inv_ctau2 * ( z - self.z0 - c*t )**2
+        longitudinal = np.exp( exp_argument )
+        return( np.array([ self.E0x * longitudinal ]),
+                np.array([ self.E0y * longitudinal ]) )
+
 
 class FlattenedGaussianLaser( LaserProfile ):
     """Class that calculates a focused flattened Gaussian"""
+    is_separable = True
 
     def __init__( self, a0, w0, tau, z0, N=6, zf=None, theta_pol=0.,
                     lambda0=0.8e-6, cep_phase=0. ):
@@ -585,3 +712,17 @@ class FlattenedGaussianLaser( LaserProfile ):
             Arrays of the same shape as x, y, z, containing the fields
         """
         return self.summed_profile.E_field( x, y, z, t )
+
+    def transverse_factors( self, x, y, z ):
+        """
+        Return the transverse factors of the Laguerre-Gauss modes
+        (See the docstring of `LaserProfile.transverse_factors`)
+        """
+        return self.summed_profile.transverse_factors( x, y, z )
+
+    def longitudinal_factors( self, z, t ):
+        """
+        Return the longitudinal factors of the Laguerre-Gauss modes
+        (See the docstring of `LaserProfile.longitudinal_factors`)
+        """
+        return self.summed_profile.longitudinal_factors( z, t )
@@ -0,0 +1,193 @@
+# Copyright 2016, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines the numba methods that are used by the laser antenna on the CPU.
+"""
+import math
+import numba
+
+@numba.njit
+def update_v_separable_numba( transverse_factors, Lx, Ly,
+                              mobility_coef, vx, vy ):
+    """
+    Update the velocities of the virtual particles of the antenna,
+    for a laser profile that is separable, i.e. of the form
+    E = sum_k Re[ L_k(z, t) * T_k(x, y) ]
+
+    Parameters
+    ----------
+    transverse_factors: 2darray of complexs
+        Array of shape (n_terms, Ntot) that contains the (cached)
+        transverse factors T_k, on each virtual particle
+
+    Lx, Ly: 1darrays of complexs
+        Arrays of shape (n_terms,) that contain the longitudinal factors
+        L_k, multiplied by the amplitude of the laser along x and y
+
+    mobility_coef: float
+        Proportionality coefficient between the velocities of the
+        virtual particles and the electric field to be emitted
+
+    vx, vy: 1darrays of floats
+        The velocities of the virtual particles (modified by this function)
+    """
+    n_terms, Ntot = transverse_factors.shape
+    for ip in range(Ntot):
+        Ex = 0.
+        Ey = 0.
+        for k in range(n_terms):
+            T = transverse_factors[k, ip]
+            Ex += ( Lx[k] * T ).real
+            Ey += ( Ly[k] * T ).real
+        vx[ip] = mobility_coef * Ex
+        vy[ip] = mobility_coef * Ey
+
+@numba.njit
+def deposit_rho_antenna_numba( baseline_x, baseline_y,
+                               excursion_x, excursion_y, w,
+                               Sz0, Sz1, invdr, rmin, Nr, rho_buffer ):
+    """
+    Deposit the charge of the positive and negative virtual particles
+    of the antenna, for all azimuthal modes, into the small-size buffer
+    rho_buffer (in one single pass over the virtual particles)
+
+    Parameters
+    ----------
+    baseline_x, baseline_y: 1darrays of floats (in meters)
+        The baseline position of the virtual particles
+
+    excursion_x, excursion_y: 1darrays of floats (in meters)
+        The excursion of the positive virtual particles (the negative
+        virtual particles have the opposite excursion)
+
+    w: 1darray of floats
+        The weights of the positive virtual particles
+
+    Sz0, Sz1: floats
+        The (linear) shape factors in z, for the two cells that surround
+        the antenna (same for all virtual particles)
+
+    invdr, rmin: floats (in meters^-1 and meters)
+        Inverse of the radial grid step, and position of the edge of the box
+
+    Nr: int
+        Number of gridpoints along r
+
+    rho_buffer: 3darray of complexs
+        Array of shape (Nm, 2, Nr) where the charge is deposited
+        (modified by this function)
+    """
+    Nm = rho_buffer.shape[0]
+    Ntot = baseline_x.shape[0]
+    for ip in range(Ntot):
+        # Loop over the positive and negative virtual particles
+        for q in (-1., 1.):
+            x = baseline_x[ip] + q*excursion_x[ip]
+            y = baseline_y[ip] + q*excursion_y[ip]
+            wq = q * w[ip]
+            # Cylindrical conversion and linear shape factors in r
+            r, cos, sin, ir0, ir1, Sr0, Sr1 = get_r_weights_linear(
+                                                    x, y, invdr, rmin, Nr )
+            # Deposit the contribution of each mode
+            exptheta = 1. + 0.j
+            for m in range(Nm):
+                if m > 0:
+                    exptheta *= ( cos + 1.j*sin )
+                rho_scal = wq * exptheta
+                rho_buffer[m, 0, ir0] += Sz0 * Sr0 * rho_scal
+                rho_buffer[m, 0, ir1] += Sz0 * Sr1 * rho_scal
+                rho_buffer[m, 1, ir0] += Sz1 * Sr0 * rho_scal
+                rho_buffer[m, 1, ir1] += Sz1 * Sr1 * rho_scal
+
+@numba.njit
+def deposit_J_antenna_numba( baseline_x, baseline_y,
+                             excursion_x, excursion_y, w, vx, vy, vz,
+                             Sz0, Sz1, invdr, rmin, Nr,
+                             Jr_buffer, Jt_buffer, Jz_buffer ):
+    """
+    Deposit the current of the positive and negative virtual particles
+    of the antenna, for all azimuthal modes and all components, into the
+    small-size buffers Jr_buffer, Jt_buffer, Jz_buffer
+    (in one single pass over the virtual particles)
+
+    Parameters
+    ----------
+    baseline_x, baseline_y, excursion_x, excursion_y, w: 1darrays of floats
+        See the docstring of `deposit_rho_antenna_numba`
+
+    vx, vy, vz: 1darrays of floats (in meters per second)
+        The velocities of the positive virtual particles (the negative
+        virtual particles have opposite transverse velocities)
+
+    Sz0, Sz1, invdr, rmin, Nr:
+        See the docstring of `deposit_rho_antenna_numba`
+
+    Jr_buffer, Jt_buffer, Jz_buffer: 3darrays of complexs
+        Arrays of shape (Nm, 2, Nr) where the current is deposited
+        (modified by this function)
+    """
+    Nm = Jr_buffer.shape[0]
+    Ntot = baseline_x.shape[0]
+    for ip in range(Ntot):
+        # Loop over the positive and negative virtual particles
+        for q in (-1., 1.):
+            x = baseline_x[ip] + q*excursion_x[ip]
+            y = baseline_y[ip] + q*excursion_y[ip]
+            wq = q * w[ip]
+            vxq = q * vx[ip]
+            vyq = q * vy[ip]
+            # Cylindrical conversion and linear shape factors in r
+            r, cos, sin, ir0, ir1, Sr0, Sr1 = get_r_weights_linear(
+                                                    x, y, invdr, rmin, Nr )
+            # Currents
+            Jr = wq * ( cos*vxq + sin*vyq )
+            Jt = wq * ( cos*vyq - sin*vxq )
+            Jz = wq * vz[ip]
+            # Deposit the contribution of each mode
+            exptheta = 1. + 0.j
+            for m in range(Nm):
+                if m > 0:
+                    exptheta *= ( cos + 1.j*sin )
+                for J, J_buffer in ( (Jr, Jr_buffer), (Jt, Jt_buffer),
+                                     (Jz, Jz_buffer) ):
+                    J_scal = J * exptheta
+                    J_buffer[m, 0, ir0] += Sz0 * Sr0 * J_scal
+                    J_buffer[m, 0, ir1] += Sz0 * Sr1 * J_scal
+                    J_buffer[m, 1, ir0] += Sz1 * Sr0 * J_scal
+                    J_buffer[m, 1, ir1] += Sz1 * Sr1 * J_scal
+
+@numba.njit
+def get_r_weights_linear( x, y, invdr, rmin, Nr ):
+    """
+    Return the radius, cosine and sine of a virtual particle, as well as
+    its (linear) radial indices and shape factors. The sign of the shape
+    factor for the guard cell below the axis is flipped (-1), and the
+    indices above the upper radial boundary are clamped to Nr-1.
+    """
+    # Cylindrical conversion (avoid division by 0.)
+    r = math.sqrt( x**2 + y**2 )
+    if r != 0.:
+        invr = 1./r
+        cos = x*invr
+        sin = y*invr
+    else:
+        cos = 1.
+        sin = 0.
+    # Indices and shape factors
+    r_cell = invdr*(r - rmin) - 0.5
+    ir0 = int( math.floor( r_cell ) )
+    ir1 = ir0 + 1
+    Sr0 = ir1 - r_cell
+    Sr1 = r_cell - ir0
+    # Guard cell below the axis
+    if ir0 < 0:
+        ir0 = abs(ir0) - 1
+        Sr0 = -Sr0
+    # Upper radial boundary
+    if ir0 > Nr-1:
+        ir0 = Nr-1
+    if ir1 > Nr-1:
+        ir1 = Nr-1
+    return( r, cos, sin, ir0, ir1, Sr0, Sr1 )
@@ -11,17 +11,18 @@ This file steers and controls the simulation.
 # as it sets the cuda context)
 from fbpic.utils.mpi import MPI
 # Check if threading is available
-from .utils.threading import threading_enabled
+from .utils.threading import threading_enabled, get_num_threads
+from .utils.placement import apply_cpu_placement_from_environment
 # Check if CUDA is available, then import CUDA functions
 from .utils.cuda import cuda_installed
 if cuda_installed:
-    from .utils.cuda import send_data_to_gpu, \
+    from .utils.cuda import cuda, send_data_to_gpu, \
                 receive_data_from_gpu, mpi_select_gpus
     mpi_select_gpus( MPI )
 
 # Import the rest of the requirements
+import copy
 import warnings
-import numba
 import numpy as np
 from scipy.constants import m_e, m_p, e, c
 from .utils.printing import ProgressBar, print_simulation_setup
@@ -48,11 +49,12 @@ class Simulation(object):
                  p_nz=None, p_nr=None, p_nt=None, n_e=None, zmin=0.,
                  n_order=-1, dens_func=None, filter_currents=True,
                  v_comoving=None, use_galilean=True,
-                 initialize_ions=False, use_cuda=False,
+                 initialize_ions=False, immobile_ions=False, use_cuda=False,
                  n_guard=None, n_damp=64, exchange_period=None,
                  current_correction='curl-free', boundaries='periodic',
                  gamma_boost=None, use_all_mpi_ranks=True,
-                 particle_shape='linear', verbose_level=1 ):
+                 particle_shape='linear', use_mode_threads=False,
+                 n_mode_ranks=1, verbose_level=1 ):
         """
         Initializes a simulation.
 
@@ -109,6 +111,11 @@ class Simulation(object):
 
         initialize_ions: bool, optional
            Whether to initialize the neutralizing ions
+        immobile_ions: bool, optional
+           Whether the neutralizing ions are immobile (see the argument
+           `immobile` of `add_new_species`). This is typically sufficient
+           when the ions are only used to neutralize the plasma, e.g.
+           with `use_true_rho`.
         filter_currents: bool, optional
             Whether to filter the currents and charge in k space
 
@@ -184,6 +191,27 @@ class Simulation(object):
             Possible values are 'cubic', 'linear'. ('cubic' corresponds to
             third order shapes and 'linear' to first order shapes).
 
+        use_mode_threads: bool, optional
+            Whether to transform and push the fields of the different
+            azimuthal modes concurrently, with one thread per mode (on CPU,
+            for `Nm > 1`). The threads are then divided between the modes.
+            This can speed up the field solver for moderate grid sizes.
+            (Requires the tbb or omp threading layer of numba, and numba
+            0.49 or higher ; the number of BLAS threads is only limited if
+            threadpoolctl is installed. The threads can be shut down with
+            `sim.fld.close()` at the end of the simulation.)
+
+        n_mode_ranks: int, optional
+            Number of MPI ranks among which the azimuthal modes of each
+            subdomain are distributed (on CPU). The domain is then divided
+            into (number of MPI ranks)/n_mode_ranks subdomains along z. Each
+            rank only holds the spectral transformers, spectral grids and
+            PSATD coefficients of its own modes, so that the memory of
+            simulations with large `Nr` and `Nm` decreases with the number
+            of ranks. The particles and the interpolation grids are
+            duplicated on the ranks of a subdomain (and the fields of
+            each mode are broadcast by the rank that handles it).
+
         verbose_level: int, optional
             Print information about the simulation setup after
             initialization of the Simulation class.
@@ -200,8 +228,12 @@ class Simulation(object):
             self.use_cuda = False
         # CPU multi-threading
         self.use_threading = threading_enabled
+        if not self.use_cuda:
+            # Place the threads on the cores before allocating the arrays
+            # (when requested by FBPIC_CPU_PLACEMENT / FBPIC_PIN_THREADS)
+            apply_cpu_placement_from_environment()
         if self.use_threading:
-            self.cpu_threads = numba.config.NUMBA_NUM_THREADS
+            self.cpu_threads = get_num_threads()
         else:
             self.cpu_threads = 1
 
@@ -223,7 +255,13 @@ class Simulation(object):
         # Initialize the boundary communicator
         self.comm = BoundaryCommunicator( Nz, zmin, zmax, Nr, rmax, Nm, dt,
             self.v_comoving, self.use_galilean, boundaries, n_order,
-            n_guard, n_damp, exchange_period, use_all_mpi_ranks )
+            n_guard, n_damp, exchange_period, use_all_mpi_ranks,
+            n_mode_ranks )
+        # With a decomposition of the modes, the ranks of a subdomain hold
+        # the same particles: use the same random numbers on these ranks
+        if self.comm.mode_comm is not None:
+            np.random.set_state(
+                self.comm.mode_comm.bcast( np.random.get_state(), root=0 ) )
         # Modify domain region
         zmin, zmax, Nz = self.comm.divide_into_domain()
         # Initialize the field structure
@@ -234,7 +272,9 @@ class Simulation(object):
                     current_correction=current_correction,
                     use_cuda=self.use_cuda,
                     # Only create threading buffers when running on CPU
-                    create_threading_buffers=(self.use_cuda is False) )
+                    create_threading_buffers=(self.use_cuda is False),
+                    use_mode_threads=use_mode_threads,
+                    mode_comm=self.comm.mode_comm )
 
         # Initialize the electrons and the ions
         self.grid_shape = self.fld.interp[0].Ez.shape
@@ -250,7 +290,8 @@ class Simulation(object):
             self.add_new_species( q=e, m=m_p, n=n_e, dens_func=dens_func,
                               p_nz=p_nz, p_nr=p_nr, p_nt=p_nt,
                               p_zmin=p_zmin, p_zmax=p_zmax,
-                              p_rmin=p_rmin, p_rmax=p_rmax )
+                              p_rmin=p_rmin, p_rmax=p_rmax,
+                              immobile=immobile_ions )
 
         # Register the time and the iteration
         self.time = 0.
@@ -266,6 +307,16 @@ class Simulation(object):
         self.checkpoints = []
         # Initialize an empty list of laser antennas
         self.laser_antennas = []
+        # By default, the simulation uses numpy's global random generator
+        # as it is (see `clone`)
+        self.random_state = None
+        # No stepping session is open initially (see `stepping`)
+        self.stepping_session = None
+
+        # Record the initial position of the grid (see `reset`)
+        self._initial_zmin_global_domain = self.comm._zmin_global_domain
+        self._initial_zmin_zmax = ( self.fld.interp[0].zmin,
+                                    self.fld.interp[0].zmax )
 
         # Print simulation setup
         print_simulation_setup( self, verbose_level=verbose_level )
@@ -300,6 +351,15 @@ class Simulation(object):
 
         show_progress: bool, optional
             Whether to show a progression bar
+
+        .. note::
+
+            Each call to `step` prepares the PIC loop (e.g. transforms the
+            fields to spectral space and sends the data to the GPU) and
+            finalizes it at the end. When `step` is called repeatedly with
+            small `N` (e.g. in order to modify the simulation between
+            calls), use a stepping session instead (see `stepping`), so
+            that this is done only once.
         """
         # Shortcuts
         ptcl = self.ptcl
@@ -314,32 +374,16 @@ class Simulation(object):
             # This is because use_true_rho requires the guard cells of
             # rho to be exchanged while correct_currents requires the opposite.
 
-        # Initialize the positions for continuous injection by moving window
-        if self.comm.moving_win is not None:
-            for species in self.ptcl:
-                if species.continuous_injection:
-                    species.injector.initialize_injection_positions(
-                        self.comm, self.comm.moving_win.v, species.z, self.dt )
+        # Prepare the PIC loop, unless this is done by an open stepping session
+        if self.stepping_session is not None:
+            session = self.stepping_session
+        else:
+            session = SteppingSession( self )
 
         # Initialize variables to measure the time taken by the simulation
-        if show_progress and self.comm.rank==0:
+        if show_progress and self.comm.rank==0 and self.comm.mode_rank==0:
             progress_bar = ProgressBar( N )
 
-        # Send simulation data to GPU (if CUDA is used)
-        if self.use_cuda:
-            send_data_to_gpu(self)
-
-        # Get the E and B fields in spectral space initially
-        # (In the rest of the loop, E and B will only be transformed
-        # from spectal space to real space, but never the other way around)
-        self.comm.exchange_fields(fld.interp, 'E', 'replace')
-        self.comm.exchange_fields(fld.interp, 'B', 'replace')
-        self.comm.damp_EB_open_boundary( fld.interp )
-        fld.interp2spect('E')
-        fld.interp2spect('B')
-        if fld.use_envelope:
-            fld.interp2spect('a')
-
         # Beginning of the N iterations
         # -----------------------------
 
@@ -347,7 +391,7 @@ class Simulation(object):
         for i_step in range(N):
 
             # Show a progression bar and calculate ETA
-            if show_progress and self.comm.rank==0:
+            if show_progress and self.comm.rank==0 and self.comm.mode_rank==0:
                 progress_bar.time( i_step )
                 progress_bar.print_progress()
 
@@ -356,9 +400,13 @@ class Simulation(object):
 
             # Check whether this iteration involves particle exchange.
             # Note: Particle exchange is imposed at the first iteration
-            # of this loop (i_step == 0) in order to ensure that all
-            # particles are inside the box, and that 'rho_prev' is correct
-            if self.iteration % self.comm.exchange_period == 0 or i_step == 0:
+            # of the session (or after `update_particles`) in order to ensure
+            # that all particles are inside the box, and that 'rho_prev'
+            # is correct
+            exchange_step = ( self.iteration % self.comm.exchange_period == 0
+                                or session.exchange_pending )
+            session.exchange_pending = False
+            if exchange_step:
                 # Particle exchange includes MPI exchange of particles, removal
                 # of out-of-box particles and (if there is a moving window)
                 # continuous injection of new particles by the moving window.
@@ -367,15 +415,25 @@ class Simulation(object):
                 for species in self.ptcl:
                     self.comm.exchange_particles(species, fld, self.time)
 
+            # Merge/split the macroparticles of the species that require it
+            resampled = False
+            for species in self.ptcl:
+                if species.resample_particles( fld, self.iteration ):
+                    resampled = True
+
+            if exchange_step or resampled:
                 # Reproject the charge on the interpolation grid
                 # (Since particles have been removed / added to the simulation;
                 # otherwise rho_prev is obtained from the previous iteration.)
+                # The cached charge of the immobile species is also updated.
+                fld.clear_immobile_rho()
                 self.deposit('rho_prev', exchange=(use_true_rho is True))
 
             # For the field diagnostics of the first step: deposit J
             # (Note however that this is not the *corrected* current)
-            if i_step == 0:
+            if session.deposit_J_pending:
                 self.deposit('J', exchange=True)
+                session.deposit_J_pending = False
 
             # Diagnostics
             # -----------
@@ -392,19 +450,39 @@ class Simulation(object):
             # Main PIC iteration
             # ------------------
 
+            # Select the species whose momenta are pushed at this iteration
+            # (Subcycled species are only gathered and pushed every
+            # `subcycle` iterations, with a timestep `subcycle*dt` ;
+            # immobile species are never gathered nor pushed)
+            moving_ptcl = [ species for species in ptcl
+                            if not species.immobile ]
+            pushed_ptcl = [ species for species in moving_ptcl if
+                            self.iteration % species.subcycle == 0 ]
+
             # Gather the fields from the grid at t = n dt
-            for species in ptcl:
+            for species in pushed_ptcl:
                 species.gather( fld.interp )
+            # Gather the laser envelope (envelope model)
+            if fld.use_envelope:
+                for species in pushed_ptcl:
+                    species.gather_envelope( fld )
             # Apply the external fields at t = n dt
             for ext_field in self.external_fields:
-                ext_field.apply_expression( self.ptcl, self.time )
+                ext_field.apply_expression( pushed_ptcl, self.time )
 
             # Push the particles' positions and velocities to t = (n+1/2) dt
+            # (The positions of all species are pushed, with their
+            # latest momenta, so that rho and J remain consistent.)
             if move_momenta:
-                for species in ptcl:
-                    species.push_p( self.time + 0.5*self.dt )
+                for species in pushed_ptcl:
+                    species.push_p( self.time + 0.5*self.dt,
+                                    use_envelope=fld.use_envelope )
+            # Get the plasma response to the envelope (with the averaged
+            # Lorentz factor of the particles), for the envelope push
+            if fld.use_envelope:
+                self.deposit('chi', exchange=True)
             if move_positions:
-                for species in ptcl:
+                for species in moving_ptcl:
                     species.push_x( 0.5*dt )
             # Get positions/velocities for antenna particles at t = (n+1/2) dt
             for antenna in self.laser_antennas:
@@ -424,12 +502,17 @@ class Simulation(object):
             # Handle elementary processes at t = (n + 1/2)dt
             # i.e. when the particles' velocity and position are synchronized
             # (e.g. ionization, Compton scattering, ...)
-            for species in ptcl:
-                species.handle_elementary_processes( self.time + 0.5*dt )
+            # (Only for the species that were gathered and pushed at this
+            # iteration, over a timestep `subcycle*dt`. The random numbers
+            # depend on the rank along z, so that the procs that share the
+            # modes of a subdomain draw the same ones)
+            for species in pushed_ptcl:
+                species.handle_elementary_processes( self.time + 0.5*dt,
+                                                     self.comm.rank )
 
             # Push the particles' positions to t = (n+1) dt
             if move_positions:
-                for species in ptcl:
+                for species in moving_ptcl:
                     species.push_x( 0.5*dt )
             # Get positions for antenna particles at t = (n+1) dt
             for antenna in self.laser_antennas:
@@ -474,6 +557,11 @@ class Simulation(object):
             self.comm.damp_EB_open_boundary( fld.interp )
             fld.partial_interp2spect('E')
             fld.partial_interp2spect('B')
+            if fld.use_envelope:
+                fld.spect2partial_interp('a')
+                self.comm.exchange_fields(fld.envelope_interp, 'a', 'replace')
+                self.comm.damp_envelope_open_boundary( fld.envelope_interp )
+                fld.partial_interp2spect('a')
 
             # Get the corresponding fields in interpolation space
             fld.spect2interp('E')
@@ -489,27 +577,61 @@ class Simulation(object):
             for checkpoint in self.checkpoints:
                 checkpoint.write( self.iteration )
 
+            # Call the user-defined functions of the stepping session
+            session.call_hooks()
+
         # End of the N iterations
         # -----------------------
 
-        # Finalize PIC loop
-        # Get the charge density and the current from spectral space.
-        fld.spect2interp('J')
-        if (not fld.exchanged_source['J']) and (self.comm.size > 1):
-            self.comm.exchange_fields(self.fld.interp, 'J', 'add')
-        fld.spect2interp('rho_prev')
-        if (not fld.exchanged_source['rho_prev']) and (self.comm.size > 1):
-            self.comm.exchange_fields(self.fld.interp, 'rho', 'add')
-
-        # Receive simulation data from GPU (if CUDA is used)
-        if self.use_cuda:
-            receive_data_from_gpu(self)
+        # Finalize PIC loop, unless the stepping session remains open
+        if session is not self.stepping_session:
+            session.close()
 
         # Print the measured time taken by the PIC cycle
-        if show_progress and (self.comm.rank==0):
+        if show_progress and (self.comm.rank==0) and (self.comm.mode_rank==0):
             progress_bar.print_summary()
 
 
+    def stepping( self ):
+        """
+        Open a stepping session, i.e. prepare the PIC loop once, for
+        several subsequent calls to `step`.
+
+        Within the session, the fields remain in spectral space and the
+        data remains on the GPU (if CUDA is used) between calls to `step`,
+        so that calling `step` with small `N` (e.g. `N=1`, in order to
+        modify the simulation between calls) has no additional cost.
+        The PIC loop is finalized when the session is closed (i.e. the
+        charge density and current are brought back to the interpolation
+        grid, and the data is copied back from the GPU).
+
+        Usage::
+
+            with sim.stepping() as session:
+                session.add_hook( my_function, period=10 )
+                for i in range(100):
+                    session.step( 1, show_progress=False )
+                    ...
+
+        .. note::
+
+            Within the session, the fields are advanced in spectral space.
+            After modifying E or B on the interpolation grid (e.g. with
+            `add_laser`), call `session.update_fields()`. After modifying
+            the particles (e.g. moving or adding macroparticles), call
+            `session.update_particles()`. When using CUDA, the data of the
+            simulation is on the GPU within the session.
+
+        Returns
+        -------
+        session: a SteppingSession object
+            Also usable as a context manager, which closes the session
+        """
+        if self.stepping_session is not None:
+            raise RuntimeError('A stepping session is already open.')
+        self.stepping_session = SteppingSession( self )
+        return( self.stepping_session )
+
     def deposit( self, fieldtype, exchange=False ):
         """
         Deposit the charge or the currents to the interpolation grid
@@ -521,7 +643,8 @@ class Simulation(object):
             The designation of the spectral field that
             should be changed by the deposition
             Either 'rho_prev', 'rho_next' or 'J'
-            (or 'rho_next_xy' and 'rho_next_z' for cross-deposition)
+            (or 'rho_next_xy' and 'rho_next_z' for cross-deposition,
+            or 'chi' for the plasma response of the envelope model)
 
         exchange: bool
             Whether to exchange guard cells via MPI before transforming
@@ -535,10 +658,23 @@ class Simulation(object):
 
         # Charge
         if fieldtype in ['rho_prev', 'rho_next', 'rho_next_xy', 'rho_next_z']:
+            # On CPU, the charge of the immobile species is cached: it is
+            # only deposited (alone) when the cache was cleared
+            use_cache = (not self.use_cuda) and \
+                any( species.immobile for species in self.ptcl )
+            if use_cache and not fld.shift_immobile_rho():
+                fld.erase('rho')
+                for species in self.ptcl:
+                    if species.immobile:
+                        species.deposit( fld, 'rho' )
+                fld.sum_reduce_deposition_array('rho')
+                fld.divide_by_volume('rho')
+                fld.store_immobile_rho()
             fld.erase('rho')
             # Deposit the particle charge
             for species in self.ptcl:
-                species.deposit( fld, 'rho' )
+                if not (use_cache and species.immobile):
+                    species.deposit( fld, 'rho' )
             # Deposit the charge of the virtual particles in the antenna
             for antenna in self.laser_antennas:
                 antenna.deposit( fld, 'rho', self.comm )
@@ -546,6 +682,9 @@ class Simulation(object):
             fld.sum_reduce_deposition_array('rho')
             # Divide by cell volume
             fld.divide_by_volume('rho')
+            # Add the cached charge of the immobile species
+            if use_cache:
+                fld.add_immobile_rho()
             # Exchange guard cells if requested by the user
             if exchange and self.comm.size > 1:
                 self.comm.exchange_fields(fld.interp, 'rho', 'add')
@@ -554,8 +693,10 @@ class Simulation(object):
         elif fieldtype == 'J':
             fld.erase('J')
             # Deposit the particle current
+            # (The current of the immobile species is zero)
             for species in self.ptcl:
-                species.deposit( fld, 'J' )
+                if not species.immobile:
+                    species.deposit( fld, 'J' )
             # Deposit the current of the virtual particles in the antenna
             for antenna in self.laser_antennas:
                 antenna.deposit( fld, 'J', self.comm )
@@ -567,6 +708,21 @@ class Simulation(object):
             if exchange and self.comm.size > 1:
                 self.comm.exchange_fields(fld.interp, 'J', 'add')
 
+        # Plasma susceptibility (envelope model)
+        elif fieldtype == 'chi':
+            # The susceptibility is deposited in the rho arrays
+            fld.erase('rho')
+            for species in self.ptcl:
+                species.deposit( fld, 'chi' )
+            fld.sum_reduce_deposition_array('rho')
+            fld.divide_by_volume('rho')
+            if exchange and self.comm.size > 1:
+                self.comm.exchange_fields(fld.interp, 'rho', 'add')
+            # Get the plasma response chi*a on the spectral grid
+            # (not filtered, and not registered in fld.exchanged_source)
+            fld.interp2spect( fieldtype )
+            return
+
         else:
             raise ValueError('Unknown fieldtype: %s' %fieldtype)
 
@@ -588,10 +744,13 @@ class Simulation(object):
             Whether to move the positions of regular particles
         """
         dt = self.dt
+        # The immobile species are not pushed
+        moving_ptcl = [ species for species in self.ptcl
+                        if not species.immobile ]
 
         # Push the particles: z[n+1/2], x[n+1/2] => z[n], x[n+1]
         if move_positions:
-            for species in self.ptcl:
+            for species in moving_ptcl:
                 species.push_x( 0.5*dt, x_push= 1., y_push= 1., z_push= -1. )
         for antenna in self.laser_antennas:
             antenna.push_x( 0.5*dt, x_push= 1., y_push= 1., z_push= -1. )
@@ -603,7 +762,7 @@ class Simulation(object):
 
         # Push the particles: z[n], x[n+1] => z[n+1], x[n]
         if move_positions:
-            for species in self.ptcl:
+            for species in moving_ptcl:
                 species.push_x(dt, x_push= -1., y_push= -1., z_push= 1.)
         for antenna in self.laser_antennas:
             antenna.push_x(dt, x_push= -1., y_push= -1., z_push= 1.)
@@ -615,7 +774,7 @@ class Simulation(object):
 
         # Push the particles: z[n+1], x[n] => z[n+1/2], x[n+1/2]
         if move_positions:
-            for species in self.ptcl:
+            for species in moving_ptcl:
                 species.push_x(0.5*dt, x_push= 1., y_push= 1., z_push= -1.)
         for antenna in self.laser_antennas:
             antenna.push_x(0.5*dt, x_push= 1., y_push= 1., z_push= -1.)
@@ -643,11 +802,114 @@ class Simulation(object):
             self.fld.interp[m].zmax += shift_distance
 
 
+    def reset( self ):
+        """
+        Bring the simulation back to its initial state (time 0, iteration 0),
+        so that it can be run again without recreating the spectral
+        transformers and the PSATD coefficients (whose calculation is the
+        most expensive part of the initialization of a `Simulation`).
+
+        More precisely:
+
+        - the fields, currents and charge density are set to zero
+        - the grid is moved back to its initial position (if it was moved
+          by the moving window or by the Galilean frame)
+        - the species regenerate the evenly-spaced macroparticles with which
+          they were initialized (species created without a density `n`,
+          e.g. the particle bunches, are emptied)
+        - the laser antennas are removed
+
+        The diagnostics, checkpoints, external fields and moving window
+        are kept. Lasers and particle bunches (e.g. from `add_laser` or
+        `add_particle_bunch`) need to be added again after calling `reset`.
+        """
+        if self.stepping_session is not None:
+            raise RuntimeError('`reset` cannot be called while a stepping '
+                               'session is open.')
+        # Reset the time and the iteration
+        self.time = 0.
+        self.iteration = 0
+
+        # Move the grid back to its initial position
+        self.comm.shift_global_domain_positions(
+            self._initial_zmin_global_domain - self.comm._zmin_global_domain )
+        zmin, zmax = self._initial_zmin_zmax
+        for m in range(self.fld.Nm):
+            self.fld.interp[m].zmin = zmin
+            self.fld.interp[m].zmax = zmax
+        if self.fld.use_envelope:
+            for m in self.fld.envelope_mode_numbers:
+                self.fld.envelope_interp[m].zmin = zmin
+                self.fld.envelope_interp[m].zmax = zmax
+        if self.comm.moving_win is not None:
+            self.comm.moving_win = MovingWindow( self.comm, self.dt,
+                                        self.comm.moving_win.v, self.time )
+
+        # Erase the fields, and regenerate the particles
+        self.fld.reset()
+        for species in self.ptcl:
+            species.reinitialize( self.comm )
+        self.laser_antennas = []
+
+    def clone( self ):
+        """
+        Return an independent copy of the simulation (fields, particles,
+        diagnostics, etc.) in its current state. This allows to run
+        several variants of a simulation from a common point (e.g. after
+        a warm-up phase), within the same Python process.
+
+        The objects that are not modified by the PIC loop (the spectral
+        transformers and, except for the envelope model, the PSATD
+        coefficients) are shared between the two simulations.
+
+        After `clone` is called, the two simulations use the same sequence
+        of random numbers (e.g. for the continuous injection), independently
+        of each other: stepping the copy gives the same result as stepping
+        the original simulation.
+
+        .. note::
+
+            The copied diagnostics write into the same directories as the
+            original ones. In order to keep the files of both simulations,
+            change the attribute `write_dir` of the diagnostics of the copy.
+
+        Returns
+        -------
+        A `Simulation` object
+        """
+        if self.stepping_session is not None:
+            raise RuntimeError('`clone` cannot be called while a stepping '
+                               'session is open.')
+        # Register the objects to be shared in the `memo` dictionary
+        # of `deepcopy` (i.e. as if they had already been copied)
+        shared = [ self.comm.mpi_comm ] + self.fld.trans
+        if not self.fld.use_envelope:
+            shared += self.fld.psatd
+        if hasattr( self.fld, 'mode_pool' ):
+            shared.append( self.fld.mode_pool )
+        if self.comm.shared_memory is not None:
+            # The exchange buffers are read directly by the neighbours
+            # of the same node: they need to remain in the shared window
+            shared += [ self.comm.shared_memory, self.comm.mpi_buffers ]
+        if self.use_cuda:
+            # Constant arrays that are always on the GPU (e.g. the kz and
+            # kr arrays, damping arrays)
+            for obj in self.fld.interp + self.fld.spect + [ self.comm ]:
+                shared += [ value for value in vars(obj).values()
+                            if cuda.is_cuda_array( value ) ]
+        memo = { id(obj): obj for obj in shared }
+
+        # Record the state of the random generator, for both simulations
+        self.random_state = np.random.get_state()
+
+        return( copy.deepcopy( self, memo ) )
+
     def add_new_species( self, q, m, n=None, dens_func=None,
                             p_nz=None, p_nr=None, p_nt=None,
                             p_zmin=-np.inf, p_zmax=np.inf,
                             p_rmin=0, p_rmax=np.inf, uz_m=0.,
-                            continuous_injection=True ):
+                            continuous_injection=True, subcycle=1,
+                            immobile=False ):
         """
         Create a new species (i.e. an instance of `Particles`) with
         charge `q` and mass `m`. Add it to the simulation (i.e. to the list
@@ -717,6 +979,23 @@ class Simulation(object):
            Whether to continuously inject the particles,
            in the case of a moving window
 
+        subcycle : int, optional
+           Number of iterations between two gathers and momentum pushes
+           of this species (with a timestep `subcycle*dt`). Using e.g.
+           `subcycle=4` for heavy ions reduces the cost of their gather and
+           push, while their charge and current are still deposited at
+           every iteration. (Ionization and Compton scattering are also
+           handled every `subcycle` iterations.)
+
+        immobile : bool, optional
+           Whether the macroparticles of this species never move (e.g.
+           for a neutralizing background of ions). They are then never
+           gathered nor pushed, and, on CPU, their charge density is cached
+           on the grid and only deposited again when macroparticles are
+           removed or injected (i.e. at the particle exchanges).
+           Not supported in boosted-frame simulations, nor with
+           ionization or Compton scattering.
+
         Returns
         -------
         new_species: an instance of the `Particles` class
@@ -764,6 +1043,10 @@ class Simulation(object):
             continuous_injection = False
             dz_particles = 0.
 
+        if immobile and (self.boost is not None):
+            raise ValueError('Immobile species cannot be used in '
+                             'boosted-frame simulations.')
+
         # Create the new species
         new_species = Particles( q=q, m=m, n=n, dens_func=dens_func,
                         Npz=Npz, zmin=p_zmin, zmax=p_zmax,
@@ -772,7 +1055,8 @@ class Simulation(object):
                         particle_shape=self.particle_shape,
                         use_cuda=self.use_cuda, grid_shape=self.grid_shape,
                         continuous_injection=continuous_injection,
-                        dz_particles=dz_particles )
+                        dz_particles=dz_particles, subcycle=subcycle,
+                        immobile=immobile )
 
         # Add it to the list of species and return it to the user
         self.ptcl.append( new_species )
@@ -809,6 +1093,150 @@ class Simulation(object):
         # Attach the moving window to the boundary communicator
         self.comm.moving_win = MovingWindow( self.comm, self.dt, v, self.time )
 
+
+class SteppingSession(object):
+    """
+    Class that prepares the PIC loop of a simulation once (fields in
+    spectral space, data on the GPU), keeps this state across several
+    calls to `Simulation.step`, and finalizes the PIC loop when closed.
+
+    A session is created by `Simulation.stepping` (or internally by
+    `Simulation.step`, for the duration of this call).
+    """
+
+    def __init__( self, sim ):
+        """
+        Prepare the PIC loop of the simulation `sim`
+
+        Parameters
+        ----------
+        sim: a Simulation object
+        """
+        self.sim = sim
+        self.closed = False
+        # List of user-defined functions, with their period (see `add_hook`)
+        self.hooks = []
+        # The first iteration exchanges the particles and redeposits
+        # rho_prev, and deposits J for the field diagnostics
+        self.exchange_pending = True
+        self.deposit_J_pending = True
+
+        # Initialize the positions for continuous injection by moving window
+        if sim.comm.moving_win is not None:
+            for species in sim.ptcl:
+                if species.continuous_injection:
+                    species.injector.initialize_injection_positions(
+                        sim.comm, sim.comm.moving_win.v, species.z, sim.dt )
+
+        # Use the random numbers of this simulation (see `clone`)
+        if sim.random_state is not None:
+            np.random.set_state( sim.random_state )
+
+        # Send simulation data to GPU (if CUDA is used)
+        if sim.use_cuda:
+            send_data_to_gpu(sim)
+
+        # Get the E and B fields in spectral space initially
+        self.update_fields()
+
+    def update_fields( self ):
+        """
+        Exchange and damp the fields E and B (and the envelope) on the
+        interpolation grid, and transform them to spectral space.
+
+        This is done when the session is opened. (In the rest of the loop,
+        E and B are only transformed from spectral space to real space,
+        but never the other way around.) Call this method again after
+        modifying the fields on the interpolation grid within the session.
+        """
+        sim = self.sim
+        fld = sim.fld
+        sim.comm.exchange_fields(fld.interp, 'E', 'replace')
+        sim.comm.exchange_fields(fld.interp, 'B', 'replace')
+        sim.comm.damp_EB_open_boundary( fld.interp )
+        fld.interp2spect('E')
+        fld.interp2spect('B')
+        if fld.use_envelope:
+            sim.comm.exchange_fields(fld.envelope_interp, 'a', 'replace')
+            sim.comm.damp_envelope_open_boundary( fld.envelope_interp )
+            fld.interp2spect('a')
+
+    def update_particles( self ):
+        """
+        Impose a particle exchange (and the deposition of the corresponding
+        charge density) at the next iteration. Call this method after
+        modifying the particles within the session.
+        """
+        self.exchange_pending = True
+
+    def add_hook( self, function, period=1 ):
+        """
+        Call `function(sim)` at the end of every `period` iterations
+        (i.e. after the checkpoints), while the session is open.
+
+        Parameters
+        ----------
+        function: callable
+            Takes the Simulation object as argument
+
+        period: int, optional
+            The function is called when the iteration number (after the
+            PIC iteration) is a multiple of `period`
+        """
+        self.hooks.append( (function, period) )
+
+    def call_hooks( self ):
+        """
+        Call the user-defined functions that are due at this iteration
+        """
+        for function, period in self.hooks:
+            if self.sim.iteration % period == 0:
+                function( self.sim )
+
+    def step( self, N=1, **kw ):
+        """
+        Perform N PIC cycles, without re-preparing the PIC loop.
+        (See `Simulation.step` for the other arguments.)
+        """
+        if self.closed:
+            raise RuntimeError('This stepping session is closed.')
+        self.sim.step( N, **kw )
+
+    def close( self ):
+        """
+        Finalize the PIC loop: bring the charge density and current back to
+        the interpolation grid and copy the data back from the GPU
+        """
+        if self.closed:
+            return
+        sim = self.sim
+        fld = sim.fld
+        # Get the charge density and the current from spectral space.
+        fld.spect2interp('J')
+        if (not fld.exchanged_source['J']) and (sim.comm.size > 1):
+            sim.comm.exchange_fields(fld.interp, 'J', 'add')
+        fld.spect2interp('rho_prev')
+        if (not fld.exchanged_source['rho_prev']) and (sim.comm.size > 1):
+            sim.comm.exchange_fields(fld.interp, 'rho', 'add')
+
+        # Receive simulation data from GPU (if CUDA is used)
+        if sim.use_cuda:
+            receive_data_from_gpu(sim)
+
+        # Record the state of the random generator (see `clone`)
+        if sim.random_state is not None:
+            sim.random_state = np.random.get_state()
+
+        self.closed = True
+        if sim.stepping_session is self:
+            sim.stepping_session = None
+
+    def __enter__( self ):
+        return( self )
+
+    def __exit__( self, exc_type, exc_value, traceback ):
+        self.close()
+
 def adapt_to_grid( x, p_xmin, p_xmax, p_nx, ncells_empty=0 ):
     """
     Adapt p_xmin and p_xmax, so that they fall exactly on the grid x
@@ -152,7 +152,8 @@ class BoostedFieldDiagnostic(FieldDiagnostic):
         else:
             # If a communicator is provided, remove guard and damp cells
             zmin_boost, zmax_boost = self.comm.get_zmin_zmax(
-                local=True, with_damp=False, with_guard=False, rank=self.rank )
+                local=True, with_damp=False, with_guard=False,
+                rank=self.comm.rank )
 
         # Extract the current time in the boosted frame
         time = iteration * self.fld.dt
@@ -247,16 +248,16 @@ class BoostedFieldDiagnostic(FieldDiagnostic):
         global_izmin, global_izmax: the indices at which the global_field_array
            should be written (or None)
         """
-        # Gather objects into lists (one element per proc)
+        # Gather objects into lists (one element per proc), in a single
+        # MPI call for the field arrays and their indices.
         # Note: this is slow, as it uses the generic mpi4py routines gather.
         # (This is because for some proc field_array can be None.)
         mpi_comm = self.comm.mpi_comm
-        field_array_list = mpi_comm.gather( field_array )
-        iz_min_list = mpi_comm.gather( iz_min )
-        iz_max_list = mpi_comm.gather( iz_max )
+        gathered_list = mpi_comm.gather( (field_array, iz_min, iz_max) )
 
         # First proc: merge the results
         if self.rank == 0:
+            field_array_list, iz_min_list, iz_max_list = zip( *gathered_list )
 
             # Check whether any processor had some slices
             no_slices = True
@@ -15,6 +15,7 @@ import math
 import numpy as np
 from scipy.constants import c, e
 from .particle_diag import ParticleDiagnostic
+from .numba_methods import sort_particles_by_z_numba
 
 # Check if CUDA is available, then import CUDA functions
 from fbpic.utils.cuda import cuda_installed
@@ -27,8 +28,10 @@ class BoostedParticleDiagnostic(ParticleDiagnostic):
     from a simulation in the boosted frame
 
     Particles are extracted from the simulation in slices each time step
-    and buffered in memory before writing to disk. On the CPU, slices of
-    particles are directly selected from the particle arrays of the species.
+    and buffered in memory before writing to disk. On the CPU, the particles
+    of each species are sorted by longitudinal cell once per time step, and
+    slices of particles are selected among the particles of the cells that
+    surround the output planes.
     On the GPU, first particles within an area of cells surrounding the
     output planes are extracted from the GPU particle arrays and stored in
     a smaller GPU array, which is then copied to the CPU for selection.
@@ -183,36 +186,51 @@ class BoostedParticleDiagnostic(ParticleDiagnostic):
         Writes the buffered slices of particles to the disk. Erase the
         buffered slices of the LabSnapshot objects
         """
-        # Loop through the labsnapshots and flush the data
-        for snapshot in self.snapshots:
-
-            # Compact the successive slices that have been buffered
-            # over time into a single array
-            for species_name in self.species_names_list:
-
-                # Get list of quantities to be written to file
-                quantities_in_file = self.array_quantities_dict[species_name]
-
-                # Compact the slices in a single array (on each proc)
-                local_particle_dict = snapshot.compact_slices(species_name,
-                                    quantities_in_file )
-
-                # Gather the slices on the first proc
-                if self.comm is not None and self.comm.size > 1:
-                    particle_dict = self.gather_particle_arrays(
-                        local_particle_dict, quantities_in_file )
-                else:
-                    particle_dict = local_particle_dict
-
-                # The first proc writes this array to disk
-                # (if this snapshot has new slices)
-                if self.rank==0:
-                    self.write_slices( particle_dict, species_name, snapshot )
+        pairs = [ (snapshot, species_name) for snapshot in self.snapshots
+                  for species_name in self.species_names_list ]
+
+        # Start gathering the numbers of buffered particles of all the
+        # snapshots and species, in a single non-blocking MPI call
+        request = None
+        if self.comm is not None and self.comm.size > 1:
+            request, n_particles = self.comm.start_allgather_counts([
+                snapshot.count_buffered_particles( species_name,
+                    self.array_quantities_dict[species_name][0] )
+                for snapshot, species_name in pairs ])
+
+        # In the meantime, compact the successive slices that have been
+        # buffered over time into a single array (on each proc), for each
+        # snapshot and species, and erase the buffered slices
+        local_dicts = []
+        for snapshot, species_name in pairs:
+            # Get list of quantities to be written to file
+            quantities_in_file = self.array_quantities_dict[species_name]
+            local_dicts.append( snapshot.compact_slices( species_name,
+                                quantities_in_file ) )
+            snapshot.buffered_slices[species_name] = []
+
+        # Wait for the numbers of particles of the other procs
+        if request is not None:
+            request.Wait()
+
+        # Loop through the labsnapshots and species and flush the data
+        for i, (snapshot, species_name) in enumerate( pairs ):
+            quantities_in_file = self.array_quantities_dict[species_name]
+
+            # Gather the slices on the first proc
+            if self.comm is not None and self.comm.size > 1:
+                particle_dict = self.gather_particle_arrays( local_dicts[i],
+                    quantities_in_file, [ int(n) for n in n_particles[:,i] ] )
+            else:
+                particle_dict = local_dicts[i]
 
-                # Erase the previous slices
-                snapshot.buffered_slices[species_name] = []
+            # The first proc writes this array to disk
+            # (if this snapshot has new slices)
+            if self.rank==0:
+                self.write_slices( particle_dict, species_name, snapshot )
 
-    def gather_particle_arrays( self, local_dict, quantities_in_file ):
+    def gather_particle_arrays( self, local_dict, quantities_in_file,
+                                n_particles_list ):
         """
         Gather the compacted arrays of particle slices, on the proc `root`
 
@@ -223,16 +241,14 @@ class BoostedParticleDiagnostic(ParticleDiagnostic):
         quantities_in_file: list of strings
             The quantities that will be written into the openPMD
             file, for this species.
+        n_particles_list: list of ints
+            The number of particles on each MPI rank
 
         Returns:
         --------
         gathered_dict: A dictionary of 1d arrays of shape (n_particles_total,)
         (None is returned on all other processors than root.)
         """
-        # Send the local number of particles to all procs
-        n_particles_local = len( local_dict[ quantities_in_file[0] ] )
-        n_particles_list = self.comm.mpi_comm.allgather( n_particles_local )
-
         # Prepare the send and receive buffers
         gathered_dict = {}
         n_particles_tot = sum( n_particles_list )
@@ -485,6 +501,14 @@ class LabSnapshot:
         # Store the values
         self.buffered_slices[species].append(slice_data_dict)
 
+    def count_buffered_particles( self, species, quantity ):
+        """
+        Return the number of particles in the buffered slices of `species`
+        (i.e. the sum of the lengths of the arrays of `quantity`)
+        """
+        return( sum( len( slice_dict[quantity] )
+                     for slice_dict in self.buffered_slices[species] ) )
+
     def compact_slices( self, species, quantities_in_file ):
         """
         Compact the successive slices that have been buffered
@@ -550,6 +574,11 @@ class ParticleCatcher:
         self.fld = fldobject
         self.dt = self.fld.dt
 
+        # Particles sorted by longitudinal cell, on CPU (one entry per
+        # species, recalculated at each time step ; see `get_z_index`)
+        self.z_index = {}
+        self.z_index_time = None
+
     def extract_slice( self, species, current_z_boost, previous_z_boost,
                        t, select=None ):
         """
@@ -641,16 +670,34 @@ class ParticleCatcher:
         """
         # CPU
         if species.use_cuda is False:
+            # Find the cells in which the particles that crossed the output
+            # plane can be (they moved by at most c*dt during the last
+            # iteration ; one cell is added on each side for safety)
+            cell_start, sorted_idx = self.get_z_index( species, t )
+            dz = self.fld.interp[0].dz
+            zmin = self.fld.interp[0].zmin
+            Nz = self.fld.interp[0].Nz
+            z_low = min( current_z_boost, previous_z_boost ) - c*self.dt
+            z_high = max( current_z_boost, previous_z_boost ) + c*self.dt
+            iz_min = min( max( math.floor((z_low-zmin)/dz) - 1, 0 ), Nz-1 )
+            iz_max = min( max( math.floor((z_high-zmin)/dz) + 1, 0 ), Nz-1 )
+            # Get the indices of the particles in these cells
+            # (in increasing order, i.e. in the order of the species arrays)
+            selected = np.sort(
+                sorted_idx[ cell_start[iz_min]:cell_start[iz_max+1] ] )
             # Create a dictionary containing the particle attributes
             particle_data = {
-                'x': species.x, 'y': species.y, 'z': species.z,
-                'ux': species.ux, 'uy' : species.uy, 'uz': species.uz,
-                'w': species.w, 'inv_gamma': species.inv_gamma }
+                'x': species.x[selected], 'y': species.y[selected],
+                'z': species.z[selected], 'ux': species.ux[selected],
+                'uy' : species.uy[selected], 'uz': species.uz[selected],
+                'w': species.w[selected],
+                'inv_gamma': species.inv_gamma[selected] }
             # Optional integer quantities
             if species.ionizer is not None:
-                particle_data['charge'] = species.ionizer.ionization_level
+                particle_data['charge'] = \
+                    species.ionizer.ionization_level[selected]
             if species.tracker is not None:
-                particle_data['id'] = species.tracker.id
+                particle_data['id'] = species.tracker.id[selected]
         # GPU
         else:
             # Check if particles are sorted, otherwise sort them
@@ -706,6 +753,41 @@ class ParticleCatcher:
 
         return( particle_data )
 
+    def get_z_index( self, species, t ):
+        """
+        Return the indices of the particles of `species`, sorted by
+        longitudinal cell of the interpolation grid, along with the index
+        of the first particle of each cell (see `sort_particles_by_z_numba`).
+
+        The sorting is only performed for the first snapshot that needs
+        it at a given time step, and reused for the other snapshots.
+
+        Parameters
+        ----------
+        species : A ParticleObject
+            Contains the particle attributes to output
+        t : float (s)
+            Current time of the simulation in the boosted frame
+
+        Returns
+        -------
+        cell_start : 1darray of ints (one element per cell, plus one)
+        sorted_idx : 1darray of ints (one element per macroparticle)
+        """
+        # Discard the sorting of the previous time step
+        if t != self.z_index_time:
+            self.z_index = {}
+            self.z_index_time = t
+        # Sort the particles
+        if id(species) not in self.z_index:
+            grid = self.fld.interp[0]
+            cell_start = np.empty( grid.Nz+1, dtype=np.int64 )
+            sorted_idx = np.empty( species.Ntot, dtype=np.int64 )
+            sort_particles_by_z_numba( species.z, grid.zmin, grid.invdz,
+                                       grid.Nz, cell_start, sorted_idx )
+            self.z_index[ id(species) ] = ( cell_start, sorted_idx )
+        return( self.z_index[ id(species) ] )
+
     def get_particle_slice( self, particle_data, current_z_boost,
                              previous_z_boost ):
         """
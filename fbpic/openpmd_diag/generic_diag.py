@@ -50,8 +50,14 @@ class OpenPMDDiagnostic(object) :
             (`iteration_min` is inclusive, `iteration_max` is exclusive)
         """
         # Get the rank of this processor
+        # (With a decomposition of the azimuthal modes, the procs of the
+        # other mode groups hold the same data as the first group: they
+        # take part in the gathering of the data, but do not write it.
+        # Their rank is thus set to None.)
         if comm is not None :
             self.rank = comm.rank
+            if comm.mode_rank != 0:
+                self.rank = None
         else :
             self.rank = 0
 
@@ -0,0 +1,53 @@
+# Copyright 2016, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This files contains numba methods that are used in the boosted-frame
+diagnostics on the CPU
+"""
+import numba
+
+@numba.njit
+def sort_particles_by_z_numba( z, zmin, invdz, Nz, cell_start, sorted_idx ):
+    """
+    Sort the indices of the particles by longitudinal cell (counting sort),
+    so that the particles of the cells iz_min to iz_max are
+    `sorted_idx[ cell_start[iz_min] : cell_start[iz_max+1] ]`.
+    (The particles that are outside of the grid are counted in the
+    first and last cell.)
+
+    Parameters
+    ----------
+    z: 1darray of floats
+        The longitudinal positions of the particles (one per macroparticle)
+
+    zmin, invdz: floats
+        The left boundary of the grid, and the inverse of the cell size
+
+    Nz: int
+        The number of cells in z
+
+    cell_start: 1darray of ints, of size Nz+1
+        Array where the index of the first particle of each cell is stored
+        (with the total number of particles as last element)
+
+    sorted_idx: 1darray of ints, of the same size as z
+        Array where the indices of the sorted particles are stored
+    """
+    Ntot = z.shape[0]
+    # Count the particles in each cell
+    cell_start[:] = 0
+    for i in range( Ntot ):
+        cell_idx = int( (z[i] - zmin)*invdz )
+        cell_idx = min( max( cell_idx, 0 ), Nz-1 )
+        cell_start[cell_idx+1] += 1
+    # Get the index of the first particle of each cell
+    for iz in range( Nz ):
+        cell_start[iz+1] += cell_start[iz]
+    # Sort the particles (the particles of each cell keep their order)
+    position = cell_start[:-1].copy()
+    for i in range( Ntot ):
+        cell_idx = int( (z[i] - zmin)*invdz )
+        cell_idx = min( max( cell_idx, 0 ), Nz-1 )
+        sorted_idx[ position[cell_idx] ] = i
+        position[cell_idx] += 1
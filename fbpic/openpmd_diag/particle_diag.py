@@ -201,6 +201,18 @@ class ParticleDiagnostic(OpenPMDDiagnostic) :
             if species.use_cuda :
                 species.receive_particles_from_gpu()
 
+        # Select the particles that will be written, for each species, and
+        # start gathering their numbers from all procs (in a single,
+        # non-blocking MPI call for all species)
+        species_names = [ species_name for species_name in
+            self.species_names_list
+            if self.species_dict[species_name] is not None ]
+        select_arrays = [ self.apply_selection( self.species_dict[name] )
+                          for name in species_names ]
+        n_local = [ select_array.sum() for select_array in select_arrays ]
+        if self.comm is not None:
+            request, n_all_ranks = self.comm.start_allgather_counts( n_local )
+
         # Create the file and setup the openPMD structure (only first proc)
         if self.rank == 0:
             filename = "data%08d.h5" %iteration
@@ -210,15 +222,14 @@ class ParticleDiagnostic(OpenPMDDiagnostic) :
             # Setup its attributes
             self.setup_openpmd_file( f, iteration, iteration*self.dt, self.dt)
 
+        # Wait for the numbers of particles of the other procs
+        if self.comm is not None and request is not None:
+            request.Wait()
+
         # Loop over the different species and
         # particle quantities that should be written
-        for species_name in self.species_names_list:
-
-            # Check if the species exists
+        for i_species, species_name in enumerate( species_names ):
             species = self.species_dict[species_name]
-            if species is None :
-                # If not, immediately go to the next species_name
-                continue
 
             # Setup the species group (only first proc)
             if self.rank==0:
@@ -231,21 +242,16 @@ class ParticleDiagnostic(OpenPMDDiagnostic) :
             else:
                 species_grp = None
 
-            # Select the particles that will be written
-            select_array = self.apply_selection( species )
-            # Get their total number
-            n = select_array.sum()
+            # Get the particles that will be written, and their total number
+            select_array = select_arrays[i_species]
             if self.comm is not None:
                 # Multi-proc output
-                if self.comm.size > 1:
-                    n_rank = self.comm.mpi_comm.allgather(n)
-                else:
-                    n_rank = [n]
+                n_rank = [ int(n) for n in n_all_ranks[:, i_species] ]
                 Ntot = sum(n_rank)
             else:
                 # Single-proc output
                 n_rank = None
-                Ntot = n
+                Ntot = n_local[i_species]
 
             # Write the datasets for each particle datatype
             self.write_particles( species_grp, species, n_rank,
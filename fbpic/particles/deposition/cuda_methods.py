@@ -1301,3 +1301,31 @@ def deposit_J_gpu_cubic(x, y, z, w, q,
             cuda.atomic.add(j_z_m1.imag, (iz3, ir2), J_z_m1_23.imag)
             cuda.atomic.add(j_z_m1.real, (iz3, ir3), J_z_m1_33.real)
             cuda.atomic.add(j_z_m1.imag, (iz3, ir3), J_z_m1_33.imag)
+
+# -----------------------------------------------------------------------
+# Weights for the deposition of the plasma susceptibility (envelope model)
+# -----------------------------------------------------------------------
+
+@cuda.jit
+def get_chi_weight_gpu( w, inv_gamma, chi_const, chi_weight, Ntot ):
+    """
+    Compute the weights with which the plasma susceptibility is deposited
+    (using the charge deposition kernels) i.e. w*inv_gamma*chi_const
+
+    Parameters
+    ----------
+    w, inv_gamma: 1darrays of floats
+        The weights and inverse Lorentz factor of the particles
+
+    chi_const: float
+        The constant q/(m*epsilon_0) of the species
+
+    chi_weight: 1darray of floats
+        The deposition weights (is modified by this function)
+
+    Ntot: int
+        The total number of particles
+    """
+    ip = cuda.grid(1)
+    if ip < Ntot:
+        chi_weight[ip] = w[ip]*inv_gamma[ip]*chi_const
@@ -0,0 +1,347 @@
+# Copyright 2016, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen, Kevin Peters
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines the deposition methods for rho and J for linear and cubic
+order shapes on the GPU using CUDA, for an arbitrary number of
+azimuthal modes.
+
+The fields of the different modes are passed as tuples of 2darrays
+(one element per mode), and all the modes are deposited in a single
+sweep over the particles. Since the per-thread registers depend on the
+number of modes, the kernels are generated (and cached) for each
+number of modes and each particle shape, by the functions
+`get_deposit_rho_gpu_multi_mode` and `get_deposit_J_gpu_multi_mode`.
+"""
+from numba import cuda, float64, complex128
+import math
+from scipy.constants import c
+import numpy as np
+from .cuda_methods import r_shape_linear, z_shape_linear, \
+    r_shape_cubic, z_shape_cubic
+
+# Cache of the compiled kernels, indexed by (Nm, particle_shape)
+_deposit_rho_kernels = {}
+_deposit_J_kernels = {}
+
+def get_deposit_rho_gpu_multi_mode( Nm, particle_shape ):
+    """
+    Return the CUDA kernel that deposits rho for `Nm` azimuthal modes,
+    with the shape `particle_shape` ('linear' or 'cubic')
+
+    The kernel is called with the arguments:
+    (x, y, z, w, q, invdz, zmin, Nz, invdr, rmin, Nr,
+    rho, cell_idx, prefix_sum), where `rho` is a tuple of `Nm`
+    2darrays of complexs (see `deposit_rho_gpu_linear` for the
+    meaning of the other arguments)
+    """
+    key = (Nm, particle_shape)
+    if key not in _deposit_rho_kernels:
+        _deposit_rho_kernels[key] = \
+            generate_deposit_rho_gpu_multi_mode( Nm, particle_shape )
+    return( _deposit_rho_kernels[key] )
+
+def get_deposit_J_gpu_multi_mode( Nm, particle_shape ):
+    """
+    Return the CUDA kernel that deposits J for `Nm` azimuthal modes,
+    with the shape `particle_shape` ('linear' or 'cubic')
+
+    The kernel is called with the arguments:
+    (x, y, z, w, q, ux, uy, uz, inv_gamma, invdz, zmin, Nz,
+    invdr, rmin, Nr, j_r, j_t, j_z, cell_idx, prefix_sum), where
+    `j_r`, `j_t` and `j_z` are tuples of `Nm` 2darrays of complexs
+    (see `deposit_J_gpu_linear` for the meaning of the other arguments)
+    """
+    key = (Nm, particle_shape)
+    if key not in _deposit_J_kernels:
+        _deposit_J_kernels[key] = \
+            generate_deposit_J_gpu_multi_mode( Nm, particle_shape )
+    return( _deposit_J_kernels[key] )
+
+def get_shape_functions( particle_shape ):
+    """
+    Return the number of cells (along each direction) to which each
+    macroparticle deposits, and the corresponding shape factor functions
+    """
+    if particle_shape == 'linear':
+        return( 2, r_shape_linear, z_shape_linear )
+    elif particle_shape == 'cubic':
+        return( 4, r_shape_cubic, z_shape_cubic )
+    else:
+        raise ValueError("`particle_shape` should be either \
+                          'linear' or 'cubic' \
+                           but is `%s`" % particle_shape)
+
+# -------------------------------
+# Field deposition - rho
+# -------------------------------
+
+def generate_deposit_rho_gpu_multi_mode( Nm, particle_shape ):
+    """
+    Compile the CUDA kernel that deposits rho for `Nm` azimuthal modes,
+    with the shape `particle_shape` ('linear' or 'cubic')
+    """
+    n_shape, r_shape, z_shape = get_shape_functions( particle_shape )
+    i_offset = n_shape//2
+
+    @cuda.jit
+    def deposit_rho_gpu_multi_mode(x, y, z, w, q,
+                                   invdz, zmin, Nz,
+                                   invdr, rmin, Nr,
+                                   rho, cell_idx, prefix_sum):
+        """
+        Deposition of the charge density rho using numba on the GPU.
+        Iterates over the cells and over the particles per cell.
+        Calculates the weighted amount of rho that is deposited to the
+        cells surounding the particle based on its shape, for all
+        the azimuthal modes at once.
+
+        Parameters
+        ----------
+        rho: tuple of 2darrays of complexs
+            The charge density on the interpolation grid
+            (one element per mode; is modified by this function)
+
+        (See `deposit_rho_gpu_linear` for the other parameters)
+        """
+        # Get the 1D CUDA grid
+        i = cuda.grid(1)
+        # Deposit the field per cell in parallel
+        # (for threads < number of cells)
+        if i < prefix_sum.shape[0]:
+            # Retrieve index of upper grid point (in z and r) from
+            # prefix-sum index (See `get_cell_idx_per_particle`)
+            iz_upper = int( i / (Nr+1) )
+            ir_upper = int( i - iz_upper * (Nr+1) )
+            # Calculate the inclusive offset for the current cell
+            incl_offset = np.int32(prefix_sum[i])
+            # Calculate the frequency per cell from the offset and the
+            # previous offset (prefix_sum[i-1]).
+            if i > 0:
+                frequency_per_cell = np.int32(incl_offset - prefix_sum[i-1])
+            if i == 0:
+                frequency_per_cell = np.int32(incl_offset)
+
+            # Declare the local field values, for all modes
+            # and all possible deposition directions
+            R = cuda.local.array( (Nm, n_shape, n_shape), dtype=complex128 )
+            for m in range(Nm):
+                for index_r in range(n_shape):
+                    for index_z in range(n_shape):
+                        R[m, index_r, index_z] = 0.
+            Sr = cuda.local.array( (n_shape,), dtype=float64 )
+            Sz = cuda.local.array( (n_shape,), dtype=float64 )
+
+            for j in range(frequency_per_cell):
+                # Get the particle index before the sorting
+                ptcl_idx = incl_offset-1-j
+
+                # Preliminary arrays for the cylindrical conversion
+                xj = x[ptcl_idx]
+                yj = y[ptcl_idx]
+                zj = z[ptcl_idx]
+                wj = q * w[ptcl_idx]
+
+                # Cylindrical conversion
+                rj = math.sqrt(xj**2 + yj**2)
+                # Avoid division by 0.
+                if (rj != 0.):
+                    invr = 1./rj
+                    cos = xj*invr  # Cosine
+                    sin = yj*invr  # Sine
+                else:
+                    cos = 1.
+                    sin = 0.
+                exptheta_1 = cos + 1.j*sin
+
+                # Positions of the particles, in the cell unit
+                r_cell = invdr*(rj - rmin) - 0.5
+                z_cell = invdz*(zj - zmin) - 0.5
+                # Shape factors (shared by all the modes)
+                for index in range(n_shape):
+                    Sr[index] = r_shape(r_cell, index)
+                    Sz[index] = z_shape(z_cell, index)
+
+                # Calculate rho, for all the modes
+                R_scal = wj + 0.j
+                for m in range(Nm):
+                    for index_r in range(n_shape):
+                        for index_z in range(n_shape):
+                            R[m, index_r, index_z] += \
+                                Sr[index_r]*Sz[index_z]*R_scal
+                    R_scal *= exptheta_1
+
+            # Atomically add the registers to global memory
+            if frequency_per_cell > 0:
+                for index_r in range(n_shape):
+                    # Calculate radial index at which to add charge
+                    ir = ir_upper - i_offset + index_r
+                    if ir < 0:
+                        # Deposition below the axis: fold index
+                        ir = -(1 + ir)
+                    ir = min( ir, Nr-1 )
+                    for index_z in range(n_shape):
+                        # Calculate longitudinal index at which to add charge
+                        iz = iz_upper - i_offset + index_z
+                        if iz < 0:
+                            iz += Nz
+                        if iz > Nz-1:
+                            iz -= Nz
+                        for m in range(Nm):
+                            cuda.atomic.add( rho[m].real, (iz, ir),
+                                        R[m, index_r, index_z].real )
+                            if m > 0:
+                                cuda.atomic.add( rho[m].imag, (iz, ir),
+                                        R[m, index_r, index_z].imag )
+
+    return( deposit_rho_gpu_multi_mode )
+
+# -------------------------------
+# Field deposition - J
+# -------------------------------
+
+def generate_deposit_J_gpu_multi_mode( Nm, particle_shape ):
+    """
+    Compile the CUDA kernel that deposits J for `Nm` azimuthal modes,
+    with the shape `particle_shape` ('linear' or 'cubic')
+    """
+    n_shape, r_shape, z_shape = get_shape_functions( particle_shape )
+    i_offset = n_shape//2
+
+    @cuda.jit
+    def deposit_J_gpu_multi_mode(x, y, z, w, q,
+                                 ux, uy, uz, inv_gamma,
+                                 invdz, zmin, Nz,
+                                 invdr, rmin, Nr,
+                                 j_r, j_t, j_z,
+                                 cell_idx, prefix_sum):
+        """
+        Deposition of the current J using numba on the GPU.
+        Iterates over the cells and over the particles per cell.
+        Calculates the weighted amount of J that is deposited to the
+        cells surounding the particle based on its shape, for all
+        the azimuthal modes at once.
+
+        Parameters
+        ----------
+        j_r, j_t, j_z: tuples of 2darrays of complexs
+            The current component in each direction (r, t, z)
+            on the interpolation grid
+            (one element per mode; is modified by this function)
+
+        (See `deposit_J_gpu_linear` for the other parameters)
+        """
+        # Get the 1D CUDA grid
+        i = cuda.grid(1)
+        # Deposit the field per cell in parallel
+        # (for threads < number of cells)
+        if i < prefix_sum.shape[0]:
+            # Retrieve index of upper grid point (in z and r) from
+            # prefix-sum index (See `get_cell_idx_per_particle`)
+            iz_upper = int( i / (Nr+1) )
+            ir_upper = int( i - iz_upper * (Nr+1) )
+            # Calculate the inclusive offset for the current cell
+            incl_offset = np.int32(prefix_sum[i])
+            # Calculate the frequency per cell from the offset and the
+            # previous offset (prefix_sum[i-1]).
+            if i > 0:
+                frequency_per_cell = np.int32(incl_offset - prefix_sum[i-1])
+            if i == 0:
+                frequency_per_cell = np.int32(incl_offset)
+
+            # Declare the local field values, for all modes
+            # and all possible deposition directions
+            J_r = cuda.local.array( (Nm, n_shape, n_shape), dtype=complex128 )
+            J_t = cuda.local.array( (Nm, n_shape, n_shape), dtype=complex128 )
+            J_z = cuda.local.array( (Nm, n_shape, n_shape), dtype=complex128 )
+            for m in range(Nm):
+                for index_r in range(n_shape):
+                    for index_z in range(n_shape):
+                        J_r[m, index_r, index_z] = 0.
+                        J_t[m, index_r, index_z] = 0.
+                        J_z[m, index_r, index_z] = 0.
+            Sr = cuda.local.array( (n_shape,), dtype=float64 )
+            Sz = cuda.local.array( (n_shape,), dtype=float64 )
+
+            for j in range(frequency_per_cell):
+                # Get the particle index before the sorting
+                ptcl_idx = incl_offset-1-j
+
+                # Preliminary arrays for the cylindrical conversion
+                xj = x[ptcl_idx]
+                yj = y[ptcl_idx]
+                zj = z[ptcl_idx]
+                uxj = ux[ptcl_idx]
+                uyj = uy[ptcl_idx]
+                uzj = uz[ptcl_idx]
+                inv_gammaj = inv_gamma[ptcl_idx]
+                wj = q * w[ptcl_idx]
+
+                # Cylindrical conversion
+                rj = math.sqrt(xj**2 + yj**2)
+                # Avoid division by 0.
+                if (rj != 0.):
+                    invr = 1./rj
+                    cos = xj*invr  # Cosine
+                    sin = yj*invr  # Sine
+                else:
+                    cos = 1.
+                    sin = 0.
+                exptheta_1 = cos + 1.j*sin
+
+                # Positions of the particles, in the cell unit
+                r_cell = invdr*(rj - rmin) - 0.5
+                z_cell = invdz*(zj - zmin) - 0.5
+                # Shape factors (shared by all the modes)
+                for index in range(n_shape):
+                    Sr[index] = r_shape(r_cell, index)
+                    Sz[index] = z_shape(z_cell, index)
+
+                # Calculate the currents, for all the modes
+                J_r_scal = wj * c * inv_gammaj*(cos*uxj + sin*uyj) + 0.j
+                J_t_scal = wj * c * inv_gammaj*(cos*uyj - sin*uxj) + 0.j
+                J_z_scal = wj * c * inv_gammaj*uzj + 0.j
+                for m in range(Nm):
+                    for index_r in range(n_shape):
+                        for index_z in range(n_shape):
+                            S = Sr[index_r]*Sz[index_z]
+                            J_r[m, index_r, index_z] += S*J_r_scal
+                            J_t[m, index_r, index_z] += S*J_t_scal
+                            J_z[m, index_r, index_z] += S*J_z_scal
+                    J_r_scal *= exptheta_1
+                    J_t_scal *= exptheta_1
+                    J_z_scal *= exptheta_1
+
+            # Atomically add the registers to global memory
+            if frequency_per_cell > 0:
+                for index_r in range(n_shape):
+                    # Calculate radial index at which to add current
+                    ir = ir_upper - i_offset + index_r
+                    if ir < 0:
+                        # Deposition below the axis: fold index
+                        ir = -(1 + ir)
+                    ir = min( ir, Nr-1 )
+                    for index_z in range(n_shape):
+                        # Calculate longitudinal index at which to add current
+                        iz = iz_upper - i_offset + index_z
+                        if iz < 0:
+                            iz += Nz
+                        if iz > Nz-1:
+                            iz -= Nz
+                        for m in range(Nm):
+                            cuda.atomic.add( j_r[m].real, (iz, ir),
+                                        J_r[m, index_r, index_z].real )
+                            cuda.atomic.add( j_t[m].real, (iz, ir),
+                                        J_t[m, index_r, index_z].real )
+                            cuda.atomic.add( j_z[m].real, (iz, ir),
+                                        J_z[m, index_r, index_z].real )
+                            if m > 0:
+                                cuda.atomic.add( j_r[m].imag, (iz, ir),
+                                        J_r[m, index_r, index_z].imag )
+                                cuda.atomic.add( j_t[m].imag, (iz, ir),
+                                        J_t[m, index_r, index_z].imag )
+                                cuda.atomic.add( j_z[m].imag, (iz, ir),
+                                        J_z[m, index_r, index_z].imag )
+
+    return( deposit_J_gpu_multi_mode )
@@ -11,7 +11,7 @@ from scipy.constants import c, h
 from .numba_methods import get_photon_density_gaussian_numba, \
     determine_scatterings_numba, scatter_photons_electrons_numba
 from ..cuda_numba_utils import allocate_empty, reallocate_and_copy_old, \
-                                perform_cumsum, generate_new_ids
+                                perform_cumsum, generate_new_ids, get_random_key
 # Check if CUDA is available, then import CUDA functions
 from fbpic.utils.cuda import cuda_installed
 from fbpic.utils.printing import catch_gpu_memory_error
@@ -54,7 +54,7 @@ class ComptonScatterer(object):
     """
     def __init__( self, source_species, target_species, laser_energy,
         laser_wavelength, laser_waist, laser_ctau, laser_initial_z0,
-        ratio_w_electron_photon, boost ):
+        ratio_w_electron_photon, boost, random_seed=None ):
         """
         Initialize Compton scattering.
 
@@ -85,6 +85,12 @@ class ComptonScatterer(object):
             weight of the photon macroparticles that it will emit.
             Increasing this ratio increases the number of photon macroparticles
             that will be emitted and therefore improves statistics.
+
+        random_seed: int, optional
+            The seed of the (counter-based) random number generator, used
+            on CPU. For a given seed, the result of the scattering is
+            reproducible, independently of the number of threads.
+            If None, the seed is drawn from numpy's global random generator.
         """
         # Register the photons species
         assert target_species.q == 0
@@ -133,9 +139,14 @@ class ComptonScatterer(object):
         # Register a few other parameters
         self.batch_size = 10
         self.use_cuda = source_species.use_cuda
+        # Register the seed and the counter of the random number generator
+        if random_seed is None:
+            random_seed = np.random.randint( 2**31 )
+        self.random_seed = random_seed
+        self.random_counter = 0
 
     @catch_gpu_memory_error
-    def handle_scattering( self, elec, t ):
+    def handle_scattering( self, elec, t, rank=0 ):
         """
         Handle Compton scattering, either on CPU or GPU
 
@@ -150,6 +161,10 @@ class ComptonScatterer(object):
 
         t: float
             The simulation time
+
+        rank: int, optional
+            The rank of the local proc in the domain decomposition
+            (used in the key of the random numbers)
         """
         # Process particles in batches (of typically 10, 20 particles)
         N_batch = int( elec.Ntot / self.batch_size ) + 1
@@ -164,6 +179,10 @@ class ComptonScatterer(object):
         if self.use_cuda:
             seed = np.random.randint( 256 )
             random_states = create_xoroshiro128p_states( N_batch, seed )
+        else:
+            random_key = get_random_key( self.random_seed,
+                                         self.random_counter, rank )
+            self.random_counter += 1
 
 
         # For each electron, calculate the local density of photons
@@ -181,20 +200,22 @@ class ComptonScatterer(object):
                 self.laser_initial_z0, self.gamma_boost, self.beta_boost  )
 
         # Determine the electrons that scatter, and count them in each batch
+        # (Scattering is handled once every `subcycle` iterations)
+        dt = elec.subcycle * elec.dt
         # (one thread per batch on GPU; parallel loop over batches on CPU)
         if use_cuda:
             batch_grid_1d, batch_block_1d = cuda_tpb_bpg_1d( N_batch )
             determine_scatterings_cuda[ batch_grid_1d, batch_block_1d ](
                 N_batch, self.batch_size, elec.Ntot,
                 nscatter_per_elec, nscatter_per_batch, random_states,
-                elec.dt, elec.ux, elec.uy, elec.uz, elec.inv_gamma,
+                dt, elec.ux, elec.uy, elec.uz, elec.inv_gamma,
                 self.ratio_w_electron_photon, photon_n, self.photon_p,
                 self.photon_beta_x, self.photon_beta_y, self.photon_beta_z )
         else:
             determine_scatterings_numba(
                 N_batch, self.batch_size, elec.Ntot,
-                nscatter_per_elec, nscatter_per_batch,
-                elec.dt, elec.ux, elec.uy, elec.uz, elec.inv_gamma,
+                nscatter_per_elec, nscatter_per_batch, random_key,
+                dt, elec.ux, elec.uy, elec.uz, elec.inv_gamma,
                 self.ratio_w_electron_photon, photon_n, self.photon_p,
                 self.photon_beta_x, self.photon_beta_y, self.photon_beta_z )
 
@@ -231,7 +252,7 @@ class ComptonScatterer(object):
         else:
             scatter_photons_electrons_numba(
                 N_batch, self.batch_size, old_Ntot, elec.Ntot,
-                cumul_nscatter_per_batch, nscatter_per_elec,
+                cumul_nscatter_per_batch, nscatter_per_elec, random_key,
                 self.photon_p, self.photon_px, self.photon_py, self.photon_pz,
                 photons.x, photons.y, photons.z, photons.inv_gamma,
                 photons.ux, photons.uy, photons.uz, photons.w,
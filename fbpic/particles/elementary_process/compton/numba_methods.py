@@ -6,13 +6,15 @@ This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
 It defines numba methods that are used in Compton scattering (on CPU).
 """
 import numba
-import math, random
+import math
 from fbpic.utils.threading import njit_parallel, prange
 # Import the inline functions
 from .inline_functions import lorentz_transform, get_scattering_probability, \
     get_photon_density_gaussian, INV_MC
+from ..inline_functions import random_uniform
 # Compile the inline functions for CPU
 lorentz_transform = numba.njit( lorentz_transform )
+random_uniform = numba.njit( random_uniform )
 get_scattering_probability = numba.njit( get_scattering_probability )
 get_photon_density_gaussian = numba.njit( get_photon_density_gaussian )
 
@@ -52,16 +54,16 @@ def get_photon_density_gaussian_numba( photon_n, elec_Ntot,
 
 @njit_parallel
 def determine_scatterings_numba( N_batch, batch_size, elec_Ntot,
-    nscatter_per_elec, nscatter_per_batch, dt,
+    nscatter_per_elec, nscatter_per_batch, random_key, dt,
     elec_ux, elec_uy, elec_uz, elec_inv_gamma, ratio_w_electron_photon,
     photon_n, photon_p, photon_beta_x, photon_beta_y, photon_beta_z ):
     """
     For each electron macroparticle, decide how many photon macroparticles
     it will emit during `dt`, using the integrated Klein-Nishina formula.
 
-    Note: this function uses a random generator within a `prange` loop.
-    This implies that an indenpendent seed and random generator will be
-    created for each thread.
+    Note: this function uses a counter-based random generator (with key
+    `random_key`) within a `prange` loop. The random numbers depend
+    only on the index of the electron, and not on the number of threads.
 
     Electrons are processed in batches of size `batch_size`, with a parallel
     loop over batches. The batching allows quicker calculation of the
@@ -89,7 +91,8 @@ def determine_scatterings_numba( N_batch, batch_size, elec_Ntot,
                 photon_p, photon_beta_x, photon_beta_y, photon_beta_z )
 
             # Determine the number of photons produced by this electron
-            nscatter = int( p * ratio_w_electron_photon + random.random() )
+            nscatter = int( p * ratio_w_electron_photon + \
+                            random_uniform( random_key, ip, 0 ) )
             # Note: if p is 0, the above formula will return nscatter=0
             # since random_draw is in [0, 1). Similarly, if p is very small,
             # nscatter will be 1 with probabiliy p * ratio_w_electron_photon,
@@ -106,7 +109,7 @@ def determine_scatterings_numba( N_batch, batch_size, elec_Ntot,
 @njit_parallel
 def scatter_photons_electrons_numba(
     N_batch, batch_size, photon_old_Ntot, elec_Ntot,
-    cumul_nscatter_per_batch, nscatter_per_elec,
+    cumul_nscatter_per_batch, nscatter_per_elec, random_key,
     photon_p, photon_px, photon_py, photon_pz,
     photon_x, photon_y, photon_z, photon_inv_gamma,
     photon_ux, photon_uy, photon_uz, photon_w,
@@ -119,12 +122,13 @@ def scatter_photons_electrons_numba(
 
     Also, apply a recoil on the electrons.
 
-    Note: this function uses a random generator within a `prange` loop.
-    This implies that an indenpendent seed and random generator will be
-    created for each thread.
+    Note: this function uses a counter-based random generator (with key
+    `random_key`) within a `prange` loop. The random numbers depend only
+    on the index of the electron, and not on the number of threads.
+    (The draw 0 of each electron is used in `determine_scatterings_numba`.)
     """
-    #  Loop over batches of particles
-    for i_batch in range( N_batch ):
+    #  Loop over batches of particles (in parallel, if threading is enabled)
+    for i_batch in prange( N_batch ):
 
         # Photon index: this is incremented each time
         # a scattered photon is identified
@@ -134,6 +138,9 @@ def scatter_photons_electrons_numba(
         N_max = min( (i_batch+1)*batch_size, elec_Ntot )
         for i_elec in range( i_batch*batch_size, N_max ):
 
+            # Index of the next random draw for this electron
+            i_draw = 1
+
             # Prepare calculation of scattered photons from this electron
             if nscatter_per_elec[i_elec] > 0:
 
@@ -189,7 +196,7 @@ def scatter_photons_electrons_numba(
                 reject = True
                 while reject:
                     # - Draw x with an approximate probability distribution
-                    r1 = random.random()
+                    r1 = random_uniform( random_key, i_elec, i_draw )
                     x = b - (b + 1.)*(0.5*c0)**r1
                     # - Calculate approximate probability distribution h
                     h = a/(b-x)
@@ -197,7 +204,8 @@ def scatter_photons_electrons_numba(
                     factor = 1 + k*(1-x)
                     f = ( (1+x**2)*factor + k**2*(1-x)**2 )/factor**3
                     # - Keep x according to rejection rule
-                    r2 = random.random()
+                    r2 = random_uniform( random_key, i_elec, i_draw+1 )
+                    i_draw += 2
                     if r2 < f/h:
                         reject = False
 
@@ -206,7 +214,8 @@ def scatter_photons_electrons_numba(
                 # - First in a system of axes aligned with the incoming photon
                 cos_theta_s = x
                 sin_theta_s = math.sqrt( 1 - x**2 )
-                phi_s = 2*math.pi*random.random()
+                phi_s = 2*math.pi*random_uniform( random_key, i_elec, i_draw )
+                i_draw += 1
                 cos_phi_s = math.cos( phi_s )
                 sin_phi_s = math.sin( phi_s )
                 new_photon_rest_pX = new_photon_rest_p * sin_theta_s*cos_phi_s
@@ -258,7 +267,8 @@ def scatter_photons_electrons_numba(
             # photon has been created, we should add recoil to the corresponding
             # electron only with a probability inv_ratio_w_elec_photon.
             if nscatter_per_elec[i_elec] > 0:
-                if random.random() < inv_ratio_w_elec_photon:
+                if random_uniform( random_key, i_elec, i_draw ) \
+                        < inv_ratio_w_elec_photon:
                     elec_ux[i_elec] += INV_MC * (photon_px - new_photon_px)
                     elec_uy[i_elec] += INV_MC * (photon_py - new_photon_py)
                     elec_uz[i_elec] += INV_MC * (photon_pz - new_photon_pz)
@@ -23,6 +23,26 @@ def allocate_empty( N, use_cuda, dtype ):
     else:
         return( np.empty( N, dtype=dtype ) )
 
+def get_random_key( seed, counter, rank=0 ):
+    """
+    Return the key (a numpy uint64) of the stream of random numbers
+    that is used by the counter-based generator `random_uniform`, for
+    the seed `seed`, the `counter`-th call to an elementary process
+    and the MPI rank `rank` (so that the procs, whose macroparticles
+    have the same local indices, draw different random numbers).
+
+    (The integers are combined with the splitmix64 finalizer, so that
+    the keys of successive calls and of different ranks are decorrelated.)
+    """
+    mask = 2**64 - 1
+    def mix( z ):
+        z = ( (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9 ) & mask
+        z = ( (z ^ (z >> 27)) * 0x94D049BB133111EB ) & mask
+        return( z ^ (z >> 31) )
+    z = mix( ( int(seed) * 0x9E3779B97F4A7C15 + int(rank) + 1 ) & mask )
+    z = mix( ( z + int(counter) * 0x9E3779B97F4A7C15 + 1 ) & mask )
+    return( np.uint64(z) )
+
 def perform_cumsum( input_array ):
     """
     Return an array containing the cumulative sum of the 1darray `input_array`
@@ -0,0 +1,55 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines inline functions that are shared by the elementary processes
+(e.g. ionization, Compton scattering), and that are compiled for CPU
+and GPU in the corresponding `numba_methods.py` and `cuda_methods.py`.
+
+The random numbers used by the elementary processes are produced by a
+counter-based generator: each random number is a hash of a key (which
+depends only on the seed, on the number of calls to the process and on
+the MPI rank), of
+the index of the macroparticle and of the index of the draw for this
+macroparticle. Therefore, random numbers can be drawn directly inside
+parallel loops, without sharing any state between threads, and the
+result is reproducible for a given seed, irrespective of the number of
+threads (or of the order in which the macroparticles are processed).
+"""
+import numpy as np
+
+# Constants of the counter-based generator (splitmix64 finalizer)
+# (Typed as unsigned integers, so that numba uses modular arithmetic)
+RNG_INDEX_STRIDE = np.uint64( 0x9E3779B97F4A7C15 )
+RNG_DRAW_STRIDE = np.uint64( 0xD1B54A32D192ED03 )
+RNG_MIX_1 = np.uint64( 0xBF58476D1CE4E5B9 )
+RNG_MIX_2 = np.uint64( 0x94D049BB133111EB )
+RNG_SHIFT_1 = np.uint64( 30 )
+RNG_SHIFT_2 = np.uint64( 27 )
+RNG_SHIFT_3 = np.uint64( 31 )
+RNG_SHIFT_53 = np.uint64( 11 )
+RNG_INV_2_53 = 1./2**53
+
+def random_uniform( key, index, draw ):
+    """
+    Return a random number, uniformly distributed in [0, 1), which is
+    entirely determined by the integers `key`, `index` and `draw`.
+
+    Parameters
+    ----------
+    key: uint64
+        Key of the random stream (see `get_random_key`)
+    index: int
+        Index of the macroparticle for which the number is drawn
+    draw: int
+        Index of the draw, for this macroparticle and this key
+        (Use different values in order to draw several numbers.)
+    """
+    z = key + np.uint64(index)*RNG_INDEX_STRIDE \
+            + np.uint64(draw)*RNG_DRAW_STRIDE
+    z = ( z ^ (z >> RNG_SHIFT_1) ) * RNG_MIX_1
+    z = ( z ^ (z >> RNG_SHIFT_2) ) * RNG_MIX_2
+    z = z ^ (z >> RNG_SHIFT_3)
+    # Keep the 53 most significant bits, to form a double in [0, 1)
+    return( (z >> RNG_SHIFT_53) * RNG_INV_2_53 )
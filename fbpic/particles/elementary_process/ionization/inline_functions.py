@@ -51,8 +51,7 @@ def get_ionization_probability( E, gamma, prefactor, power, exp_prefactor ):
 # -----------------
 
 def copy_ionized_electrons_batch(
-    i_batch, batch_size, elec_old_Ntot, ion_Ntot,
-    cumulative_n_ionized, is_ionized,
+    i_batch, batch_size, elec_start, ion_Ntot, is_ionized,
     elec_x, elec_y, elec_z, elec_inv_gamma,
     elec_ux, elec_uy, elec_uz, elec_w,
     elec_Ex, elec_Ey, elec_Ez, elec_Bx, elec_By, elec_Bz,
@@ -66,13 +65,13 @@ def copy_ionized_electrons_batch(
     Particles are handled by batch: this functions goes through one batch
     of ion macroparticles and checks which macroparticles have been ionized
     during the present timestep (using the flag `is_ionized`).
-    In order to know at which position, in the electron array, this data
-    should be copied, the cumulated number of electrons `cumulative_n_ionized`
-    (one element per batch) is used.
+    The data is copied in the electron array, starting at the index
+    `elec_start` (which is typically obtained from the cumulated number
+    of electrons created by the preceding batches).
     """
     # Electron index: this is incremented each time
     # an ionized electron is identified
-    elec_index = elec_old_Ntot + cumulative_n_ionized[i_batch]
+    elec_index = elec_start
     # Loop through the ions in this batch
     N_max = min( (i_batch+1)*batch_size, ion_Ntot )
     for ion_index in range( i_batch*batch_size, N_max ):
@@ -35,13 +35,12 @@ from scipy.special import gamma
 from .read_atomic_data import get_ionization_energies
 from .numba_methods import ionize_ions_numba, copy_ionized_electrons_numba
 from ..cuda_numba_utils import allocate_empty, reallocate_and_copy_old, \
-                                perform_cumsum, generate_new_ids
+                                perform_cumsum, generate_new_ids, get_random_key
 
 # Check if CUDA is available, then import CUDA functions
 from fbpic.utils.cuda import cuda_installed
 from fbpic.utils.printing import catch_gpu_memory_error
 if cuda_installed:
-    from pyculib.rand import PRNG
     from fbpic.utils.cuda import cuda_tpb_bpg_1d
     from .cuda_methods import ionize_ions_cuda, copy_ionized_electrons_cuda
 
@@ -62,8 +61,12 @@ class Ionizer(object):
       macroparticle, multiplied by the ionization level. (This is updated
       whenever further ionization happens, and is passed to the deposition
       kernel as the effective weight of the particles)
+    - active_batches: 1darray of integers (one element per active batch)
+      which contains the indices of the batches of macroparticles that
+      are not yet fully ionized (on CPU). The other batches are skipped.
     """
-    def __init__(self, element, ionizable_species, target_species, level_start):
+    def __init__(self, element, ionizable_species, target_species,
+                    level_start, random_seed=None ):
         """
         Initialize an Ionizer instance
 
@@ -85,6 +88,12 @@ class Ionizer(object):
         level_start: int
             The ionization level at which the macroparticles are initially
             (e.g. 0 for initially neutral atoms)
+
+        random_seed: int, optional
+            The seed of the (counter-based) random number generator.
+            For a given seed, the result of ionization is reproducible,
+            independently of the number of threads. If None, the seed is
+            drawn from numpy's global random generator.
         """
         # Register a few parameters
         self.target_species = target_species
@@ -92,9 +101,22 @@ class Ionizer(object):
         self.use_cuda = ionizable_species.use_cuda
         # Process ionized particles into batches
         self.batch_size = 10
+        # Register the seed and the counter of the random number generator
+        if random_seed is None:
+            random_seed = np.random.randint( 2**31 )
+        self.random_seed = random_seed
+        self.random_counter = 0
+        # Batches that are not yet fully ionized, and temporary arrays
+        # (These are (re)built whenever the ion arrays are reallocated)
+        self.active_batches = None
+        self.active_ionization_level = None
+        self.N_active = 0
+        self.is_ionized = None
 
         # Initialize ionization-relevant meta-data
-        self.initialize_ADK_parameters( element, ionizable_species.dt )
+        # (Ionization is handled once every `subcycle` iterations)
+        self.initialize_ADK_parameters( element,
+                    ionizable_species.subcycle * ionizable_species.dt )
 
         # Initialize the required arrays
         Ntot = ionizable_species.Ntot
@@ -147,12 +169,64 @@ class Ionizer(object):
             * ( 2*(Uion/UH)**(3./2)*Ea )**(2*n_eff - 1)
         self.adk_exp_prefactor = -2./3 * ( Uion/UH )**(3./2) * Ea
 
-        # Prepare random number generator
+    def update_active_batches( self, ion ):
+        """
+        (Re)build the list of active batches (i.e. batches that contain at
+        least one ion below `level_max`) and allocate the temporary arrays,
+        if the arrays of the ions have been reallocated or reordered since
+        the last call (e.g. because of the moving window or of the exchange
+        of particles between MPI ranks).
+
+        On GPU, the particles are reordered at each iteration (sorting),
+        and thus all the batches are considered active.
+
+        Parameters:
+        -----------
+        ion: an fbpic.Particles object
+            The ionizable species
+        """
+        # Nothing to do if the ion arrays were not modified
+        if self.active_ionization_level is self.ionization_level:
+            return
+        self.active_ionization_level = self.ionization_level
+
+        N_batch = int( ion.Ntot / self.batch_size ) + 1
         if self.use_cuda:
-            self.prng = PRNG()
+            # Reuse the existing arrays, if the number of ions is unchanged
+            if self.is_ionized is None or self.is_ionized.shape[0] != ion.Ntot:
+                self.N_active = N_batch
+                self.active_batches = cuda.to_device(
+                    np.arange( N_batch, dtype=np.int64 ) )
+                self.is_ionized = allocate_empty(
+                    ion.Ntot, True, dtype=np.int16 )
+                self.n_ionized = allocate_empty( N_batch, True, dtype=np.int64)
+                self.is_active = allocate_empty( N_batch, True, dtype=np.int16)
+        else:
+            # Find the batches whose minimal ionization level is below max
+            if ion.Ntot > 0:
+                min_level = np.minimum.reduceat( self.ionization_level,
+                                    np.arange(0, ion.Ntot, self.batch_size) )
+                self.active_batches = np.flatnonzero( min_level<self.level_max )
+            else:
+                self.active_batches = np.zeros( 0, dtype=np.int64 )
+            self.N_active = len( self.active_batches )
+            self.is_ionized = np.empty( ion.Ntot, dtype=np.int16 )
+            self.n_ionized = np.empty( self.N_active, dtype=np.int64 )
+            self.is_active = np.empty( self.N_active, dtype=np.int16 )
+
+    def prune_active_batches( self ):
+        """
+        Remove, from the list of active batches, the batches in which all
+        ions reached `level_max` during the last call to `handle_ionization`
+        (CPU only)
+        """
+        is_active = self.is_active[:self.N_active].astype( bool )
+        if not is_active.all():
+            self.active_batches = self.active_batches[ is_active ]
+            self.N_active = len( self.active_batches )
 
     @catch_gpu_memory_error
-    def handle_ionization( self, ion ):
+    def handle_ionization( self, ion, rank=0 ):
         """
         Handle ionization, either on CPU or GPU
 
@@ -164,36 +238,44 @@ class Ionizer(object):
         -----------
         ion: an fbpic.Particles object
             The ionizable species, from which new electrons are created.
+
+        rank: int, optional
+            The rank of the local proc in the domain decomposition
+            (used in the key of the random numbers)
         """
-        # Process particles in batches (of typically 10, 20 particles)
-        N_batch = int( ion.Ntot / self.batch_size ) + 1
         # Short-cut for use_cuda
         use_cuda = self.use_cuda
-
-        # Create temporary arrays (on CPU or GPU, depending on `use_cuda`)
-        is_ionized = allocate_empty( ion.Ntot, use_cuda, dtype=np.int16 )
-        n_ionized = allocate_empty( N_batch, use_cuda, dtype=np.int64 )
-        # Draw random numbers
-        if self.use_cuda:
-            random_draw = allocate_empty(ion.Ntot, use_cuda, dtype=np.float32)
-            self.prng.uniform( random_draw )
-        else:
-            random_draw = np.random.rand( ion.Ntot )
+        # Key of the random numbers for this call (incremented at each call)
+        random_key = get_random_key( self.random_seed,
+                                     self.random_counter, rank )
+        self.random_counter += 1
+
+        # Process particles in batches (of typically 10, 20 particles),
+        # skipping the batches that are already fully ionized
+        self.update_active_batches( ion )
+        N_active = self.N_active
+        if N_active == 0:
+            return
+        active_batches = self.active_batches
+        is_ionized = self.is_ionized
+        n_ionized = self.n_ionized
 
         # Determine the ions that are ionized, and count them in each batch
         # (one thread per batch on GPU; parallel loop over batches on CPU)
         if use_cuda:
-            batch_grid_1d, batch_block_1d = cuda_tpb_bpg_1d( N_batch )
+            batch_grid_1d, batch_block_1d = cuda_tpb_bpg_1d( N_active )
             ionize_ions_cuda[ batch_grid_1d, batch_block_1d ](
-                N_batch, self.batch_size, ion.Ntot, self.level_max,
-                n_ionized, is_ionized, self.ionization_level, random_draw,
+                N_active, active_batches, self.batch_size, ion.Ntot,
+                self.level_max, n_ionized, is_ionized, self.is_active,
+                self.ionization_level, random_key,
                 self.adk_prefactor, self.adk_power, self.adk_exp_prefactor,
                 ion.ux, ion.uy, ion.uz, ion.Ex, ion.Ey, ion.Ez,
                 ion.Bx, ion.By, ion.Bz, ion.w, self.w_times_level )
         else:
             ionize_ions_numba(
-                N_batch, self.batch_size, ion.Ntot, self.level_max,
-                n_ionized, is_ionized, self.ionization_level, random_draw,
+                N_active, active_batches, self.batch_size, ion.Ntot,
+                self.level_max, n_ionized, is_ionized, self.is_active,
+                self.ionization_level, random_key,
                 self.adk_prefactor, self.adk_power, self.adk_exp_prefactor,
                 ion.ux, ion.uy, ion.uz, ion.Ex, ion.Ey, ion.Ez,
                 ion.Bx, ion.By, ion.Bz, ion.w, self.w_times_level )
@@ -202,9 +284,11 @@ class Ionizer(object):
         # on the CPU, as this is typically difficult on the GPU)
         if use_cuda:
             n_ionized = n_ionized.copy_to_host()
-        cumulative_n_ionized = perform_cumsum( n_ionized )
+        cumulative_n_ionized = perform_cumsum( n_ionized[:N_active] )
         # If no new particle was created, skip the rest of this function
         if cumulative_n_ionized[-1] == 0:
+            if not use_cuda:
+                self.prune_active_batches()
             return
 
         # Reallocate electron species (on CPU or GPU depending on `use_cuda`),
@@ -219,7 +303,7 @@ class Ionizer(object):
         if use_cuda:
             cumulative_n_ionized = cuda.to_device( cumulative_n_ionized )
             copy_ionized_electrons_cuda[ batch_grid_1d, batch_block_1d ](
-                N_batch, self.batch_size, old_Ntot, ion.Ntot,
+                N_active, active_batches, self.batch_size, old_Ntot, ion.Ntot,
                 cumulative_n_ionized, is_ionized,
                 elec.x, elec.y, elec.z, elec.inv_gamma,
                 elec.ux, elec.uy, elec.uz, elec.w,
@@ -231,7 +315,7 @@ class Ionizer(object):
             elec.sorted = False
         else:
             copy_ionized_electrons_numba(
-                N_batch, self.batch_size, old_Ntot, ion.Ntot,
+                N_active, active_batches, self.batch_size, old_Ntot, ion.Ntot,
                 cumulative_n_ionized, is_ionized,
                 elec.x, elec.y, elec.z, elec.inv_gamma,
                 elec.ux, elec.uy, elec.uz, elec.w,
@@ -239,6 +323,8 @@ class Ionizer(object):
                 ion.x, ion.y, ion.z, ion.inv_gamma,
                 ion.ux, ion.uy, ion.uz, ion.w,
                 ion.Ex, ion.Ey, ion.Ez, ion.Bx, ion.By, ion.Bz )
+            # Skip the batches that are now fully ionized, at the next call
+            self.prune_active_batches()
 
         # If the electrons are tracked, generate new ids
         # (on GPU or GPU depending on `use_cuda`)
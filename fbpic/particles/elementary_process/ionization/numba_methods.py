@@ -17,10 +17,12 @@ from .inline_functions import get_ionization_probability, \
 get_ionization_probability = numba.njit(get_ionization_probability)
 get_E_amplitude = numba.njit(get_E_amplitude)
 copy_ionized_electrons_batch = numba.njit(copy_ionized_electrons_batch)
+from ..inline_functions import random_uniform
+random_uniform = numba.njit(random_uniform)
 
 @njit_parallel
-def ionize_ions_numba( N_batch, batch_size, Ntot, level_max,
-    n_ionized, is_ionized, ionization_level, random_draw,
+def ionize_ions_numba( N_active, active_batches, batch_size, Ntot, level_max,
+    n_ionized, is_ionized, is_active, ionization_level, random_key,
     adk_prefactor, adk_power, adk_exp_prefactor,
     ux, uy, uz, Ex, Ey, Ez, Bx, By, Bz, w, w_times_level ):
     """
@@ -31,16 +33,26 @@ def ionize_ions_numba( N_batch, batch_size, Ntot, level_max,
     `w_times_level` of the ions to take into account the change in level
     of the corresponding macroparticle.
 
-    For the purpose of counting and creating the corresponding electrons,
-    `is_ionized` (one element per macroparticle) is set to 1 at the position
-    of the ionized ions, and `n_ionized` (one element per batch) counts
-    the total number of ionized particles in the current batch.
+    Only the batches whose indices are listed in `active_batches` (i.e.
+    the batches that contained at least one ion below `level_max`) are
+    processed. For the purpose of counting and creating the corresponding
+    electrons, `is_ionized` (one element per macroparticle) is set to 1
+    at the position of the ionized ions, and `n_ionized` (one element per
+    active batch) counts the total number of ionized particles in the
+    current batch. `is_active` (one element per active batch) is set to 0
+    if all the ions of the batch have now reached `level_max`.
+
+    The random numbers are drawn with a counter-based generator (with key
+    `random_key`), so that the result does not depend on the number of
+    threads.
     """
     # Loop over batches of particles (in parallel, if threading is enabled)
-    for i_batch in prange( N_batch ):
+    for i_active in prange( N_active ):
 
         # Set the count of ionized particles in the batch to 0
-        n_ionized[i_batch] = 0
+        i_batch = active_batches[i_active]
+        n_ionized[i_active] = 0
+        is_active[i_active] = 0
 
         # Loop through the batch
         # (Note: a while loop is used here, because numba 0.34 does
@@ -63,25 +75,29 @@ def ionize_ions_numba( N_batch, batch_size, Ntot, level_max,
                 p = get_ionization_probability( E, gamma,
                   adk_prefactor[level], adk_power[level], adk_exp_prefactor[level])
                 # Ionize particles
-                if random_draw[ip] < p:
+                if random_uniform( random_key, ip, 0 ) < p:
                     # Set the corresponding flag and update particle count
                     is_ionized[ip] = 1
-                    n_ionized[i_batch] += 1
+                    n_ionized[i_active] += 1
                     # Update the ionization level and the corresponding weight
                     ionization_level[ip] += 1
                     w_times_level[ip] = w[ip] * ionization_level[ip]
                 else:
                     is_ionized[ip] = 0
+                # Keep the batch active if this ion can be further ionized
+                if ionization_level[ip] < level_max:
+                    is_active[i_active] = 1
 
             # Increment ip
             ip = ip + 1
 
-    return( n_ionized, is_ionized, ionization_level, w_times_level )
+    return( n_ionized, is_ionized, is_active,
+            ionization_level, w_times_level )
 
 
 @njit_parallel
 def copy_ionized_electrons_numba(
-    N_batch, batch_size, elec_old_Ntot, ion_Ntot,
+    N_active, active_batches, batch_size, elec_old_Ntot, ion_Ntot,
     cumulative_n_ionized, is_ionized,
     elec_x, elec_y, elec_z, elec_inv_gamma,
     elec_ux, elec_uy, elec_uz, elec_w,
@@ -92,18 +108,23 @@ def copy_ionized_electrons_numba(
     """
     Create the new electrons by copying the properties (position, momentum,
     etc) of the ions that they originate from.
+
+    `cumulative_n_ionized` has one element per active batch
+    (see `ionize_ions_numba`)
     """
     #  Loop over batches of particles (in parallel, if threading is enabled)
-    for i_batch in prange( N_batch ):
-        copy_ionized_electrons_batch(
-            i_batch, batch_size, elec_old_Ntot, ion_Ntot,
-            cumulative_n_ionized, is_ionized,
-            elec_x, elec_y, elec_z, elec_inv_gamma,
-            elec_ux, elec_uy, elec_uz, elec_w,
-            elec_Ex, elec_Ey, elec_Ez, elec_Bx, elec_By, elec_Bz,
-            ion_x, ion_y, ion_z, ion_inv_gamma,
-            ion_ux, ion_uy, ion_uz, ion_w,
-            ion_Ex, ion_Ey, ion_Ez, ion_Bx, ion_By, ion_Bz )
+    for i_active in prange( N_active ):
+        # Skip the batches in which no ion was ionized
+        elec_start = elec_old_Ntot + cumulative_n_ionized[i_active]
+        if cumulative_n_ionized[i_active+1] > cumulative_n_ionized[i_active]:
+            copy_ionized_electrons_batch(
+                active_batches[i_active], batch_size, elec_start, ion_Ntot,
+                is_ionized, elec_x, elec_y, elec_z, elec_inv_gamma,
+                elec_ux, elec_uy, elec_uz, elec_w,
+                elec_Ex, elec_Ey, elec_Ez, elec_Bx, elec_By, elec_Bz,
+                ion_x, ion_y, ion_z, ion_inv_gamma,
+                ion_ux, ion_uy, ion_uz, ion_w,
+                ion_Ex, ion_Ey, ion_Ez, ion_Bx, ion_By, ion_Bz )
 
     return( elec_x, elec_y, elec_z, elec_inv_gamma,
         elec_ux, elec_uy, elec_uz, elec_w,
@@ -185,3 +185,70 @@ def add_cubic_gather_for_mode( m,
     Fz += factor*(Fz_m*exptheta_m).real
 
     return(Fr, Ft, Fz)
+
+def add_envelope_gather_for_mode( m, a, da_dr, da_dz, da_dt, exptheta_m,
+    a_grid, iz_lower, iz_upper, ir_lower, ir_upper, below_axis,
+    Sr_lower, Sr_upper, Sz_lower, Sz_upper, invdr, invdz ):
+    """
+    Add the contribution of the envelope mode `m` to the envelope `a` felt
+    by one macroparticle and to its derivatives, using linear weights.
+
+    Parameters:
+    -----------
+    m: int
+        The azimuthal mode number of the envelope (can be negative)
+
+    a, da_dr, da_dz, da_dt: complexs
+        The envelope felt by one macroparticle, and its derivatives along
+        r, z and theta (before the contribution of mode `m` has been added)
+
+    exptheta_m: complex
+        The complex azimuthal factor $e^{-i m \theta}$ where $\theta$ is
+        the azimuthal position of the macroparticle considered.
+
+    a_grid: 2darray of complexs
+        The envelope on the interpolation grid for mode `m`
+
+    iz_lower, iz_upper, ir_lower, ir_upper: ints
+        Lower and upper index in z and r from which the macroparticle
+        considered should gather the envelope (in the array a_grid)
+
+    below_axis: bool
+        Whether the lower point in r is a guard point below the axis
+        (in which case its value is mirrored from the point ir=0)
+
+    Sr_lower, Sr_upper, Sz_lower, Sz_upper: floats
+        The linear weights along r and z
+
+    invdr, invdz: floats (in meters^-1)
+        Inverse of the grid step along r and z
+
+    Returns:
+    --------
+    a, da_dr, da_dz, da_dt: complexs
+        (after the contribution of mode `m` has been added)
+    """
+    # Values of the envelope at the 4 surrounding points
+    a_ll = a_grid[ iz_lower, ir_lower ]
+    a_ul = a_grid[ iz_upper, ir_lower ]
+    a_lu = a_grid[ iz_lower, ir_upper ]
+    a_uu = a_grid[ iz_upper, ir_upper ]
+    if below_axis:
+        flip_factor = (-1.)**m
+        a_ll = flip_factor * a_ll
+        a_ul = flip_factor * a_ul
+    # Envelope and derivatives of the linear interpolation
+    a_m = Sz_lower*( Sr_lower*a_ll + Sr_upper*a_lu ) \
+        + Sz_upper*( Sr_lower*a_ul + Sr_upper*a_uu )
+    da_dr_m = invdr*( Sz_lower*( a_lu - a_ll ) + Sz_upper*( a_uu - a_ul ) )
+    da_dz_m = invdz*( Sr_lower*( a_ul - a_ll ) + Sr_upper*( a_uu - a_lu ) )
+
+    # Add the contribution from mode m
+    # (The envelope is decomposed as a = sum_m a_m exp(-i m theta),
+    # over positive and negative m)
+    a += a_m*exptheta_m
+    da_dr += da_dr_m*exptheta_m
+    da_dz += da_dz_m*exptheta_m
+    da_dt += -1.j*m*a_m*exptheta_m
+
+    return( a, da_dr, da_dz, da_dt )
@@ -0,0 +1,448 @@
+# Copyright 2016, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen, Kevin Peters
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines the field gathering methods linear and cubic order shapes
+on the CPU with threading, for an arbitrary number of azimuthal modes.
+
+The fields of the different modes are passed as tuples of 2darrays
+(one element per mode), so that all the modes are gathered in a single
+sweep over the particles. (numba compiles one specialization of these
+functions for each number of modes.)
+"""
+import numba
+from numba import int64
+from fbpic.utils.threading import njit_parallel, prange
+import math
+import numpy as np
+# Import inline functions
+from .inline_functions import add_linear_gather_for_mode, \
+    add_cubic_gather_for_mode, add_envelope_gather_for_mode
+# Compile the inline functions for CPU
+add_linear_gather_for_mode = numba.njit( add_linear_gather_for_mode )
+add_cubic_gather_for_mode = numba.njit( add_cubic_gather_for_mode )
+add_envelope_gather_for_mode = numba.njit( add_envelope_gather_for_mode )
+
+# -----------------------
+# Field gathering linear
+# -----------------------
+
+@njit_parallel
+def gather_field_numba_linear_multi_mode(x, y, z,
+                    invdz, zmin, Nz,
+                    invdr, rmin, Nr,
+                    Er, Et, Ez,
+                    Br, Bt, Bz,
+                    Ex, Ey, Ez_ptcl,
+                    Bx, By, Bz_ptcl ):
+    """
+    Gathering of the fields (E and B) using numba with multi-threading.
+    Iterates over the particles, calculates the weighted amount
+    of fields acting on each particle based on its shape (linear).
+    Fields are gathered in cylindrical coordinates and then
+    transformed to cartesian coordinates.
+    Supports an arbitrary number of azimuthal modes.
+
+    Parameters
+    ----------
+    x, y, z : 1darray of floats (in meters)
+        The position of the particles
+
+    invdz, invdr : float (in meters^-1)
+        Inverse of the grid step along the considered direction
+
+    zmin, rmin : float (in meters)
+        Position of the edge of the simulation box along the
+        direction considered
+
+    Nz, Nr : int
+        Number of gridpoints along the considered direction
+
+    Er, Et, Ez : tuples of 2darrays of complexs
+        The electric fields on the interpolation grid (one element per mode)
+
+    Br, Bt, Bz : tuples of 2darrays of complexs
+        The magnetic fields on the interpolation grid (one element per mode)
+
+    Ex, Ey, Ez_ptcl : 1darray of floats
+        The electric fields acting on the particles
+        (is modified by this function)
+
+    Bx, By, Bz_ptcl : 1darray of floats
+        The magnetic fields acting on the particles
+        (is modified by this function)
+    """
+    Nm = len(Er)
+    # Gather the field per particle in parallel
+    for i in prange(x.shape[0]):
+        # Preliminary arrays for the cylindrical conversion
+        # --------------------------------------------
+        # Position
+        xj = x[i]
+        yj = y[i]
+        zj = z[i]
+
+        # Cylindrical conversion
+        rj = math.sqrt( xj**2 + yj**2 )
+        if (rj !=0. ) :
+            invr = 1./rj
+            cos = xj*invr  # Cosine
+            sin = yj*invr  # Sine
+        else :
+            cos = 1.
+            sin = 0.
+        exptheta_1 = cos - 1.j*sin
+
+        # Get linear weights for the deposition
+        # -------------------------------------
+        # Positions of the particles, in the cell unit
+        r_cell =  invdr*(rj - rmin) - 0.5
+        z_cell =  invdz*(zj - zmin) - 0.5
+        # Original index of the uppper and lower cell
+        ir_lower = int(math.floor( r_cell ))
+        ir_upper = ir_lower + 1
+        iz_lower = int(math.floor( z_cell ))
+        iz_upper = iz_lower + 1
+        # Linear weight
+        Sr_lower = ir_upper - r_cell
+        Sr_upper = r_cell - ir_lower
+        Sz_lower = iz_upper - z_cell
+        Sz_upper = z_cell - iz_lower
+        # Set guard weights to zero
+        Sr_guard = 0.
+
+        # Treat the boundary conditions
+        # -----------------------------
+        # guard cells in lower r
+        if ir_lower < 0:
+            Sr_guard = Sr_lower
+            Sr_lower = 0.
+            ir_lower = 0
+        # absorbing in upper r
+        if ir_lower > Nr-1:
+            ir_lower = Nr-1
+        if ir_upper > Nr-1:
+            ir_upper = Nr-1
+        # periodic boundaries in z
+        # lower z boundaries
+        if iz_lower < 0:
+            iz_lower += Nz
+        if iz_upper < 0:
+            iz_upper += Nz
+        # upper z boundaries
+        if iz_lower > Nz-1:
+            iz_lower -= Nz
+        if iz_upper > Nz-1:
+            iz_upper -= Nz
+
+        # Precalculate Shapes
+        S_ll = Sz_lower*Sr_lower
+        S_lu = Sz_lower*Sr_upper
+        S_ul = Sz_upper*Sr_lower
+        S_uu = Sz_upper*Sr_upper
+        S_lg = Sz_lower*Sr_guard
+        S_ug = Sz_upper*Sr_guard
+
+        # Loop over the modes, with the same shape factors
+        # ------------------------------------------------
+        Fr_E = 0.
+        Ft_E = 0.
+        Fz_E = 0.
+        Fr_B = 0.
+        Ft_B = 0.
+        Fz_B = 0.
+        exptheta_m = 1. + 0.j
+        for m in range(Nm):
+            # E-Field: add contribution from mode m
+            Fr_E, Ft_E, Fz_E = add_linear_gather_for_mode( m,
+                Fr_E, Ft_E, Fz_E, exptheta_m, Er[m], Et[m], Ez[m],
+                iz_lower, iz_upper, ir_lower, ir_upper,
+                S_ll, S_lu, S_lg, S_ul, S_uu, S_ug )
+            # B-Field: add contribution from mode m
+            Fr_B, Ft_B, Fz_B = add_linear_gather_for_mode( m,
+                Fr_B, Ft_B, Fz_B, exptheta_m, Br[m], Bt[m], Bz[m],
+                iz_lower, iz_upper, ir_lower, ir_upper,
+                S_ll, S_lu, S_lg, S_ul, S_uu, S_ug )
+            exptheta_m *= exptheta_1
+
+        # Convert to Cartesian coordinates
+        # and write to particle field arrays
+        Ex[i] = cos*Fr_E - sin*Ft_E
+        Ey[i] = sin*Fr_E + cos*Ft_E
+        Ez_ptcl[i] = Fz_E
+        Bx[i] = cos*Fr_B - sin*Ft_B
+        By[i] = sin*Fr_B + cos*Ft_B
+        Bz_ptcl[i] = Fz_B
+
+    return Ex, Ey, Ez_ptcl, Bx, By, Bz_ptcl
+
+# -----------------------
+# Field gathering cubic
+# -----------------------
+
+@njit_parallel
+def gather_field_numba_cubic_multi_mode(x, y, z,
+                    invdz, zmin, Nz,
+                    invdr, rmin, Nr,
+                    Er, Et, Ez,
+                    Br, Bt, Bz,
+                    Ex, Ey, Ez_ptcl,
+                    Bx, By, Bz_ptcl,
+                    nthreads, ptcl_chunk_indices):
+    """
+    Gathering of the fields (E and B) using numba with multi-threading.
+    Iterates over the particles, calculates the weighted amount
+    of fields acting on each particle based on its shape (cubic).
+    Fields are gathered in cylindrical coordinates and then
+    transformed to cartesian coordinates.
+    Supports an arbitrary number of azimuthal modes.
+
+    Parameters
+    ----------
+    x, y, z : 1darray of floats (in meters)
+        The position of the particles
+
+    invdz, invdr : float (in meters^-1)
+        Inverse of the grid step along the considered direction
+
+    zmin, rmin : float (in meters)
+        Position of the edge of the simulation box along the
+        direction considered
+
+    Nz, Nr : int
+        Number of gridpoints along the considered direction
+
+    Er, Et, Ez : tuples of 2darrays of complexs
+        The electric fields on the interpolation grid (one element per mode)
+
+    Br, Bt, Bz : tuples of 2darrays of complexs
+        The magnetic fields on the interpolation grid (one element per mode)
+
+    Ex, Ey, Ez_ptcl : 1darray of floats
+        The electric fields acting on the particles
+        (is modified by this function)
+
+    Bx, By, Bz_ptcl : 1darray of floats
+        The magnetic fields acting on the particles
+        (is modified by this function)
+
+    nthreads : int
+        Number of CPU threads used with numba prange
+
+    ptcl_chunk_indices : array of int, of size nthreads+1
+        The indices (of the particle array) between which each thread
+        should loop. (i.e. divisions of particle array between threads)
+    """
+    Nm = len(Er)
+    # Gather the field per cell in parallel
+    for nt in prange( nthreads ):
+
+        # Create private arrays for each thread
+        # to store the particle index and shape
+        Sr = np.empty( 4 )
+        Sz = np.empty( 4 )
+
+        # Loop over all particles in thread chunk
+        for i in range( ptcl_chunk_indices[nt],
+                            ptcl_chunk_indices[nt+1] ):
+
+            # Preliminary arrays for the cylindrical conversion
+            # --------------------------------------------
+            # Position
+            xj = x[i]
+            yj = y[i]
+            zj = z[i]
+
+            # Cylindrical conversion
+            rj = math.sqrt(xj**2 + yj**2)
+            if (rj != 0.):
+                invr = 1./rj
+                cos = xj*invr  # Cosine
+                sin = yj*invr  # Sine
+            else:
+                cos = 1.
+                sin = 0.
+            exptheta_1 = cos - 1.j*sin
+
+            # Get weights for the deposition
+            # --------------------------------------------
+            # Positions of the particle, in the cell unit
+            r_cell = invdr*(rj - rmin) - 0.5
+            z_cell = invdz*(zj - zmin) - 0.5
+
+            # Calculate the shape factors
+            ir_lowest = int64(math.floor(r_cell)) - 1
+            r_local = r_cell-ir_lowest
+            Sr[0] = -1./6. * (r_local-2.)**3
+            Sr[1] = 1./6. * (3.*(r_local-1.)**3 - 6.*(r_local-1.)**2 + 4.)
+            Sr[2] = 1./6. * (3.*(2.-r_local)**3 - 6.*(2.-r_local)**2 + 4.)
+            Sr[3] = -1./6. * (1.-r_local)**3
+            iz_lowest = int64(math.floor(z_cell)) - 1
+            z_local = z_cell-iz_lowest
+            Sz[0] = -1./6. * (z_local-2.)**3
+            Sz[1] = 1./6. * (3.*(z_local-1.)**3 - 6.*(z_local-1.)**2 + 4.)
+            Sz[2] = 1./6. * (3.*(2.-z_local)**3 - 6.*(2.-z_local)**2 + 4.)
+            Sz[3] = -1./6. * (1.-z_local)**3
+
+            # Loop over the modes, with the same shape factors
+            # ------------------------------------------------
+            Fr_E = 0.
+            Ft_E = 0.
+            Fz_E = 0.
+            Fr_B = 0.
+            Ft_B = 0.
+            Fz_B = 0.
+            exptheta_m = 1. + 0.j
+            for m in range(Nm):
+                # E-Field: add contribution from mode m
+                Fr_E, Ft_E, Fz_E = add_cubic_gather_for_mode( m,
+                    Fr_E, Ft_E, Fz_E, exptheta_m, Er[m], Et[m], Ez[m],
+                    ir_lowest, iz_lowest, Sr, Sz, Nr, Nz )
+                # B-Field: add contribution from mode m
+                Fr_B, Ft_B, Fz_B = add_cubic_gather_for_mode( m,
+                    Fr_B, Ft_B, Fz_B, exptheta_m, Br[m], Bt[m], Bz[m],
+                    ir_lowest, iz_lowest, Sr, Sz, Nr, Nz )
+                exptheta_m *= exptheta_1
+
+            # Convert to Cartesian coordinates
+            # and write to particle field arrays
+            Ex[i] = cos*Fr_E - sin*Ft_E
+            Ey[i] = sin*Fr_E + cos*Ft_E
+            Ez_ptcl[i] = Fz_E
+            Bx[i] = cos*Fr_B - sin*Ft_B
+            By[i] = sin*Fr_B + cos*Ft_B
+            Bz_ptcl[i] = Fz_B
+
+    return Ex, Ey, Ez_ptcl, Bx, By, Bz_ptcl
+
+# -------------------------
+# Envelope gathering linear
+# -------------------------
+
+@njit_parallel
+def gather_envelope_numba_linear(x, y, z,
+                    invdz, zmin, Nz,
+                    invdr, rmin, Nr,
+                    a_grid, a2, grad_a2_x, grad_a2_y, grad_a2_z ):
+    """
+    Gathering of the laser envelope (envelope model), for all the envelope
+    modes in a single sweep over the particles, using linear weights
+    (regardless of the particle shape).
+    Iterates over the particles and calculates the square modulus of the
+    envelope and its gradient (in cartesian coordinates), which are used
+    for the ponderomotive force.
+
+    Parameters
+    ----------
+    x, y, z : 1darray of floats (in meters)
+        The position of the particles
+
+    invdz, invdr : float (in meters^-1)
+        Inverse of the grid step along the considered direction
+
+    zmin, rmin : float (in meters)
+        Position of the edge of the simulation box along the
+        direction considered
+
+    Nz, Nr : int
+        Number of gridpoints along the considered direction
+
+    a_grid : tuple of 2darrays of complexs
+        The envelope on the interpolation grid, for the modes
+        0, 1, ..., Nm-1, -Nm+1, ..., -1 (in this order)
+
+    a2, grad_a2_x, grad_a2_y, grad_a2_z : 1darrays of floats
+        The square modulus of the envelope and its gradient,
+        at the position of the particles (is modified by this function)
+    """
+    Nenv = len(a_grid)
+    Nm = (Nenv + 1)//2
+    # Gather the envelope per particle in parallel
+    for i in prange(x.shape[0]):
+        # Position
+        xj = x[i]
+        yj = y[i]
+        zj = z[i]
+
+        # Cylindrical conversion
+        rj = math.sqrt( xj**2 + yj**2 )
+        if (rj !=0. ) :
+            invr = 1./rj
+            cos = xj*invr  # Cosine
+            sin = yj*invr  # Sine
+        else :
+            invr = 0.
+            cos = 1.
+            sin = 0.
+        exptheta_1 = cos - 1.j*sin
+
+        # Get linear weights for the gathering
+        # ------------------------------------
+        # Positions of the particles, in the cell unit
+        r_cell =  invdr*(rj - rmin) - 0.5
+        z_cell =  invdz*(zj - zmin) - 0.5
+        # Original index of the uppper and lower cell
+        ir_lower = int(math.floor( r_cell ))
+        ir_upper = ir_lower + 1
+        iz_lower = int(math.floor( z_cell ))
+        iz_upper = iz_lower + 1
+        # Linear weight
+        Sr_lower = ir_upper - r_cell
+        Sr_upper = r_cell - ir_lower
+        Sz_lower = iz_upper - z_cell
+        Sz_upper = z_cell - iz_lower
+
+        # Treat the boundary conditions
+        # -----------------------------
+        # guard cells in lower r (mirrored from ir=0)
+        below_axis = False
+        if ir_lower < 0:
+            below_axis = True
+            ir_lower = 0
+        # absorbing in upper r
+        if ir_lower > Nr-1:
+            ir_lower = Nr-1
+        if ir_upper > Nr-1:
+            ir_upper = Nr-1
+        # periodic boundaries in z
+        # lower z boundaries
+        if iz_lower < 0:
+            iz_lower += Nz
+        if iz_upper < 0:
+            iz_upper += Nz
+        # upper z boundaries
+        if iz_lower > Nz-1:
+            iz_lower -= Nz
+        if iz_upper > Nz-1:
+            iz_upper -= Nz
+
+        # Loop over the modes m and -m, with the same weights
+        # ---------------------------------------------------
+        a = 0.j
+        da_dr = 0.j
+        da_dz = 0.j
+        da_dt = 0.j
+        exptheta_m = 1. + 0.j
+        for m in range(Nm):
+            a, da_dr, da_dz, da_dt = add_envelope_gather_for_mode( m,
+                a, da_dr, da_dz, da_dt, exptheta_m, a_grid[m],
+                iz_lower, iz_upper, ir_lower, ir_upper, below_axis,
+                Sr_lower, Sr_upper, Sz_lower, Sz_upper, invdr, invdz )
+            if m > 0:
+                a, da_dr, da_dz, da_dt = add_envelope_gather_for_mode( -m,
+                    a, da_dr, da_dz, da_dt, exptheta_m.conjugate(),
+                    a_grid[Nenv-m], iz_lower, iz_upper, ir_lower, ir_upper,
+                    below_axis, Sr_lower, Sr_upper, Sz_lower, Sz_upper,
+                    invdr, invdz )
+            exptheta_m *= exptheta_1
+
+        # Square modulus and its gradient: grad |a|^2 = 2 Re( a^* grad a )
+        grad_r = 2*( a.conjugate()*da_dr ).real
+        grad_t = 2*invr*( a.conjugate()*da_dt ).real
+        a2[i] = a.real**2 + a.imag**2
+        grad_a2_x[i] = cos*grad_r - sin*grad_t
+        grad_a2_y[i] = sin*grad_r + cos*grad_t
+        grad_a2_z[i] = 2*( a.conjugate()*da_dz ).real
+
+    return a2, grad_a2_x, grad_a2_y, grad_a2_z
@@ -7,8 +7,9 @@ It defines the structure and methods associated with the particles.
 """
 import warnings
 import numpy as np
-from scipy.constants import e
+from scipy.constants import e, epsilon_0
 from .tracking import ParticleTracker
+from .resampling import ParticleResampler
 from .elementary_process.ionization import Ionizer
 from .elementary_process.compton import ComptonScatterer
 from .injection import BallisticBeforePlane, ContinuousInjector, \
@@ -16,33 +17,36 @@ from .injection import BallisticBeforePlane, ContinuousInjector, \
 
 # Load the numba methods
 from .push.numba_methods import push_p_numba, push_p_ioniz_numba, \
-                                push_p_after_plane_numba, push_x_numba
+                push_p_after_plane_numba, push_p_envelope_numba, push_x_numba
 from .gathering.threading_methods import gather_field_numba_linear, \
         gather_field_numba_cubic
-from .gathering.threading_methods_one_mode import erase_eb_numba, \
-    gather_field_numba_linear_one_mode, gather_field_numba_cubic_one_mode
+from .gathering.threading_methods_multi_mode import \
+    gather_field_numba_linear_multi_mode, gather_field_numba_cubic_multi_mode, \
+    gather_envelope_numba_linear
 from .deposition.threading_methods import \
         deposit_rho_numba_linear, deposit_rho_numba_cubic, \
         deposit_J_numba_linear, deposit_J_numba_cubic
 
 # Check if threading is enabled
 from fbpic.utils.threading import nthreads, get_chunk_indices
+from fbpic.utils.placement import first_touch_zeros, first_touch_copy
 # Check if CUDA is available, then import CUDA functions
 from fbpic.utils.cuda import cuda_installed
 if cuda_installed:
     # Load the CUDA methods
-    from fbpic.utils.cuda import cuda, cuda_tpb_bpg_1d
+    from fbpic.utils.cuda import cuda, cuda_tpb_bpg_1d, cuda_tpb
     from .push.cuda_methods import push_p_gpu, push_p_ioniz_gpu, \
-                                push_p_after_plane_gpu, push_x_gpu
+                push_p_after_plane_gpu, push_p_envelope_gpu, push_x_gpu
     from .deposition.cuda_methods import deposit_rho_gpu_linear, \
-        deposit_J_gpu_linear, deposit_rho_gpu_cubic, deposit_J_gpu_cubic
-    from .deposition.cuda_methods_one_mode import \
-        deposit_rho_gpu_linear_one_mode, deposit_J_gpu_linear_one_mode, \
-        deposit_rho_gpu_cubic_one_mode, deposit_J_gpu_cubic_one_mode
+        deposit_J_gpu_linear, deposit_rho_gpu_cubic, deposit_J_gpu_cubic, \
+        get_chi_weight_gpu
+    from .deposition.cuda_methods_multi_mode import \
+        get_deposit_rho_gpu_multi_mode, get_deposit_J_gpu_multi_mode
     from .gathering.cuda_methods import gather_field_gpu_linear, \
         gather_field_gpu_cubic
-    from .gathering.cuda_methods_one_mode import erase_eb_cuda, \
-        gather_field_gpu_linear_one_mode, gather_field_gpu_cubic_one_mode
+    from .gathering.cuda_methods_multi_mode import \
+        gather_field_gpu_linear_multi_mode, gather_field_gpu_cubic_multi_mode, \
+        gather_envelope_gpu_linear
     from .utilities.cuda_sorting import write_sorting_buffer, \
         get_cell_idx_per_particle, sort_particles_per_cell, \
         prefill_prefix_sum, incl_prefix_sum
@@ -66,7 +70,8 @@ class Particles(object) :
                     ux_th=0., uy_th=0., uz_th=0.,
                     dens_func=None, continuous_injection=True,
                     grid_shape=None, particle_shape='linear',
-                    use_cuda=False, dz_particles=None ):
+                    use_cuda=False, dz_particles=None, subcycle=1,
+                    immobile=False ):
         """
         Initialize a uniform set of particles
 
@@ -136,6 +141,26 @@ class Particles(object) :
             from the arguments `zmin`, `zmax` and `Npz`. However, when
             there are no particles in the initial box (`Npz = 0`),
             `dz_particles` needs to be explicitly passed.
+
+        subcycle: int, optional
+            The number of PIC iterations between two successive gathers and
+            momentum pushes of this species (the momentum push then uses a
+            timestep `subcycle*dt`). The positions are still pushed, and the
+            charge and current are still deposited, at every iteration (with
+            the momentum from the last push), so that the deposited charge
+            and current remain consistent with each other.
+            Elementary processes (ionization, Compton scattering) are
+            also only handled every `subcycle` iterations, with the
+            timestep `subcycle*dt`.
+            This is typically useful for heavy species (e.g. ions).
+
+        immobile: bool, optional
+            Whether this species is immobile, i.e. never gathers the fields
+            nor moves. Its charge is deposited once and cached (on CPU), and
+            only deposited again when its macroparticles change (e.g.
+            when the moving window injects new ones), while its current
+            is zero. This is typically useful for a neutralizing background
+            of ions. The macroparticles of this species have to be at rest.
         """
         # Define whether or not to use the GPU
         self.use_cuda = use_cuda
@@ -146,9 +171,12 @@ class Particles(object) :
             self.use_cuda = False
 
         # Generate evenly-spaced particles
-        Ntot, x, y, z, ux, uy, uz, inv_gamma, w = generate_evenly_spaced(
-            Npz, zmin, zmax, Npr, rmin, rmax, Nptheta, n, dens_func,
-            ux_m, uy_m, uz_m, ux_th, uy_th, uz_th )
+        # (The arguments are kept, in order to regenerate the particles
+        # when the simulation is reset ; see `reinitialize`)
+        self.generation_args = ( Npz, zmin, zmax, Npr, rmin, rmax, Nptheta,
+                n, dens_func, ux_m, uy_m, uz_m, ux_th, uy_th, uz_th )
+        Ntot, x, y, z, ux, uy, uz, inv_gamma, w = \
+            generate_evenly_spaced( *self.generation_args )
 
         # Register the properties of the particles
         # (Necessary for the pusher, and when adding more particles later, )
@@ -156,24 +184,41 @@ class Particles(object) :
         self.q = q
         self.m = m
         self.dt = dt
+        if (int(subcycle) != subcycle) or (subcycle < 1):
+            raise ValueError('`subcycle` should be a positive integer.')
+        self.subcycle = int(subcycle)
+        if immobile and any( u != 0 for u in
+                            [ux_m, uy_m, uz_m, ux_th, uy_th, uz_th] ):
+            raise ValueError('The particles of an immobile species '
+                             'should be at rest.')
+        self.immobile = immobile
 
         # Register the particle arrarys
-        self.x = x
-        self.y = y
-        self.z = z
-        self.ux = ux
-        self.uy = uy
-        self.uz = uz
-        self.inv_gamma = inv_gamma
-        self.w = w
+        # (The arrays are copied in parallel, so that each chunk of
+        # particles is allocated on the NUMA node of the thread that
+        # processes it ; see `fbpic.utils.placement`)
+        self.x = first_touch_copy( x )
+        self.y = first_touch_copy( y )
+        self.z = first_touch_copy( z )
+        self.ux = first_touch_copy( ux )
+        self.uy = first_touch_copy( uy )
+        self.uz = first_touch_copy( uz )
+        self.inv_gamma = first_touch_copy( inv_gamma )
+        self.w = first_touch_copy( w )
 
         # Initialize the fields array (at the positions of the particles)
-        self.Ez = np.zeros( Ntot )
-        self.Ex = np.zeros( Ntot )
-        self.Ey = np.zeros( Ntot )
-        self.Bz = np.zeros( Ntot )
-        self.Bx = np.zeros( Ntot )
-        self.By = np.zeros( Ntot )
+        self.Ez = first_touch_zeros( Ntot )
+        self.Ex = first_touch_zeros( Ntot )
+        self.Ey = first_touch_zeros( Ntot )
+        self.Bz = first_touch_zeros( Ntot )
+        self.Bx = first_touch_zeros( Ntot )
+        self.By = first_touch_zeros( Ntot )
+        # Square modulus of the laser envelope and its gradient (envelope
+        # model only; allocated in `gather_envelope`, when needed)
+        self.a2 = None
+        self.grad_a2_x = None
+        self.grad_a2_y = None
+        self.grad_a2_z = None
 
         # The particle injector stores information that is useful in order
         # continuously inject particles in the simulation, with moving window
@@ -193,6 +238,9 @@ class Particles(object) :
         # (see method make_ionizable and activate_compton)
         self.ionizer = None
         self.compton_scatterer = None
+        # By default, the macroparticles are not resampled
+        # (see method activate_resampling)
+        self.resampler = None
         # Total number of quantities (necessary in MPI communications)
         self.n_integer_quantities = 0
         self.n_float_quantities = 8 # x, y, z, ux, uy, uz, inv_gamma, w
@@ -345,6 +393,74 @@ class Particles(object) :
         return( float_buffer, uint_buffer )
 
 
+    def reinitialize( self, comm ):
+        """
+        Discard all the macroparticles of this species, and generate again
+        the evenly-spaced macroparticles with which it was initialized
+        (if any). This is called by `Simulation.reset`.
+
+        The tracking, ionization, Compton scattering and resampling
+        modules of this species are kept, and their per-particle data
+        is initialized as for new macroparticles.
+
+        Parameters
+        ----------
+        comm: an fbpic.BoundaryCommunicator object
+            Contains information about the number of processors
+        """
+        # Regenerate the particles
+        Ntot, x, y, z, ux, uy, uz, inv_gamma, w = \
+            generate_evenly_spaced( *self.generation_args )
+        self.Ntot = Ntot
+        self.x = x
+        self.y = y
+        self.z = z
+        self.ux = ux
+        self.uy = uy
+        self.uz = uz
+        self.inv_gamma = inv_gamma
+        self.w = w
+
+        # Reallocate the fields arrays (at the positions of the particles)
+        self.Ez = np.zeros( Ntot )
+        self.Ex = np.zeros( Ntot )
+        self.Ey = np.zeros( Ntot )
+        self.Bz = np.zeros( Ntot )
+        self.Bx = np.zeros( Ntot )
+        self.By = np.zeros( Ntot )
+        self.a2 = None
+        self.grad_a2_x = None
+        self.grad_a2_y = None
+        self.grad_a2_z = None
+
+        # The injection positions are initialized again at the next `step`
+        if self.continuous_injection:
+            self.injector.reset_injection_positions()
+
+        # Reinitialize the per-particle data of the attached modules
+        if self.tracker is not None:
+            self.tracker = ParticleTracker( comm.size, comm.rank, Ntot )
+        if self.ionizer is not None:
+            ionizer = self.ionizer
+            ionizer.ionization_level = \
+                np.ones( Ntot, dtype=np.uint64 ) * ionizer.level_start
+            ionizer.w_times_level = self.w * ionizer.ionization_level
+            ionizer.random_counter = 0
+            ionizer.active_batches = None
+            ionizer.active_ionization_level = None
+            ionizer.N_active = 0
+            ionizer.is_ionized = None
+
+        # Reallocate the sorting arrays when using CUDA
+        if self.use_cuda:
+            self.cell_idx = np.empty( Ntot, dtype=np.int32 )
+            self.sorted_idx = np.empty( Ntot, dtype=np.uint32 )
+            self.sorting_buffer = np.empty( Ntot, dtype=np.float64 )
+            if self.n_integer_quantities > 0:
+                self.int_sorting_buffer = np.empty( Ntot, dtype=np.uint64 )
+            self.prefix_sum_shift = 0
+            self.sorted = False
+
     def track( self, comm ):
         """
         Activate particle tracking for the current species
@@ -365,7 +481,7 @@ class Particles(object) :
 
     def activate_compton( self, target_species, laser_energy, laser_wavelength,
         laser_waist, laser_ctau, laser_initial_z0, ratio_w_electron_photon=1,
-        boost=None ):
+        boost=None, random_seed=None ):
         """
         Activate Compton scattering.
 
@@ -404,14 +520,23 @@ class Particles(object) :
             weight of the photon macroparticles that it will emit.
             Increasing this ratio increases the number of photon macroparticles
             that will be emitted and therefore improves statistics.
+
+        random_seed: int, optional
+            The seed of the random number generator used on CPU (for a given
+            seed, the result does not depend on the number of threads).
+            If None, the seed is drawn from numpy's global random generator.
         """
+        if self.immobile or target_species.immobile:
+            raise NotImplementedError(
+                'Compton scattering is not implemented for immobile species.')
         self.compton_scatterer = ComptonScatterer(
             self, target_species, laser_energy, laser_wavelength,
             laser_waist, laser_ctau, laser_initial_z0,
-            ratio_w_electron_photon, boost )
+            ratio_w_electron_photon, boost, random_seed )
 
 
-    def make_ionizable( self, element, target_species, level_start=0):
+    def make_ionizable( self, element, target_species, level_start=0,
+                        random_seed=None ):
         """
         Make this species ionizable.
 
@@ -440,9 +565,22 @@ class Particles(object) :
         level_start: int
             The ionization level at which the macroparticles are initially
             (e.g. 0 for initially neutral atoms)
+
+        random_seed: int, optional
+            The seed of the random number generator used for ionization
+            (for a given seed, the result does not depend on the number
+            of threads). If None, the seed is drawn from numpy's global
+            random generator.
         """
+        if self.resampler is not None:
+            raise NotImplementedError(
+                'Resampling is not implemented for ionizable species.')
+        if self.immobile or target_species.immobile:
+            raise NotImplementedError(
+                'Ionization is not implemented for immobile species.')
         # Initialize the ionizer module
-        self.ionizer = Ionizer( element, self, target_species, level_start )
+        self.ionizer = Ionizer( element, self, target_species, level_start,
+                                random_seed )
         # Set charge to the elementary charge e (assumed by deposition kernel,
         # when using self.ionizer.w_times_level as the effective weight)
         self.q = e
@@ -455,17 +593,97 @@ class Particles(object) :
             self.int_sorting_buffer = np.empty( self.Ntot, dtype=np.uint64 )
 
 
-    def handle_elementary_processes( self, t ):
+    def activate_resampling( self, period, min_group_size=8,
+                split_weight=None, n_azimuthal_bins=8,
+                momentum_resolution=0.1, n_direction_bins=(8, 16), start=0 ):
+        """
+        Activate the periodic resampling (merging and splitting) of the
+        macroparticles of this species.
+
+        Every `period` iterations, the macroparticles that are in the same
+        cell and have similar momenta are merged (by groups of at least
+        `min_group_size` macroparticles, each group being replaced by 2
+        macroparticles), in such a way that the total charge, momentum
+        and energy are exactly conserved. In addition, the macroparticles
+        whose weight is larger than `split_weight` are split in two.
+
+        This is typically useful for species whose number of macroparticles
+        keeps increasing (e.g. electrons from ionization, photons from
+        Compton scattering).
+
+        Parameters
+        ----------
+        period: int
+            The number of iterations between two resampling operations
+
+        min_group_size: int, optional
+            The minimal number of macroparticles that are merged together
+
+        split_weight: float or None, optional
+            The weight above which macroparticles are split
+            (If None, macroparticles are never split)
+
+        n_azimuthal_bins, momentum_resolution, n_direction_bins, start:
+            See the docstring of the class `ParticleResampler`
+        """
+        if self.ionizer is not None:
+            raise NotImplementedError(
+                'Resampling is not implemented for ionizable species.')
+        self.resampler = ParticleResampler( period, min_group_size,
+            split_weight, n_azimuthal_bins, momentum_resolution,
+            n_direction_bins, start )
+
+    def resample_particles( self, fld, iteration ):
+        """
+        Resample the macroparticles of this species, if resampling
+        was activated and is due at this iteration.
+
+        Parameters
+        ----------
+        fld: a Fields object
+            Contains information about the dimension of the grid
+
+        iteration: int
+            The current iteration
+
+        Returns
+        -------
+        A boolean that indicates whether the macroparticles were resampled
+        (in which case the charge density needs to be deposited again)
+        """
+        if (self.resampler is None) or \
+                (not self.resampler.is_due( iteration )):
+            return( False )
+
+        # The resampling is performed on the CPU
+        if self.use_cuda:
+            self.receive_particles_from_gpu()
+        self.resampler.resample( self, fld.interp[0] )
+        if self.use_cuda:
+            # Reallocate the sorting arrays with the new number of particles
+            self.cell_idx = np.empty( self.Ntot, dtype=np.int32 )
+            self.sorted_idx = np.empty( self.Ntot, dtype=np.uint32 )
+            self.sorting_buffer = np.empty( self.Ntot, dtype=np.float64 )
+            if self.n_integer_quantities > 0:
+                self.int_sorting_buffer = np.empty(self.Ntot, dtype=np.uint64)
+            self.send_particles_to_gpu()
+            self.sorted = False
+        return( True )
+
+    def handle_elementary_processes( self, t, rank=0 ):
         """
         Handle elementary processes for this species (e.g. ionization,
         Compton scattering) at simulation time t.
+
+        (`rank` is the rank of the local proc in the domain decomposition,
+        which is used in the key of the random numbers.)
         """
         # Ionization
         if self.ionizer is not None:
-            self.ionizer.handle_ionization( self )
+            self.ionizer.handle_ionization( self, rank )
         # Compton scattering
         if self.compton_scatterer is not None:
-            self.compton_scatterer.handle_scattering( self, t )
+            self.compton_scatterer.handle_scattering( self, t, rank )
 
 
     def rearrange_particle_arrays( self ):
@@ -512,7 +730,7 @@ class Particles(object) :
             # Assign the old particle data array to the particle buffer
             self.int_sorting_buffer = particle_array
 
-    def push_p( self, t ) :
+    def push_p( self, t, use_envelope=False ) :
         """
         Advance the particles' momenta over one timestep, using the Vay pusher
         Reference : Vay, Physics of Plasmas 15, 056701 (2008)
@@ -521,15 +739,25 @@ class Particles(object) :
         half-timestep *behind* the positions (x, y, z), and it brings
         them one half-timestep *ahead* of the positions.
 
+        For subcycled species, the timestep is `subcycle*dt`.
+
         Parameters
         ----------
         t: float
             The current simulation time
             (Useful for particles that are ballistic before a given plane)
+
+        use_envelope: bool, optional
+            Whether to add the averaged ponderomotive force of the laser
+            envelope (envelope model), which requires `gather_envelope` to
+            be called beforehand. (Ionizable species and particles that are
+            ballistic before a plane are not coupled to the envelope.)
         """
         # Skip push for neutral particles (e.g. photons)
         if self.q == 0:
             return
+        # Timestep of the push (longer for subcycled species)
+        dt = self.subcycle * self.dt
         # For particles that are ballistic before a plane,
         # get the current position of the plane
         if isinstance( self.injector, BallisticBeforePlane ):
@@ -552,7 +780,7 @@ class Particles(object) :
                     self.ux, self.uy, self.uz, self.inv_gamma,
                     self.Ex, self.Ey, self.Ez,
                     self.Bx, self.By, self.Bz,
-                    self.m, self.Ntot, self.dt, self.ionizer.ionization_level )
+                    self.m, self.Ntot, dt, self.ionizer.ionization_level )
             elif z_plane is not None:
                 # Particles that are ballistic before a plane also
                 # require a different pusher
@@ -561,14 +789,22 @@ class Particles(object) :
                     self.ux, self.uy, self.uz, self.inv_gamma,
                     self.Ex, self.Ey, self.Ez,
                     self.Bx, self.By, self.Bz,
-                    self.q, self.m, self.Ntot, self.dt )
+                    self.q, self.m, self.Ntot, dt )
+            elif use_envelope:
+                # Pusher with the ponderomotive force of the envelope
+                push_p_envelope_gpu[dim_grid_1d, dim_block_1d](
+                    self.ux, self.uy, self.uz, self.inv_gamma,
+                    self.Ex, self.Ey, self.Ez,
+                    self.Bx, self.By, self.Bz, self.a2,
+                    self.grad_a2_x, self.grad_a2_y, self.grad_a2_z,
+                    self.q, self.m, self.Ntot, dt )
             else:
                 # Standard pusher
                 push_p_gpu[dim_grid_1d, dim_block_1d](
                     self.ux, self.uy, self.uz, self.inv_gamma,
                     self.Ex, self.Ey, self.Ez,
                     self.Bx, self.By, self.Bz,
-                    self.q, self.m, self.Ntot, self.dt )
+                    self.q, self.m, self.Ntot, dt )
 
         # CPU version
         else:
@@ -577,7 +813,7 @@ class Particles(object) :
                 # macroparticle, and hence require a different function
                 push_p_ioniz_numba(self.ux, self.uy, self.uz, self.inv_gamma,
                     self.Ex, self.Ey, self.Ez, self.Bx, self.By, self.Bz,
-                    self.m, self.Ntot, self.dt, self.ionizer.ionization_level )
+                    self.m, self.Ntot, dt, self.ionizer.ionization_level )
             elif z_plane is not None:
                 # Particles that are ballistic before a plane also
                 # require a different pusher
@@ -586,12 +822,19 @@ class Particles(object) :
                     self.ux, self.uy, self.uz, self.inv_gamma,
                     self.Ex, self.Ey, self.Ez,
                     self.Bx, self.By, self.Bz,
-                    self.q, self.m, self.Ntot, self.dt )
+                    self.q, self.m, self.Ntot, dt )
+            elif use_envelope:
+                # Pusher with the ponderomotive force of the envelope
+                push_p_envelope_numba(self.ux, self.uy, self.uz,
+                    self.inv_gamma, self.Ex, self.Ey, self.Ez,
+                    self.Bx, self.By, self.Bz, self.a2,
+                    self.grad_a2_x, self.grad_a2_y, self.grad_a2_z,
+                    self.q, self.m, self.Ntot, dt )
             else:
                 # Standard pusher
                 push_p_numba(self.ux, self.uy, self.uz, self.inv_gamma,
                     self.Ex, self.Ey, self.Ez, self.Bx, self.By, self.Bz,
-                    self.q, self.m, self.Ntot, self.dt )
+                    self.q, self.m, self.Ntot, dt )
 
 
     def push_x( self, dt, x_push=1., y_push=1., z_push=1. ) :
@@ -651,7 +894,8 @@ class Particles(object) :
         # GPU (CUDA) version
         if self.use_cuda:
             # Get the threads per block and the blocks per grid
-            dim_grid_1d, dim_block_1d = cuda_tpb_bpg_1d( self.Ntot, TPB=64 )
+            dim_grid_1d, dim_block_1d = cuda_tpb_bpg_1d( self.Ntot,
+                                            TPB=cuda_tpb['gather'] )
             # Call the CUDA Kernel for the gathering of E and B Fields
             if self.particle_shape == 'linear':
                 if Nm == 2:
@@ -668,19 +912,20 @@ class Particles(object) :
                          self.Bx, self.By, self.Bz)
                 else:
                     # Generic version for arbitrary number of modes
-                    erase_eb_cuda[dim_grid_1d, dim_block_1d](
-                                    self.Ex, self.Ey, self.Ez,
-                                    self.Bx, self.By, self.Bz, self.Ntot )
-                    for m in range(Nm):
-                        gather_field_gpu_linear_one_mode[
-                            dim_grid_1d, dim_block_1d](
-                            self.x, self.y, self.z,
-                            grid[m].invdz, grid[m].zmin, grid[m].Nz,
-                            grid[m].invdr, grid[m].rmin, grid[m].Nr,
-                            grid[m].Er, grid[m].Et, grid[m].Ez,
-                            grid[m].Br, grid[m].Bt, grid[m].Bz, m,
-                            self.Ex, self.Ey, self.Ez,
-                            self.Bx, self.By, self.Bz)
+                    # (all the modes are gathered in a single sweep)
+                    gather_field_gpu_linear_multi_mode[
+                        dim_grid_1d, dim_block_1d](
+                        self.x, self.y, self.z,
+                        grid[0].invdz, grid[0].zmin, grid[0].Nz,
+                        grid[0].invdr, grid[0].rmin, grid[0].Nr,
+                        tuple( grid[m].Er for m in range(Nm) ),
+                        tuple( grid[m].Et for m in range(Nm) ),
+                        tuple( grid[m].Ez for m in range(Nm) ),
+                        tuple( grid[m].Br for m in range(Nm) ),
+                        tuple( grid[m].Bt for m in range(Nm) ),
+                        tuple( grid[m].Bz for m in range(Nm) ),
+                        self.Ex, self.Ey, self.Ez,
+                        self.Bx, self.By, self.Bz )
             elif self.particle_shape == 'cubic':
                 if Nm == 2:
                     # Optimized version for 2 modes
@@ -696,19 +941,20 @@ class Particles(object) :
                          self.Bx, self.By, self.Bz)
                 else:
                     # Generic version for arbitrary number of modes
-                    erase_eb_cuda[dim_grid_1d, dim_block_1d](
-                                    self.Ex, self.Ey, self.Ez,
-                                    self.Bx, self.By, self.Bz, self.Ntot )
-                    for m in range(Nm):
-                        gather_field_gpu_cubic_one_mode[
-                            dim_grid_1d, dim_block_1d](
-                            self.x, self.y, self.z,
-                            grid[m].invdz, grid[m].zmin, grid[m].Nz,
-                            grid[m].invdr, grid[m].rmin, grid[m].Nr,
-                            grid[m].Er, grid[m].Et, grid[m].Ez,
-                            grid[m].Br, grid[m].Bt, grid[m].Bz, m,
-                            self.Ex, self.Ey, self.Ez,
-                            self.Bx, self.By, self.Bz)
+                    # (all the modes are gathered in a single sweep)
+                    gather_field_gpu_cubic_multi_mode[
+                        dim_grid_1d, dim_block_1d](
+                        self.x, self.y, self.z,
+                        grid[0].invdz, grid[0].zmin, grid[0].Nz,
+                        grid[0].invdr, grid[0].rmin, grid[0].Nr,
+                        tuple( grid[m].Er for m in range(Nm) ),
+                        tuple( grid[m].Et for m in range(Nm) ),
+                        tuple( grid[m].Ez for m in range(Nm) ),
+                        tuple( grid[m].Br for m in range(Nm) ),
+                        tuple( grid[m].Bt for m in range(Nm) ),
+                        tuple( grid[m].Bz for m in range(Nm) ),
+                        self.Ex, self.Ey, self.Ez,
+                        self.Bx, self.By, self.Bz )
             else:
                 raise ValueError("`particle_shape` should be either \
                                   'linear' or 'cubic' \
@@ -730,18 +976,19 @@ class Particles(object) :
                         self.Bx, self.By, self.Bz)
                 else:
                     # Generic version for arbitrary number of modes
-                    erase_eb_numba( self.Ex, self.Ey, self.Ez,
-                                    self.Bx, self.By, self.Bz, self.Ntot )
-                    for m in range(Nm):
-                        gather_field_numba_linear_one_mode(
-                            self.x, self.y, self.z,
-                            grid[m].invdz, grid[m].zmin, grid[m].Nz,
-                            grid[m].invdr, grid[m].rmin, grid[m].Nr,
-                            grid[m].Er, grid[m].Et, grid[m].Ez,
-                            grid[m].Br, grid[m].Bt, grid[m].Bz, m,
-                            self.Ex, self.Ey, self.Ez,
-                            self.Bx, self.By, self.Bz
-                        )
+                    # (all the modes are gathered in a single sweep)
+                    gather_field_numba_linear_multi_mode(
+                        self.x, self.y, self.z,
+                        grid[0].invdz, grid[0].zmin, grid[0].Nz,
+                        grid[0].invdr, grid[0].rmin, grid[0].Nr,
+                        tuple( grid[m].Er for m in range(Nm) ),
+                        tuple( grid[m].Et for m in range(Nm) ),
+                        tuple( grid[m].Ez for m in range(Nm) ),
+                        tuple( grid[m].Br for m in range(Nm) ),
+                        tuple( grid[m].Bt for m in range(Nm) ),
+                        tuple( grid[m].Bz for m in range(Nm) ),
+                        self.Ex, self.Ey, self.Ez,
+                        self.Bx, self.By, self.Bz )
             elif self.particle_shape == 'cubic':
                 # Divide particles into chunks (each chunk is handled by a
                 # different thread) and return the indices that bound chunks
@@ -761,23 +1008,75 @@ class Particles(object) :
                         nthreads, ptcl_chunk_indices )
                 else:
                     # Generic version for arbitrary number of modes
-                    erase_eb_numba( self.Ex, self.Ey, self.Ez,
-                                    self.Bx, self.By, self.Bz, self.Ntot )
-                    for m in range(Nm):
-                        gather_field_numba_cubic_one_mode(
-                            self.x, self.y, self.z,
-                            grid[m].invdz, grid[m].zmin, grid[m].Nz,
-                            grid[m].invdr, grid[m].rmin, grid[m].Nr,
-                            grid[m].Er, grid[m].Et, grid[m].Ez,
-                            grid[m].Br, grid[m].Bt, grid[m].Bz, m,
-                            self.Ex, self.Ey, self.Ez,
-                            self.Bx, self.By, self.Bz,
-                            nthreads, ptcl_chunk_indices )
+                    # (all the modes are gathered in a single sweep)
+                    gather_field_numba_cubic_multi_mode(
+                        self.x, self.y, self.z,
+                        grid[0].invdz, grid[0].zmin, grid[0].Nz,
+                        grid[0].invdr, grid[0].rmin, grid[0].Nr,
+                        tuple( grid[m].Er for m in range(Nm) ),
+                        tuple( grid[m].Et for m in range(Nm) ),
+                        tuple( grid[m].Ez for m in range(Nm) ),
+                        tuple( grid[m].Br for m in range(Nm) ),
+                        tuple( grid[m].Bt for m in range(Nm) ),
+                        tuple( grid[m].Bz for m in range(Nm) ),
+                        self.Ex, self.Ey, self.Ez,
+                        self.Bx, self.By, self.Bz,
+                        nthreads, ptcl_chunk_indices )
             else:
                 raise ValueError("`particle_shape` should be either \
                                   'linear' or 'cubic' \
                                    but is `%s`" % self.particle_shape)
 
+    def gather_envelope( self, fld ):
+        """
+        Gather the square modulus of the laser envelope and its gradient
+        onto the macroparticles (envelope model), into the arrays `a2`,
+        `grad_a2_x`, `grad_a2_y` and `grad_a2_z` (used in `push_p`)
+
+        The envelope is gathered with linear weights, for any particle shape.
+
+        Parameter
+        ----------
+        fld : a Fields object
+             Contains the list of EnvelopeInterpolationGrid objects
+        """
+        # Skip gathering for neutral particles (e.g. photons)
+        if self.q == 0:
+            return
+
+        # (Re)allocate the arrays if the number of particles changed
+        if (self.a2 is None) or (self.a2.shape[0] != self.Ntot):
+            if self.use_cuda:
+                allocate = cuda.device_array
+            else:
+                allocate = np.empty
+            self.a2 = allocate( self.Ntot, dtype=np.float64 )
+            self.grad_a2_x = allocate( self.Ntot, dtype=np.float64 )
+            self.grad_a2_y = allocate( self.Ntot, dtype=np.float64 )
+            self.grad_a2_z = allocate( self.Ntot, dtype=np.float64 )
+
+        # Shortcuts
+        grid = fld.envelope_interp
+        a_grid = tuple( env_grid.a for env_grid in grid )
+
+        # GPU (CUDA) version
+        if self.use_cuda:
+            # Get the threads per block and the blocks per grid
+            dim_grid_1d, dim_block_1d = cuda_tpb_bpg_1d( self.Ntot,
+                                            TPB=cuda_tpb['gather'] )
+            gather_envelope_gpu_linear[dim_grid_1d, dim_block_1d](
+                self.x, self.y, self.z,
+                grid[0].invdz, grid[0].zmin, grid[0].Nz,
+                grid[0].invdr, grid[0].rmin, grid[0].Nr, a_grid,
+                self.a2, self.grad_a2_x, self.grad_a2_y, self.grad_a2_z )
+        # CPU version
+        else:
+            gather_envelope_numba_linear(
+                self.x, self.y, self.z,
+                grid[0].invdz, grid[0].zmin, grid[0].Nz,
+                grid[0].invdr, grid[0].rmin, grid[0].Nr, a_grid,
+                self.a2, self.grad_a2_x, self.grad_a2_y, self.grad_a2_z )
+
     def deposit( self, fld, fieldtype ) :
         """
         Deposit the particles charge or current onto the grid
@@ -793,15 +1092,20 @@ class Particles(object) :
 
         fieldtype : string
              Indicates which field to deposit
-             Either 'J' or 'rho'
+             Either 'J', 'rho' or 'chi' (plasma susceptibility of the
+             envelope model, i.e. q**2*n/(m*epsilon_0*gamma), which is
+             deposited in the `rho` arrays)
         """
         # Skip deposition for neutral particles (e.g. photons)
         if self.q == 0:
             return
+        # The susceptibility of ionizable (heavy) species is neglected
+        if fieldtype == 'chi' and self.ionizer is not None:
+            return
 
         # Shortcuts and safe-guards
         grid = fld.interp
-        assert fieldtype in ['rho', 'J']
+        assert fieldtype in ['rho', 'J', 'chi']
         assert self.particle_shape in ['linear', 'cubic']
 
         # When running on GPU: first sort the arrays of particles
@@ -819,100 +1123,99 @@ class Particles(object) :
             weight = self.ionizer.w_times_level
         else:
             weight = self.w
+        # For the susceptibility: deposit w/gamma with the charge deposition
+        # (the weights include the factor q/(m*epsilon_0) of this species)
+        if fieldtype == 'chi':
+            chi_const = self.q/(self.m*epsilon_0)
+            if self.use_cuda:
+                weight = cuda.device_array_like( self.w )
+                dim_grid_1d, dim_block_1d = cuda_tpb_bpg_1d( self.Ntot )
+                get_chi_weight_gpu[dim_grid_1d, dim_block_1d](
+                    self.w, self.inv_gamma, chi_const, weight, self.Ntot )
+            else:
+                weight = self.w*self.inv_gamma*chi_const
+            fieldtype = 'rho'
 
         # GPU (CUDA) version
         if self.use_cuda:
             # Get the threads per block and the blocks per grid
             dim_grid_2d_flat, dim_block_2d_flat = \
-                cuda_tpb_bpg_1d( self.prefix_sum.shape[0], TPB=64 )
+                cuda_tpb_bpg_1d( self.prefix_sum.shape[0],
+                                 TPB=cuda_tpb['deposit'] )
 
             # Call the CUDA Kernel for the deposition of rho or J
             Nm = len( grid )
-            # Rho
-            if fieldtype == 'rho':
+            if Nm != 2:
+                # Generic version for arbitrary number of modes
+                # (all the modes are deposited in a single sweep)
+                if fieldtype == 'rho':
+                    deposit_rho_gpu_multi_mode = \
+                        get_deposit_rho_gpu_multi_mode( Nm,
+                                                self.particle_shape )
+                    deposit_rho_gpu_multi_mode[
+                        dim_grid_2d_flat, dim_block_2d_flat](
+                        self.x, self.y, self.z, weight, self.q,
+                        grid[0].invdz, grid[0].zmin, grid[0].Nz,
+                        grid[0].invdr, grid[0].rmin, grid[0].Nr,
+                        tuple( grid[m].rho for m in range(Nm) ),
+                        self.cell_idx, self.prefix_sum)
+                elif fieldtype == 'J':
+                    deposit_J_gpu_multi_mode = \
+                        get_deposit_J_gpu_multi_mode( Nm,
+                                                self.particle_shape )
+                    deposit_J_gpu_multi_mode[
+                        dim_grid_2d_flat, dim_block_2d_flat](
+                        self.x, self.y, self.z, weight, self.q,
+                        self.ux, self.uy, self.uz, self.inv_gamma,
+                        grid[0].invdz, grid[0].zmin, grid[0].Nz,
+                        grid[0].invdr, grid[0].rmin, grid[0].Nr,
+                        tuple( grid[m].Jr for m in range(Nm) ),
+                        tuple( grid[m].Jt for m in range(Nm) ),
+                        tuple( grid[m].Jz for m in range(Nm) ),
+                        self.cell_idx, self.prefix_sum)
+            # Rho (optimized version for 2 modes)
+            elif fieldtype == 'rho':
                 if self.particle_shape == 'linear':
-                    if Nm == 2:
-                        deposit_rho_gpu_linear[
-                            dim_grid_2d_flat, dim_block_2d_flat](
-                            self.x, self.y, self.z, weight, self.q,
-                            grid[0].invdz, grid[0].zmin, grid[0].Nz,
-                            grid[0].invdr, grid[0].rmin, grid[0].Nr,
-                            grid[0].rho, grid[1].rho,
-                            self.cell_idx, self.prefix_sum)
-                    else:
-                        for m in range(Nm):
-                            deposit_rho_gpu_linear_one_mode[
-                                dim_grid_2d_flat, dim_block_2d_flat](
-                                self.x, self.y, self.z, weight, self.q,
-                                grid[m].invdz, grid[m].zmin, grid[m].Nz,
-                                grid[m].invdr, grid[m].rmin, grid[m].Nr,
-                                grid[m].rho, m,
-                                self.cell_idx, self.prefix_sum)
+                    deposit_rho_gpu_linear[
+                        dim_grid_2d_flat, dim_block_2d_flat](
+                        self.x, self.y, self.z, weight, self.q,
+                        grid[0].invdz, grid[0].zmin, grid[0].Nz,
+                        grid[0].invdr, grid[0].rmin, grid[0].Nr,
+                        grid[0].rho, grid[1].rho,
+                        self.cell_idx, self.prefix_sum)
                 elif self.particle_shape == 'cubic':
-                    if Nm == 2:
-                        deposit_rho_gpu_cubic[
-                            dim_grid_2d_flat, dim_block_2d_flat](
-                            self.x, self.y, self.z, weight, self.q,
-                            grid[0].invdz, grid[0].zmin, grid[0].Nz,
-                            grid[0].invdr, grid[0].rmin, grid[0].Nr,
-                            grid[0].rho, grid[1].rho,
-                            self.cell_idx, self.prefix_sum)
-                    else:
-                        for m in range(Nm):
-                            deposit_rho_gpu_cubic_one_mode[
-                                dim_grid_2d_flat, dim_block_2d_flat](
-                                self.x, self.y, self.z, weight, self.q,
-                                grid[m].invdz, grid[m].zmin, grid[m].Nz,
-                                grid[m].invdr, grid[m].rmin, grid[m].Nr,
-                                grid[m].rho, m,
-                                self.cell_idx, self.prefix_sum)
-            # J
+                    deposit_rho_gpu_cubic[
+                        dim_grid_2d_flat, dim_block_2d_flat](
+                        self.x, self.y, self.z, weight, self.q,
+                        grid[0].invdz, grid[0].zmin, grid[0].Nz,
+                        grid[0].invdr, grid[0].rmin, grid[0].Nr,
+                        grid[0].rho, grid[1].rho,
+                        self.cell_idx, self.prefix_sum)
+            # J (optimized version for 2 modes)
             elif fieldtype == 'J':
                 # Deposit J in each of four directions
                 if self.particle_shape == 'linear':
-                    if Nm == 2:
-                        deposit_J_gpu_linear[
-                            dim_grid_2d_flat, dim_block_2d_flat](
-                            self.x, self.y, self.z, weight, self.q,
-                            self.ux, self.uy, self.uz, self.inv_gamma,
-                            grid[0].invdz, grid[0].zmin, grid[0].Nz,
-                            grid[0].invdr, grid[0].rmin, grid[0].Nr,
-                            grid[0].Jr, grid[1].Jr,
-                            grid[0].Jt, grid[1].Jt,
-                            grid[0].Jz, grid[1].Jz,
-                            self.cell_idx, self.prefix_sum)
-                    else:
-                        for m in range(Nm):
-                            deposit_J_gpu_linear_one_mode[
-                                dim_grid_2d_flat, dim_block_2d_flat](
-                                self.x, self.y, self.z, weight, self.q,
-                                self.ux, self.uy, self.uz, self.inv_gamma,
-                                grid[m].invdz, grid[m].zmin, grid[m].Nz,
-                                grid[m].invdr, grid[m].rmin, grid[m].Nr,
-                                grid[m].Jr, grid[m].Jt, grid[m].Jz, m,
-                                self.cell_idx, self.prefix_sum)
+                    deposit_J_gpu_linear[
+                        dim_grid_2d_flat, dim_block_2d_flat](
+                        self.x, self.y, self.z, weight, self.q,
+                        self.ux, self.uy, self.uz, self.inv_gamma,
+                        grid[0].invdz, grid[0].zmin, grid[0].Nz,
+                        grid[0].invdr, grid[0].rmin, grid[0].Nr,
+                        grid[0].Jr, grid[1].Jr,
+                        grid[0].Jt, grid[1].Jt,
+                        grid[0].Jz, grid[1].Jz,
+                        self.cell_idx, self.prefix_sum)
                 elif self.particle_shape == 'cubic':
-                    if Nm == 2:
-                        deposit_J_gpu_cubic[
-                            dim_grid_2d_flat, dim_block_2d_flat](
-                            self.x, self.y, self.z, weight, self.q,
-                            self.ux, self.uy, self.uz, self.inv_gamma,
-                            grid[0].invdz, grid[0].zmin, grid[0].Nz,
-                            grid[0].invdr, grid[0].rmin, grid[0].Nr,
-                            grid[0].Jr, grid[1].Jr,
-                            grid[0].Jt, grid[1].Jt,
-                            grid[0].Jz, grid[1].Jz,
-                            self.cell_idx, self.prefix_sum)
-                    else:
-                        for m in range(Nm):
-                            deposit_J_gpu_cubic_one_mode[
-                                dim_grid_2d_flat, dim_block_2d_flat](
-                                self.x, self.y, self.z, weight, self.q,
-                                self.ux, self.uy, self.uz, self.inv_gamma,
-                                grid[m].invdz, grid[m].zmin, grid[m].Nz,
-                                grid[m].invdr, grid[m].rmin, grid[m].Nr,
-                                grid[m].Jr, grid[m].Jt, grid[m].Jz, m,
-                                self.cell_idx, self.prefix_sum)
+                    deposit_J_gpu_cubic[
+                        dim_grid_2d_flat, dim_block_2d_flat](
+                        self.x, self.y, self.z, weight, self.q,
+                        self.ux, self.uy, self.uz, self.inv_gamma,
+                        grid[0].invdz, grid[0].zmin, grid[0].Nz,
+                        grid[0].invdr, grid[0].rmin, grid[0].Nr,
+                        grid[0].Jr, grid[1].Jr,
+                        grid[0].Jt, grid[1].Jt,
+                        grid[0].Jz, grid[1].Jz,
+                        self.cell_idx, self.prefix_sum)
 
         # CPU version
         else:
@@ -8,7 +8,7 @@ It defines the particle push methods on the CPU with numba.
 import math
 import numba
 from fbpic.utils.threading import njit_parallel, prange
-from scipy.constants import c, e
+from scipy.constants import c, e, m_e
 
 @njit_parallel
 def push_x_numba( x, y, z, ux, uy, uz, inv_gamma, Ntot, dt,
@@ -46,6 +46,39 @@ def push_p_numba( ux, uy, uz, inv_gamma,
 
     return ux, uy, uz, inv_gamma
 
+@njit_parallel
+def push_p_envelope_numba( ux, uy, uz, inv_gamma,
+                Ex, Ey, Ez, Bx, By, Bz, a2, grad_a2_x, grad_a2_y, grad_a2_z,
+                q, m, Ntot, dt ) :
+    """
+    Advance the particles' momenta, using numba, including the averaged
+    ponderomotive force of a laser envelope (envelope model).
+
+    `a2` and `grad_a2_*` are |a|^2 and its gradient at the position of the
+    particles, where `a` is the envelope normalized for electrons.
+    """
+    # Set a few constants
+    econst = q*dt/(m*c)
+    bconst = 0.5*q*dt/m
+    # Scaling of |a|^2 for the charge and mass of this species
+    a2_ratio = ( q*m_e/(e*m) )**2
+    pconst = 0.25*c*dt*a2_ratio
+
+    # Loop over the particles (in parallel if threading is installed)
+    for ip in prange(Ntot) :
+        # Averaged Lorentz factor (includes the quiver motion)
+        a2_half = 0.5*a2_ratio*a2[ip]
+        inv_gamma_i = 1./math.sqrt( 1 + ux[ip]**2 + uy[ip]**2 + uz[ip]**2
+                                    + a2_half )
+        ux[ip], uy[ip], uz[ip], inv_gamma[ip] = push_p_vay_envelope(
+            ux[ip], uy[ip], uz[ip], inv_gamma_i,
+            Ex[ip], Ey[ip], Ez[ip], Bx[ip], By[ip], Bz[ip], econst, bconst,
+            -pconst*inv_gamma_i*grad_a2_x[ip],
+            -pconst*inv_gamma_i*grad_a2_y[ip],
+            -pconst*inv_gamma_i*grad_a2_z[ip], a2_half )
+
+    return ux, uy, uz, inv_gamma
+
 @njit_parallel
 def push_p_after_plane_numba( z, z_plane, ux, uy, uz, inv_gamma,
                 Ex, Ey, Ez, Bx, By, Bz, q, m, Ntot, dt ) :
@@ -133,3 +166,47 @@ def push_p_vay( ux_i, uy_i, uz_i, inv_gamma_i,
     uz_f = s*( uzp + tz*ut + uxp*ty - uyp*tx )
 
     return( ux_f, uy_f, uz_f, inv_gamma_f )
+
+@numba.njit
+def push_p_vay_envelope( ux_i, uy_i, uz_i, inv_gamma_i,
+                Ex, Ey, Ez, Bx, By, Bz, econst, bconst,
+                dux_pond, duy_pond, duz_pond, a2_half ):
+    """
+    Push at single macroparticle, using the Vay pusher, with the additional
+    ponderomotive momentum kick `du*_pond` of a laser envelope.
+    The returned 1./gamma is the averaged one, which includes `a2_half`
+    (i.e. |a|^2/2 for this species).
+    """
+    # Get the magnetic rotation vector
+    taux = bconst*Bx
+    tauy = bconst*By
+    tauz = bconst*Bz
+    tau2 = taux**2 + tauy**2 + tauz**2
+
+    # Get the momenta at the half timestep
+    uxp = ux_i + econst*Ex + dux_pond \
+    + inv_gamma_i*( uy_i*tauz - uz_i*tauy )
+    uyp = uy_i + econst*Ey + duy_pond \
+    + inv_gamma_i*( uz_i*taux - ux_i*tauz )
+    uzp = uz_i + econst*Ez + duz_pond \
+    + inv_gamma_i*( ux_i*tauy - uy_i*taux )
+    sigma = 1 + a2_half + uxp**2 + uyp**2 + uzp**2 - tau2
+    utau = uxp*taux + uyp*tauy + uzp*tauz
+
+    # Get the new 1./gamma
+    inv_gamma_f = math.sqrt(
+        2./( sigma + math.sqrt( sigma**2 + 4*(tau2 + utau**2 ) ) ) )
+
+    # Reuse the tau and utau variables to save memory
+    tx = inv_gamma_f*taux
+    ty = inv_gamma_f*tauy
+    tz = inv_gamma_f*tauz
+    ut = inv_gamma_f*utau
+    s = 1./( 1 + tau2*inv_gamma_f**2 )
+
+    # Get the new u
+    ux_f = s*( uxp + tx*ut + uyp*tz - uzp*ty )
+    uy_f = s*( uyp + ty*ut + uzp*tx - uxp*tz )
+    uz_f = s*( uzp + tz*ut + uxp*ty - uyp*tx )
+
+    return( ux_f, uy_f, uz_f, inv_gamma_f )
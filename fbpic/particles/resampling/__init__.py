@@ -0,0 +1,8 @@
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It imports the ParticleResampler object, which is used in order to merge
+and split macroparticles at runtime.
+"""
+
+from .resampling import ParticleResampler
+__all__ = ['ParticleResampler']
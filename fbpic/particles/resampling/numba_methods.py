@@ -0,0 +1,332 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines the numba methods that are used in order to merge and
+split macroparticles (on CPU).
+"""
+import math
+import numpy as np
+from fbpic.utils.threading import njit_parallel, prange
+
+@njit_parallel
+def get_resampling_keys_numba( keys, Ntot, x, y, z, ux, uy, uz,
+        zmin, invdz, Nz, invdr, Nr, n_azimuthal_bins,
+        inv_momentum_resolution, n_magnitude_bins,
+        n_polar_bins, n_azimuth_bins ):
+    """
+    Compute, for each macroparticle, an integer key that identifies
+    the (cell, momentum bin) in which it is located. Macroparticles
+    that have the same key are candidates for merging.
+
+    The cell is identified by the indices along z and r of the grid, and
+    by an azimuthal bin (since a cell of the grid is a full ring in 3D).
+    The momentum bin is identified by the magnitude of the momentum
+    (with a bin width `1./inv_momentum_resolution` in asinh(|u|)), and by
+    its direction (polar and azimuthal angle of the momentum).
+    """
+    for ip in prange( Ntot ):
+        # Cell indices (clamped to the grid)
+        iz = int( math.floor( (z[ip] - zmin)*invdz ) )
+        iz = min( max( iz, 0 ), Nz-1 )
+        r = math.sqrt( x[ip]**2 + y[ip]**2 )
+        ir = min( int( r*invdr ), Nr-1 )
+        itheta = int( ( math.atan2( y[ip], x[ip] ) + math.pi ) \
+                        * n_azimuthal_bins/(2*math.pi) )
+        itheta = min( itheta, n_azimuthal_bins-1 )
+        # Momentum bin
+        u = math.sqrt( ux[ip]**2 + uy[ip]**2 + uz[ip]**2 )
+        iu = min( int( math.asinh(u) * inv_momentum_resolution ),
+                    n_magnitude_bins-1 )
+        if u > 0:
+            cos_polar = uz[ip]/u
+        else:
+            cos_polar = 1.
+        ipolar = min( int( 0.5*(cos_polar + 1.)*n_polar_bins ),
+                    n_polar_bins-1 )
+        iazimuth = int( ( math.atan2( uy[ip], ux[ip] ) + math.pi ) \
+                        * n_azimuth_bins/(2*math.pi) )
+        iazimuth = min( iazimuth, n_azimuth_bins-1 )
+        # Combine the indices into one single key
+        key = iz*Nr + ir
+        key = key*n_azimuthal_bins + itheta
+        key = key*n_magnitude_bins + iu
+        key = key*n_polar_bins + ipolar
+        key = key*n_azimuth_bins + iazimuth
+        keys[ip] = key
+
+    return( keys )
+
+@njit_parallel
+def sort_by_slab_numba( keys, slab_size, Nz, chunk_indices,
+                        slab_count, slab_start, sorted_idx ):
+    """
+    Sort the indices of the particles by longitudinal slab of the grid
+    (i.e. by `keys // slab_size`, see `get_resampling_keys_numba`), with
+    a parallel counting sort: each thread counts the particles of its
+    chunk in each slab, and then places them in `sorted_idx`.
+    The particles of each slab keep their original order.
+
+    Parameters
+    ----------
+    keys: 1darray of int64
+        The key of each particle
+
+    slab_size: int
+        The number of different keys in each slab
+
+    Nz: int
+        The number of slabs
+
+    chunk_indices: 1darray of ints
+        The indices of the particles between which each thread loops
+
+    slab_count: 2darray of int64, of shape (n_chunks, Nz)
+        Array used to count the particles of each chunk in each slab
+
+    slab_start: 1darray of int64, of size Nz+1
+        Array where the index of the first particle of each slab is stored
+        (with the total number of particles as last element)
+
+    sorted_idx: 1darray of int64, of the same size as keys
+        Array where the indices of the sorted particles are stored
+    """
+    n_chunks = len( chunk_indices ) - 1
+    # Count the particles of each chunk in each slab
+    for i_chk in prange( n_chunks ):
+        for iz in range( Nz ):
+            slab_count[i_chk, iz] = 0
+        for ip in range( chunk_indices[i_chk], chunk_indices[i_chk+1] ):
+            slab_count[i_chk, keys[ip]//slab_size] += 1
+    # Get the index at which each chunk starts writing in each slab
+    # (the chunks are placed one after the other, within each slab)
+    total = 0
+    for iz in range( Nz ):
+        slab_start[iz] = total
+        for i_chk in range( n_chunks ):
+            n = slab_count[i_chk, iz]
+            slab_count[i_chk, iz] = total
+            total += n
+    slab_start[Nz] = total
+    # Place the particles
+    for i_chk in prange( n_chunks ):
+        for ip in range( chunk_indices[i_chk], chunk_indices[i_chk+1] ):
+            iz = keys[ip]//slab_size
+            sorted_idx[ slab_count[i_chk, iz] ] = ip
+            slab_count[i_chk, iz] += 1
+
+    return( sorted_idx )
+
+@njit_parallel
+def sort_slabs_by_key_numba( keys, slab_start, sorted_idx ):
+    """
+    Sort the indices of the particles of each slab (see `sort_by_slab_numba`)
+    by key, in parallel over the slabs. (The sort is stable, so that the
+    result is the same as a stable sort of all the particles by key.)
+    """
+    for iz in prange( len(slab_start)-1 ):
+        i_start = slab_start[iz]
+        i_end = slab_start[iz+1]
+        if i_end - i_start > 1:
+            idx = sorted_idx[i_start:i_end].copy()
+            order = np.argsort( keys[idx], kind='mergesort' )
+            for i in range( i_end - i_start ):
+                sorted_idx[i_start + i] = idx[ order[i] ]
+
+    return( sorted_idx )
+
+@njit_parallel
+def merge_groups_numba( N_groups, group_start, sorted_idx, min_group_size,
+        dtheta, x, y, z, ux, uy, uz, inv_gamma, w, massless, keep ):
+    """
+    Merge each group of macroparticles (i.e. macroparticles that share the
+    same key in `get_resampling_keys_numba`) that contains at least
+    `min_group_size` macroparticles into 2 macroparticles, following
+    Vranic et al., Comput. Phys. Commun. 191 (2015).
+
+    The two new macroparticles have half the total weight of the group,
+    and their momenta are chosen so that the total weight (i.e. charge),
+    momentum and kinetic energy of the group are exactly conserved.
+    They are located at the (weighted) center of the group in r and z,
+    and rotated by +/- `dtheta` around the axis, with respect to the
+    (weighted) center of the group in theta. (Placing both at the same
+    position would make them deposit their charge at the same point, and
+    thus increase the noise, when their momenta are close.)
+
+    The new macroparticles are written in the slots of the first two
+    macroparticles of the group, and `keep` is set to 0 for the other
+    macroparticles of the group (`keep` is not modified otherwise).
+
+    Parameters
+    ----------
+    N_groups: int
+        The number of groups
+
+    group_start: 1darray of ints
+        Index, in `sorted_idx`, of the first particle of each group
+        (with one additional element, equal to the number of particles)
+
+    sorted_idx: 1darray of ints
+        Indices of the particles, sorted by key
+
+    min_group_size: int
+        The minimal number of macroparticles of a group that is merged
+
+    dtheta: float (in radians)
+        The azimuthal offset of each of the two new macroparticles
+
+    massless: bool
+        Whether the particles are massless (e.g. photons). In this case
+        `inv_gamma` contains the inverse of |u| instead of the inverse
+        of the Lorentz factor.
+    """
+    cos_d = math.cos( dtheta )
+    sin_d = math.sin( dtheta )
+    for i_group in prange( N_groups ):
+        i_start = group_start[i_group]
+        i_end = group_start[i_group+1]
+        if i_end - i_start < min_group_size:
+            continue
+
+        # Sum the weight, position, momentum and energy of the group
+        W = 0.
+        Wx = 0.
+        Wy = 0.
+        Wr = 0.
+        Wz = 0.
+        Px = 0.
+        Py = 0.
+        Pz = 0.
+        E = 0.
+        for i in range( i_start, i_end ):
+            ip = sorted_idx[i]
+            wp = w[ip]
+            W += wp
+            Wx += wp*x[ip]
+            Wy += wp*y[ip]
+            Wr += wp*math.sqrt( x[ip]**2 + y[ip]**2 )
+            Wz += wp*z[ip]
+            Px += wp*ux[ip]
+            Py += wp*uy[ip]
+            Pz += wp*uz[ip]
+            E += wp/inv_gamma[ip]
+        if W <= 0:
+            continue
+        invW = 1./W
+
+        # Energy and momentum of each of the two new macroparticles
+        eps = E*invW
+        if massless:
+            u_new = eps
+        else:
+            u_new = math.sqrt( max( eps**2 - 1., 0. ) )
+        P = math.sqrt( Px**2 + Py**2 + Pz**2 )
+        # Unit vector along the total momentum (e1), and
+        # angle between e1 and the momenta of the new macroparticles
+        ip0 = sorted_idx[i_start]
+        if P > 0:
+            e1x = Px/P
+            e1y = Py/P
+            e1z = Pz/P
+        else:
+            e1x = 0.
+            e1y = 0.
+            e1z = 1.
+        if u_new > 0:
+            cos_a = min( P*invW/u_new, 1. )
+        else:
+            cos_a = 1.
+        sin_a = math.sqrt( 1. - cos_a**2 )
+        # Unit vector perpendicular to e1 (e2), chosen along the component
+        # of the momentum of the first particle of the group that is
+        # perpendicular to e1 (or along an arbitrary axis, if it is 0)
+        u_par = ux[ip0]*e1x + uy[ip0]*e1y + uz[ip0]*e1z
+        e2x = ux[ip0] - u_par*e1x
+        e2y = uy[ip0] - u_par*e1y
+        e2z = uz[ip0] - u_par*e1z
+        n2 = math.sqrt( e2x**2 + e2y**2 + e2z**2 )
+        if n2 <= 1.e-12*( abs(u_par) + 1.e-300 ):
+            # Cross product of e1 with the axis of its smallest component
+            if abs(e1x) <= abs(e1y) and abs(e1x) <= abs(e1z):
+                e2x, e2y, e2z = 0., e1z, -e1y
+            elif abs(e1y) <= abs(e1z):
+                e2x, e2y, e2z = -e1z, 0., e1x
+            else:
+                e2x, e2y, e2z = e1y, -e1x, 0.
+            n2 = math.sqrt( e2x**2 + e2y**2 + e2z**2 )
+        e2x = e2x/n2
+        e2y = e2y/n2
+        e2z = e2z/n2
+
+        # Position of the new macroparticles
+        r_new = Wr*invW
+        rxy = math.sqrt( Wx**2 + Wy**2 )
+        if rxy > 0:
+            cos_t = Wx/rxy
+            sin_t = Wy/rxy
+        else:
+            cos_t = 1.
+            sin_t = 0.
+        z_new = Wz*invW
+        if u_new > 0:
+            inv_gamma_new = 1./eps
+        else:
+            inv_gamma_new = inv_gamma[ip0]
+
+        # Write the two new macroparticles in the first two slots
+        for k in range(2):
+            ip = sorted_idx[i_start + k]
+            sign = 1. - 2.*k
+            x[ip] = r_new*( cos_t*cos_d - sign*sin_t*sin_d )
+            y[ip] = r_new*( sin_t*cos_d + sign*cos_t*sin_d )
+            z[ip] = z_new
+            ux[ip] = u_new*( cos_a*e1x + sign*sin_a*e2x )
+            uy[ip] = u_new*( cos_a*e1y + sign*sin_a*e2y )
+            uz[ip] = u_new*( cos_a*e1z + sign*sin_a*e2z )
+            inv_gamma[ip] = inv_gamma_new
+            w[ip] = 0.5*W
+        # Remove the other macroparticles of the group
+        for i in range( i_start+2, i_end ):
+            keep[ sorted_idx[i] ] = 0
+
+    return( x, y, z, ux, uy, uz, inv_gamma, w, keep )
+
+@njit_parallel
+def append_copies_numba( array, idx, new_array ):
+    """
+    Copy `array` into the first elements of `new_array`, and the elements
+    `idx` of `array` into the remaining elements of `new_array`
+    (of size `len(array) + len(idx)`)
+    """
+    N = len( array )
+    for i in prange( N ):
+        new_array[i] = array[i]
+    for i in prange( len(idx) ):
+        new_array[N + i] = array[ idx[i] ]
+
+    return( new_array )
+
+@njit_parallel
+def split_particles_numba( idx, N, dtheta, x, y, w ):
+    """
+    Split the macroparticles `idx`, whose copies were appended from the
+    index `N` (see `append_copies_numba`): halve the weight of both, and
+    rotate the original macroparticles and the copies by +/- `dtheta`
+    around the axis.
+    """
+    cos_d = math.cos( dtheta )
+    sin_d = math.sin( dtheta )
+    for i in prange( len(idx) ):
+        ip = idx[i]
+        ic = N + i
+        xp = x[ip]
+        yp = y[ip]
+        x[ip] = cos_d*xp - sin_d*yp
+        y[ip] = sin_d*xp + cos_d*yp
+        x[ic] = cos_d*xp + sin_d*yp
+        y[ic] = -sin_d*xp + cos_d*yp
+        w[ip] = 0.5*w[ip]
+        w[ic] = w[ip]
+
+    return( x, y, w )
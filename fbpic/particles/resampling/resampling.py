@@ -0,0 +1,188 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines the structure and methods associated with the resampling
+(i.e. merging and splitting) of macroparticles.
+"""
+import numpy as np
+from fbpic.utils.threading import nthreads, get_chunk_indices
+from .numba_methods import get_resampling_keys_numba, merge_groups_numba, \
+    sort_by_slab_numba, sort_slabs_by_key_numba, append_copies_numba, \
+    split_particles_numba
+
+class ParticleResampler(object):
+    """
+    Class that periodically merges and splits the macroparticles of a
+    species, in order to control the number of macroparticles.
+
+    - Merging: the macroparticles are binned in (cell, momentum) space.
+      In each bin that contains at least `min_group_size` macroparticles,
+      the macroparticles are replaced by 2 macroparticles, in such a way
+      that the total charge, momentum and energy are exactly conserved.
+      (See Vranic et al., Comput. Phys. Commun. 191 (2015)) The two new
+      macroparticles are rotated symmetrically around the axis by a
+      quarter of an azimuthal bin, with respect to the center of the bin.
+    - Splitting: the macroparticles whose weight is larger than
+      `split_weight` are replaced by 2 macroparticles with half the
+      weight and the same momentum, rotated symmetrically around the
+      axis by a quarter of an azimuthal bin (so that they remain in
+      the same cell, and in the same subdomain).
+    """
+    def __init__( self, period, min_group_size=8, split_weight=None,
+                    n_azimuthal_bins=8, momentum_resolution=0.1,
+                    n_direction_bins=(8, 16), start=0 ):
+        """
+        Initialize a ParticleResampler
+
+        Parameters
+        ----------
+        period: int
+            The number of iterations between two resampling operations
+
+        min_group_size: int, optional
+            The minimal number of macroparticles in a (cell, momentum) bin,
+            for these macroparticles to be merged. (Must be larger than 2.)
+
+        split_weight: float or None, optional
+            The weight above which macroparticles are split.
+            If None, no macroparticle is split.
+
+        n_azimuthal_bins: int, optional
+            The number of bins along theta, in each cell of the grid
+            (Only macroparticles in the same bin are merged together.)
+
+        momentum_resolution: float, optional
+            The width of the momentum bins, for the quantity asinh(|u|)
+            (i.e. the relative width for relativistic particles, and the
+            absolute width in units of m*c for non-relativistic particles)
+
+        n_direction_bins: tuple of 2 ints, optional
+            The number of bins for the direction of the momentum, along
+            the polar angle (with respect to z) and azimuthal angle.
+
+        start: int, optional
+            The iteration at which resampling starts
+        """
+        if min_group_size <= 2:
+            raise ValueError('`min_group_size` should be larger than 2.')
+        self.period = period
+        self.start = start
+        self.min_group_size = min_group_size
+        self.split_weight = split_weight
+        self.n_azimuthal_bins = n_azimuthal_bins
+        self.inv_momentum_resolution = 1./momentum_resolution
+        self.n_polar_bins, self.n_azimuth_bins = n_direction_bins
+        # Bound the number of magnitude bins, so that the keys fit in int64
+        self.n_magnitude_bins = 4096
+
+    def is_due( self, iteration ):
+        """
+        Return whether resampling should be performed at this iteration
+        """
+        return( (iteration >= self.start) and
+                ((iteration - self.start) % self.period == 0) )
+
+    def resample( self, species, grid ):
+        """
+        Merge and split the macroparticles of `species` (on CPU).
+
+        Parameters
+        ----------
+        species: an fbpic.Particles object
+            The species to be resampled (its arrays are replaced)
+
+        grid: an fbpic InterpolationGrid object
+            The grid that defines the cells (typically `fld.interp[0]`)
+        """
+        # Merge the macroparticles
+        if species.Ntot > 0:
+            keep = self.merge( species, grid )
+            if not keep.all():
+                self.select_particles( species, keep )
+        # Split the heavy macroparticles
+        if (self.split_weight is not None) and species.Ntot > 0:
+            to_split = species.w > self.split_weight
+            if to_split.any():
+                self.split( species, to_split,
+                            0.5*np.pi/self.n_azimuthal_bins )
+
+    def merge( self, species, grid ):
+        """
+        Merge the macroparticles in each (cell, momentum) bin, and return
+        a boolean array that indicates which macroparticles are kept.
+        """
+        Ntot = species.Ntot
+        # Get the key of the bin of each macroparticle
+        keys = np.empty( Ntot, dtype=np.int64 )
+        get_resampling_keys_numba( keys, Ntot, species.x, species.y,
+            species.z, species.ux, species.uy, species.uz,
+            grid.zmin, grid.invdz, grid.Nz, grid.invdr, grid.Nr,
+            self.n_azimuthal_bins, self.inv_momentum_resolution,
+            self.n_magnitude_bins, self.n_polar_bins, self.n_azimuth_bins )
+        # Sort the macroparticles by key: first by slab of the grid along z
+        # (parallel counting sort), then by key within each slab
+        slab_size = grid.Nr * self.n_azimuthal_bins * self.n_magnitude_bins \
+                    * self.n_polar_bins * self.n_azimuth_bins
+        chunk_indices = get_chunk_indices( Ntot, nthreads )
+        slab_count = np.empty( (nthreads, grid.Nz), dtype=np.int64 )
+        slab_start = np.empty( grid.Nz+1, dtype=np.int64 )
+        sorted_idx = np.empty( Ntot, dtype=np.int64 )
+        sort_by_slab_numba( keys, slab_size, grid.Nz, chunk_indices,
+                            slab_count, slab_start, sorted_idx )
+        sort_slabs_by_key_numba( keys, slab_start, sorted_idx )
+        sorted_keys = keys[ sorted_idx ]
+        # Find the first particle of each group
+        is_first = np.empty( Ntot, dtype=bool )
+        is_first[0] = True
+        np.not_equal( sorted_keys[1:], sorted_keys[:-1], out=is_first[1:] )
+        group_start = np.append( np.flatnonzero(is_first), Ntot )
+        # Merge the groups
+        keep = np.ones( Ntot, dtype=np.uint8 )
+        merge_groups_numba( len(group_start)-1, group_start, sorted_idx,
+            self.min_group_size, 0.5*np.pi/self.n_azimuthal_bins,
+            species.x, species.y, species.z,
+            species.ux, species.uy, species.uz, species.inv_gamma,
+            species.w, species.m == 0, keep )
+        return( keep.astype(bool) )
+
+    def select_particles( self, species, selec ):
+        """
+        Keep only the macroparticles of `species` for which `selec` is True
+        """
+        for attr in [ 'x', 'y', 'z', 'ux', 'uy', 'uz', 'inv_gamma', 'w',
+                      'Ex', 'Ey', 'Ez', 'Bx', 'By', 'Bz' ]:
+            setattr( species, attr, getattr( species, attr )[selec] )
+        if species.tracker is not None:
+            species.tracker.id = species.tracker.id[selec]
+        species.Ntot = len( species.w )
+
+    def split( self, species, to_split, dtheta ):
+        """
+        Split the macroparticles for which `to_split` is True into two
+        macroparticles, rotated by +/- `dtheta` around the axis.
+        (Their z, r and momentum are unchanged, so that the total charge,
+        momentum and energy are conserved, and that they remain in the
+        same cell.)
+        """
+        idx = np.flatnonzero( to_split )
+        N = species.Ntot
+        N_new = N + len(idx)
+        # Append the copies (each array is allocated once, with the
+        # new number of macroparticles)
+        for attr in [ 'x', 'y', 'z', 'ux', 'uy', 'uz', 'inv_gamma', 'w',
+                      'Ex', 'Ey', 'Ez', 'Bx', 'By', 'Bz' ]:
+            array = getattr( species, attr )
+            new_array = np.empty( N_new, dtype=array.dtype )
+            setattr( species, attr,
+                     append_copies_numba( array, idx, new_array ) )
+        # Halve the weight, and rotate the original macroparticles
+        # and the copies in opposite directions
+        split_particles_numba( idx, N, dtheta, species.x, species.y, species.w )
+        if species.tracker is not None:
+            new_id = np.empty( N_new, dtype=species.tracker.id.dtype )
+            new_id[:N] = species.tracker.id
+            new_id[N:] = species.tracker.generate_new_ids( len(idx) )
+            species.tracker.id = new_id
+        species.Ntot = N_new
@@ -0,0 +1,509 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines the function `plan`, which predicts the memory footprint
+(per MPI rank) and the cost of one PIC iteration of a simulation,
+without allocating any of its arrays, as well as the function `calibrate`,
+which measures the coefficients of the cost model on the current machine.
+"""
+import numpy as np
+from scipy.constants import c
+from fbpic.utils.timing import perf_counter
+
+# Size (in bytes) of the data types used by the arrays of FBPIC
+float_size = 8
+complex_size = 16
+
+# Number of arrays of shape (Nz, Nr), for each azimuthal mode
+# - Interpolation grid: Er, Et, Ez, Br, Bt, Bz, Jr, Jt, Jz, rho (complex)
+n_interp_arrays = 10
+# - Spectral grid: Ep, Em, Ez, Bp, Bm, Bz, Jp, Jm, Jz, rho_prev, rho_next
+#   (complex), and kz, kr, filter_array (real)
+n_spect_arrays = 11
+n_spect_real_arrays = 3
+# - PSATD coefficients: C, S_w, j_coef, rho_prev_coef, rho_next_coef (real)
+#   or, for comoving currents or a Galilean frame, C, S_w (real) and
+#   T_eb, T_cc, T_rho, j_corr_coef, j_coef, rho_prev_coef, rho_next_coef
+#   (complex)
+n_psatd_real_arrays = 5
+n_psatd_comoving_real_arrays = 2
+n_psatd_comoving_complex_arrays = 7
+# - Spectral transformer: 4 complex buffers (spect_buffer_r/t/p/m),
+#   2 complex buffers for the FFT plans, and for each of the 3 DHTs
+#   (m-1, m, m+1), 2 real buffers of shape (2*Nz, Nr)
+n_trans_arrays = 6
+n_dht = 3
+
+# Number of 64-bit quantities per macroparticle
+# - x, y, z, ux, uy, uz, inv_gamma, w
+n_particle_quantities = 8
+# - Ex, Ey, Ez, Bx, By, Bz (gathered fields)
+n_particle_fields = 6
+# - GPU sorting: cell_idx (int32), sorted_idx (uint32), sorting_buffer
+n_particle_sorting_bytes = 16
+
+# Coefficients of the cost model (in seconds), measured with `calibrate`
+# on a single CPU core. The time of one PIC iteration is modeled as
+#   Np * Nm * particle[shape] + Nz * Nr * Nm * cell + Nz * Nr**2 * Nm * dht
+# where Np is the number of macroparticles of the rank and Nz, Nr, Nm
+# are the dimensions of its local grid.
+default_cost_coefficients = {
+    'particle': { 'linear': 1.8e-7, 'cubic': 6.9e-7 },
+    'cell': 3.0e-7,
+    'dht': 5.6e-9,
+    'nthreads': 1 }
+
+
+class ResourcePlan(object):
+    """
+    Class that holds the predicted resources of a simulation.
+
+    Main attributes
+    ---------------
+    - memory: list of dictionaries
+        For each MPI rank, the predicted memory (in bytes) of
+        each subsystem of the simulation
+    - Nz_local: list of ints
+        The number of cells in z of the local grid of each rank
+        (including the damping and guard cells)
+    - N_particles: list of ints
+        The number of macroparticles of each rank, at initialization
+    - step_time: list of floats
+        The predicted time (in seconds) of one PIC iteration, for each rank
+    - errors: list of strings
+        The problems that would prevent the simulation from running
+    """
+
+    def __init__( self, memory, Nz_local, N_particles, step_time,
+                  n_guard, n_damp, exchange_period, errors ):
+        """
+        Register the predicted resources (see `plan`)
+        """
+        self.memory = memory
+        self.Nz_local = Nz_local
+        self.N_particles = N_particles
+        self.step_time = step_time
+        self.n_guard = n_guard
+        self.n_damp = n_damp
+        self.exchange_period = exchange_period
+        self.errors = errors
+
+    @property
+    def total_memory( self ):
+        """List of the total predicted memory (in bytes) of each rank"""
+        return( [ sum( mem.values() ) for mem in self.memory ] )
+
+    @property
+    def max_memory( self ):
+        """Predicted memory (in bytes) of the rank that uses the most"""
+        return( max( self.total_memory ) )
+
+    def __str__( self ):
+        """
+        Return a table of the memory per subsystem, and of the step time,
+        for the first rank, the last rank and the rank that uses the most
+        memory.
+        """
+        n_procs = len( self.memory )
+        ranks = sorted( set([ 0, n_procs-1,
+                        int( np.argmax( self.total_memory ) ) ]) )
+        lines = [ 'Predicted resources per MPI rank (%d ranks)' %n_procs,
+                  '(n_guard = %d, n_damp = %d, exchange_period = %d)'
+                  %(self.n_guard, self.n_damp, self.exchange_period) ]
+        header = '%-30s' %'' + ''.join([ '%14s' %('rank %d' %rank)
+                                            for rank in ranks ])
+        lines += [ header, '-'*len(header) ]
+        for subsystem in self.memory[0].keys():
+            lines.append( '%-30s' %subsystem + ''.join([ '%11.1f MB'
+                %(self.memory[rank][subsystem]/1.e6) for rank in ranks ]) )
+        lines.append( '-'*len(header) )
+        lines.append( '%-30s' %'Total memory' + ''.join([ '%11.1f MB'
+                %(self.total_memory[rank]/1.e6) for rank in ranks ]) )
+        lines.append( '%-30s' %'Cells in z (local grid)' + ''.join([
+            '%14d' %self.Nz_local[rank] for rank in ranks ]) )
+        lines.append( '%-30s' %'Macroparticles' + ''.join([
+            '%14d' %self.N_particles[rank] for rank in ranks ]) )
+        lines.append( '%-30s' %'Time per iteration' + ''.join([
+            '%12.2e s' %self.step_time[rank] for rank in ranks ]) )
+        for error in self.errors:
+            lines.append( 'Error: ' + error )
+        return( '\n'.join( lines ) )
+
+
+def plan( Nz, zmax, Nr, rmax, Nm, dt,
+          p_zmin=-np.inf, p_zmax=np.inf, p_rmin=0, p_rmax=np.inf,
+          p_nz=None, p_nr=None, p_nt=None, n_e=None, zmin=0.,
+          n_order=-1, v_comoving=None, use_galilean=True,
+          initialize_ions=False, use_cuda=False,
+          n_guard=None, n_damp=64, exchange_period=None,
+          current_correction='curl-free', boundaries='periodic',
+          gamma_boost=None, particle_shape='linear',
+          species=[], n_procs=1, n_mode_ranks=1, nthreads=None,
+          Ntot_snapshots_lab=0,
+          diag_period=1, boosted_particle_diag=False,
+          cost_coefficients=None, verbose=True ):
+    """
+    Predict the memory used by each MPI rank, and the time of one PIC
+    iteration, for a simulation with the given parameters.
+
+    No array is allocated (and no MPI communicator is needed): this can
+    be run on a login node, in order to choose the number of MPI ranks
+    and of threads before submitting a simulation.
+
+    The arguments from `Nz` to `particle_shape` have the same meaning as
+    in `Simulation.__init__` (see the docstring of `Simulation`).
+    (The arguments that do not change the memory footprint, such as
+    `dens_func` or `filter_currents`, are not needed.)
+
+    Parameters
+    ----------
+    species: list of dictionaries, optional
+        The additional species of the simulation. Each dictionary contains
+        either the arguments `n`, `p_nz`, `p_nr`, `p_nt` (and optionally
+        `p_zmin`, `p_zmax`, `p_rmin`, `p_rmax`, `uz_m`) of `add_new_species`,
+        or the total number of macroparticles `N` (e.g. for a bunch ; all of
+        these macroparticles are then counted on each rank, as an upper
+        bound). The optional keys `tracked` and `ionizable` indicate
+        whether the species is tracked and ionizable.
+
+    n_procs: int, optional
+        The number of MPI ranks
+
+    n_mode_ranks: int, optional
+        The number of MPI ranks among which the azimuthal modes of each
+        subdomain are distributed (see `Simulation.__init__`). The domain
+        is then divided into n_procs/n_mode_ranks subdomains along z.
+
+    nthreads: int, optional
+        The number of threads per MPI rank. (Defaults to the number of
+        threads used by numba on the current machine.)
+
+    Ntot_snapshots_lab: int, optional
+        The number of lab-frame snapshots of the boosted-frame diagnostics
+
+    diag_period: int, optional
+        The period of the boosted-frame diagnostics (i.e. the number
+        of slices that are buffered in memory before being written)
+
+    boosted_particle_diag: bool, optional
+        Whether the boosted-frame diagnostics also output the particles
+
+    cost_coefficients: dict, optional
+        The coefficients of the cost model, as returned by `calibrate`.
+        (Defaults to `default_cost_coefficients`.)
+
+    verbose: bool, optional
+        Whether to print the table of the predicted resources
+
+    Returns
+    -------
+    A `ResourcePlan` object
+    """
+    # Import fbpic functions here, so that `import fbpic` remains light
+    from fbpic.fields.utility_methods import get_stencil_reach
+    from fbpic.lpa_utils.boosted_frame import BoostConverter
+    from fbpic.utils.threading import nthreads as numba_nthreads
+
+    if nthreads is None:
+        nthreads = numba_nthreads
+    if cost_coefficients is None:
+        cost_coefficients = default_cost_coefficients
+    errors = []
+
+    # Convert the box and the timestep to the boosted frame
+    boost = None
+    if gamma_boost is not None:
+        boost = BoostConverter( gamma_boost )
+        zmin, zmax, dt = boost.copropag_length([ zmin, zmax, dt ])
+    dz = (zmax-zmin)/Nz
+    dr = rmax/Nr
+    comoving = (v_comoving is not None)
+    if not comoving:
+        use_galilean = False
+
+    # Number of subdomains along z
+    # (same rules as in `BoundaryCommunicator`)
+    if (n_procs % n_mode_ranks != 0) or (n_mode_ranks > Nm):
+        errors.append( 'The number of MPI ranks (%d) should be a multiple of '
+            'n_mode_ranks (%d), which should not exceed Nm (%d).'
+            %(n_procs, n_mode_ranks, Nm) )
+    n_domains = max( 1, n_procs // n_mode_ranks )
+
+    # Guard cells, damping cells and exchange period
+    # (same rules as in `BoundaryCommunicator`)
+    if n_guard is None:
+        if n_order == -1:
+            n_guard = 64
+            if n_domains != 1:
+                errors.append( 'The infinite-order stencil (n_order=-1) '
+                    'cannot be used with several MPI ranks.' )
+        else:
+            n_guard = get_stencil_reach( Nz, dz, c*dt, n_order,
+                                         v_comoving, use_galilean ) + 1
+    if boundaries == 'periodic':
+        n_damp = 0
+        if n_domains == 1:
+            n_guard = 0
+    if exchange_period is None:
+        cells_per_step = 2.*c*dt/dz
+        exchange_period = int( ((n_guard/2)-3)/cells_per_step )
+        if n_domains == 1 and boundaries == 'periodic':
+            exchange_period = 1
+        if exchange_period < 1:
+            errors.append( 'The guard region (n_guard=%d) is too small for '
+                'the chosen timestep.' %n_guard )
+
+    # Decomposition of the domain (same rules as in `get_Nz_and_iz`)
+    Nz_per_proc = int( Nz/n_domains )
+    if Nz_per_proc == 0:
+        errors.append( 'There are more MPI ranks than cells in z.' )
+
+    memory = []
+    small_ranks = []
+    Nz_local = []
+    N_particles = []
+    step_time = []
+    for rank in range( n_procs ):
+        # Subdomain of this rank, and number of modes of its spectral grids
+        # (same rules as in `BoundaryCommunicator` and `Fields`)
+        z_rank = rank // n_mode_ranks
+        Nm_local = len([ m for m in range(Nm)
+                         if m % n_mode_ranks == rank % n_mode_ranks ])
+        # Local physical domain, and local grid (with damp and guard cells)
+        Nz_phys = Nz_per_proc
+        if z_rank == n_domains-1:
+            Nz_phys += Nz % n_domains
+        zmin_phys = zmin + z_rank*Nz_per_proc*dz
+        zmax_phys = zmin_phys + Nz_phys*dz
+        Nz_enlarged = Nz_phys + 2*n_guard
+        iz_enlarged = z_rank*Nz_per_proc - n_guard
+        if z_rank == 0:
+            Nz_enlarged += n_damp
+            iz_enlarged -= n_damp
+        if z_rank == n_domains-1:
+            Nz_enlarged += n_damp
+        if Nz_enlarged < 4*n_guard:
+            small_ranks.append( rank )
+        Nz_local.append( Nz_enlarged )
+        # (Positions of the cell centers, as in `InterpolationGrid`)
+        zmin_enlarged = zmin + iz_enlarged*dz
+        zmax_enlarged = zmin_enlarged + Nz_enlarged*dz
+        z = zmin_enlarged + (0.5 + np.arange(Nz_enlarged)) \
+            * (zmax_enlarged - zmin_enlarged)/Nz_enlarged
+        r = (0.5 + np.arange(Nr))*dr
+
+        # Number of macroparticles of each species
+        all_species = []
+        if n_e is not None:
+            electrons = dict( n=n_e, p_nz=p_nz, p_nr=p_nr, p_nt=p_nt,
+                p_zmin=p_zmin, p_zmax=p_zmax, p_rmin=p_rmin, p_rmax=p_rmax )
+            all_species.append( electrons )
+            if initialize_ions:
+                all_species.append( electrons )
+        all_species += species
+        N_species = []
+        for sp in all_species:
+            N = count_macroparticles( sp, boost, z, r, zmin_phys, zmax_phys )
+            N_species.append( N )
+        N_ptcl = sum( N_species )
+        N_particles.append( N_ptcl )
+
+        # Memory of each subsystem
+        mem = {}
+        cells = Nz_enlarged * Nr
+        mem['Interpolation grids'] = Nm * ( n_interp_arrays*cells*complex_size
+                                            + Nr*float_size )
+        n_spect = n_spect_arrays
+        if current_correction == 'cross-deposition':
+            n_spect += 2    # rho_next_z and rho_next_xy
+        mem['Spectral grids'] = Nm_local * ( n_spect*cells*complex_size
+            + n_spect_real_arrays*cells*float_size
+            + Nz_enlarged*complex_size )
+        if current_correction == 'curl-free':
+            mem['Spectral grids'] += Nm_local*cells*float_size   # inv_k2
+        if comoving:
+            mem['PSATD coefficients'] = Nm_local * cells * (
+                n_psatd_comoving_real_arrays*float_size
+                + n_psatd_comoving_complex_arrays*complex_size )
+        else:
+            mem['PSATD coefficients'] = \
+                Nm_local*n_psatd_real_arrays*cells*float_size
+        mem['Spectral transformers'] = Nm_local * (
+                n_trans_arrays*cells*complex_size
+                + n_dht*( 2*Nr*Nr*float_size + 2*2*cells*float_size ) )
+        if use_cuda:
+            mem['Deposition buffers'] = 0
+        else:
+            mem['Deposition buffers'] = 4 * nthreads * Nm \
+                * (Nz_enlarged+4) * (Nr+4) * complex_size
+        mem['Particles'] = 0
+        for sp, N in zip( all_species, N_species ):
+            bytes_per_particle = \
+                (n_particle_quantities + n_particle_fields)*float_size
+            if sp.get( 'tracked', False ):
+                bytes_per_particle += 8
+            if sp.get( 'ionizable', False ):
+                bytes_per_particle += 16
+            if use_cuda:
+                bytes_per_particle += n_particle_sorting_bytes
+                mem['Particles'] += Nz_enlarged*(Nr+1)*4    # prefix_sum
+            mem['Particles'] += N * bytes_per_particle
+        if n_domains > 1:
+            Na = 2*Nm - 1
+            mem['MPI buffers'] = 4 * ( 14*Nm + 2*Na ) \
+                * n_guard * Nr * complex_size
+        else:
+            mem['MPI buffers'] = 0
+        # Boosted-frame diagnostics: one slice, and `diag_period` buffered
+        # slices per snapshot, for the fields ; for the particles, the
+        # macroparticles that cross the output plane during `diag_period`
+        slice_size = 10 * (2*Nm-1) * Nr * float_size
+        mem['Boosted-frame diagnostics'] = Ntot_snapshots_lab \
+            * (diag_period+1) * slice_size
+        if boosted_particle_diag and Nz_phys > 0:
+            particles_per_slice = N_ptcl / Nz_phys * max( 1., c*dt/dz )
+            mem['Boosted-frame diagnostics'] += Ntot_snapshots_lab \
+                * diag_period * particles_per_slice \
+                * (n_particle_quantities+1) * float_size
+        memory.append( mem )
+
+        # Cost of one iteration
+        step_time.append( predict_step_time( cost_coefficients,
+            N_ptcl, Nz_enlarged, Nr, Nm, particle_shape, nthreads,
+            Nm_local=Nm_local ) )
+
+    if small_ranks:
+        errors.append( 'The number of local cells in z is smaller than '
+            '4 times n_guard (%d) on rank(s) %s. Use fewer ranks or fewer '
+            'guard cells.' %(n_guard, small_ranks) )
+
+    resource_plan = ResourcePlan( memory, Nz_local, N_particles, step_time,
+                                  n_guard, n_damp, exchange_period, errors )
+    if verbose:
+        print( resource_plan )
+    return( resource_plan )
+
+
+def count_macroparticles( sp, boost, z, r, zmin_phys, zmax_phys ):
+    """
+    Return the number of macroparticles that `add_new_species` would create
+    on the local grid, for the species described by the dictionary `sp`
+    (see the argument `species` of `plan`).
+
+    Parameters
+    ----------
+    sp: dict
+        The arguments of the species
+
+    boost: BoostConverter or None
+        The conversion to the boosted frame
+
+    z, r: 1darrays of floats
+        The positions of the cell centers of the local grid
+        (including damp and guard cells in z)
+
+    zmin_phys, zmax_phys: floats
+        The edges of the local physical domain (without damp and guard cells)
+    """
+    from fbpic.main import adapt_to_grid
+
+    if 'N' in sp:
+        return( int( sp['N'] ) )
+    if sp.get( 'n', None ) is None:
+        return( 0 )
+    p_zmin = sp.get( 'p_zmin', -np.inf )
+    p_zmax = sp.get( 'p_zmax', np.inf )
+    if boost is not None:
+        uz_m = sp.get( 'uz_m', 0. )
+        beta0 = uz_m/( 1.+uz_m**2 )**0.5
+        p_zmin, p_zmax = boost.copropag_length(
+            [ p_zmin, p_zmax ], beta_object=beta0 )
+    p_zmin = max( zmin_phys, p_zmin )
+    p_zmax = min( zmax_phys, p_zmax )
+    _, _, Npz = adapt_to_grid( z, p_zmin, p_zmax, sp['p_nz'] )
+    _, _, Npr = adapt_to_grid( r, sp.get( 'p_rmin', 0 ),
+                               sp.get( 'p_rmax', np.inf ), sp['p_nr'] )
+    return( Npz * Npr * sp['p_nt'] )
+
+
+def predict_step_time( cost_coefficients, N_ptcl, Nz, Nr, Nm,
+                       particle_shape, nthreads, Nm_local=None ):
+    """
+    Return the predicted time (in seconds) of one PIC iteration, on a grid
+    of Nz x Nr x Nm cells with N_ptcl macroparticles, with `nthreads`
+    threads (assuming ideal thread scaling with respect to the number of
+    threads used when calibrating the model).
+    (`Nm_local` is the number of modes that are transformed by the rank,
+    with a decomposition of the modes ; defaults to Nm.)
+    """
+    if Nm_local is None:
+        Nm_local = Nm
+    t = N_ptcl * Nm * cost_coefficients['particle'][particle_shape] \
+        + Nz * Nr * Nm * cost_coefficients['cell'] \
+        + Nz * Nr**2 * Nm_local * cost_coefficients['dht']
+    return( t * cost_coefficients['nthreads'] / nthreads )
+
+
+def calibrate( N_steps=10, use_cuda=False, verbose=True ):
+    """
+    Measure the coefficients of the cost model of `plan`, by timing
+    a few PIC iterations of small simulations on the current machine
+    (with the number of threads currently used by numba).
+
+    Parameters
+    ----------
+    N_steps: int, optional
+        The number of timed PIC iterations, for each simulation
+
+    use_cuda: bool, optional
+        Whether to calibrate the model for the GPU
+
+    verbose: bool, optional
+        Whether to print the measured coefficients
+
+    Returns
+    -------
+    A dictionary that can be passed as `cost_coefficients` to `plan`
+    """
+    from fbpic.main import Simulation
+    from fbpic.utils.threading import nthreads
+
+    Nz = 128
+    Nm = 2
+    zmax = 20.e-6
+    rmax = 20.e-6
+    dt = zmax/Nz/c
+
+    def time_step( Nr, **kw ):
+        "Return the time of one PIC iteration, for the given simulation"
+        sim = Simulation( Nz, zmax, Nr, rmax, Nm, dt, use_cuda=use_cuda,
+                          verbose_level=0, **kw )
+        sim.step( 2, show_progress=False )    # Compilation
+        start = perf_counter()
+        sim.step( N_steps, show_progress=False )
+        return( (perf_counter() - start)/N_steps )
+
+    # Field-only simulations, with different Nr: fit the grid coefficients
+    Nr_list = [ 32, 64, 128 ]
+    times = [ time_step( Nr ) for Nr in Nr_list ]
+    matrix = np.array([ [ Nz*Nr*Nm, Nz*Nr**2*Nm ] for Nr in Nr_list ])
+    cell, dht = np.maximum( np.linalg.lstsq(
+        matrix, np.array(times), rcond=None )[0], 0. )
+
+    # Simulations with a plasma: the remaining time is due to the particles
+    coefficients = { 'particle': {}, 'cell': cell, 'dht': dht,
+                     'nthreads': nthreads }
+    Nr = 32
+    N_ptcl = Nz * Nr * 2*2*4
+    for particle_shape in [ 'linear', 'cubic' ]:
+        t = time_step( Nr, n_e=1.e24, p_nz=2, p_nr=2, p_nt=4,
+                       particle_shape=particle_shape )
+        t_grid = Nz*Nr*Nm*cell + Nz*Nr**2*Nm*dht
+        coefficients['particle'][particle_shape] = \
+            max( t - t_grid, 0. ) / ( N_ptcl*Nm )
+
+    if verbose:
+        print( 'Cost model coefficients: %s' %coefficients )
+    return( coefficients )
@@ -0,0 +1,8 @@
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It imports the QuasiStaticSimulation object, which replaces the PIC cycle
+by a quasi-static plasma response (for beam-driven and long-stage runs).
+"""
+
+from .quasistatic_simulation import QuasiStaticSimulation
+__all__ = ['QuasiStaticSimulation']
@@ -0,0 +1,238 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines the numba methods that deposit, gather and push a transverse
+slice of plasma macroparticles, in the quasi-static solver (on CPU).
+
+The macroparticles of the slice are described by their transverse
+positions `x`, `y`, their transverse momenta `ux`, `uy` and by the
+quasi-static quantity `h = gamma - uz`, which is used as a substitute
+for the longitudinal momentum. The radial grid of the slice is the
+grid of the azimuthal mode 0 of fbpic (with cells centered at
+r = (ir+0.5)*dr), and the shape of the macroparticles is linear.
+"""
+import math
+import numba
+from fbpic.utils.threading import njit_parallel, prange
+from scipy.constants import c
+
+@numba.njit
+def deposit_slice_numba( x, y, ux, uy, h, w, q, invdr, Nr, rho, Jr, Jz ):
+    """
+    Add the charge density and currents of the slice of macroparticles
+    to the 1d arrays `rho`, `Jr`, `Jz` (one value per radial cell).
+
+    In the quasi-static approximation, each macroparticle stands for a
+    stream of plasma particles crossing the slice. As a consequence,
+    its contribution to rho is multiplied by gamma/h = 1/(1-vz/c).
+
+    (The deposited quantities are not divided by the cell volume. The
+    particles below the axis are treated with the same convention as in
+    the deposition kernels of the PIC loop, so that the plasma and the
+    beams are deposited consistently.)
+
+    Parameters
+    ----------
+    x, y, ux, uy, h, w: 1darrays of floats
+        The positions, transverse momenta, quantity h = gamma - uz,
+        and weights of the macroparticles
+
+    q: float
+        The charge of the species
+
+    invdr: float
+        The inverse of the radial cell size
+
+    Nr: int
+        The number of radial cells
+
+    rho, Jr, Jz: 1darrays of floats
+        The arrays (of size Nr) to which the deposited quantities are added
+    """
+    for i in range( x.shape[0] ):
+        # Skip the macroparticles that were discarded from the slice
+        if w[i] == 0.:
+            continue
+        # Cylindrical conversion
+        rj = math.sqrt( x[i]**2 + y[i]**2 )
+        if rj != 0.:
+            cos = x[i]/rj
+            sin = y[i]/rj
+        else:
+            cos = 1.
+            sin = 0.
+        # Quasi-static quantities
+        inv_h = 1./h[i]
+        gamma = 0.5*( 1. + ux[i]**2 + uy[i]**2 + h[i]**2 )*inv_h
+        uz = gamma - h[i]
+        qw = q*w[i]
+        rho_j = qw*gamma*inv_h
+        Jr_j = qw*c*( cos*ux[i] + sin*uy[i] )*inv_h
+        Jz_j = qw*c*uz*inv_h
+
+        # Linear weights along r
+        r_cell = invdr*rj - 0.5
+        ir_lower = int( math.floor( r_cell ) )
+        ir_upper = ir_lower + 1
+        Sr_lower = ir_upper - r_cell
+        Sr_upper = r_cell - ir_lower
+        if ir_lower < 0:
+            # Fold the guard cell below the axis into the first cell
+            Sr_upper -= Sr_lower
+            Sr_lower = 0.
+            ir_lower = 0
+        # Add the contributions (the particles beyond rmax are lost)
+        if ir_lower < Nr:
+            rho[ir_lower] += Sr_lower*rho_j
+            Jr[ir_lower] += Sr_lower*Jr_j
+            Jz[ir_lower] += Sr_lower*Jz_j
+        if ir_upper < Nr:
+            rho[ir_upper] += Sr_upper*rho_j
+            Jr[ir_upper] += Sr_upper*Jr_j
+            Jz[ir_upper] += Sr_upper*Jz_j
+
+@numba.njit
+def deposit_slice_chi_numba( x, y, h, w, invdr, Nr, chi ):
+    """
+    Add the quantity w/h of the macroparticles of the slice to the 1darray
+    `chi` (one value per radial cell), with the same shape as in
+    `deposit_slice_numba`. (Once multiplied by mu_0 q^2/m and divided by
+    the cell volume, this gives the susceptibility of the plasma to Btheta.)
+    """
+    for i in range( x.shape[0] ):
+        if w[i] == 0.:
+            continue
+        rj = math.sqrt( x[i]**2 + y[i]**2 )
+        chi_j = w[i]/h[i]
+        # Linear weights along r
+        r_cell = invdr*rj - 0.5
+        ir_lower = int( math.floor( r_cell ) )
+        ir_upper = ir_lower + 1
+        Sr_lower = ir_upper - r_cell
+        Sr_upper = r_cell - ir_lower
+        if ir_lower < 0:
+            Sr_upper -= Sr_lower
+            Sr_lower = 0.
+            ir_lower = 0
+        if ir_lower < Nr:
+            chi[ir_lower] += Sr_lower*chi_j
+        if ir_upper < Nr:
+            chi[ir_upper] += Sr_upper*chi_j
+
+@njit_parallel
+def gather_slice_numba( x, y, invdr, Nr, Er_grid, Ez_grid, Bt_grid,
+                        Ex, Ey, Ez, Bx, By ):
+    """
+    Gather the fields of the slice (mode 0: `Er_grid`, `Ez_grid` and
+    `Bt_grid`, which are 1darrays of size Nr) on the macroparticles,
+    and store them in the arrays `Ex`, `Ey`, `Ez`, `Bx`, `By`.
+    """
+    for i in prange( x.shape[0] ):
+        # Cylindrical conversion
+        rj = math.sqrt( x[i]**2 + y[i]**2 )
+        if rj != 0.:
+            cos = x[i]/rj
+            sin = y[i]/rj
+        else:
+            cos = 1.
+            sin = 0.
+        # Linear weights along r
+        r_cell = invdr*rj - 0.5
+        ir_lower = int( math.floor( r_cell ) )
+        ir_upper = ir_lower + 1
+        Sr_lower = ir_upper - r_cell
+        Sr_upper = r_cell - ir_lower
+        Sr_guard = 0.
+        if ir_lower < 0:
+            Sr_guard = Sr_lower
+            Sr_lower = 0.
+            ir_lower = 0
+        if ir_lower > Nr-1:
+            ir_lower = Nr-1
+        if ir_upper > Nr-1:
+            ir_upper = Nr-1
+        # Below the axis, the radial and azimuthal components change sign
+        Fr = Sr_lower*Er_grid[ir_lower] + Sr_upper*Er_grid[ir_upper] \
+                - Sr_guard*Er_grid[0]
+        Fz = Sr_lower*Ez_grid[ir_lower] + Sr_upper*Ez_grid[ir_upper] \
+                + Sr_guard*Ez_grid[0]
+        Ft = Sr_lower*Bt_grid[ir_lower] + Sr_upper*Bt_grid[ir_upper] \
+                - Sr_guard*Bt_grid[0]
+        # Convert to Cartesian coordinates
+        Ex[i] = cos*Fr
+        Ey[i] = sin*Fr
+        Ez[i] = Fz
+        Bx[i] = -sin*Ft
+        By[i] = cos*Ft
+
+@njit_parallel
+def push_slice_numba( x, y, ux, uy, h, w, Ex, Ey, Ez, Bx, By,
+                      q, m, ds, max_weighting_factor,
+                      history, update_history,
+                      x_new, y_new, ux_new, uy_new, h_new, w_new ):
+    """
+    Advance the macroparticles of the slice by `ds` towards the back of
+    the box (i.e. from xi to xi - ds, where xi = z - c t), using the
+    fields gathered at the current slice.
+
+    The quantities (x, y, ux, uy, h) are advanced with a second-order
+    Adams-Bashforth scheme: their derivatives with respect to -xi are
+    evaluated at the current slice (so that positions and momenta are
+    always known at the same slice), and combined with the derivatives of
+    the previous slice, stored in `history` (2darray of shape (5, N)).
+    The result is written in the arrays `*_new`, which can be the same
+    arrays as the input ones, and `history` is updated if `update_history`
+    is True.
+
+    Macroparticles whose weighting factor gamma/h exceeds
+    `max_weighting_factor` (i.e. which approach the speed of light in the
+    forward direction, and thus violate the quasi-static approximation)
+    are discarded from the slice, by setting their weight to zero.
+    """
+    econst = q/(m*c**2)
+    for i in prange( x.shape[0] ):
+        inv_h = 1./h[i]
+        gamma = 0.5*( 1. + ux[i]**2 + uy[i]**2 + h[i]**2 )*inv_h
+        uz = gamma - h[i]
+        # Derivatives with respect to -xi (Lorentz force, with
+        # dt = d(-xi)/(c-vz), and conservation of gamma - uz - q psi/mc^2)
+        dx = ux[i]*inv_h
+        dy = uy[i]*inv_h
+        dux = econst*inv_h*( gamma*Ex[i] - c*uz*By[i] )
+        duy = econst*inv_h*( gamma*Ey[i] + c*uz*Bx[i] )
+        dh = econst*( inv_h*( ux[i]*( Ex[i] - c*By[i] )
+                            + uy[i]*( Ey[i] + c*Bx[i] ) ) - Ez[i] )
+        # Adams-Bashforth step
+        x_i = x[i] + ds*( 1.5*dx - 0.5*history[0,i] )
+        y_i = y[i] + ds*( 1.5*dy - 0.5*history[1,i] )
+        ux_i = ux[i] + ds*( 1.5*dux - 0.5*history[2,i] )
+        uy_i = uy[i] + ds*( 1.5*duy - 0.5*history[3,i] )
+        h_i = h[i] + ds*( 1.5*dh - 0.5*history[4,i] )
+        w_i = w[i]
+        # Discard the macroparticles that violate the approximation
+        if (h_i <= 0.) or \
+            ( 0.5*(1. + ux_i**2 + uy_i**2 + h_i**2) > \
+                  max_weighting_factor*h_i**2 ):
+            ux_i = 0.
+            uy_i = 0.
+            h_i = 1.
+            w_i = 0.
+            dx = 0.
+            dy = 0.
+            dux = 0.
+            duy = 0.
+            dh = 0.
+        if update_history:
+            history[0,i] = dx
+            history[1,i] = dy
+            history[2,i] = dux
+            history[3,i] = duy
+            history[4,i] = dh
+        x_new[i] = x_i
+        y_new[i] = y_i
+        ux_new[i] = ux_i
+        uy_new[i] = uy_i
+        h_new[i] = h_i
+        w_new[i] = w_i
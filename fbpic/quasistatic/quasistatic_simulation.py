@@ -0,0 +1,408 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines the QuasiStaticSimulation class, which replaces the PIC cycle
+by a quasi-static plasma response, for beam-driven and long-stage runs.
+"""
+import numpy as np
+from scipy.constants import c, e, m_e, mu_0
+from fbpic.main import Simulation, adapt_to_grid
+from fbpic.particles import Particles
+from fbpic.utils.printing import ProgressBar
+from .slice_solver import SliceFieldSolver
+from .numba_methods import deposit_slice_numba, deposit_slice_chi_numba, \
+    gather_slice_numba, push_slice_numba
+
+class QuasiStaticSimulation(Simulation):
+    """
+    Simulation in which the plasma responds quasi-statically to the
+    beams: the fields in the box (which moves at the speed of light)
+    are assumed to depend on z and t only through xi = z - c t.
+
+    At each step, a transverse slice of plasma macroparticles enters the
+    box at its front and is advanced towards its back, slice by slice.
+    In each slice, the fields are solved from the charge and currents of
+    the plasma slice and of the beams (with the Hankel transforms of the
+    PIC solver), and the plasma macroparticles are pushed to the next
+    slice. The beams (i.e. the species in `ptcl`) are then pushed in
+    these fields, with a timestep `dt` that can be much larger than the
+    cell size divided by c (typically a fraction of the betatron period).
+
+    The plasma response is axisymmetric (azimuthal mode 0 only), the
+    plasma ions form an immobile neutralizing background, and the solver
+    runs on CPU, on a single MPI rank. The fields are stored in `fld`, as
+    for a regular `Simulation`, so that the diagnostics (e.g.
+    `FieldDiagnostic`, `ParticleDiagnostic`) can be used without changes.
+    """
+
+    def __init__(self, Nz, zmax, Nr, rmax, dt, zmin=0.,
+                 n_e=None, dens_func=None, p_nr=2, p_nt=4,
+                 p_rmin=0., p_rmax=np.inf, n_iterations=2,
+                 max_weighting_factor=35., particle_shape='linear',
+                 use_all_mpi_ranks=True, verbose_level=1 ):
+        """
+        Initializes a quasi-static simulation, with a plasma of density
+        `n_e` and no beam. (The beams can then be added with
+        `add_new_species`, or with the functions of `fbpic.lpa_utils.bunch`)
+
+        Parameters
+        ----------
+        Nz, Nr: int
+            The number of gridpoints along z and r
+
+        zmax, rmax: floats (in meters)
+            The position of the upper edge of the box in z and r
+
+        dt: float (in seconds)
+            The timestep with which the beams are pushed
+
+        zmin: float (in meters), optional
+            The position of the lower edge of the box in z
+
+        n_e: float (in particles per m^3) or None, optional
+            The density of the plasma electrons. If this is `None`, there is
+            no plasma, and only the self-fields of the beams are calculated.
+
+        dens_func: callable, optional
+            A function of the form `dens_func( z, r )`, where z and r are
+            1d arrays, and which returns a 1d array containing the density
+            *relative to n_e*. At each step, it is evaluated at the position
+            of the front of the box (i.e. the density is assumed to vary
+            slowly on the scale of the box).
+
+        p_nr, p_nt: int, optional
+            The number of plasma macroparticles per cell along r, and along
+            theta, in the plasma slice
+
+        p_rmin, p_rmax: floats (in meters), optional
+            The radial boundaries of the plasma
+
+        n_iterations: int, optional
+            The number of iterations of the implicit solver for Btheta, in
+            each slice (Btheta depends on the derivative of the plasma
+            current along xi, which itself depends on Btheta)
+
+        max_weighting_factor: float, optional
+            Plasma macroparticles for which 1/(1-vz/c) exceeds this value
+            are discarded from the slice (since the quasi-static
+            approximation breaks down for these particles)
+
+        particle_shape: str, optional
+            The particle shape for the deposition and gathering of the
+            beams ('linear' or 'cubic')
+
+        use_all_mpi_ranks: bool, optional
+            Should be set to False when running parameter scans with
+            mpirun (the quasi-static solver does not support domain
+            decomposition)
+
+        verbose_level: int, optional
+            Print information about the simulation setup (0, 1 or 2)
+        """
+        # Initialize the grid, the fields and the diagnostics tools
+        # (with a single azimuthal mode, on CPU)
+        Simulation.__init__( self, Nz, zmax, Nr, rmax, 1, dt, zmin=zmin,
+                             particle_shape=particle_shape,
+                             use_all_mpi_ranks=use_all_mpi_ranks,
+                             verbose_level=verbose_level )
+        if self.comm.size > 1:
+            raise ValueError('The quasi-static solver does not support '
+                'domain decomposition.\n(Use `use_all_mpi_ranks=False` for '
+                'independent simulations on each MPI rank.)')
+        # The beams are added by the user
+        self.ptcl = []
+
+        # Initialize the transverse solver
+        self.slice_solver = SliceFieldSolver( Nr, rmax )
+        self.n_iterations = n_iterations
+        self.max_weighting_factor = max_weighting_factor
+
+        # Initialize the plasma slice (one macroparticle per cell along z)
+        self.dens_func = dens_func
+        if n_e is not None:
+            interp = self.fld.interp[0]
+            p_rmin, p_rmax, Npr = adapt_to_grid( interp.r,
+                                                  p_rmin, p_rmax, p_nr )
+            self.plasma = Particles( q=-e, m=m_e, n=n_e, Npz=1,
+                        zmin=0., zmax=interp.dz, Npr=Npr, rmin=p_rmin,
+                        rmax=p_rmax, Nptheta=p_nt, dt=dt,
+                        continuous_injection=False )
+            # Register the initial state of the macroparticles
+            self.plasma_x0 = self.plasma.x.copy()
+            self.plasma_y0 = self.plasma.y.copy()
+            self.plasma_w0 = self.plasma.w.copy()
+            self.plasma_h = np.ones( self.plasma.Ntot )
+            # Derivatives of (x, y, ux, uy, h) in the previous slice
+            # (for the Adams-Bashforth push)
+            self.plasma_history = np.zeros( (5, self.plasma.Ntot) )
+        else:
+            self.plasma = None
+
+    def set_moving_window( self, *args, **kwargs ):
+        """
+        The box of a quasi-static simulation always moves at the speed of
+        light; this method is thus not supported.
+        """
+        raise ValueError('The box of a `QuasiStaticSimulation` always moves'
+                         ' at the speed of light.')
+
+    def stepping( self ):
+        """
+        The quasi-static step does not need to prepare a PIC loop;
+        stepping sessions are thus not supported.
+        """
+        raise ValueError('Stepping sessions are not supported by a '
+                         '`QuasiStaticSimulation`; call `step` directly.')
+
+    def step( self, N=1, show_progress=True ):
+        """
+        Perform N quasi-static steps.
+
+        Each step calculates the fields in the box (quasi-static plasma
+        response to the beams at time n), runs the diagnostics, pushes
+        the beams to time n+1 and moves the box by c*dt.
+
+        Parameters
+        ----------
+        N: int, optional
+            The number of timesteps to take
+
+        show_progress: bool, optional
+            Whether to show a progression bar
+        """
+        if show_progress:
+            progress_bar = ProgressBar( N )
+
+        for i_step in range(N):
+
+            # Show a progression bar and calculate ETA
+            if show_progress:
+                progress_bar.time( i_step )
+                progress_bar.print_progress()
+
+            # Calculate the fields at time n dt
+            self.solve_quasistatic_fields()
+
+            # Run the diagnostics
+            for diag in self.diags:
+                diag.write( self.iteration )
+
+            # Push the beams to time (n+1) dt
+            for species in self.ptcl:
+                species.gather( self.fld.interp )
+            for ext_field in self.external_fields:
+                ext_field.apply_expression( self.ptcl, self.time )
+            for species in self.ptcl:
+                species.push_p( self.time + 0.5*self.dt )
+                species.push_x( self.dt )
+
+            # Move the box at the speed of light
+            self.comm.shift_global_domain_positions( c*self.dt )
+            for interp in self.fld.interp:
+                interp.zmin += c*self.dt
+                interp.zmax += c*self.dt
+
+            # Increment the global time and iteration
+            self.time += self.dt
+            self.iteration += 1
+
+            # Write the checkpoints if needed
+            for checkpoint in self.checkpoints:
+                checkpoint.write( self.iteration )
+
+        # Print the measured time taken by the quasi-static cycle
+        if show_progress:
+            progress_bar.print_summary()
+
+    def solve_quasistatic_fields( self ):
+        """
+        Calculate the fields in the whole box, by advancing a slice of
+        plasma from the front to the back of the box, in the fields of
+        the beams and of the plasma.
+
+        The fields, as well as the total charge density and currents, are
+        stored in `fld.interp` (and the charge density and currents are
+        also transformed to the spectral grid, for the diagnostics).
+        """
+        interp = self.fld.interp[0]
+        Nz, Nr = interp.Nz, interp.Nr
+        dz = interp.dz
+        invvol = interp.invvol
+        solver = self.slice_solver
+
+        # Deposit the charge and currents of the beams
+        rho_beam, Jr_beam, Jz_beam = self.deposit_beams()
+
+        # Initialize the plasma slice at the front of the box
+        plasma = self.plasma
+        rho_ions = np.zeros( Nr )
+        if plasma is not None:
+            plasma.x[:] = self.plasma_x0
+            plasma.y[:] = self.plasma_y0
+            plasma.ux[:] = 0.
+            plasma.uy[:] = 0.
+            self.plasma_h[:] = 1.
+            self.plasma_history[:,:] = 0.
+            if self.dens_func is None:
+                plasma.w[:] = self.plasma_w0
+            else:
+                r0 = np.sqrt( self.plasma_x0**2 + self.plasma_y0**2 )
+                z0 = interp.zmax*np.ones_like( r0 )
+                plasma.w[:] = self.plasma_w0 * self.dens_func( z0, r0 )
+            # The ions neutralize the unperturbed plasma electrons
+            self.deposit_plasma( plasma.x, plasma.y, plasma.ux, plasma.uy,
+                    self.plasma_h, plasma.w, rho_ions, np.zeros(Nr),
+                    np.zeros(Nr), invvol )
+            rho_ions *= -1
+            # Buffers for the predictor steps
+            x_next = np.empty_like( plasma.x )
+            y_next = np.empty_like( plasma.y )
+            ux_next = np.empty_like( plasma.ux )
+            uy_next = np.empty_like( plasma.uy )
+            h_next = np.empty_like( self.plasma_h )
+            w_next = np.empty_like( plasma.w )
+
+        # Loop over the slices, from the front to the back of the box
+        Jr_prev = np.zeros( Nr )
+        Bt_prev = np.zeros( Nr )
+        Bt_prev_prev = np.zeros( Nr )
+        for iz in range( Nz-1, -1, -1 ):
+
+            # Charge and currents in the slice
+            rho = rho_beam[iz] + rho_ions
+            Jr = Jr_beam[iz].copy()
+            Jz = Jz_beam[iz].copy()
+            if plasma is not None:
+                self.deposit_plasma( plasma.x, plasma.y, plasma.ux, plasma.uy,
+                    self.plasma_h, plasma.w, rho, Jr, Jz, invvol )
+
+            # Fields that depend only on the sources in this slice
+            solver.solve_psi_and_Ez( rho, Jr, Jz )
+            # Btheta depends on dJr/dxi, i.e. on the plasma current
+            # in the next slice, which itself depends on Btheta
+            Jr_next = self.get_row( Jr_beam, iz-1 )
+            if plasma is None:
+                solver.solve_Bt( (Jr_prev - Jr_next)/(2*dz) )
+            else:
+                # Predict the current in the next slice, with Btheta
+                # extrapolated from the previous slices
+                solver.Bt[:] = 2*Bt_prev - Bt_prev_prev
+                solver.Er[:] = solver.minus_dr_psi + c*solver.Bt
+                self.gather_plasma( solver )
+                self.push_plasma( dz, x_next, y_next, ux_next, uy_next,
+                                  h_next, w_next, update_history=False )
+                chi = np.zeros( Nr )
+                self.deposit_plasma( x_next, y_next, ux_next, uy_next,
+                    h_next, w_next, np.zeros(Nr), Jr_next, np.zeros(Nr),
+                    invvol, chi=chi )
+                # Correct Btheta, with the linear response of the current
+                solver.solve_Bt( (Jr_prev - Jr_next)/(2*dz), chi=chi,
+                                 n_iterations=self.n_iterations )
+                # Push the plasma to the next slice
+                self.gather_plasma( solver )
+                self.push_plasma( dz, plasma.x, plasma.y, plasma.ux,
+                        plasma.uy, self.plasma_h, plasma.w, update_history=True )
+
+            # Store the fields and sources of this slice
+            interp.Er[iz,:] = solver.Er
+            interp.Ez[iz,:] = solver.Ez
+            interp.Bt[iz,:] = solver.Bt
+            interp.rho[iz,:] = rho
+            interp.Jr[iz,:] = Jr
+            interp.Jz[iz,:] = Jz
+            Jr_prev = Jr
+            Bt_prev_prev = Bt_prev
+            Bt_prev = solver.Bt.copy()
+
+        # The other components vanish for an axisymmetric response
+        for field in ['Et', 'Br', 'Bz', 'Jt']:
+            getattr( interp, field )[:,:] = 0.
+        # Get rho and J on the spectral grid (used by the field diagnostics)
+        self.fld.interp2spect('rho_prev')
+        self.fld.interp2spect('J')
+
+    def deposit_beams( self ):
+        """
+        Deposit the charge and currents of the beams (i.e. of the species
+        in `ptcl`) on the grid, with the deposition kernels of the PIC
+        loop, and return them as real arrays of shape (Nz, Nr).
+        """
+        fld = self.fld
+        fld.erase('rho')
+        fld.erase('J')
+        for species in self.ptcl:
+            species.deposit( fld, 'rho' )
+            species.deposit( fld, 'J' )
+        fld.sum_reduce_deposition_array('rho')
+        fld.sum_reduce_deposition_array('J')
+        fld.divide_by_volume('rho')
+        fld.divide_by_volume('J')
+        interp = fld.interp[0]
+        return( interp.rho.real.copy(), interp.Jr.real.copy(),
+                interp.Jz.real.copy() )
+
+    def deposit_plasma( self, x, y, ux, uy, h, w, rho, Jr, Jz, invvol,
+                        chi=None ):
+        """
+        Add the charge density and currents of the plasma slice (with the
+        macroparticle quantities `x`, `y`, `ux`, `uy`, `h`, `w`)
+        to the 1d arrays `rho`, `Jr` and `Jz`.
+        If `chi` is not None, also add the effective susceptibility of
+        dJr/dxi to Btheta (in m^-2) to this array: with the Adams-Bashforth
+        push over one cell and the centered derivative over two cells,
+        this is 3/4 mu_0 q^2/m sum(w/h)/volume.
+        """
+        Nr = len(invvol)
+        invdr = self.fld.interp[0].invdr
+        rho_slice = np.zeros( Nr )
+        Jr_slice = np.zeros( Nr )
+        Jz_slice = np.zeros( Nr )
+        deposit_slice_numba( x, y, ux, uy, h, w, self.plasma.q,
+                             invdr, Nr, rho_slice, Jr_slice, Jz_slice )
+        rho += rho_slice*invvol
+        Jr += Jr_slice*invvol
+        Jz += Jz_slice*invvol
+        if chi is not None:
+            chi_slice = np.zeros( Nr )
+            deposit_slice_chi_numba( x, y, h, w, invdr, Nr, chi_slice )
+            chi += 0.75*mu_0*self.plasma.q**2/self.plasma.m * chi_slice*invvol
+
+    def gather_plasma( self, solver ):
+        """
+        Gather the fields of the slice (stored in `solver`)
+        on the macroparticles of the plasma slice.
+        """
+        plasma = self.plasma
+        interp = self.fld.interp[0]
+        gather_slice_numba( plasma.x, plasma.y, interp.invdr, interp.Nr,
+            solver.Er, solver.Ez, solver.Bt,
+            plasma.Ex, plasma.Ey, plasma.Ez, plasma.Bx, plasma.By )
+
+    def push_plasma( self, ds, x_new, y_new, ux_new, uy_new, h_new, w_new,
+                     update_history ):
+        """
+        Push the macroparticles of the plasma slice to the next slice,
+        with the fields that were gathered last, and store the result
+        in the arrays `*_new` (which can be the arrays of the plasma).
+        The derivatives used by the Adams-Bashforth scheme are stored
+        only if `update_history` is True (i.e. not for predictor pushes).
+        """
+        plasma = self.plasma
+        push_slice_numba( plasma.x, plasma.y, plasma.ux, plasma.uy,
+            self.plasma_h, plasma.w, plasma.Ex, plasma.Ey, plasma.Ez,
+            plasma.Bx, plasma.By, plasma.q, plasma.m, ds,
+            self.max_weighting_factor,
+            self.plasma_history, update_history,
+            x_new, y_new, ux_new, uy_new, h_new, w_new )
+
+    def get_row( self, array, iz ):
+        """
+        Return a copy of the row `iz` of `array`
+        (or zeros, if `iz` is outside of the box)
+        """
+        if 0 <= iz < array.shape[0]:
+            return( array[iz].copy() )
+        else:
+            return( np.zeros( array.shape[1] ) )
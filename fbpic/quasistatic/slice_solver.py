@@ -0,0 +1,144 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines the SliceFieldSolver class, which solves the quasi-static
+field equations in one transverse slice, with the Hankel transforms of
+the azimuthal mode 0.
+"""
+import numpy as np
+from scipy.constants import c, epsilon_0, mu_0
+from fbpic.fields.spectral_transform import SpectralTransformer
+
+class SliceFieldSolver(object):
+    """
+    Solves the quasi-static field equations for the azimuthal mode 0,
+    in a slice of constant xi = z - c t.
+
+    In the quasi-static approximation, the fields depend on z and t only
+    through xi. The transverse Laplacian of the fields is then given by
+    the sources in the same slice:
+
+    - Laplacian(psi) = -(rho - Jz/c)/epsilon_0, where psi = phi - c Az
+      gives the transverse force on a particle moving at c:
+      Er - c Btheta = -d(psi)/dr
+    - Laplacian(Ez) = div(J_perp)/(epsilon_0 c)
+    - Laplacian(Btheta) = mu_0 ( dJz/dr - dJr/dxi )
+
+    These equations are solved in spectral space, with the discrete Hankel
+    transforms of order 0 (for psi, Ez and the sources rho, Jz) and of
+    order 1 (for Er, Btheta and the source Jr) used by the PIC solver.
+    The fields vanish at the upper radial boundary of the box.
+    """
+
+    def __init__( self, Nr, rmax ):
+        """
+        Initialize the Hankel transforms and the spectral coefficients.
+
+        Parameters
+        ----------
+        Nr: int
+            The number of radial cells
+
+        rmax: float (in meters)
+            The upper radial boundary of the box
+        """
+        # Reuse the transforms of the PIC solver, for one slice (Nz=1)
+        trans = SpectralTransformer( 1, Nr, 0, rmax )
+        self.dht0 = trans.dht0
+        self.dht1 = trans.dhtp
+        # Radial wavevectors (the same for the orders 0 and 1, for m=0)
+        kr = 2*np.pi*self.dht0.get_nu()
+        self.kr = kr[np.newaxis,:]
+        self.inv_kr2 = 1./self.kr**2
+
+        # Allocate the buffers for the transforms
+        self.interp_buffer = np.zeros( (1, Nr), dtype=np.complex128 )
+        self.spect_buffer = np.zeros( (1, Nr), dtype=np.complex128 )
+        self.Jz_spect = np.zeros( (1, Nr), dtype=np.complex128 )
+        self.dxi_Jr_spect = np.zeros( (1, Nr), dtype=np.complex128 )
+
+        # Fields of the slice (real, on the radial grid)
+        self.minus_dr_psi = np.zeros( Nr )
+        self.Ez = np.zeros( Nr )
+        self.Bt = np.zeros( Nr )
+        self.Er = np.zeros( Nr )
+
+    def _transform( self, dht, source ):
+        """Return the Hankel transform of the real 1darray `source`"""
+        self.interp_buffer[0,:] = source
+        dht.transform( self.interp_buffer, self.spect_buffer )
+        return( self.spect_buffer.copy() )
+
+    def _inverse_transform( self, dht, spect, result ):
+        """Store the inverse Hankel transform of `spect` in `result`"""
+        dht.inverse_transform( spect, self.interp_buffer )
+        result[:] = self.interp_buffer[0,:].real
+
+    def solve_psi_and_Ez( self, rho, Jr, Jz ):
+        """
+        Calculate -d(psi)/dr and Ez in the slice, from the charge density
+        and currents of the slice (1darrays of size Nr).
+        The transform of Jz is stored for the subsequent calculation of
+        Btheta (see `solve_Bt`).
+        """
+        # psi: -kr^2 psi = -(rho - Jz/c)/epsilon_0 ; -d/dr -> kr (order 1)
+        psi_spect = self._transform( self.dht0, rho - Jz/c ) \
+                        * self.inv_kr2/epsilon_0
+        self._inverse_transform( self.dht1, self.kr*psi_spect,
+                                  self.minus_dr_psi )
+        # Ez: -kr^2 Ez = kr Jr/(epsilon_0 c) (the divergence is kr Jr)
+        Ez_spect = - self._transform( self.dht1, Jr ) \
+                        / (self.kr*epsilon_0*c)
+        self._inverse_transform( self.dht0, Ez_spect, self.Ez )
+        # Store the transform of Jz, for Btheta
+        self.Jz_spect[:,:] = self._transform( self.dht0, Jz )
+
+    def solve_Bt( self, dxi_Jr, chi=None, n_iterations=1 ):
+        """
+        Calculate Btheta and Er in the slice, from the derivative of Jr
+        along xi (1darray of size Nr), and from the transform of Jz
+        stored by `solve_psi_and_Ez` (which should be called first).
+
+        When the plasma current depends on Btheta, `dxi_Jr` is the
+        derivative predicted with the current value of `self.Bt`
+        (i.e. by pushing the plasma in this field). Since the plasma
+        current responds linearly to a change of Btheta, with the
+        effective susceptibility `chi` (1darray of size Nr, in m^-2), this
+        leads to
+        Laplacian(Bt) - chi Bt = mu_0 ( dJz/dr - dJr/dxi ) - chi Bt_guess
+        This equation is solved iteratively, with the constant part
+        chi0 = max(chi) of the susceptibility treated in spectral space,
+        which converges for any chi >= 0.
+
+        Parameters
+        ----------
+        dxi_Jr: 1darray of floats
+            The derivative of Jr along xi
+
+        chi: 1darray of floats, or None
+            The effective susceptibility of dJr/dxi to Btheta.
+            If None, the current does not depend on Btheta.
+
+        n_iterations: int
+            The number of iterations of the solver (when `chi` is not None;
+            each iteration requires two Hankel transforms)
+        """
+        # -kr^2 Bt = mu_0 ( -kr Jz - dJr/dxi ) (d/dr -> -kr, from order 0)
+        self.dxi_Jr_spect[:,:] = self._transform( self.dht1, dxi_Jr )
+        source_spect = mu_0*( self.kr*self.Jz_spect + self.dxi_Jr_spect )
+        if chi is None:
+            self._inverse_transform( self.dht1,
+                                      self.inv_kr2*source_spect, self.Bt )
+        else:
+            Bt_guess = self.Bt.copy()
+            chi0 = chi.max()
+            inv_helmholtz = 1./( self.kr**2 + chi0 )
+            for _ in range( n_iterations ):
+                correction = ( chi - chi0 )*self.Bt - chi*Bt_guess
+                Bt_spect = inv_helmholtz*( source_spect
+                            - self._transform( self.dht1, correction ) )
+                self._inverse_transform( self.dht1, Bt_spect, self.Bt )
+        # Radial electric field
+        self.Er[:] = self.minus_dr_psi + c*self.Bt
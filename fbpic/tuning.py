@@ -0,0 +1,482 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines the function `autotune`, which selects the parameters of a
+simulation that only affect its performance (guard cells, exchange period,
+threads per MPI rank, FFT library and CUDA block sizes) by timing a few
+PIC iterations for different candidate values, and which stores the best
+configuration on disk, for the current machine and the given problem.
+"""
+import os
+import json
+import platform
+import warnings
+import numpy as np
+from scipy.constants import c
+from fbpic.utils.timing import perf_counter
+
+# File in which the tuned configurations are stored
+# (can be changed with the environment variable FBPIC_AUTOTUNE_FILE)
+default_cache_file = os.path.join( os.path.expanduser('~'),
+                                   '.fbpic', 'autotune.json' )
+if 'FBPIC_AUTOTUNE_FILE' in os.environ:
+    default_cache_file = os.environ['FBPIC_AUTOTUNE_FILE']
+
+# Candidate numbers of threads per block for the CUDA particle kernels
+cuda_tpb_candidates = [ 32, 64, 128, 256 ]
+
+
+class TunedConfiguration(object):
+    """
+    Class that holds a set of performance parameters, as selected
+    by `autotune`.
+
+    Main attributes
+    ---------------
+    - simulation_kwargs: dict
+        The arguments `n_order`, `n_guard` and `exchange_period` that
+        should be passed to `Simulation`
+    - ranks_per_node, nthreads: ints
+        The number of MPI ranks per node, and of threads per rank
+    - fft_backend: string
+        The library used for the FFTs on CPU ('mkl' or 'fftw')
+    - cuda_tpb: dict
+        The threads per block of the CUDA particle kernels
+    - step_time: float
+        The time (in seconds) of one PIC iteration, for this configuration
+    """
+
+    def __init__( self, n_order, n_guard, exchange_period, ranks_per_node,
+                  nthreads, fft_backend, cuda_tpb, step_time=None ):
+        """
+        Register the performance parameters (see the class docstring)
+        """
+        self.n_order = n_order
+        self.n_guard = n_guard
+        self.exchange_period = exchange_period
+        self.ranks_per_node = ranks_per_node
+        self.nthreads = nthreads
+        self.fft_backend = fft_backend
+        self.cuda_tpb = dict( cuda_tpb )
+        self.step_time = step_time
+
+    @property
+    def simulation_kwargs( self ):
+        """Arguments that should be passed to `Simulation`"""
+        return( dict( n_order=self.n_order, n_guard=self.n_guard,
+                      exchange_period=self.exchange_period ) )
+
+    def apply( self ):
+        """
+        Set the number of threads used by numba, the FFT library and
+        the CUDA block sizes, for the simulations created afterwards.
+        """
+        import numba
+        from fbpic.utils.threading import num_threads_settable
+        from fbpic.utils.cuda import cuda_tpb
+        from fbpic.fields.spectral_transform.fourier import set_fft_backend
+        if num_threads_settable:
+            numba.set_num_threads(
+                min( self.nthreads, numba.config.NUMBA_NUM_THREADS ) )
+        set_fft_backend( self.fft_backend )
+        cuda_tpb.update( self.cuda_tpb )
+
+    def to_dict( self ):
+        """Return the parameters as a dictionary (e.g. for json)"""
+        return( dict( vars(self) ) )
+
+    def __str__( self ):
+        return( 'n_order = %d, n_guard = %s, exchange_period = %s, '
+            'ranks_per_node = %d, nthreads = %d, fft_backend = %s, '
+            'cuda_tpb = %s' %(self.n_order, self.n_guard,
+            self.exchange_period, self.ranks_per_node, self.nthreads,
+            self.fft_backend, self.cuda_tpb) )
+
+
+def autotune( Nz, zmax, Nr, rmax, Nm, dt, zmin=0., n_order=-1,
+              boundaries='periodic', n_order_candidates=None, n_nodes=1,
+              cores_per_node=None, ranks_per_node_candidates=None,
+              N_steps=5, cache_file=None, retune=False, apply=True,
+              verbose=True, **kw ):
+    """
+    Return the performance parameters of a simulation, either from the
+    file of tuned configurations (if this problem was already tuned on
+    the current machine), or by timing a few PIC iterations of trial
+    simulations for different candidate values of the parameters.
+
+    The parameters are tuned one after the other (keeping the best value
+    of the previous parameters):
+    - the number of MPI ranks per node (and thus of threads per rank)
+    - the order of the stencil (among `n_order_candidates`) and the number
+      of guard cells
+    - the period of the particle exchange
+    - the FFT library (on CPU, if both MKL and FFTW are installed)
+    - the threads per block of the CUDA particle kernels (on GPU)
+
+    With several MPI ranks, each trial simulation is the local grid of
+    one rank (with its guard cells), filled with the plasma of the
+    simulation: the time of the MPI communications is not included.
+
+    This function should be run on a single process of the target machine
+    (e.g. in an interactive job), before launching the simulation. The
+    simulation script can then call `autotune` with the same arguments:
+    the stored configuration is returned (and applied) without new trials.
+    (With numba older than 0.49, the number of threads cannot be changed
+    at runtime: no trials are then run, and the default parameters are
+    returned.)
+
+    Parameters
+    ----------
+    Nz, zmax, Nr, rmax, Nm, dt, zmin, n_order, boundaries:
+        Same as in `Simulation` (the global simulation box)
+
+    n_order_candidates: list of ints, optional
+        The orders of the stencil that can be used (the order changes the
+        accuracy of the simulation, and is thus only chosen by the user).
+        Defaults to `[n_order]`.
+
+    n_nodes: int, optional
+        The number of nodes on which the simulation will run
+
+    cores_per_node: int, optional
+        The number of cores per node (defaults to NUMBA_NUM_THREADS)
+
+    ranks_per_node_candidates: list of ints, optional
+        The numbers of MPI ranks per node that are tried (the cores of
+        the node are divided between these ranks). Defaults to the powers
+        of 2 that divide `cores_per_node`.
+
+    N_steps: int, optional
+        The number of timed PIC iterations, for each trial
+
+    cache_file: string, optional
+        The file in which the tuned configurations are stored.
+        (Defaults to `~/.fbpic/autotune.json`, or to the environment
+        variable FBPIC_AUTOTUNE_FILE.)
+
+    retune: bool, optional
+        Whether to run the trials even if the problem was already tuned
+
+    apply: bool, optional
+        Whether to apply the configuration (see `TunedConfiguration.apply`)
+
+    verbose: bool, optional
+        Whether to print the time of each trial
+
+    **kw: keyword arguments
+        The other arguments of `Simulation` (e.g. `n_e`, `p_nz`, `p_nr`,
+        `p_nt`, `particle_shape`, `use_cuda`, `v_comoving`, `gamma_boost`)
+
+    Returns
+    -------
+    A `TunedConfiguration` object
+    """
+    import numba
+    from fbpic.utils.mpi import comm
+    from fbpic.utils.threading import threading_enabled, num_threads_settable
+    from fbpic.fields.spectral_transform.fourier import \
+        available_fft_backends
+
+    if n_order_candidates is None:
+        n_order_candidates = [ n_order ]
+    if cores_per_node is None:
+        cores_per_node = numba.config.NUMBA_NUM_THREADS
+    if ranks_per_node_candidates is None:
+        ranks_per_node_candidates = [ 2**i for i in
+            range( int(np.log2(cores_per_node))+1 )
+            if cores_per_node % 2**i == 0 ]
+    use_cuda = kw.get( 'use_cuda', False )
+    if cache_file is None:
+        cache_file = default_cache_file
+
+    # Check whether this problem was already tuned on this machine
+    machine = get_machine_signature( use_cuda )
+    problem = get_problem_signature( Nz, zmax, Nr, rmax, Nm, dt, zmin,
+        boundaries, n_order_candidates, n_nodes, cores_per_node, kw )
+    cache = load_cache( cache_file )
+    if (not retune) and (problem in cache.get( machine, {} )):
+        config = TunedConfiguration( **cache[machine][problem] )
+        if apply:
+            config.apply()
+        return( config )
+
+    # Start from the default parameters
+    config = get_current_configuration( n_order_candidates[0] )
+    if threading_enabled and not num_threads_settable:
+        warnings.warn( 'The number of threads cannot be changed with this '
+            'version of numba (0.49 or higher is needed).\n'
+            'The parameters are not tuned ; the default parameters are used.' )
+        return( config )
+    config.nthreads = cores_per_node
+    if comm.size > 1:
+        warnings.warn( 'This problem was not tuned on this machine. '
+            'Run `autotune` on a single process before launching the '
+            'simulation with MPI.\nThe default parameters are used.' )
+        return( config )
+
+    trial = TrialRunner( Nz, zmax, Nr, rmax, Nm, dt, zmin, boundaries,
+                         n_nodes, cores_per_node, N_steps, verbose, kw )
+    # Ranks per node (and threads per rank)
+    config = trial.select( config, [ dict( ranks_per_node=rpn,
+        nthreads=cores_per_node//rpn, n_guard=None, exchange_period=None )
+        for rpn in ranks_per_node_candidates ] )
+    # Order of the stencil, guard cells and exchange period (except for
+    # a single periodic domain, which has no guard cells)
+    if config.step_time is not None and not ( boundaries == 'periodic'
+                    and n_nodes*config.ranks_per_node == 1 ):
+        candidates = []
+        for order in n_order_candidates:
+            n_guard = trial.get_min_guard_cells( order )
+            candidates += [ dict( n_order=order, n_guard=n_guard ),
+                            dict( n_order=order, n_guard=2*n_guard ) ]
+        config = trial.select( config, candidates )
+        if config.n_guard is not None:
+            max_period = trial.get_max_exchange_period( config.n_guard )
+            config = trial.select( config, [ dict( exchange_period=period )
+                for period in sorted(set([ 1, max_period//2, max_period ]))
+                if period >= 1 ] )
+    # FFT library
+    if (not use_cuda) and len( available_fft_backends ) > 1:
+        config = trial.select( config, [ dict( fft_backend=backend )
+                                for backend in available_fft_backends ] )
+    # CUDA block sizes
+    if use_cuda:
+        for kernel in [ 'gather', 'deposit' ]:
+            config = trial.select( config, [ dict( cuda_tpb=dict(
+                config.cuda_tpb, **{kernel: tpb} ) )
+                for tpb in cuda_tpb_candidates ] )
+    if config.step_time is None:
+        raise ValueError( 'None of the candidate configurations can run.' )
+
+    # Store the configuration
+    cache.setdefault( machine, {} )[problem] = config.to_dict()
+    save_cache( cache, cache_file )
+    if verbose:
+        print( 'Tuned configuration: %s' %config )
+    if apply:
+        config.apply()
+    return( config )
+
+
+class TrialRunner(object):
+    """
+    Class that runs and times the trial simulations of `autotune`.
+    """
+
+    def __init__( self, Nz, zmax, Nr, rmax, Nm, dt, zmin, boundaries,
+                  n_nodes, cores_per_node, N_steps, verbose, kw ):
+        """
+        Register the parameters of the simulation (see `autotune`)
+        """
+        from fbpic.lpa_utils.boosted_frame import BoostConverter
+        self.Nz = Nz
+        self.zmin = zmin
+        self.zmax = zmax
+        self.Nr = Nr
+        self.rmax = rmax
+        self.Nm = Nm
+        self.dt = dt
+        self.boundaries = boundaries
+        self.n_nodes = n_nodes
+        self.N_steps = N_steps
+        self.verbose = verbose
+        # The tuned parameters cannot be passed by the user
+        self.kw = { key: value for key, value in kw.items() if key not in
+                    [ 'n_guard', 'exchange_period', 'verbose_level' ] }
+        # Cell size and timestep in the frame of the simulation
+        if kw.get( 'gamma_boost', None ) is not None:
+            boost = BoostConverter( kw['gamma_boost'] )
+            zmin, zmax, dt = boost.copropag_length([ zmin, zmax, dt ])
+        self.dz = (zmax - zmin)/Nz
+        self.cdt = c*dt
+
+    def get_min_guard_cells( self, n_order ):
+        """
+        Return the minimal number of guard cells for a stencil of order
+        `n_order` (same rule as in `BoundaryCommunicator`)
+        """
+        from fbpic.fields.utility_methods import get_stencil_reach
+        if n_order == -1:
+            return( 64 )
+        v_comoving = self.kw.get( 'v_comoving', None )
+        use_galilean = self.kw.get( 'use_galilean', True ) \
+                        and (v_comoving is not None)
+        return( get_stencil_reach( self.Nz, self.dz, self.cdt, n_order,
+                                   v_comoving, use_galilean ) + 1 )
+
+    def get_max_exchange_period( self, n_guard ):
+        """
+        Return the largest exchange period that is allowed with `n_guard`
+        guard cells (same rule as in `BoundaryCommunicator`)
+        """
+        return( int( ((n_guard/2)-3) / (2.*self.cdt/self.dz) ) )
+
+    def select( self, config, candidates ):
+        """
+        Time the trial simulations for the configurations obtained by
+        updating `config` with each of the dictionaries `candidates`,
+        and return the fastest configuration (or `config` itself, if
+        none of these configurations can run).
+        """
+        best = config
+        best_time = None
+        for changes in candidates:
+            params = config.to_dict()
+            params.update( changes )
+            params['step_time'] = None
+            candidate = TunedConfiguration( **params )
+            step_time = self.time_step( candidate )
+            if self.verbose:
+                print( '%s: %s' %( candidate, '%.3e s' %step_time
+                        if step_time is not None else 'cannot run' ) )
+            if step_time is not None and (
+                best_time is None or step_time < best_time ):
+                candidate.step_time = step_time
+                best = candidate
+                best_time = step_time
+        return( best )
+
+    def time_step( self, config ):
+        """
+        Return the time of one PIC iteration of a trial simulation with
+        the parameters of `config`, or None if these parameters are invalid
+        """
+        from fbpic.main import Simulation
+        n_ranks = self.n_nodes * config.ranks_per_node
+        if n_ranks == 1:
+            # The trial simulation is the full simulation
+            Nz, zmax = self.Nz, self.zmax
+            boundaries = self.boundaries
+            kw = dict( self.kw )
+        else:
+            # The trial simulation is the local grid of a rank (without
+            # damping cells), filled with plasma
+            if config.n_order == -1:
+                return( None )
+            Nz = self.Nz // n_ranks
+            zmax = self.zmin + Nz*(self.zmax - self.zmin)/self.Nz
+            boundaries = 'open'
+            kw = { key: value for key, value in self.kw.items()
+                   if key not in ['p_zmin', 'p_zmax', 'n_damp'] }
+            kw['n_damp'] = 0
+            n_guard = config.n_guard
+            if n_guard is None:
+                n_guard = self.get_min_guard_cells( config.n_order )
+            if Nz + 2*n_guard < 4*n_guard:
+                return( None )
+        if config.exchange_period is not None and config.n_guard is not None:
+            if config.exchange_period > \
+                    self.get_max_exchange_period( config.n_guard ):
+                return( None )
+
+        # Use the parameters, and time the trial simulation
+        # (The previous threads, FFT library and CUDA block sizes are
+        # restored afterwards, even if the trial fails)
+        previous = get_current_configuration( config.n_order )
+        try:
+            config.apply()
+            try:
+                sim = Simulation( Nz, zmax, self.Nr, self.rmax, self.Nm,
+                    self.dt, zmin=self.zmin, n_order=config.n_order,
+                    n_guard=config.n_guard,
+                    exchange_period=config.exchange_period,
+                    boundaries=boundaries, verbose_level=0, **kw )
+            except ValueError:
+                # e.g. too few cells for the guard cells
+                return( None )
+            sim.step( 1, show_progress=False )    # Compilation
+            start = perf_counter()
+            sim.step( self.N_steps, show_progress=False )
+            return( (perf_counter() - start)/self.N_steps )
+        finally:
+            previous.apply()
+
+
+def get_current_configuration( n_order ):
+    """
+    Return a `TunedConfiguration` with the default values of `n_guard`,
+    `exchange_period` and `ranks_per_node`, and with the threads, FFT
+    library and CUDA block sizes that are currently used
+    """
+    from fbpic.utils.cuda import cuda_tpb
+    from fbpic.utils.threading import get_num_threads
+    from fbpic.fields.spectral_transform import fourier
+    return( TunedConfiguration( n_order, None, None, 1, get_num_threads(),
+                                fourier.fft_backend, cuda_tpb ) )
+
+
+def get_machine_signature( use_cuda ):
+    """
+    Return a string that identifies the hardware of the current machine
+    (processor model, number of cores and, on GPU, the model of the GPU)
+    """
+    import numba
+    processor = platform.processor()
+    if os.path.exists( '/proc/cpuinfo' ):
+        with open( '/proc/cpuinfo' ) as f:
+            for line in f:
+                if line.startswith( 'model name' ):
+                    processor = line.split( ':', 1 )[1].strip()
+                    break
+    signature = '%s %s, %s cores' %( platform.machine(), processor,
+                                     numba.config.NUMBA_NUM_THREADS )
+    if use_cuda:
+        from fbpic.utils.cuda import cuda
+        signature += ', %s' %cuda.get_current_device().name.decode()
+    return( signature )
+
+
+def get_problem_signature( Nz, zmax, Nr, rmax, Nm, dt, zmin, boundaries,
+                           n_order_candidates, n_nodes, cores_per_node, kw ):
+    """
+    Return a string that identifies the problem: grid size, number of
+    macroparticles per cell, particle shape, algorithms and resources
+    (but not the physical parameters that do not affect the performance)
+    """
+    ppc = 0
+    if kw.get( 'n_e', None ) is not None:
+        ppc = kw['p_nz'] * kw['p_nr'] * kw['p_nt']
+        if kw.get( 'initialize_ions', False ):
+            ppc *= 2
+    signature = dict( Nz=Nz, Nr=Nr, Nm=Nm, ppc=ppc,
+        cdt_over_dz=round( c*dt*Nz/(zmax-zmin), 6 ),
+        boundaries=boundaries, n_order=sorted( n_order_candidates ),
+        n_nodes=n_nodes, cores_per_node=cores_per_node,
+        particle_shape=kw.get( 'particle_shape', 'linear' ),
+        use_cuda=kw.get( 'use_cuda', False ),
+        comoving=kw.get( 'v_comoving', None ) is not None,
+        use_galilean=kw.get( 'use_galilean', True ),
+        gamma_boost=kw.get( 'gamma_boost', None ),
+        current_correction=kw.get( 'current_correction', 'curl-free' ) )
+    return( json.dumps( signature, sort_keys=True ) )
+
+
+def load_cache( cache_file ):
+    """Return the dictionary of tuned configurations stored in `cache_file`"""
+    if not os.path.exists( cache_file ):
+        return( {} )
+    with open( cache_file ) as f:
+        return( json.load( f ) )
+
+
+def save_cache( cache, cache_file ):
+    """Store the dictionary of tuned configurations in `cache_file`"""
+    directory = os.path.dirname( os.path.abspath( cache_file ) )
+    try:
+        os.makedirs( directory )
+    except OSError:
+        # The directory already exists (or cannot be created)
+        if not os.path.isdir( directory ):
+            raise
+    # Write to a temporary file first, so that the file is never corrupted
+    temp_file = cache_file + '.tmp'
+    with open( temp_file, 'w' ) as f:
+        json.dump( cache, f, indent=2 )
+    try:
+        os.rename( temp_file, cache_file )
+    except OSError:
+        # On Windows, the existing file needs to be removed first
+        os.remove( cache_file )
+        os.rename( temp_file, cache_file )
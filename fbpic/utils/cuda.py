@@ -13,6 +13,12 @@ try:
 except Exception:
     cuda_installed = False
 
+# Threads per block of the particle kernels that do not use the default
+# block size: field gathering, and deposition (one thread per cell).
+# (These can be modified before running the simulation, e.g. by
+# `fbpic.autotune`.)
+cuda_tpb = { 'gather': 64, 'deposit': 64 }
+
 # -----------------------------------------------------
 # CUDA grid utilities
 # -----------------------------------------------------
@@ -0,0 +1,357 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines the placement of the CPU threads and of the data on
+multi-socket (NUMA) nodes:
+- each MPI rank can be given a NUMA-local set of cores, and a number of
+  threads that matches this set (environment variable FBPIC_CPU_PLACEMENT)
+- the threads can be pinned to individual cores (FBPIC_PIN_THREADS)
+- the arrays are initialized in parallel ("first touch"), with the same
+  partitioning as the `prange` loops that later process them, so that
+  each memory page is placed on the NUMA node of the thread that uses it
+"""
+import os
+import glob
+import ctypes
+import warnings
+import numba
+import numpy as np
+from .threading import threading_enabled, num_threads_settable, \
+    get_num_threads, njit_parallel, prange
+
+# Check if the environment variables FBPIC_CPU_PLACEMENT and
+# FBPIC_PIN_THREADS are set to 1
+cpu_placement_enabled = False
+if 'FBPIC_CPU_PLACEMENT' in os.environ:
+    if int(os.environ['FBPIC_CPU_PLACEMENT']) == 1:
+        cpu_placement_enabled = True
+pin_threads_enabled = False
+if 'FBPIC_PIN_THREADS' in os.environ:
+    if int(os.environ['FBPIC_PIN_THREADS']) == 1:
+        pin_threads_enabled = True
+
+# Get the function `gettid` of the C library (used in order to pin the
+# threads of numba; only available on Linux, with glibc 2.30 or higher,
+# and with a version of numba that provides `numba.get_thread_id`)
+try:
+    libc_gettid = ctypes.CDLL(None).gettid
+    libc_gettid.restype = ctypes.c_int
+    libc_gettid.argtypes = []
+    gettid_available = hasattr( os, 'sched_setaffinity' ) and \
+                        hasattr( numba, 'get_thread_id' )
+except (AttributeError, OSError):
+    gettid_available = False
+
+# Cores of the current process, once the placement has been applied
+# (None if `set_cpu_placement` was not called)
+placed_cores = None
+
+# NUMA topology and placement of the MPI ranks
+# --------------------------------------------
+
+def parse_cpulist( cpulist ):
+    """
+    Convert a list of cpus in the Linux format (e.g. '0-3,8,10-11')
+    into a list of ints
+    """
+    cpus = []
+    for item in cpulist.strip().split(','):
+        if item == '':
+            continue
+        if '-' in item:
+            start, end = item.split('-')
+            cpus += list( range( int(start), int(end)+1 ) )
+        else:
+            cpus.append( int(item) )
+    return( cpus )
+
+def get_numa_nodes( available_cores=None ):
+    """
+    Return the cores of each NUMA node of the machine (as given by
+    /sys/devices/system/node), restricted to `available_cores`
+
+    Parameters
+    ----------
+    available_cores: set of ints, optional
+        The cores on which the process is allowed to run
+        (by default: the affinity of the current process)
+
+    Returns
+    -------
+    A list of sorted lists of ints (one per NUMA node that contains
+    available cores). On machines without NUMA information, this is
+    a single list with all the available cores.
+    """
+    if available_cores is None:
+        available_cores = os.sched_getaffinity(0)
+    nodes = []
+    node_dirs = glob.glob('/sys/devices/system/node/node[0-9]*')
+    for node_dir in sorted( node_dirs,
+                        key=lambda d: int(d.split('node')[-1]) ):
+        try:
+            with open( os.path.join( node_dir, 'cpulist' ) ) as f:
+                cpus = parse_cpulist( f.read() )
+        except IOError:
+            continue
+        cpus = sorted( set(cpus) & set(available_cores) )
+        if len(cpus) > 0:
+            nodes.append( cpus )
+    if len(nodes) == 0:
+        nodes = [ sorted( available_cores ) ]
+    return( nodes )
+
+def get_local_rank():
+    """
+    Return the rank of the current MPI process among the processes of the
+    same node, and the number of such processes
+
+    Returns
+    -------
+    local_rank, n_local_ranks: ints
+    """
+    from .mpi import MPI, comm, mpi_installed
+    if not mpi_installed or comm.size == 1:
+        return( 0, 1 )
+    node_comm = comm.Split_type( MPI.COMM_TYPE_SHARED )
+    local_rank, n_local_ranks = node_comm.rank, node_comm.size
+    node_comm.Free()
+    return( local_rank, n_local_ranks )
+
+def get_rank_cores( local_rank, n_local_ranks, numa_nodes ):
+    """
+    Select the cores of a given MPI rank, so that the cores of each rank
+    are within a single NUMA node (when there are at least as many ranks
+    as NUMA nodes), or consist of whole NUMA nodes (otherwise)
+
+    Parameters
+    ----------
+    local_rank, n_local_ranks: ints
+        The rank among the processes of the same node, and their number
+
+    numa_nodes: list of lists of ints
+        The cores of each NUMA node (see `get_numa_nodes`)
+
+    Returns
+    -------
+    A sorted list of ints
+    """
+    n_nodes = len( numa_nodes )
+    if n_local_ranks >= n_nodes:
+        # Distribute the ranks among the NUMA nodes, and
+        # divide the cores of a NUMA node among its ranks
+        node = local_rank * n_nodes // n_local_ranks
+        node_ranks = [ rank for rank in range(n_local_ranks)
+                       if rank * n_nodes // n_local_ranks == node ]
+        i_rank = node_ranks.index( local_rank )
+        cores = numa_nodes[ node ]
+        n_ranks = len( node_ranks )
+        if len(cores) < n_ranks:
+            # More ranks than cores: share the cores of this node
+            return( cores )
+        i_start = i_rank * len(cores) // n_ranks
+        i_end = (i_rank+1) * len(cores) // n_ranks
+        return( cores[ i_start:i_end ] )
+    else:
+        # Give whole NUMA nodes to each rank
+        node_start = local_rank * n_nodes // n_local_ranks
+        node_end = (local_rank+1) * n_nodes // n_local_ranks
+        return( sorted( sum( numa_nodes[node_start:node_end], [] ) ) )
+
+def set_cpu_placement( pin_threads=False, verbose=False ):
+    """
+    Restrict the current process to a NUMA-local set of cores (which
+    depends on its rank among the MPI processes of the same node), and
+    use one numba thread per core of this set.
+
+    If the process was already restricted to a subset of the cores of
+    the node (e.g. by the options of `mpirun` or of the job scheduler),
+    this subset is kept.
+
+    This should be called before the arrays of the simulation are
+    allocated (this is done automatically when creating a `Simulation`,
+    if the environment variable FBPIC_CPU_PLACEMENT is set to 1).
+
+    Parameters
+    ----------
+    pin_threads: bool, optional
+        Whether to additionally pin each numba thread to a single core
+
+    verbose: bool, optional
+        Whether to print the selected cores
+
+    Returns
+    -------
+    cores: a sorted list of ints
+    """
+    global placed_cores
+    available_cores = os.sched_getaffinity(0)
+    if len( available_cores ) < os.cpu_count():
+        # The launcher already restricted this process: keep its choice
+        cores = sorted( available_cores )
+    else:
+        local_rank, n_local_ranks = get_local_rank()
+        cores = get_rank_cores( local_rank, n_local_ranks,
+                                get_numa_nodes( available_cores ) )
+        os.sched_setaffinity( 0, cores )
+    # Use one thread per core
+    # (The threads of numba may have been launched before the affinity of
+    # the process was changed: their affinity is thus also set explicitly)
+    if num_threads_settable:
+        numba.set_num_threads(
+            min( len(cores), numba.config.NUMBA_NUM_THREADS ) )
+        place_numba_threads( cores, pin_threads=pin_threads )
+    placed_cores = cores
+    if verbose:
+        print('Running on cores %s, with %d threads.'
+              %( cores, get_num_threads() ) )
+    return( cores )
+
+def apply_cpu_placement_from_environment():
+    """
+    Apply the placement requested by the environment variables
+    FBPIC_CPU_PLACEMENT and FBPIC_PIN_THREADS (only once per process)
+    """
+    if placed_cores is None:
+        if cpu_placement_enabled:
+            set_cpu_placement( pin_threads=pin_threads_enabled )
+        elif pin_threads_enabled and threading_enabled:
+            place_numba_threads( sorted( os.sched_getaffinity(0) ),
+                                 pin_threads=True )
+
+# Pinning of the threads
+# ----------------------
+
+if gettid_available:
+
+    @njit_parallel
+    def get_numba_thread_ids( tids ):
+        """
+        Fill `tids` with the native (Linux) id of each numba thread
+        (indexed by the numba thread id)
+        """
+        for i in prange( len(tids) ):
+            tids[ numba.get_thread_id() ] = libc_gettid()
+
+def place_numba_threads( cores, pin_threads=False ):
+    """
+    Restrict the numba threads to the set `cores`, or, if `pin_threads`
+    is True, pin the i-th numba thread to the core `cores[i % len(cores)]`
+
+    Parameters
+    ----------
+    cores: list of ints
+
+    pin_threads: bool, optional
+    """
+    if not gettid_available:
+        if pin_threads:
+            warnings.warn('The threads cannot be pinned on this platform.')
+        return
+    n_threads = get_num_threads()
+    tids = np.zeros( n_threads, dtype=np.int64 )
+    get_numba_thread_ids( tids )
+    for i_thread, tid in enumerate( tids ):
+        # (tid is 0 if this thread did not take part in the loop)
+        if tid > 0:
+            if pin_threads:
+                os.sched_setaffinity( int(tid),
+                                      [ cores[i_thread % len(cores)] ] )
+            else:
+                os.sched_setaffinity( int(tid), cores )
+
+# First-touch initialization of the arrays
+# ----------------------------------------
+
+@njit_parallel
+def zero_rows_numba( array ):
+    """
+    Set the 2darray `array` to 0, with one row per `prange` iteration
+    """
+    for i in prange( array.shape[0] ):
+        for j in range( array.shape[1] ):
+            array[i, j] = 0
+
+@njit_parallel
+def copy_rows_numba( source, target ):
+    """
+    Copy the 2darray `source` into `target`, with one row per `prange`
+    iteration
+    """
+    for i in prange( source.shape[0] ):
+        for j in range( source.shape[1] ):
+            target[i, j] = source[i, j]
+
+def as_rows( array ):
+    """
+    Return a 2d view of `array`, whose first axis is the axis that is
+    partitioned between threads by the `prange` loops: the first axis
+    for multi-dimensional arrays (e.g. z for the grids, or the thread
+    index for the deposition buffers), and the particle index for 1d arrays
+    """
+    if array.ndim == 1:
+        return( array.reshape( (array.shape[0], 1) ) )
+    else:
+        return( array.reshape( (array.shape[0], -1) ) )
+
+def first_touch_zeros( shape, dtype=np.float64 ):
+    """
+    Return an array of zeros, whose memory pages are first written by
+    the threads that process the corresponding part of the array in the
+    `prange` loops (see `as_rows`)
+
+    Parameters
+    ----------
+    shape: int or tuple of ints
+    dtype: numpy dtype, optional
+    """
+    array = np.empty( shape, dtype=dtype )
+    if threading_enabled and array.size > 0:
+        zero_rows_numba( as_rows( array ) )
+    else:
+        array[...] = 0
+    return( array )
+
+def first_touch_copy( array ):
+    """
+    Return a copy of `array`, whose memory pages are first written by the
+    threads that process the corresponding part of the array
+    (see `first_touch_zeros`)
+    """
+    copy = np.empty( array.shape, dtype=array.dtype )
+    if threading_enabled and array.size > 0:
+        copy_rows_numba( as_rows( np.ascontiguousarray(array) ),
+                         as_rows( copy ) )
+    else:
+        copy[...] = array
+    return( copy )
+
+@njit_parallel
+def concatenate_numba( left, middle, right, result ):
+    """
+    Copy `left`, `middle` and `right` one after the other into `result`,
+    with one element of `result` per `prange` iteration
+    """
+    n_left = len(left)
+    n_middle = len(middle)
+    for i in prange( len(result) ):
+        if i < n_left:
+            result[i] = left[i]
+        elif i < n_left + n_middle:
+            result[i] = middle[i-n_left]
+        else:
+            result[i] = right[i-n_left-n_middle]
+
+def first_touch_concatenate( left, middle, right ):
+    """
+    Concatenate the 1darrays `left`, `middle` and `right` into a new
+    1darray, whose memory pages are first written by the threads that
+    process the corresponding part of the array (see `first_touch_zeros`)
+    """
+    result = np.empty( len(left)+len(middle)+len(right), dtype=middle.dtype )
+    if threading_enabled:
+        concatenate_numba( left, middle, right, result )
+    else:
+        result[:] = np.hstack( (left, middle, right) )
+    return( result )
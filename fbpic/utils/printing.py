@@ -22,7 +22,8 @@ class ProgressBar(object):
     summary of the total runtime.
     """
 
-    def __init__(self, N, n_avg=20, Nbars=35, char=progress_char):
+    def __init__(self, N, n_avg=20, Nbars=35, char=progress_char,
+                 print_interval=0.1):
         """
         Initializes a timer / progression bar.
         Timing is done with respect to the absolute time at initialization.
@@ -41,11 +42,18 @@ class ProgressBar(object):
 
         char: str, optional
             The character used to show the progression.
+
+        print_interval: float, optional
+            The minimal time (in seconds) between two prints of the
+            progression bar. (Printing and flushing stdout at every step
+            delays rank 0, and thus all the ranks which exchange data with it,
+            when the steps are short.)
         """
         self.N = N
         self.n_avg = n_avg
         self.Nbars = Nbars
         self.bar_char = char
+        self.print_interval = print_interval
 
         # Initialize variables to measure the time taken by the simulation
         self.i_step = 0
@@ -55,6 +63,7 @@ class ProgressBar(object):
         self.time_per_step = 0.
         self.avg_time_per_step = 0.
         self.eta = None
+        self.last_print_time = None
 
     def time( self, i_step ):
         """
@@ -93,6 +102,12 @@ class ProgressBar(object):
         remaining simulation time and the time taken by the last step.
         """
         i = self.i_step
+        # Skip this print if the previous one is too recent
+        # (except for the last step, so that the final bar is complete)
+        if (self.last_print_time is not None) and (i < self.N-1) and \
+            (self.prev_time - self.last_print_time < self.print_interval):
+            return
+        self.last_print_time = self.prev_time
         # Print progress bar
         if i == 0:
             # Let the user know that the first step is much longer
@@ -166,6 +181,9 @@ def print_simulation_setup( sim, verbose_level=1 ):
                 message += "\nRunning on CPU "
             if sim.comm.size > 1:
                 message += "with %d MPI processes " %sim.comm.size
+            if sim.comm.n_mode_ranks > 1:
+                message += "(x %d for the azimuthal modes) " \
+                    %sim.comm.n_mode_ranks
             if sim.use_threading and not sim.use_cuda:
                 message += "(%d threads per process) " %sim.cpu_threads
         # Detailed information
@@ -199,7 +217,7 @@ def print_simulation_setup( sim, verbose_level=1 ):
                     message += '\nThreads: %s' %sim.cpu_threads
                 else:
                     message += '\nCPU multi-threading enabled: No'
-                if sim.fld.trans[0].fft.use_mkl:
+                if sim.fld.trans[sim.fld.local_modes[0]].fft.use_mkl:
                     message += '\nFFT library: MKL'
                 else:
                     message += '\nFFT library: pyFFTW'
@@ -236,7 +254,7 @@ def print_simulation_setup( sim, verbose_level=1 ):
         message += '\n'
 
         # Only processor 0 prints the message:
-        if sim.comm.rank == 0:
+        if sim.comm.rank == 0 and sim.comm.mode_rank == 0:
             print( message )
 
 def print_available_gpus():
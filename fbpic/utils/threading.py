@@ -8,6 +8,7 @@ It defines a set of generic functions for multithreaded CPU execution.
 import os, sys
 import warnings
 import numpy as np
+import numba
 from numba import njit
 
 # By default threading is enabled, except on Windows (not supported by Numba)
@@ -28,7 +29,6 @@ if threading_enabled:
         from numba import prange as numba_prange
         # Check that numba is version 0.34 or higher than 0.36
         # (other versions fail)
-        import numba
         numba_minor_version = int(numba.__version__.split('.')[1])
         assert ( numba_minor_version==34 or numba_minor_version >= 36 )
     except (ImportError, AssertionError):
@@ -51,6 +51,49 @@ else:
     prange = numba_prange
     nthreads = numba.config.NUMBA_NUM_THREADS
 
+# Check whether the number of threads can be changed at runtime
+# (`numba.set_num_threads` is only available for numba 0.49 or higher)
+num_threads_settable = threading_enabled and \
+                        hasattr( numba, 'set_num_threads' )
+
+def get_num_threads():
+    """
+    Return the number of threads currently used by numba
+    (i.e. `nthreads`, if this number cannot be changed at runtime)
+    """
+    if num_threads_settable:
+        return( numba.get_num_threads() )
+    else:
+        return( nthreads )
+
+# Check if threadpoolctl is available (used in order to limit the number
+# of threads of BLAS, when several transforms are performed concurrently)
+try:
+    from threadpoolctl import threadpool_limits
+    threadpoolctl_installed = True
+except ImportError:
+    threadpoolctl_installed = False
+
+
+class limit_blas_threads(object):
+    """
+    Context manager that limits the number of threads used by BLAS
+    (e.g. in the matrix products of the Hankel transforms) to `n`.
+    This does nothing if threadpoolctl is not installed.
+    """
+    def __init__( self, n ):
+        self.n = n
+        self.limits = None
+
+    def __enter__( self ):
+        if threadpoolctl_installed:
+            self.limits = threadpool_limits( limits=self.n, user_api='blas' )
+        return( self )
+
+    def __exit__( self, *args ):
+        if self.limits is not None:
+            self.limits.restore_original_limits()
+
 
 def get_chunk_indices( Ntot, nthreads ):
     """
@@ -0,0 +1,15 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This file is part of the Fourier-Bessel Particle-In-Cell code (FB-PIC)
+It defines the clock that is used to time the different parts of the code
+(profiling of the communications, autotuning, calibration of the cost model).
+"""
+try:
+    from time import perf_counter
+except ImportError:
+    # Python 2
+    from time import time as perf_counter
+
+__all__ = [ 'perf_counter' ]
@@ -0,0 +1,69 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It tests the selection of the particles that crossed the output plane of
+the boosted-frame particle diagnostic, on CPU: the particles returned when
+using the particles sorted by longitudinal cell are compared with those
+obtained by scanning all the particles of the species.
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_boosted_particle_slicing.py
+"""
+import numpy as np
+from scipy.constants import c
+from fbpic.main import Simulation
+from fbpic.openpmd_diag.boosted_particle_diag import ParticleCatcher
+
+# Parameters
+Nz = 100
+zmin = -20.e-6
+zmax = 20.e-6
+Nr = 20
+rmax = 20.e-6
+gamma_boost = 10.
+
+def test_boosted_particle_slicing():
+    "Check that the particles of the slices are the same as with a full scan"
+    sim = Simulation( Nz, zmax, Nr, rmax, 1, (zmax-zmin)/Nz/c, zmin=zmin,
+                      n_e=1.e24, p_nz=2, p_nr=2, p_nt=4, use_cuda=False,
+                      verbose_level=0 )
+    species = sim.ptcl[0]
+    # Give random longitudinal momenta to the particles (backward and
+    # forward), and track them
+    np.random.seed(0)
+    species.uz[:] = 10.*np.random.randn( species.Ntot )
+    species.inv_gamma[:] = 1./np.sqrt( 1 + species.uz**2 )
+    species.track( sim.comm )
+
+    beta_boost = np.sqrt( 1. - 1./gamma_boost**2 )
+    catcher = ParticleCatcher( gamma_boost, beta_boost, sim.fld )
+    full_data = { 'x': species.x, 'y': species.y, 'z': species.z,
+        'ux': species.ux, 'uy' : species.uy, 'uz': species.uz,
+        'w': species.w, 'inv_gamma': species.inv_gamma,
+        'id': species.tracker.id }
+    N_slices = 0
+    # Planes that move backward in the boosted frame (including
+    # planes close to or outside of the edges of the box)
+    for current_z_boost in np.linspace( 1.1*zmin, 1.1*zmax, 23 ):
+        previous_z_boost = current_z_boost + c*sim.dt/beta_boost
+        ref = catcher.get_particle_slice( full_data,
+                                current_z_boost, previous_z_boost )
+        data = catcher.get_particle_data( species,
+                                current_z_boost, previous_z_boost, 0. )
+        result = catcher.get_particle_slice( data,
+                                current_z_boost, previous_z_boost )
+        assert len( result['id'] ) == len( ref['id'] )
+        N_slices += len( ref['id'] )
+        for quantity in ref.keys():
+            assert np.array_equal( result[quantity], ref[quantity] )
+    assert N_slices > 0
+    # Only a small fraction of the particles is considered for each slice
+    assert len( data['z'] ) < 0.2*species.Ntot
+
+if __name__ == '__main__':
+    test_boosted_particle_slicing()
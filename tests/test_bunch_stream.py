@@ -0,0 +1,102 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It tests the chunked loading of an electron bunch from a binary file
+(`add_elec_bunch_stream`), in a boosted-frame simulation: the particles
+are written to an HDF5 file and to a NumPy file, loaded by small chunks,
+and compared with the particles loaded with `add_elec_bunch_from_arrays`.
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_bunch_stream.py
+"""
+import os
+import shutil
+import h5py
+import numpy as np
+from scipy.constants import c, e
+from fbpic.main import Simulation
+from fbpic.lpa_utils.bunch import add_elec_bunch_from_arrays, \
+    add_elec_bunch_stream
+from fbpic.lpa_utils.boosted_frame import BoostConverter
+
+# Parameters
+Nz = 64
+zmin = -20.e-6
+zmax = 20.e-6
+Nr = 32
+rmax = 20.e-6
+Nm = 1
+gamma_boost = 5.
+N_part = 10000
+chunk_size = 777
+Q_tot = 10.e-12
+temp_dir = 'tmp_bunch_stream'
+
+def get_bunch():
+    "Return the phase space of a Gaussian bunch, in the lab frame"
+    np.random.seed(0)
+    x = 2.e-6 * np.random.randn( N_part )
+    y = 2.e-6 * np.random.randn( N_part )
+    # Some of the particles are outside of the box, in the boosted frame
+    z = 10.e-6 * np.random.randn( N_part )
+    ux = 0.1 * np.random.randn( N_part )
+    uy = 0.1 * np.random.randn( N_part )
+    uz = 100. + np.random.randn( N_part )
+    w = Q_tot/(N_part*e) * np.ones( N_part )
+    return( x, y, z, ux, uy, uz, w )
+
+def create_simulation():
+    "Return a boosted-frame simulation without plasma"
+    return( Simulation( Nz, zmax, Nr, rmax, Nm, (zmax-zmin)/Nz/c, zmin=zmin,
+                    gamma_boost=gamma_boost, boundaries='open',
+                    use_cuda=False, verbose_level=0 ) )
+
+def compare_bunches( sim_ref, sim ):
+    "Check that the bunch (last species) and fields of two simulations agree"
+    ref = sim_ref.ptcl[-1]
+    species = sim.ptcl[-1]
+    assert 0 < species.Ntot < N_part
+    assert species.Ntot == ref.Ntot
+    for quantity in [ 'x', 'y', 'z', 'ux', 'uy', 'uz', 'inv_gamma', 'w' ]:
+        assert np.allclose( getattr( species, quantity ),
+                            getattr( ref, quantity ), rtol=1.e-12 )
+    Er_ref = sim_ref.fld.interp[0].Er
+    assert np.allclose( sim.fld.interp[0].Er, Er_ref,
+                        rtol=1.e-10, atol=1.e-10*abs(Er_ref).max() )
+
+def test_bunch_stream():
+    "Load a bunch from HDF5 and NumPy files, by chunks"
+    x, y, z, ux, uy, uz, w = get_bunch()
+    boost = BoostConverter( gamma_boost )
+    sim_ref = create_simulation()
+    add_elec_bunch_from_arrays( sim_ref, x, y, z, ux, uy, uz, w, boost=boost )
+
+    # Write the files
+    os.makedirs( temp_dir, exist_ok=True )
+    h5_file = os.path.join( temp_dir, 'bunch.h5' )
+    with h5py.File( h5_file, 'w' ) as f:
+        for quantity, array in zip( ['x', 'y', 'z', 'ux', 'uy', 'uz', 'w'],
+                                    [x, y, z, ux, uy, uz, w] ):
+            f['beam/' + quantity] = array
+    npy_file = os.path.join( temp_dir, 'bunch.npy' )
+    np.save( npy_file, np.stack( [x, y, z, ux, uy, uz], axis=1 ) )
+
+    # Load the HDF5 file (with weights) and the NumPy file (without weights)
+    sim = create_simulation()
+    add_elec_bunch_stream( sim, h5_file, group='beam',
+                           chunk_size=chunk_size, boost=boost )
+    compare_bunches( sim_ref, sim )
+    sim = create_simulation()
+    add_elec_bunch_stream( sim, npy_file, Q_tot=Q_tot,
+                           chunk_size=chunk_size, boost=boost )
+    compare_bunches( sim_ref, sim )
+
+    shutil.rmtree( temp_dir )
+
+if __name__ == '__main__':
+    test_bunch_stream()
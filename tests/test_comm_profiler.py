@@ -0,0 +1,76 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It tests the profiler of the MPI communications (`CommProfiler`):
+records of several ranks are aggregated into a report, and it is checked
+that this report identifies stragglers, latency-bound and bandwidth-bound
+communications. It is also checked that the profiler can be enabled in a
+(single-proc) simulation.
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_comm_profiler.py
+"""
+import numpy as np
+from scipy.constants import c
+from fbpic.main import Simulation
+from fbpic.boundaries.comm_profiler import CommProfiler, \
+    aggregate_records, diagnose, format_report
+
+def make_records( wait_times, n_bytes ):
+    "Return the records of several ranks, which exchange the field E"
+    records_per_rank = []
+    for wait in wait_times:
+        profiler = CommProfiler( None, 0, 1 )
+        for neighbour in ['left', 'right']:
+            profiler.record_exchange( 'fields E:replace', neighbour,
+                np.zeros(n_bytes//16), np.zeros(n_bytes//16), wait/2 )
+        profiler.record( 'fields E:replace', 'local', pack=1.e-3 )
+        records_per_rank += profiler.gather_records()
+    return( records_per_rank )
+
+def test_report():
+    "Check the aggregation and the diagnosis of synthetic records"
+    # Balanced ranks, small messages
+    records = make_records( [1., 1.1, 0.9, 1.], 1024 )
+    combined, totals = aggregate_records( records )
+    assert len( combined ) == 3
+    assert np.all( totals[:,0] == 4 )
+    assert np.all( totals[:,1] == 2*1024 )
+    assert diagnose( totals ).startswith( 'latency-bound' )
+    # Balanced ranks, large messages
+    records = make_records( [1., 1.1, 0.9, 1.], 2**22 )
+    assert diagnose( aggregate_records(records)[1] ).startswith(
+        'bandwidth-bound' )
+    # One rank is slow: the others wait for it
+    records = make_records( [1., 0.1, 1., 1.], 2**22 )
+    diagnosis = diagnose( aggregate_records(records)[1] )
+    assert diagnosis.startswith( 'waiting on stragglers' )
+    assert 'rank 1 ' in diagnosis
+    # The report contains one line per operation and per rank
+    report = format_report( records )
+    assert 'fields E:replace' in report
+    assert len( report.split('\n') ) == 2 + 4 + 6 + 2
+
+def test_simulation_profiler():
+    "Check that the profiler can be enabled in a simulation"
+    sim = Simulation( 100, 20.e-6, 20, 20.e-6, 2, 0.4e-6/c, zmin=-20.e-6,
+        n_e=1.e24, p_nz=1, p_nr=1, p_nt=2, boundaries='open',
+        use_cuda=False, verbose_level=0 )
+    profiler = sim.comm.enable_profiler()
+    assert sim.comm.enable_profiler() is profiler
+    sim.step( 5, show_progress=False )
+    # The removal of the particles at the open boundaries is recorded
+    assert ('particles', 'local') in profiler.records
+    if sim.comm.size == 1:
+        # No exchange between ranks
+        assert list( profiler.records.keys() ) == [('particles', 'local')]
+        assert 'no MPI communication' in profiler.get_report()
+
+if __name__ == '__main__':
+    test_report()
+    test_simulation_profiler()
@@ -0,0 +1,94 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It tests the placement of the CPU threads and of the data
+(`fbpic.utils.placement`):
+- the cores that are selected for each MPI rank of a node are checked for
+  a few NUMA topologies (each rank should be within a single NUMA node,
+  and the ranks should not share cores when there are enough cores)
+- the arrays that are allocated with the first-touch functions are
+  checked against the corresponding numpy functions
+- the placement is applied on the current machine
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_cpu_placement.py
+"""
+import os
+import numba
+import numpy as np
+from fbpic.utils.placement import parse_cpulist, get_rank_cores, \
+    set_cpu_placement, first_touch_zeros, first_touch_copy, \
+    first_touch_concatenate
+
+# Parameters
+# Two sockets of 8 cores each, with hyperthreads numbered after the cores
+numa_nodes = [ parse_cpulist('0-7,16-23'), parse_cpulist('8-15,24-31') ]
+
+def test_parse_cpulist():
+    "Check the parsing of the Linux format of the lists of cpus"
+    assert parse_cpulist('0-3,8,10-11\n') == [0, 1, 2, 3, 8, 10, 11]
+    assert parse_cpulist('5') == [5]
+    assert parse_cpulist('') == []
+
+def test_rank_cores():
+    "Check the selection of the cores of each rank, for 2 NUMA nodes"
+    all_cores = sorted( sum( numa_nodes, [] ) )
+    # Fewer ranks than NUMA nodes: whole nodes
+    assert get_rank_cores( 0, 1, numa_nodes ) == all_cores
+    # As many ranks as NUMA nodes, or more: each rank is within one node,
+    # and the ranks of a node share its cores without overlap
+    for n_ranks in [ 2, 4, 8 ]:
+        cores_per_rank = [ get_rank_cores( rank, n_ranks, numa_nodes )
+                           for rank in range(n_ranks) ]
+        for cores in cores_per_rank:
+            assert len(cores) == 32 // n_ranks
+            assert any( set(cores) <= set(node) for node in numa_nodes )
+        assert sorted( sum( cores_per_rank, [] ) ) == all_cores
+    # More ranks than cores: the cores of a node are shared
+    cores = get_rank_cores( 0, 64, [ [0, 1], [2, 3] ] )
+    assert cores == [0, 1]
+
+def test_first_touch():
+    "Check the first-touch allocations against numpy"
+    zeros = first_touch_zeros( (4, 2, 13, 7), np.complex128 )
+    assert zeros.dtype == np.complex128
+    assert zeros.shape == (4, 2, 13, 7)
+    assert np.all( zeros == 0 )
+    assert np.all( first_touch_zeros( 1000 ) == 0 )
+
+    x = np.random.rand( 1001 )
+    copy = first_touch_copy( x )
+    assert copy is not x
+    assert np.array_equal( copy, x )
+
+    ids = np.arange( 20, dtype=np.uint64 )
+    for left, right in [ (ids[:3], ids[15:]), (ids[:0], ids[15:]),
+                         (ids[:3], ids[:0]), (ids[:0], ids[:0]) ]:
+        result = first_touch_concatenate( left, ids[3:15], right )
+        assert result.dtype == np.uint64
+        assert np.array_equal( result, np.hstack( (left, ids[3:15], right) ) )
+
+def test_placement():
+    "Apply the placement on the current machine"
+    n_threads = numba.get_num_threads()
+    affinity = os.sched_getaffinity(0)
+    try:
+        cores = set_cpu_placement( pin_threads=True )
+        assert set(cores) <= affinity
+        assert numba.get_num_threads() == \
+            min( len(cores), numba.config.NUMBA_NUM_THREADS )
+    finally:
+        # Restore the initial settings
+        os.sched_setaffinity( 0, affinity )
+        numba.set_num_threads( n_threads )
+
+if __name__ == '__main__':
+    test_parse_cpulist()
+    test_rank_cores()
+    test_first_touch()
+    test_placement()
@@ -13,7 +13,8 @@ $ python tests/test_external_fields.py
 import numpy as np
 from scipy.constants import e, m_e, c
 from fbpic.main import Simulation
-from fbpic.lpa_utils.external_fields import ExternalField
+from fbpic.lpa_utils.external_fields import ExternalField, \
+    TabulatedExternalField
 import math
 
 # Parameters
@@ -121,6 +122,72 @@ def test_external_laser_field(show=False):
         assert np.allclose( ux, ux_analytical, atol=5.e-2 )
         assert np.allclose( uz, uz_analytical, atol=5.e-2 )
 
+def test_tabulated_external_field():
+    """
+    Function that is run by py.test, when doing `python setup.py test`
+    Check that tabulated fields (1D, 2D cylindrical and 3D) are correctly
+    interpolated on the particles, and only inside their support.
+    """
+    # Initialize the simulation (only used to create the particles)
+    sim = Simulation( Nz, zmax, Nr, rmax, Nm, dt,
+        p_zmin, p_zmax, 0, rmax, 2, 2, 4, 1.e18,
+        initialize_ions=False, zmin=zmin,
+        use_cuda=use_cuda, boundaries='periodic' )
+    ptcl = sim.ptcl[0]
+    if use_cuda:
+        ptcl.receive_particles_from_gpu()
+    # Support of the fields: only part of the box in z and r
+    zmin_f = 0.2*zmax
+    zmax_f = 0.6*zmax
+    rmax_f = 0.5*rmax
+    # Linear fields, which are exactly reproduced by linear interpolation
+    z_f = np.linspace( zmin_f, zmax_f, 11 )
+    r_f = np.linspace( 0, rmax_f, 21 )
+    x_f = np.linspace( -rmax_f, rmax_f, 41 )
+    x3d, y3d, z3d = np.meshgrid( x_f, x_f, z_f, indexing='ij' )
+    r2d = r_f[np.newaxis,:] * np.ones( (len(z_f), 1) )
+    tabulated_fields = [
+        TabulatedExternalField( {'Ez': 1.e9*z_f/zmax, 'By': 2.*np.ones(11)},
+                                zmin_f, zmax_f ),
+        TabulatedExternalField( {'Bt': 100.*r2d, 'Er': 3.e8*r2d/rmax},
+                                zmin_f, zmax_f, rmax=rmax_f ),
+        TabulatedExternalField( {'Ex': 1.e9*x3d/rmax, 'Bz': 5.*y3d/rmax},
+                zmin_f, zmax_f, xmin=-rmax_f, xmax=rmax_f,
+                ymin=-rmax_f, ymax=rmax_f ) ]
+
+    x, y, z = ptcl.x, ptcl.y, ptcl.z
+    r = np.sqrt( x**2 + y**2 )
+    in_z = (z >= zmin_f) & (z <= zmax_f)
+    assert np.any( in_z & (r <= rmax_f) ) and np.any( ~in_z )
+    for i_field, ext_field in enumerate( tabulated_fields ):
+        for fieldtype in ['Ex', 'Ey', 'Ez', 'Bx', 'By', 'Bz']:
+            getattr( ptcl, fieldtype )[:] = 1.
+        # Check that the fields are not applied outside the time window
+        ext_field.t_end = 0.
+        ext_field.apply_expression( [ptcl], 1.e-15 )
+        for fieldtype in ['Ex', 'Ey', 'Ez', 'Bx', 'By', 'Bz']:
+            assert np.all( getattr( ptcl, fieldtype ) == 1. )
+        # Apply the fields, and compare with the analytical expression
+        ext_field.t_end = np.inf
+        ext_field.apply_expression( [ptcl], 1.e-15 )
+        if i_field == 0:
+            expected = { 'Ez': np.where( in_z, 1.e9*z/zmax, 0 ),
+                         'By': np.where( in_z, 2., 0 ) }
+        elif i_field == 1:
+            inside = in_z & (r <= rmax_f)
+            expected = { 'Bx': np.where( inside, -100.*y, 0 ),
+                         'By': np.where( inside, 100.*x, 0 ),
+                         'Ex': np.where( inside, 3.e8*x/rmax, 0 ),
+                         'Ey': np.where( inside, 3.e8*y/rmax, 0 ) }
+        else:
+            inside = in_z & (abs(x) <= rmax_f) & (abs(y) <= rmax_f)
+            expected = { 'Ex': np.where( inside, 1.e9*x/rmax, 0 ),
+                         'Bz': np.where( inside, 5.*y/rmax, 0 ) }
+        for fieldtype in ['Ex', 'Ey', 'Ez', 'Bx', 'By', 'Bz']:
+            F_expected = 1. + expected.get( fieldtype, 0. )
+            assert np.allclose( getattr( ptcl, fieldtype ), F_expected,
+                                rtol=1.e-10 )
+
 def laser_func( F, x, y, z, t, amplitude, length_scale ):
     """
     Function to be called at each timestep on the particles 
@@ -130,3 +197,4 @@ def laser_func( F, x, y, z, t, amplitude, length_scale ):
 if __name__ == '__main__' :
 
     test_external_laser_field( show )
+    test_tabulated_external_field()
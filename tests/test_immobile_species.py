@@ -0,0 +1,85 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It tests the immobile species (argument `immobile_ions` of the
+`Simulation`), with a laser, a plasma and a moving window:
+- the ions should not move, and their charge should be cached
+- the fields are compared with those of a simulation where the ions
+  are regular species, with a very large mass (i.e. the ions are
+  gathered, pushed and deposited at every iteration, but do not move)
+- the immobile species cannot be given a momentum
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_immobile_species.py
+"""
+import numpy as np
+import pytest
+from scipy.constants import c
+from fbpic.main import Simulation
+from fbpic.particles import Particles
+from fbpic.lpa_utils.laser import add_laser
+
+# Parameters
+Nz = 128
+zmin = -10.e-6
+zmax = 10.e-6
+Nr = 32
+rmax = 20.e-6
+Nm = 2
+dt = (zmax-zmin)/Nz/c
+N_steps = 60
+exchange_period = 8
+
+def run_simulation( immobile_ions ):
+    """
+    Run a laser-plasma simulation with a moving window, with immobile ions
+    or with very heavy ions, and return the simulation object
+    """
+    np.random.seed(0)
+    sim = Simulation( Nz, zmax, Nr, rmax, Nm, dt, zmin=zmin,
+                      n_e=1.e24, p_zmin=0., p_nz=2, p_nr=2, p_nt=4,
+                      initialize_ions=True, immobile_ions=immobile_ions,
+                      exchange_period=exchange_period, boundaries='open',
+                      use_cuda=False, verbose_level=0 )
+    if not immobile_ions:
+        sim.ptcl[1].m = 1.e30
+    sim.set_moving_window( v=c )
+    add_laser( sim, 1., 5.e-6, 3.e-6, -3.e-6 )
+    sim.step( N_steps, use_true_rho=True, show_progress=False )
+    return( sim )
+
+def test_immobile_ions():
+    "Check that immobile ions give the same fields as very heavy ions"
+    sim_immobile = run_simulation( immobile_ions=True )
+    sim_heavy = run_simulation( immobile_ions=False )
+
+    # The immobile ions are at rest, and their charge is cached
+    ions = sim_immobile.ptcl[1]
+    assert ions.immobile
+    assert np.all( ions.uz == 0 ) and np.all( ions.ux == 0 )
+    assert sim_immobile.fld.immobile_rho is not None
+
+    # The two simulations have the same ions, and the same fields
+    assert ions.Ntot == sim_heavy.ptcl[1].Ntot
+    assert np.allclose( ions.z, sim_heavy.ptcl[1].z )
+    for m in range(Nm):
+        for field in [ 'Er', 'Ez', 'Bt', 'Jz', 'rho' ]:
+            ref = getattr( sim_heavy.fld.interp[m], field )
+            assert np.allclose( getattr( sim_immobile.fld.interp[m], field ),
+                ref, rtol=1.e-9, atol=1.e-9*abs(ref).max() )
+
+def test_immobile_momentum():
+    "Check that an immobile species cannot be given a momentum"
+    with pytest.raises( ValueError ):
+        Particles( q=1., m=1., n=1., Npz=4, zmin=0., zmax=1.,
+                   Npr=4, rmin=0., rmax=1., Nptheta=4, dt=1.,
+                   uz_m=1., immobile=True )
+
+if __name__ == '__main__':
+    test_immobile_ions()
+    test_immobile_momentum()
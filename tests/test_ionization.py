@@ -23,6 +23,7 @@ through external fields.
 # Imports
 # -------
 import shutil, math
+import numba
 import numpy as np
 from scipy.constants import c, m_e, m_p, e
 # Import the relevant structures in FBPIC
@@ -182,6 +183,76 @@ def run_simulation( gamma_boost ):
         # Remove openPMD files
         shutil.rmtree('./tests/lab_diags/')
 
+def run_ionization_steps( element, random_seed, E, N_step,
+                          n_threads=None, rank=0 ):
+    """
+    Ionize atoms of `element` in a uniform, static electric field `E` during
+    `N_step` calls to the ionizer (with `n_threads` threads, and the random
+    numbers of the MPI rank `rank`), and return the final ionization levels,
+    the number of created electrons and the number of active batches
+    """
+    initial_n_threads = numba.get_num_threads()
+    if n_threads is not None:
+        numba.set_num_threads( n_threads )
+    sim = Simulation( 16, 10.e-6, 8, 10.e-6, 2, 1.e-16, zmin=0.,
+                      initialize_ions=False, use_cuda=use_cuda )
+    elec = sim.ptcl[0]
+    atoms = sim.add_new_species( q=0, m=14.*m_p, n=1.e24,
+                        p_nz=2, p_nr=2, p_nt=4 )
+    atoms.make_ionizable( element=element, level_start=0, target_species=elec,
+                          random_seed=random_seed )
+    atoms.Ex[:] = E
+    for _ in range(N_step):
+        atoms.ionizer.handle_ionization( atoms, rank )
+    numba.set_num_threads( initial_n_threads )
+    return( atoms.ionizer.ionization_level.copy(), elec.Ntot,
+            atoms.ionizer.N_active )
+
+def test_ionization_reproducible():
+    """
+    Check that the counter-based random generator gives reproducible
+    results for a given seed, irrespective of the number of threads,
+    that different MPI ranks draw different random numbers, and that
+    fully-ionized batches are skipped.
+    """
+    # Partial ionization of nitrogen, with statistical fluctuations
+    n_threads = numba.config.NUMBA_NUM_THREADS
+    level1, Ntot1, _ = run_ionization_steps( 'N', 1, 3.e11, 5, n_threads=1 )
+    level2, Ntot2, _ = run_ionization_steps( 'N', 1, 3.e11, 5,
+                                             n_threads=n_threads )
+    level3, _, _ = run_ionization_steps( 'N', 2, 3.e11, 5 )
+    level4, _, _ = run_ionization_steps( 'N', 1, 3.e11, 5, rank=1 )
+    assert level1.min() < level1.max()
+    # Same seed: same result (with any number of threads) ;
+    # different seed or different rank: different result
+    assert np.all( level1 == level2 )
+    assert Ntot1 == Ntot2 == level1.sum()
+    assert np.any( level1 != level3 )
+    assert np.any( level1 != level4 )
+    # Full ionization of hydrogen: no batch remains active
+    level, Ntot, N_active = run_ionization_steps( 'H', 1, 1.e11, 5 )
+    assert np.all( level == 1 )
+    assert Ntot == level.sum()
+    assert N_active == 0
+
+def test_ionization_subcycled():
+    """
+    Check that the ionization probability of a subcycled species is
+    computed over the timestep `subcycle*dt`, since it is only ionized
+    every `subcycle` iterations.
+    """
+    sim = Simulation( 16, 10.e-6, 8, 10.e-6, 2, 1.e-16, zmin=0.,
+                      initialize_ions=False, use_cuda=use_cuda )
+    elec = sim.ptcl[0]
+    prefactors = []
+    for subcycle in [1, 4]:
+        atoms = sim.add_new_species( q=0, m=14.*m_p, n=1.e24,
+                        p_nz=1, p_nr=1, p_nt=4, subcycle=subcycle )
+        atoms.make_ionizable( element='N', level_start=0,
+                              target_species=elec )
+        prefactors.append( atoms.ionizer.adk_prefactor )
+    assert np.allclose( prefactors[1], 4*prefactors[0] )
+
 def test_ionization_labframe():
     run_simulation(1.)
 
@@ -190,5 +261,7 @@ def test_ionization_boostedframe():
 
 # Run the tests
 if __name__ == '__main__':
+    test_ionization_reproducible()
+    test_ionization_subcycled()
     test_ionization_labframe()
     test_ionization_boostedframe()
@@ -29,7 +29,8 @@ import numpy as np
 from scipy.optimize import curve_fit
 from scipy.constants import c, m_e, e
 from fbpic.main import Simulation
-from fbpic.lpa_utils.laser import add_laser
+from fbpic.lpa_utils.laser import add_laser, GaussianLaser, \
+    LaguerreGaussLaser, FlattenedGaussianLaser
 from fbpic.openpmd_diag import FieldDiagnostic
 from fbpic.lpa_utils.boosted_frame import BoostConverter
 
@@ -77,6 +78,36 @@ def test_antenna_boostedframe(show=False, write_files=False):
     """
     run_and_check_laser_antenna(gamma_boost, show, write_files)
 
+def test_separable_profiles():
+    """
+    Function that is run by py.test, when doing `python setup.py test`
+    Check that the separable evaluation of the laser profiles (which is
+    used by the antenna) agrees with the full evaluation `E_field`
+    """
+    # Transverse positions of the points (similar to antenna particles)
+    x = np.linspace( -2*w0, 2*w0, 41 )
+    y = 0.7 * x[::-1]
+    z = z0_antenna
+    # Profiles to be tested (with diffraction, chirp and polarization)
+    profiles = [
+        GaussianLaser( a0, w0, ctau/c, z0, zf=zf+20.e-3,
+                       phi2_chirp=1.e-28, theta_pol=0.3 ),
+        LaguerreGaussLaser( 1, 1, a0, w0, ctau/c, z0, zf=zf+20.e-3,
+                            theta_pol=0.3, theta0=0.2 ),
+        FlattenedGaussianLaser( a0, w0, ctau/c, z0, zf=zf+20.e-3,
+                                theta_pol=0.3 ) ]
+    for profile in profiles:
+        assert profile.is_separable
+        transverse = np.array( profile.transverse_factors( x, y, z ) )
+        for t in np.linspace( -z0/c, (Lprop-z0)/c, 5 ):
+            Ex, Ey = profile.E_field( x, y, z*np.ones_like(x), t )
+            Lx, Ly = profile.longitudinal_factors( z, t )
+            Ex_sep = ( Lx[:,np.newaxis] * transverse ).real.sum( axis=0 )
+            Ey_sep = ( Ly[:,np.newaxis] * transverse ).real.sum( axis=0 )
+            E_max = np.sqrt( Ex**2 + Ey**2 ).max()
+            assert np.allclose( Ex, Ex_sep, atol=1.e-12*E_max )
+            assert np.allclose( Ey, Ey_sep, atol=1.e-12*E_max )
+
 def run_and_check_laser_antenna(gamma_b, show, write_files):
     """
     Generic function, which runs and check the laser antenna for
@@ -222,5 +253,6 @@ def gaussian_laser( z, r, a0, z0_phase, z0_prop, ctau, lambda0 ):
 if __name__ == '__main__' :
 
     # Run the testing functions
+    test_separable_profiles()
     test_antenna_labframe(show, write_files)
     test_antenna_boostedframe(show, write_files)
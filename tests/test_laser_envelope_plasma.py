@@ -0,0 +1,108 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It tests the coupling between the laser envelope model and the particles:
+- The gathering of |a|^2 and of its gradient on the macroparticles is
+  compared with the analytical expression of a Gaussian envelope
+- The ponderomotive push of an electron initially at rest is compared with
+  the averaged equation of motion du/dt = -c/(4 gamma) grad |a|^2
+- The phase of a wide envelope propagating in a uniform plasma is
+  compared with the dispersion relation w^2 = w0^2 + wp^2
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_laser_envelope_plasma.py
+"""
+import numpy as np
+from scipy.constants import c, e, m_e, m_p, epsilon_0
+from fbpic.main import Simulation
+from fbpic.lpa_utils.laser import add_laser_pulse, GaussianLaser
+
+# Parameters
+zmin = -20.e-6
+zmax = 20.e-6
+lambda0 = 0.8e-6
+n_plasma = 1.e25
+
+def get_simulation( Nz, Nr, rmax, Nm, laser, n=None ):
+    """
+    Return a simulation with a laser envelope `laser` and (if `n` is not
+    None) a uniform plasma of electrons and protons of density `n`
+    """
+    dt = (zmax-zmin)/Nz/c
+    sim = Simulation( Nz, zmax, Nr, rmax, Nm, dt, zmin=zmin,
+                      initialize_ions=False, use_cuda=False )
+    elec = None
+    if n is not None:
+        for q, m in [ (-e, m_e), (e, m_p) ]:
+            species = sim.add_new_species( q=q, m=m, n=n,
+                p_nz=2, p_nr=2, p_nt=4, p_zmin=zmin, p_zmax=zmax, p_rmax=rmax )
+            if q < 0:
+                elec = species
+    add_laser_pulse( sim, laser, method='direct_envelope' )
+    return( sim, elec )
+
+def test_envelope_gathering_and_ponderomotive_push():
+    "Check the gathered |a|^2, its gradient, and the ponderomotive push"
+    Nr = 50
+    rmax = 30.e-6
+    laser = GaussianLaser( a0=0.5, waist=8.e-6, tau=10.e-6/c, z0=0.,
+                           lambda0=lambda0, theta_pol=0. )
+    sim, elec = get_simulation( 200, Nr, rmax, 2, laser, n=1.e24 )
+    elec.gather_envelope( sim.fld )
+
+    # Compare with the analytical envelope (away from the upper boundary)
+    r = np.sqrt( elec.x**2 + elec.y**2 )
+    selec = ( r < rmax - 5*rmax/Nr )
+    a2 = abs( laser.a_field( elec.x, elec.y, elec.z, sim.time ) )**2
+    assert np.allclose( elec.a2[selec], a2[selec], atol=1.e-2*a2.max() )
+    h = 1.e-9
+    for grad_a2, dx, dy, dz in [ (elec.grad_a2_x, h, 0, 0),
+            (elec.grad_a2_y, 0, h, 0), (elec.grad_a2_z, 0, 0, h) ]:
+        expected = ( abs(laser.a_field( elec.x+dx, elec.y+dy, elec.z+dz,
+            sim.time ))**2 - abs(laser.a_field( elec.x-dx, elec.y-dy,
+            elec.z-dz, sim.time ))**2 )/(2*h)
+        assert np.allclose( grad_a2[selec], expected[selec],
+                            atol=0.1*abs(expected).max() )
+
+    # Push electrons initially at rest, without E and B field
+    for attr in [ 'ux', 'uy', 'uz', 'Ex', 'Ey', 'Ez', 'Bx', 'By', 'Bz' ]:
+        getattr( elec, attr )[:] = 0.
+    elec.push_p( sim.time, use_envelope=True )
+    inv_gamma = 1./np.sqrt( 1 + 0.5*elec.a2 )
+    pconst = -0.25*c*elec.dt*inv_gamma
+    assert np.allclose( elec.ux, pconst*elec.grad_a2_x, rtol=1.e-10 )
+    assert np.allclose( elec.uy, pconst*elec.grad_a2_y, rtol=1.e-10 )
+    assert np.allclose( elec.uz, pconst*elec.grad_a2_z, rtol=1.e-10 )
+    assert np.allclose( elec.inv_gamma, 1./np.sqrt( 1 + 0.5*elec.a2
+        + elec.ux**2 + elec.uy**2 + elec.uz**2 ), rtol=1.e-10 )
+
+def test_envelope_plasma_dispersion():
+    "Check the phase shift of the envelope, due to a uniform plasma"
+    # Wide and long envelope: its wavevector is approximately k0
+    laser = GaussianLaser( a0=0.01, waist=40.e-6, tau=200.e-6/c, z0=0.,
+                           lambda0=lambda0, theta_pol=0. )
+    N_steps = 50
+    a_center = []
+    for n in [ None, n_plasma ]:
+        sim, _ = get_simulation( 64, 32, 80.e-6, 1, laser, n=n )
+        sim.step( N_steps, show_progress=False )
+        a_center.append( sim.fld.envelope_interp[0].a[ 32, 0 ] )
+    a_vacuum, a_plasma = a_center
+
+    # In the plasma, the envelope acquires the phase -(w - w0) t
+    w0 = 2*np.pi*c/lambda0
+    wp2 = n_plasma*e**2/(m_e*epsilon_0)
+    expected_phase = -( np.sqrt(w0**2 + wp2) - w0 )*N_steps*sim.dt
+    phase = np.angle( a_plasma/a_vacuum )
+    print( 'Phase shift: %f (expected: %f)' %(phase, expected_phase) )
+    assert abs( phase - expected_phase ) < 0.05*abs( expected_phase )
+    assert abs( abs(a_plasma) - abs(a_vacuum) ) < 0.02*abs( a_vacuum )
+
+if __name__ == '__main__':
+    test_envelope_gathering_and_ponderomotive_push()
+    test_envelope_plasma_dispersion()
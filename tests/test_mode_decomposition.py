@@ -0,0 +1,99 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It tests the decomposition of the azimuthal modes among MPI ranks
+(argument `n_mode_ranks` of the `Simulation`):
+- on a single proc, the fields are checked to hold all the modes
+  in spectral space
+- on 2 procs, a laser propagates in a plasma, and the resulting fields are
+  checked to be identical, whether the 2 procs share the modes of the
+  domain or each proc runs the whole simulation on its own.
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_mode_decomposition.py
+or
+$ mpirun -np 2 python tests/test_mode_decomposition.py
+"""
+import os
+import pytest
+import numpy as np
+from scipy.constants import c
+from fbpic.main import Simulation
+from fbpic.fields import Fields
+from fbpic.lpa_utils.laser import add_laser
+from fbpic.utils.mpi import comm, mpi_installed
+
+# Parameters
+Nz = 128
+zmin = -20.e-6
+zmax = 20.e-6
+Nr = 32
+rmax = 20.e-6
+Nm = 3
+dt = (zmax-zmin)/Nz/c
+N_step = 40
+# Plasma and laser
+n_e = 1.e24
+a0 = 1.
+w0 = 8.e-6
+ctau = 5.e-6
+z0 = 0.
+
+def test_local_modes():
+    "Check that all the modes are local without decomposition"
+    fld = Fields( Nz, zmax, Nr, rmax, Nm, dt, zmin=zmin )
+    assert fld.local_modes == list(range(Nm))
+    for m in range(Nm):
+        assert fld.spect[m] is not None
+        assert fld.trans[m] is not None
+
+@pytest.mark.skipif( not mpi_installed,
+                     reason='mpi4py is not installed' )
+def test_mode_decomposition():
+    "Function that is run by py.test: launch the comparison on 2 procs"
+    response = os.system( 'mpirun -np 2 python %s' %os.path.abspath(__file__) )
+    assert response == 0
+
+def run_simulation( n_mode_ranks ):
+    """
+    Run the simulation with the modes distributed among `n_mode_ranks`
+    procs (or on each proc independently, if `n_mode_ranks` is 1),
+    and return the gathered fields (on proc 0)
+    """
+    sim = Simulation( Nz, zmax, Nr, rmax, Nm, dt, zmin=zmin,
+        p_zmin=zmin, p_zmax=zmax, p_rmax=rmax, p_nz=1, p_nr=1, p_nt=4,
+        n_e=n_e, boundaries='periodic', n_mode_ranks=n_mode_ranks,
+        use_all_mpi_ranks=(n_mode_ranks > 1), verbose_level=0 )
+    assert len( sim.fld.local_modes ) == \
+        len( range( sim.comm.mode_rank, Nm, n_mode_ranks ) )
+    add_laser( sim, a0, w0, ctau, z0 )
+    sim.step( N_step, show_progress=False )
+
+    fields = []
+    for m in range(Nm):
+        for fieldtype in [ 'Er', 'Ez', 'Bt', 'Jz', 'rho' ]:
+            fields.append( sim.comm.gather_grid_array(
+                getattr( sim.fld.interp[m], fieldtype ) ) )
+    return( fields )
+
+def compare_decompositions():
+    "Check that the decomposition of the modes gives the same fields"
+    fields_modes = run_simulation( n_mode_ranks=2 )
+    fields_single = run_simulation( n_mode_ranks=1 )
+    if comm.rank == 0:
+        for modes, single in zip( fields_modes, fields_single ):
+            assert np.allclose( modes, single,
+                atol=1.e-12*abs(single).max(), rtol=1.e-12 )
+        print('The decomposition of the modes gives the same fields.')
+
+if __name__ == '__main__':
+    if mpi_installed and comm.size > 1:
+        compare_decompositions()
+    else:
+        test_local_modes()
+        test_mode_decomposition()
@@ -0,0 +1,58 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It tests the concurrent handling of the azimuthal modes on CPU
+(`use_mode_threads=True`): a simulation with a laser and a plasma is run
+with and without this option, and the resulting fields are compared.
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_mode_threads.py
+"""
+import numpy as np
+from scipy.constants import c
+from fbpic.main import Simulation
+from fbpic.lpa_utils.laser import add_laser
+
+# Parameters
+Nz = 128
+zmin = -10.e-6
+zmax = 10.e-6
+Nr = 32
+rmax = 20.e-6
+Nm = 3
+N_steps = 10
+
+def run_simulation( use_mode_threads ):
+    "Run a short laser-plasma simulation and return its fields object"
+    dt = (zmax-zmin)/Nz/c
+    # Use the same random angles for the macroparticles in both runs
+    np.random.seed(0)
+    sim = Simulation( Nz, zmax, Nr, rmax, Nm, dt, zmin=zmin,
+                      n_e=1.e24, p_zmin=0., p_nz=2, p_nr=2, p_nt=8,
+                      use_cuda=False, use_mode_threads=use_mode_threads,
+                      verbose_level=0 )
+    add_laser( sim, 1., 5.e-6, 3.e-6, -3.e-6 )
+    sim.step( N_steps, show_progress=False )
+    return( sim.fld )
+
+def test_mode_threads():
+    "Check that the fields do not depend on `use_mode_threads`"
+    fld_serial = run_simulation( False )
+    fld_threads = run_simulation( True )
+    for m in range(Nm):
+        for field in [ 'Er', 'Et', 'Ez', 'Br', 'Bt', 'Bz', 'Jr', 'rho' ]:
+            ref = getattr( fld_serial.interp[m], field )
+            assert np.allclose( getattr( fld_threads.interp[m], field ),
+                                ref, rtol=1.e-10, atol=1.e-10*abs(ref).max() )
+    # The pool of threads can be shut down (the modes are then serial)
+    fld_threads.close()
+    assert fld_threads.mode_pool is None
+    assert not fld_threads.mode_threads_available()
+
+if __name__ == '__main__':
+    test_mode_threads()
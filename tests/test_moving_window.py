@@ -0,0 +1,55 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It tests that the moving window follows its continuous position, which is
+calculated from the simulation time on each proc (without communication):
+after many steps, the grid must lag behind this position by less than one
+cell, and the particles must have been injected at the right edge.
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_moving_window.py
+"""
+import numpy as np
+from scipy.constants import c
+from fbpic.main import Simulation
+
+# Parameters
+Nz = 100
+zmin = -20.e-6
+zmax = 20.e-6
+Nr = 20
+rmax = 20.e-6
+Nm = 2
+dz = (zmax-zmin)/Nz
+N_step = 237
+
+def check_moving_window( v, dt ):
+    "Run the simulation with a moving window, and check its position"
+    sim = Simulation( Nz, zmax, Nr, rmax, Nm, dt, zmin=zmin, n_e=1.e24,
+        p_nz=1, p_nr=1, p_nt=2, boundaries='open', use_cuda=False,
+        verbose_level=0 )
+    sim.set_moving_window( v=v )
+    sim.step( N_step, show_progress=False )
+
+    # The grid lags behind the continuous position by less than one cell
+    z_window = zmin + v*N_step*dt
+    zmin_grid = sim.fld.interp[0].zmin + sim.comm.n_damp*dz \
+                    + sim.comm.n_guard*dz
+    assert 0 <= z_window - zmin_grid < dz
+    assert np.isclose( sim.comm.moving_win.zmin, z_window )
+    # Particles fill the domain up to its right edge
+    assert sim.ptcl[0].z.max() > zmin_grid + (zmax-zmin) - 2*dz
+
+def test_moving_window():
+    "Check the position of the moving window, for a few velocities"
+    check_moving_window( c, dz/c )
+    check_moving_window( 0.99*c, 0.73*dz/c )
+    check_moving_window( 0.3*c, 0.41*dz/c )
+
+if __name__ == '__main__':
+    test_moving_window()
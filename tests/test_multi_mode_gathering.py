@@ -0,0 +1,113 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It checks the gathering kernels for an arbitrary number of azimuthal modes
+(which gather all the modes in a single sweep over the particles):
+- When the fields of the modes m>1 are zero, the result should be the same
+  as that of the optimized kernels for 2 modes
+- A field in the mode m should be gathered with the azimuthal
+  dependency 2 Re( F exp(-i m theta) )
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_multi_mode_gathering.py
+"""
+import numpy as np
+from scipy.constants import c
+from fbpic.main import Simulation
+
+# Parameters
+Nz = 32
+zmax = 20.e-6
+Nr = 16
+rmax = 20.e-6
+dt = zmax/Nz/c
+
+def get_simulation( Nm, particle_shape ):
+    """
+    Return a simulation with `Nm` modes, with one species of electrons
+    and random fields (with the same values in modes 0 and 1 for any `Nm`)
+    """
+    sim = Simulation( Nz, zmax, Nr, rmax, Nm, dt, zmin=0.,
+                      particle_shape=particle_shape,
+                      initialize_ions=False, use_cuda=False )
+    elec = sim.add_new_species( q=-1.6e-19, m=9.1e-31, n=1.e24,
+                                p_nz=2, p_nr=2, p_nt=8 )
+    np.random.seed(0)
+    for m in range(Nm):
+        for field in ['Er', 'Et', 'Ez', 'Br', 'Bt', 'Bz']:
+            grid = getattr( sim.fld.interp[m], field )
+            if m < 2:
+                grid[:,:] = np.random.normal( size=grid.shape ) \
+                    + 1.j*np.random.normal( size=grid.shape )
+            else:
+                grid[:,:] = 0.
+    return( sim, elec )
+
+def copy_positions( source, target ):
+    """Copy the positions of the macroparticles of `source` to `target`"""
+    assert source.Ntot == target.Ntot
+    for attr in ['x', 'y', 'z']:
+        setattr( target, attr, getattr( source, attr ).copy() )
+
+def check_gathering_against_2_modes( particle_shape ):
+    """
+    Check that the generic gathering for Nm=1 and Nm=3 gives the same
+    result as the optimized gathering for Nm=2, when the modes m>1 are 0
+    """
+    sim2, elec2 = get_simulation( 2, particle_shape )
+    elec2.gather( sim2.fld.interp )
+    sim3, elec3 = get_simulation( 3, particle_shape )
+    copy_positions( elec2, elec3 )
+    elec3.gather( sim3.fld.interp )
+    for field in ['Ex', 'Ey', 'Ez', 'Bx', 'By', 'Bz']:
+        assert np.allclose( getattr(elec2, field), getattr(elec3, field),
+                            rtol=1.e-12, atol=1.e-12 )
+
+    # With 1 mode, only the mode 0 is gathered
+    sim1, elec1 = get_simulation( 1, particle_shape )
+    copy_positions( elec2, elec1 )
+    elec1.gather( sim1.fld.interp )
+    for field in ['Er', 'Et', 'Ez', 'Br', 'Bt', 'Bz']:
+        getattr( sim2.fld.interp[1], field )[:,:] = 0.
+    elec2.gather( sim2.fld.interp )
+    for field in ['Ex', 'Ey', 'Ez', 'Bx', 'By', 'Bz']:
+        assert np.allclose( getattr(elec2, field), getattr(elec1, field),
+                            rtol=1.e-12, atol=1.e-12 )
+
+def check_gathering_of_higher_mode( particle_shape ):
+    """
+    Check the azimuthal dependency of a uniform Ez field in the mode 3
+    """
+    sim, elec = get_simulation( 4, particle_shape )
+    for m in range(4):
+        for field in ['Er', 'Et', 'Ez', 'Br', 'Bt', 'Bz']:
+            getattr( sim.fld.interp[m], field )[:,:] = 0.
+    Ez_3 = 1. + 2.j
+    sim.fld.interp[3].Ez[:,:] = Ez_3
+    # Only keep the particles that are far from the axis and upper boundary
+    r = np.sqrt( elec.x**2 + elec.y**2 )
+    selec = (r > 4*rmax/Nr) & (r < rmax - 4*rmax/Nr)
+    elec.gather( sim.fld.interp )
+    theta = np.arctan2( elec.y, elec.x )
+    Ez_expected = 2*( Ez_3*np.exp(-3.j*theta) ).real
+    assert np.allclose( elec.Ez[selec], Ez_expected[selec] )
+    assert np.allclose( elec.Ex, 0. ) and np.allclose( elec.Bz, 0. )
+
+def test_gathering_multi_mode_linear():
+    "Check the gathering with an arbitrary number of modes (linear)"
+    check_gathering_against_2_modes( 'linear' )
+    check_gathering_of_higher_mode( 'linear' )
+
+def test_gathering_multi_mode_cubic():
+    "Check the gathering with an arbitrary number of modes (cubic)"
+    check_gathering_against_2_modes( 'cubic' )
+    check_gathering_of_higher_mode( 'cubic' )
+
+if __name__ == '__main__':
+    test_gathering_multi_mode_linear()
+    test_gathering_multi_mode_cubic()
@@ -0,0 +1,92 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It tests the removal of the particles that leave the local domain on CPU
+(`remove_particles_cpu`), which partitions the particle arrays in place:
+the sending buffers and the remaining particles are compared with those
+obtained by selecting the particles with boolean masks.
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_particle_removal.py
+"""
+import numpy as np
+from scipy.constants import c
+from fbpic.main import Simulation
+from fbpic.boundaries.particle_buffer_handling import remove_particles_cpu, \
+    ParticleExchangeBuffers
+
+# Parameters
+Nz = 100
+zmin = -20.e-6
+zmax = 20.e-6
+Nr = 20
+rmax = 20.e-6
+Nm = 2
+n_guard = 10
+dt = (zmax-zmin)/Nz/c
+
+def check_removal( sim, buffers, left_proc, right_proc ):
+    "Remove the outside particles, and compare with a boolean selection"
+    elec = sim.ptcl[0]
+    interp = sim.fld.interp[0]
+    # Move the particles randomly, so that some are in the guard cells
+    elec.z[:] = np.random.uniform( interp.zmin, interp.zmax, elec.Ntot )
+    elec.ux[:] = np.random.normal( size=elec.Ntot )
+    # Reference selection
+    zbox_min = interp.zmin + n_guard*interp.dz
+    zbox_max = interp.zmax - n_guard*interp.dz
+    selec_left = ( elec.z < zbox_min )
+    selec_right = ( elec.z > zbox_max )
+    selec_stay = ~selec_left & ~selec_right
+    ref = { name: getattr( elec, name ).copy() for name in ['z', 'ux', 'w'] }
+    ref['id'] = elec.tracker.id.copy()
+
+    float_send_left, float_send_right, uint_send_left, uint_send_right = \
+        remove_particles_cpu( elec, sim.fld, n_guard, left_proc, right_proc,
+                              buffers )
+
+    # The sending buffers contain the leaving particles, in the same order
+    for send_float, send_uint, selec, proc in [
+            (float_send_left, uint_send_left, selec_left, left_proc),
+            (float_send_right, uint_send_right, selec_right, right_proc) ]:
+        if proc is None:
+            assert send_float.shape[1] == 0
+            continue
+        assert send_uint.dtype == np.uint64
+        assert np.array_equal( send_float[2], ref['z'][selec] )
+        assert np.array_equal( send_float[3], ref['ux'][selec] )
+        assert np.array_equal( send_float[7], ref['w'][selec] )
+        assert np.array_equal( send_uint[0], ref['id'][selec] )
+    # The staying particles are the same (up to their order)
+    assert elec.Ntot == selec_stay.sum()
+    order = np.argsort( elec.tracker.id )
+    ref_order = np.argsort( ref['id'][selec_stay] )
+    for name in ['id', 'z', 'ux', 'w']:
+        if name == 'id':
+            array = elec.tracker.id
+        else:
+            array = getattr( elec, name )
+        assert len( array ) == elec.Ntot
+        assert np.array_equal( array[order], ref[name][selec_stay][ref_order] )
+
+def test_particle_removal():
+    "Check the in-place removal, with persistent buffers"
+    sim = Simulation( Nz, zmax, Nr, rmax, Nm, dt, zmin=zmin, n_e=1.e24,
+        p_nz=2, p_nr=2, p_nt=4, boundaries='open', use_cuda=False,
+        verbose_level=0 )
+    sim.ptcl[0].track( sim.comm )
+    buffers = ParticleExchangeBuffers()
+    np.random.seed(0)
+    # Successive removals reuse (and possibly enlarge) the same buffers
+    check_removal( sim, buffers, left_proc=0, right_proc=1 )
+    check_removal( sim, buffers, left_proc=None, right_proc=1 )
+    check_removal( sim, buffers, left_proc=0, right_proc=None )
+    check_removal( sim, None, left_proc=None, right_proc=None )
+
+if __name__ == '__main__':
+    test_particle_removal()
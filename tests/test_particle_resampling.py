@@ -0,0 +1,132 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It tests the resampling (merging and splitting) of macroparticles:
+- The merging should reduce the number of macroparticles, while
+  conserving exactly the total charge, momentum and energy
+- The splitting should conserve the total charge, momentum and energy,
+  and keep the macroparticles at the same longitudinal and radial position
+- The parallel sorting of the macroparticles by key should give the same
+  result as a stable sort of all the macroparticles
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_particle_resampling.py
+"""
+import numpy as np
+from scipy.constants import e, m_e
+from fbpic.main import Simulation
+from fbpic.utils.threading import nthreads, get_chunk_indices
+from fbpic.particles.resampling.numba_methods import \
+    sort_by_slab_numba, sort_slabs_by_key_numba
+
+# Parameters
+Nz = 32
+zmax = 20.e-6
+Nr = 16
+rmax = 20.e-6
+Nm = 2
+dt = zmax/Nz/3.e8
+n = 1.e24
+
+def get_simulation_with_thermal_electrons( u_th=0.01 ):
+    """
+    Return a simulation with a single species of electrons, with a
+    drifting thermal distribution
+    """
+    sim = Simulation( Nz, zmax, Nr, rmax, Nm, dt, zmin=0.,
+                      initialize_ions=False, use_cuda=False )
+    elec = sim.add_new_species( q=-e, m=m_e, n=n,
+                                p_nz=4, p_nr=4, p_nt=8 )
+    np.random.seed(0)
+    elec.ux = u_th*np.random.normal( size=elec.Ntot )
+    elec.uy = u_th*np.random.normal( size=elec.Ntot )
+    elec.uz = 1. + u_th*np.random.normal( size=elec.Ntot )
+    elec.inv_gamma = 1./np.sqrt( 1 + elec.ux**2 + elec.uy**2 + elec.uz**2 )
+    return( sim, elec )
+
+def get_totals( ptcl ):
+    """Return the total weight, momentum, energy and mean radius"""
+    return( np.array([ ptcl.w.sum(), (ptcl.w*ptcl.ux).sum(),
+        (ptcl.w*ptcl.uy).sum(), (ptcl.w*ptcl.uz).sum(),
+        (ptcl.w/ptcl.inv_gamma).sum(),
+        (ptcl.w*np.sqrt(ptcl.x**2+ptcl.y**2)).sum()/ptcl.w.sum() ]) )
+
+def test_merging_conservation():
+    "Check that merging conserves charge, momentum and energy"
+    sim, elec = get_simulation_with_thermal_electrons()
+    Ntot_before = elec.Ntot
+    totals_before = get_totals( elec )
+
+    elec.activate_resampling( period=1, min_group_size=4,
+        momentum_resolution=1., n_direction_bins=(2, 2) )
+    assert elec.resample_particles( sim.fld, 0 )
+
+    totals_after = get_totals( elec )
+    print( 'Number of macroparticles: %d -> %d' %(Ntot_before, elec.Ntot) )
+    assert elec.Ntot < 0.5*Ntot_before
+    assert np.allclose( totals_before, totals_after, rtol=1.e-10 )
+    # Check the consistency of inv_gamma
+    assert np.allclose( elec.inv_gamma,
+        1./np.sqrt( 1 + elec.ux**2 + elec.uy**2 + elec.uz**2 ), rtol=1.e-10 )
+    # All field arrays should be consistent with the number of particles
+    for attr in ['x', 'y', 'z', 'ux', 'uy', 'uz', 'inv_gamma', 'w',
+                'Ex', 'Ey', 'Ez', 'Bx', 'By', 'Bz']:
+        assert len( getattr(elec, attr) ) == elec.Ntot
+
+def test_splitting():
+    "Check that heavy macroparticles are split, with conservation"
+    sim, elec = get_simulation_with_thermal_electrons()
+    elec.track( sim.comm )
+    w_split = 0.5*elec.w.max()
+    n_heavy = np.sum( elec.w > w_split )
+    Ntot_before = elec.Ntot
+    totals_before = get_totals( elec )
+    z_heavy = elec.z[ elec.w > w_split ]
+
+    elec.activate_resampling( period=10, min_group_size=10**6,
+                              split_weight=w_split )
+    # Resampling is not due at iteration 5
+    assert not elec.resample_particles( sim.fld, 5 )
+    assert elec.resample_particles( sim.fld, 10 )
+
+    assert elec.Ntot == Ntot_before + n_heavy
+    assert np.allclose( totals_before, get_totals( elec ), rtol=1.e-10 )
+    assert len( np.unique( elec.tracker.id ) ) == elec.Ntot
+    # The copies are at the same z as the original macroparticles
+    assert np.all( elec.z[Ntot_before:] == z_heavy )
+
+def test_sorting_by_key():
+    "Check that the parallel sort by key matches a stable global sort"
+    Nz_keys = 20
+    slab_size = 7
+    np.random.seed(0)
+    keys = np.random.randint( Nz_keys*slab_size, size=10000 ).astype(np.int64)
+    chunk_indices = get_chunk_indices( len(keys), nthreads )
+    slab_count = np.empty( (nthreads, Nz_keys), dtype=np.int64 )
+    slab_start = np.empty( Nz_keys+1, dtype=np.int64 )
+    sorted_idx = np.empty( len(keys), dtype=np.int64 )
+    sort_by_slab_numba( keys, slab_size, Nz_keys, chunk_indices,
+                        slab_count, slab_start, sorted_idx )
+    sort_slabs_by_key_numba( keys, slab_start, sorted_idx )
+    assert np.all( sorted_idx == np.argsort( keys, kind='mergesort' ) )
+
+def test_resampling_in_simulation():
+    "Check that a simulation runs with periodic resampling"
+    sim, elec = get_simulation_with_thermal_electrons()
+    elec.activate_resampling( period=3, min_group_size=4,
+        momentum_resolution=1., n_direction_bins=(2, 2) )
+    Ntot_before = elec.Ntot
+    sim.step( 4, show_progress=False )
+    assert elec.Ntot < Ntot_before
+    assert np.all( np.isfinite( sim.fld.interp[0].Ez ) )
+
+if __name__ == '__main__':
+    test_merging_conservation()
+    test_splitting()
+    test_sorting_by_key()
+    test_resampling_in_simulation()
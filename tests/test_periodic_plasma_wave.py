@@ -177,22 +177,40 @@ def test_periodic_plasma_wave_cubic_shape( show=False ):
     "Function that is run by py.test, when doing `python setup.py test"
     simulate_periodic_plasma_wave( 'cubic', show=show )
 
-def simulate_periodic_plasma_wave( particle_shape, show=False ):
-    "Simulate a periodic plasma wave and check its fields"
+def test_periodic_plasma_wave_subcycled_ions( show=False ):
+    "Function that is run by py.test, when doing `python setup.py test"
+    simulate_periodic_plasma_wave( 'linear', show=show, ion_subcycle=4 )
+
+def simulate_periodic_plasma_wave( particle_shape, show=False,
+                                    ion_subcycle=None ):
+    """
+    Simulate a periodic plasma wave and check its fields
 
+    If `ion_subcycle` is not None, (heavy) ions are explicitly
+    added to the simulation, with the corresponding subcycling factor.
+    """
     # Initialization of the simulation object
     sim = Simulation( Nz, zmax, Nr, rmax, Nm, dt,
                   p_zmin, p_zmax, p_rmin, p_rmax, p_nz, p_nr,
                   p_nt, n_e, n_order=n_order, use_cuda=use_cuda,
                   particle_shape=particle_shape )
+    if ion_subcycle is not None:
+        sim.add_new_species( q=e, m=1.e6*m_e, n=n_e, p_nz=p_nz, p_nr=p_nr,
+            p_nt=p_nt, p_zmin=p_zmin, p_zmax=p_zmax, p_rmin=p_rmin,
+            p_rmax=p_rmax, subcycle=ion_subcycle )
 
     # Save the initial density in spectral space, and consider it
     # to be the density of the (uninitialized) ions
+    # (If the ions are explicitly present, their density is already
+    # included in the deposited charge)
     sim.deposit('rho_prev', exchange=True)
     sim.fld.spect2interp('rho_prev')
     rho_ions = [ ]
     for m in range(len(sim.fld.interp)):
-        rho_ions.append( -sim.fld.interp[m].rho.copy() )
+        if ion_subcycle is None:
+            rho_ions.append( -sim.fld.interp[m].rho.copy() )
+        else:
+            rho_ions.append( np.zeros_like( sim.fld.interp[m].rho ) )
 
     # Impart velocities to the electrons
     # (The electrons are initially homogeneous, but have an
@@ -460,3 +478,4 @@ if __name__ == '__main__' :
     # Run the simulation and show the results to the user
     test_periodic_plasma_wave_linear_shape(show=show)
     test_periodic_plasma_wave_cubic_shape(show=show)
+    test_periodic_plasma_wave_subcycled_ions(show=show)
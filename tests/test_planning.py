@@ -0,0 +1,99 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It tests the resource planner (`fbpic.planning.plan`): the predicted
+memory of each subsystem and the predicted number of macroparticles are
+compared with those of actual simulations, and the planner is checked to
+detect invalid domain decompositions.
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_planning.py
+"""
+import numpy as np
+from scipy.constants import c
+from fbpic.main import Simulation
+from fbpic.planning import plan
+from fbpic.utils.threading import nthreads
+
+# Parameters
+Nz = 100
+zmin = -20.e-6
+zmax = 20.e-6
+Nr = 30
+rmax = 20.e-6
+Nm = 2
+dt = (zmax-zmin)/Nz/c
+
+def get_nbytes( objects ):
+    "Return the total size of the arrays that are attributes of `objects`"
+    return( sum( value.nbytes for obj in objects
+        for value in vars(obj).values() if isinstance(value, np.ndarray) ) )
+
+def check_plan( **kw ):
+    "Compare the planned memory with that of an actual simulation"
+    sim = Simulation( Nz, zmax, Nr, rmax, Nm, dt, zmin=zmin,
+                      use_cuda=False, verbose_level=0, **kw )
+    elec = sim.add_new_species( q=-1., m=1., n=1.e24, p_nz=1, p_nr=1, p_nt=2,
+                                p_zmin=0., p_rmax=10.e-6 )
+    elec.track( sim.comm )
+    resources = plan( Nz, zmax, Nr, rmax, Nm, dt, zmin=zmin, verbose=False,
+            species=[ dict( n=1.e24, p_nz=1, p_nr=1, p_nt=2, p_zmin=0.,
+                            p_rmax=10.e-6, tracked=True ) ], **kw )
+    memory = resources.memory[0]
+    fld = sim.fld
+    assert resources.Nz_local[0] == fld.Nz
+    assert resources.N_particles[0] == sum( sp.Ntot for sp in sim.ptcl )
+    assert memory['Interpolation grids'] == get_nbytes( fld.interp )
+    assert memory['Spectral grids'] == get_nbytes( fld.spect )
+    assert memory['PSATD coefficients'] == get_nbytes( fld.psatd )
+    assert memory['Deposition buffers'] == get_nbytes( [fld] )
+    assert memory['Particles'] == get_nbytes( sim.ptcl ) \
+        + get_nbytes([ sp.tracker for sp in sim.ptcl if sp.tracker ])
+    # For the transformers, the buffers of the FFT plans are not attributes
+    trans_nbytes = get_nbytes( fld.trans ) + get_nbytes( [ dht
+        for trans in fld.trans for dht in [trans.dht0, trans.dhtp, trans.dhtm] ])
+    assert trans_nbytes <= memory['Spectral transformers'] \
+        <= 1.2*trans_nbytes
+    assert resources.step_time[0] > 0
+
+def test_plan_single_proc():
+    "Check the predicted memory for a few simulation setups"
+    check_plan()
+    check_plan( n_e=1.e24, p_nz=2, p_nr=2, p_nt=4, p_zmin=-5.e-6,
+                initialize_ions=True, boundaries='open' )
+    check_plan( v_comoving=-0.99*c, use_galilean=False,
+                boundaries='open', n_order=16 )
+    check_plan( current_correction='cross-deposition', gamma_boost=5. )
+
+def test_plan_multi_proc():
+    "Check the decomposition of the domain, and the detection of errors"
+    dt = (zmax-zmin)/1000/c
+    resources = plan( 1000, zmax, Nr, rmax, Nm, dt, zmin=zmin, n_order=16,
+        n_e=1.e24, p_nz=2, p_nr=2, p_nt=4, n_procs=4, boundaries='open',
+        verbose=False )
+    assert resources.errors == []
+    assert sum( resources.N_particles ) == 1000*Nr*2*2*4
+    # The edge ranks have the damping cells, and the last one the remainder
+    assert resources.Nz_local[0] == 250 + 2*resources.n_guard + 64
+    assert resources.Nz_local[1] == 250 + 2*resources.n_guard
+    assert resources.memory[1]['MPI buffers'] > 0
+    assert resources.max_memory == resources.total_memory[0]
+    # Twice more threads: twice more memory for the deposition buffers
+    resources_2 = plan( 1000, zmax, Nr, rmax, Nm, dt, zmin=zmin, n_order=16,
+        n_procs=4, boundaries='open', nthreads=2*nthreads, verbose=False )
+    assert resources_2.memory[1]['Deposition buffers'] == \
+        2*resources.memory[1]['Deposition buffers']
+    # Too many ranks, and infinite-order stencil with several ranks
+    assert len( plan( 1000, zmax, Nr, rmax, Nm, dt, zmin=zmin, n_order=16,
+                      n_procs=40, verbose=False ).errors ) == 1
+    assert len( plan( 1000, zmax, Nr, rmax, Nm, dt, zmin=zmin,
+                      n_procs=8, verbose=False ).errors ) == 2
+
+if __name__ == '__main__':
+    test_plan_single_proc()
+    test_plan_multi_proc()
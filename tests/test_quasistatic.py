@@ -0,0 +1,110 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It tests the quasi-static solver, with a Gaussian electron bunch:
+- Without plasma, the radial field of the bunch is compared with Gauss's
+  law, and the longitudinal field and the force Er - c Btheta are checked
+  to be negligible
+- In a plasma, the on-axis longitudinal field of the linear wake is
+  compared with the analytical expression of linear theory
+- A few quasi-static steps are performed, with a field diagnostic
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_quasistatic.py
+"""
+import shutil
+import numpy as np
+from scipy.constants import c, e, m_e, epsilon_0
+from scipy.integrate import quad
+from scipy.special import k0
+from fbpic.quasistatic import QuasiStaticSimulation
+from fbpic.lpa_utils.bunch import add_elec_bunch_gaussian
+from fbpic.openpmd_diag import FieldDiagnostic
+
+# Parameters
+zmin = -200.e-6
+zmax = 50.e-6
+rmax = 150.e-6
+Nz = 300
+Nr = 64
+dt = 1.e-12
+n_plasma = 1.e23
+# Bunch
+sig_r = 10.e-6
+sig_z = 8.e-6
+Q = 1.e-12
+gamma0 = 1000.
+
+def get_simulation( n_e ):
+    "Return a quasi-static simulation with a Gaussian bunch"
+    sim = QuasiStaticSimulation( Nz, zmax, Nr, rmax, dt, zmin=zmin,
+                                 n_e=n_e, verbose_level=0 )
+    np.random.seed(0)
+    add_elec_bunch_gaussian( sim, sig_r, sig_z, 1.e-6, gamma0, 0.,
+                             Q, 200000, zf=0. )
+    return( sim )
+
+def test_bunch_self_fields():
+    "Check the self-fields of the bunch without plasma, with Gauss's law"
+    sim = get_simulation( None )
+    sim.solve_quasistatic_fields()
+    interp = sim.fld.interp[0]
+    z = interp.z[:,np.newaxis]
+    r = interp.r[np.newaxis,:]
+
+    # Radial field of an infinitely-long Gaussian bunch, with the local
+    # linear charge density
+    Er_th = - Q/( (2*np.pi)**1.5*sig_z*epsilon_0 ) \
+        * np.exp( -z**2/(2*sig_z**2) )*( 1 - np.exp( -r**2/(2*sig_r**2) ) )/r
+    Er = interp.Er.real
+    assert abs( Er - Er_th ).max() < 0.05*abs( Er_th ).max()
+    # The force on the ultra-relativistic bunch vanishes
+    assert abs( Er - c*interp.Bt.real ).max() < 1.e-6*abs( Er_th ).max()
+    assert abs( interp.Ez ).max() < 1.e-3*abs( Er_th ).max()
+
+def test_linear_wake():
+    "Check the on-axis longitudinal field of the linear wake"
+    sim = get_simulation( n_plasma )
+    sim.solve_quasistatic_fields()
+    interp = sim.fld.interp[0]
+
+    # Linear theory: the wake of a Gaussian bunch, on axis
+    kp = np.sqrt( n_plasma*e**2/(m_e*epsilon_0) )/c
+    R0 = kp**2*quad( lambda x: x*k0(kp*x)*np.exp(-x**2/(2*sig_r**2)),
+                     0, 50*sig_r )[0]
+    rho0 = - Q/( (2*np.pi)**1.5*sig_r**2*sig_z )
+    Ez_th = np.array([ - R0/epsilon_0*quad( lambda zp: rho0 \
+        *np.exp(-zp**2/(2*sig_z**2))*np.cos( kp*(zp-z) ), z, zmax )[0]
+        for z in interp.z ])
+    Ez = interp.Ez[:,0].real
+    print( 'Relative error: %f' %(abs(Ez - Ez_th).max()/abs(Ez_th).max()) )
+    assert abs( Ez - Ez_th ).max() < 0.08*abs( Ez_th ).max()
+
+def test_quasistatic_steps():
+    "Check that the box moves with the bunch, and that diagnostics work"
+    sim = get_simulation( n_plasma )
+    sim.diags = [ FieldDiagnostic( 2, sim.fld, comm=sim.comm,
+                                   write_dir='tmp_quasistatic' ) ]
+    zmin0 = sim.fld.interp[0].zmin
+    z_mean0 = np.average( sim.ptcl[0].z, weights=sim.ptcl[0].w )
+    N_steps = 3
+    sim.step( N_steps, show_progress=False )
+
+    # The box and the bunch move at (nearly) the speed of light
+    interp = sim.fld.interp[0]
+    assert np.isclose( interp.zmin, zmin0 + N_steps*c*dt )
+    z_mean = np.average( sim.ptcl[0].z, weights=sim.ptcl[0].w )
+    assert abs( z_mean - z_mean0 - N_steps*c*dt ) < 1.e-3*N_steps*c*dt
+    for field in [ 'Er', 'Ez', 'Bt' ]:
+        assert np.all( np.isfinite( getattr( interp, field ) ) )
+    shutil.rmtree( 'tmp_quasistatic' )
+
+if __name__ == '__main__':
+    test_bunch_self_fields()
+    test_linear_wake()
+    test_quasistatic_steps()
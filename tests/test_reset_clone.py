@@ -0,0 +1,87 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It tests the methods `reset` and `clone` of the `Simulation` object,
+with a laser, a plasma and a moving window:
+- a clone of a simulation is run in parallel with the original simulation,
+  and the resulting fields and particles are compared
+- a simulation is reset and run again, and the result is compared
+  with that of a new simulation
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_reset_clone.py
+"""
+import numpy as np
+from scipy.constants import c
+from fbpic.main import Simulation
+from fbpic.lpa_utils.laser import add_laser
+
+# Parameters
+Nz = 128
+zmin = -10.e-6
+zmax = 10.e-6
+Nr = 32
+rmax = 20.e-6
+Nm = 2
+N_steps = 20
+
+def create_simulation():
+    "Create a laser-plasma simulation with a moving window"
+    dt = (zmax-zmin)/Nz/c
+    np.random.seed(0)
+    sim = Simulation( Nz, zmax, Nr, rmax, Nm, dt, zmin=zmin,
+                      n_e=1.e24, p_zmin=0., p_nz=2, p_nr=2, p_nt=4,
+                      boundaries='open', use_cuda=False, verbose_level=0 )
+    sim.set_moving_window( v=c )
+    add_laser( sim, 1., 5.e-6, 3.e-6, -3.e-6 )
+    return( sim )
+
+def compare_simulations( sim1, sim2, rtol ):
+    "Check that the fields and the particles of two simulations agree"
+    assert sim1.iteration == sim2.iteration
+    assert sim1.fld.interp[0].zmin == sim2.fld.interp[0].zmin
+    for m in range(Nm):
+        for field in [ 'Er', 'Et', 'Ez', 'Br', 'Bt', 'Bz', 'rho' ]:
+            ref = getattr( sim1.fld.interp[m], field )
+            assert np.allclose( getattr( sim2.fld.interp[m], field ),
+                                ref, rtol=rtol, atol=rtol*abs(ref).max() )
+    assert sim1.ptcl[0].Ntot == sim2.ptcl[0].Ntot
+    for coord in [ 'z', 'uz' ]:
+        assert np.allclose( getattr( sim1.ptcl[0], coord ),
+                            getattr( sim2.ptcl[0], coord ), rtol=rtol )
+
+def test_clone():
+    "Check that a clone evolves independently, like the original simulation"
+    sim = create_simulation()
+    sim.step( N_steps, show_progress=False )
+    sim_clone = sim.clone()
+    # The transformers are shared, but not the fields
+    assert sim_clone.fld.trans[0] is sim.fld.trans[0]
+    assert sim_clone.fld.interp[0] is not sim.fld.interp[0]
+    # Run the original simulation first, then the clone
+    sim.step( N_steps, show_progress=False )
+    sim_clone.step( N_steps, show_progress=False )
+    compare_simulations( sim, sim_clone, rtol=1.e-12 )
+
+def test_reset():
+    "Check that a reset simulation reproduces the result of a new simulation"
+    sim_ref = create_simulation()
+    sim_ref.step( N_steps, show_progress=False )
+
+    sim = create_simulation()
+    sim.step( 2*N_steps, show_progress=False )
+    np.random.seed(0)
+    sim.reset()
+    assert sim.time == 0.
+    add_laser( sim, 1., 5.e-6, 3.e-6, -3.e-6 )
+    sim.step( N_steps, show_progress=False )
+    compare_simulations( sim_ref, sim, rtol=1.e-9 )
+
+if __name__ == '__main__':
+    test_clone()
+    test_reset()
@@ -0,0 +1,88 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It tests the exchange of the guard cells through an MPI-3 shared-memory
+window (`fbpic.boundaries.shared_memory`), between two procs of the same
+node: a laser propagates in a plasma, with periodic boundaries (so that
+each proc is the neighbour of the other one on both sides), and the
+resulting fields are checked to be identical to those obtained when
+the guard cells are exchanged through MPI messages.
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_shared_memory.py
+or
+$ mpirun -np 2 python tests/test_shared_memory.py
+"""
+import os
+import pytest
+import numpy as np
+from scipy.constants import c
+from fbpic.main import Simulation
+from fbpic.lpa_utils.laser import add_laser
+from fbpic.utils.mpi import comm, mpi_installed
+from fbpic.boundaries import boundary_communicator
+from fbpic.boundaries.shared_memory import shared_memory_enabled
+
+# Parameters
+Nz = 256
+zmin = -20.e-6
+zmax = 20.e-6
+Nr = 32
+rmax = 20.e-6
+Nm = 2
+dt = (zmax-zmin)/Nz/c
+n_order = 16
+N_step = 40
+# Plasma and laser
+n_e = 1.e24
+a0 = 1.
+w0 = 8.e-6
+ctau = 5.e-6
+z0 = 0.
+
+@pytest.mark.skipif( not shared_memory_enabled,
+                     reason='MPI-3 shared memory is not available' )
+def test_shared_memory_exchange():
+    "Function that is run by py.test: launch the comparison on 2 procs"
+    response = os.system( 'mpirun -np 2 python %s' %os.path.abspath(__file__) )
+    assert response == 0
+
+def run_simulation( use_shared_memory ):
+    """
+    Run the simulation, with or without the shared-memory exchange,
+    and return the gathered fields (on proc 0)
+    """
+    boundary_communicator.shared_memory_enabled = use_shared_memory
+    sim = Simulation( Nz, zmax, Nr, rmax, Nm, dt, zmin=zmin,
+        p_zmin=zmin, p_zmax=zmax, p_rmax=rmax, p_nz=1, p_nr=1, p_nt=4,
+        n_e=n_e, n_order=n_order, boundaries='periodic', verbose_level=0 )
+    assert (sim.comm.shared_memory is not None) == use_shared_memory
+    add_laser( sim, a0, w0, ctau, z0 )
+    sim.step( N_step, show_progress=False )
+
+    fields = []
+    for m in range(Nm):
+        for fieldtype in [ 'Er', 'Ez', 'Bt', 'Jz', 'rho' ]:
+            fields.append( sim.comm.gather_grid_array(
+                getattr( sim.fld.interp[m], fieldtype ) ) )
+    return( fields )
+
+def compare_exchanges():
+    "Check that the two types of exchange give the same fields"
+    fields_shared = run_simulation( use_shared_memory=True )
+    fields_messages = run_simulation( use_shared_memory=False )
+    if comm.rank == 0:
+        for shared, messages in zip( fields_shared, fields_messages ):
+            assert np.array_equal( shared, messages )
+        print('The shared-memory exchange gives the same fields.')
+
+if __name__ == '__main__':
+    if mpi_installed and comm.size > 1:
+        compare_exchanges()
+    else:
+        test_shared_memory_exchange()
@@ -0,0 +1,65 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It tests the calculation of the space charge field of a relativistic bunch
+on the local subdomain (`distributed=True` in `get_space_charge_fields`),
+by comparing it with the calculation on the global grid, in a simulation
+with open boundaries (and thus with guard cells) and a pre-existing laser.
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_space_charge_distributed.py
+"""
+import numpy as np
+from scipy.constants import c
+from fbpic.main import Simulation
+from fbpic.lpa_utils.laser import add_laser
+from fbpic.lpa_utils.bunch import add_elec_bunch_gaussian, \
+    get_space_charge_fields
+
+# Parameters
+Nz = 200
+zmin = -20.e-6
+zmax = 20.e-6
+Nr = 50
+rmax = 20.e-6
+Nm = 2
+gamma0 = 100.
+
+def get_fields( distributed ):
+    "Initialize a laser and a bunch, and return the fields (all modes)"
+    np.random.seed(0)
+    sim = Simulation( Nz, zmax, Nr, rmax, Nm, (zmax-zmin)/Nz/c, zmin=zmin,
+                      boundaries='open', use_cuda=False, verbose_level=0 )
+    add_laser( sim, 0.1, 5.e-6, 3.e-6, 10.e-6 )
+    add_elec_bunch_gaussian( sim, 3.e-6, 3.e-6, 1.e-6, gamma0, 0.,
+                             10.e-12, 20000, 0., -5.e-6 )
+    # Add the space charge field a second time, with the selected method
+    get_space_charge_fields( sim, sim.ptcl[-1], distributed=distributed )
+    # Select the physical domain (and damping cells)
+    Nz_local, iz_start = sim.comm.get_Nz_and_iz(
+        local=True, with_damp=True, with_guard=False, rank=sim.comm.rank )
+    _, iz_start_array = sim.comm.get_Nz_and_iz(
+        local=True, with_damp=True, with_guard=True, rank=sim.comm.rank )
+    iz = iz_start - iz_start_array
+    return( [ np.array([ getattr( sim.fld.interp[m], field )[iz:iz+Nz_local]
+              for m in range(Nm) ]) for field in ['Er', 'Ez', 'Bt'] ] )
+
+def test_space_charge_distributed():
+    "Check that the local and global space charge calculations agree"
+    for field_global, field_local in zip( get_fields(False), get_fields(True) ):
+        # Mode 0: the field of the bunch is local
+        amplitude = abs( field_global[0] ).max()
+        assert np.allclose( field_local[0], field_global[0],
+                            atol=1.e-6*amplitude )
+        # Mode 1: the kr=0 component (uniform transverse field) is not local
+        # and depends on the length of the (periodic) grid
+        assert np.allclose( field_local[1], field_global[1],
+                            atol=1.e-2*amplitude )
+
+if __name__ == '__main__':
+    test_space_charge_distributed()
@@ -0,0 +1,104 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It tests the stepping sessions (`Simulation.stepping`), with a laser,
+a plasma and a moving window:
+- stepping one iteration at a time within a session is compared with
+  a single call to `step`, and the user-defined hooks are checked
+- the fields and the particles are modified within a session, and the
+  result is compared with a simulation that is modified in the same way
+  between two calls to `step`
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_stepping_session.py
+"""
+import numpy as np
+import pytest
+from scipy.constants import c
+from fbpic.main import Simulation
+from fbpic.lpa_utils.laser import add_laser
+
+# Parameters
+Nz = 128
+zmin = -10.e-6
+zmax = 10.e-6
+Nr = 32
+rmax = 20.e-6
+Nm = 2
+N_steps = 12
+
+def create_simulation():
+    "Create a laser-plasma simulation with a moving window"
+    dt = (zmax-zmin)/Nz/c
+    np.random.seed(0)
+    sim = Simulation( Nz, zmax, Nr, rmax, Nm, dt, zmin=zmin,
+                      n_e=1.e24, p_zmin=0., p_nz=2, p_nr=2, p_nt=4,
+                      boundaries='open', use_cuda=False, verbose_level=0 )
+    sim.set_moving_window( v=c )
+    add_laser( sim, 1., 5.e-6, 3.e-6, -3.e-6 )
+    return( sim )
+
+def compare_simulations( sim1, sim2, rtol ):
+    "Check that the fields and the particles of two simulations agree"
+    assert sim1.iteration == sim2.iteration
+    for m in range(Nm):
+        for field in [ 'Er', 'Et', 'Ez', 'Br', 'Bt', 'Bz', 'Jz', 'rho' ]:
+            ref = getattr( sim1.fld.interp[m], field )
+            assert np.allclose( getattr( sim2.fld.interp[m], field ),
+                                ref, rtol=rtol, atol=rtol*abs(ref).max() )
+    assert sim1.ptcl[0].Ntot == sim2.ptcl[0].Ntot
+    for coord in [ 'z', 'uz' ]:
+        assert np.allclose( getattr( sim1.ptcl[0], coord ),
+                            getattr( sim2.ptcl[0], coord ), rtol=rtol )
+
+def test_session_steps():
+    "Check that stepping within a session is equivalent to a single step"
+    sim_ref = create_simulation()
+    sim_ref.step( N_steps, show_progress=False )
+
+    sim = create_simulation()
+    iterations = []
+    with sim.stepping() as session:
+        assert sim.stepping_session is session
+        session.add_hook( lambda s: iterations.append(s.iteration), period=3 )
+        with pytest.raises( RuntimeError ):
+            sim.stepping()
+        with pytest.raises( RuntimeError ):
+            sim.clone()
+        for i in range( N_steps ):
+            session.step( 1, show_progress=False )
+    assert sim.stepping_session is None
+    assert iterations == list( range(3, N_steps+1, 3) )
+    compare_simulations( sim_ref, sim, rtol=1.e-12 )
+    # The simulation can be stepped again after the session
+    sim.step( 2, show_progress=False )
+    with pytest.raises( RuntimeError ):
+        session.step( 1 )
+
+def test_session_updates():
+    "Check the modification of the fields and particles within a session"
+    sim_ref = create_simulation()
+    sim_ref.step( N_steps, show_progress=False )
+    add_laser( sim_ref, 0.5, 5.e-6, 3.e-6, -6.e-6 )
+    sim_ref.ptcl[0].uz[:] += 0.1
+    sim_ref.step( N_steps, show_progress=False )
+
+    sim = create_simulation()
+    with sim.stepping() as session:
+        session.step( N_steps, show_progress=False )
+        # Add a laser and modify the particles
+        add_laser( sim, 0.5, 5.e-6, 3.e-6, -6.e-6 )
+        session.update_fields()
+        sim.ptcl[0].uz[:] += 0.1
+        session.update_particles()
+        session.step( N_steps, show_progress=False )
+    compare_simulations( sim_ref, sim, rtol=1.e-12 )
+
+if __name__ == '__main__':
+    test_session_steps()
+    test_session_updates()
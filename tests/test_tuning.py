@@ -0,0 +1,104 @@
+# Copyright 2018, FBPIC contributors
+# Authors: Remi Lehe, Manuel Kirchen
+# License: 3-Clause-BSD-LBNL
+"""
+This test file is part of FB-PIC (Fourier-Bessel Particle-In-Cell).
+
+It tests the auto-tuner (`fbpic.tuning.autotune`): the trials are run for a
+small simulation with open boundaries on two "ranks", the selected
+configuration is checked to be valid and stored on disk, and it is then
+checked that a second call returns the stored configuration without
+running new trials. It also checks that the runtime settings are restored
+when a trial fails.
+
+Usage :
+-------
+In order to run the tests:
+$ py.test -q tests/test_tuning.py
+"""
+import os
+import json
+import shutil
+from scipy.constants import c
+from fbpic.main import Simulation
+from fbpic.tuning import autotune, TrialRunner, TunedConfiguration
+from fbpic.utils.cuda import cuda_tpb
+from fbpic.utils.threading import get_num_threads
+from fbpic.fields.spectral_transform import fourier
+
+# Parameters
+Nz = 200
+zmin = -20.e-6
+zmax = 20.e-6
+Nr = 32
+rmax = 20.e-6
+Nm = 2
+dt = (zmax-zmin)/Nz/c
+temp_dir = 'tmp_autotune'
+cache_file = os.path.join( temp_dir, 'autotune.json' )
+sim_kw = dict( n_e=1.e24, p_nz=1, p_nr=1, p_nt=2, boundaries='open',
+               zmin=zmin, use_cuda=False )
+
+def test_autotune():
+    "Tune a small simulation, and check that the configuration is stored"
+    shutil.rmtree( temp_dir, ignore_errors=True )
+    n_threads = get_num_threads()
+    config = autotune( Nz, zmax, Nr, rmax, Nm, dt, cache_file=cache_file,
+                       n_order_candidates=[16, 32], cores_per_node=2,
+                       N_steps=1, apply=False, verbose=False, **sim_kw )
+    # The trials did not change the runtime settings (apply=False)
+    assert get_num_threads() == n_threads
+    # The selected configuration is valid
+    assert config.step_time > 0
+    assert config.ranks_per_node in [1, 2]
+    assert config.nthreads*config.ranks_per_node == 2
+    assert config.n_order in [16, 32]
+    assert config.fft_backend in fourier.available_fft_backends
+    runner = TrialRunner( Nz, zmax, Nr, rmax, Nm, dt, zmin, 'open', 1, 2,
+                          1, False, sim_kw )
+    assert config.n_guard >= runner.get_min_guard_cells( config.n_order )
+    assert 1 <= config.exchange_period \
+        <= runner.get_max_exchange_period( config.n_guard )
+    # The configuration can be used to create a simulation
+    sim = Simulation( Nz, zmax, Nr, rmax, Nm, dt, verbose_level=0,
+                      **dict( sim_kw, **config.simulation_kwargs ) )
+    assert sim.comm.n_guard == config.n_guard
+    assert sim.comm.exchange_period == config.exchange_period
+
+    # The configuration was stored, and is returned without new trials
+    with open( cache_file ) as f:
+        assert len( json.load( f ) ) == 1
+    time_step = TrialRunner.time_step
+    TrialRunner.time_step = None
+    try:
+        stored_config = autotune( Nz, zmax, Nr, rmax, Nm, dt,
+                cache_file=cache_file, n_order_candidates=[16, 32],
+                cores_per_node=2, verbose=False, **sim_kw )
+    finally:
+        TrialRunner.time_step = time_step
+    assert stored_config.to_dict() == config.to_dict()
+    assert fourier.fft_backend == config.fft_backend
+
+    shutil.rmtree( temp_dir )
+
+def test_failed_trial():
+    "Check that the settings are restored when a trial simulation fails"
+    cuda_tpb_before = dict( cuda_tpb )
+    fft_backend_before = fourier.fft_backend
+    # The unknown argument makes the creation of the simulation fail
+    runner = TrialRunner( Nz, zmax, Nr, rmax, Nm, dt, zmin, 'open', 1, 1,
+                          1, False, dict( sim_kw, unknown_argument=0 ) )
+    config = TunedConfiguration( 16, None, None, 1, 1,
+        fourier.available_fft_backends[-1], { 'gather': 32, 'deposit': 32 } )
+    try:
+        runner.time_step( config )
+    except TypeError:
+        pass
+    else:
+        raise AssertionError( 'The trial simulation should have failed.' )
+    assert cuda_tpb == cuda_tpb_before
+    assert fourier.fft_backend == fft_backend_before
+
+if __name__ == '__main__':
+    test_autotune()
+    test_failed_trial()